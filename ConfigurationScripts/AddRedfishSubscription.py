@@ -21,23 +21,53 @@ import json
 import logging
 import sys
 import warnings
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
 import pprint
 
+import RedfishCapabilityCache
+import RedfishResilience
+from RedfishEventFilters import build_subscription_filters, get_event_service, split_filter_argument
+from RedfishHelpers import read_idracs_csv
+
 warnings.filterwarnings("ignore")
-logging.getLogger().setLevel(logging.INFO)  # Change to logging.DEBUG for detailed logs
+#logging.getLogger().setLevel(logging.INFO)  # Change to logging.DEBUG for detailed logs
+logging.basicConfig(format='%(message)s', stream=sys.stdout, level=logging.INFO)
 
 parser = argparse.ArgumentParser(description="Python script using Redfish to add a Redfish subscription to the iDRAC")
-parser.add_argument('-ip', help='iDRAC IP address', required=True)
-parser.add_argument('-u', help='iDRAC username', required=True)
-parser.add_argument('-p', help='iDRAC password', required=True)
+parser.add_argument('-ip', help='iDRAC IP address, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-u', help='iDRAC username, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-p', help='iDRAC password, argument only required if configuring one iDRAC', required=False)
 parser.add_argument('script_examples', action="store_true",
-                    help="AddRedfishSubscription.py -ip 192.168.0.120 -u root -p calvin -d https://192.168.0.145 -c LMEpzC")
+                    help="AddRedfishSubscription.py -ip 192.168.0.120 -u root -p calvin -d https://192.168.0.145 -c LMEpzC"
+                         " or 'AddRedfishSubscription.py -f iDRACs.csv -d https://192.168.0.145 -c LMEpzC --reconcile' "
+                         "to make sure every iDRAC in the CSV file has exactly one matching subscription")
 parser.add_argument('-d', help='Redfish listener destination address', required=True)
 parser.add_argument('-c', help='Context ID for the subscription. Use a string to uniquely identify the subscription',
                     default='LMEpzC', required=False)
+parser.add_argument('-f', help='Pass in csv file name. If file is not located in same directory as script, pass in the '
+                               'full directory path with file name. NOTE: Make sure to use iDRACs.csv file from the '
+                               'repo which has the correct format. iDRACs from the CSV file are always reconciled, see '
+                               '--reconcile.', required=False)
+parser.add_argument('--event-format-type', help='EventFormatType of the subscription. Possible values are MetricReport'
+                                                '/Event', default='MetricReport', required=False)
+parser.add_argument('--metric-report-definitions', help='Comma separated metric report names the subscription is '
+                    'limited to, for example PowerMetrics,ThermalSensor. Default is all metric reports', required=False)
+parser.add_argument('--registry-prefixes', help='Comma separated message registry prefixes the subscription is limited '
+                    'to, for example iDRAC', required=False)
+parser.add_argument('--resource-types', help='Comma separated resource types the subscription is limited to, for '
+                    'example Systems', required=False)
+parser.add_argument('--reconcile', help='Compare the existing subscriptions of each iDRAC with the desired '
+                                        'subscription and only add or delete what differs. Subscriptions with the '
+                                        'same destination which do not match the desired subscription are deleted.',
+                    action='store_true')
+parser.add_argument('--dry-run', help='Print the change plan of --reconcile without applying it', action='store_true')
+parser.add_argument('--max-workers', help='Number of iDRACs reconciled concurrently', type=int, default=16,
+                    required=False)
 
+RedfishResilience.add_arguments(parser)
 args = vars(parser.parse_args())
+RedfishResilience.configure_from_args(args)
 
 idrac_ip = args["ip"]
 idrac_username = args["u"]
@@ -45,33 +75,64 @@ idrac_password = args["p"]
 
 
 def validate_telemetry_support():
-    """Ensures that the targeted server supports telemetry before we take action"""
+    """Ensures that the targeted server supports telemetry before we take action, using the capability cache"""
 
-    url = 'https://{}/redfish/v1/TelemetryService'.format(idrac_ip)
-    headers = {'content-type': 'application/json'}
-    response = requests.get(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
-    if response.status_code != 200:
+    capabilities = RedfishCapabilityCache.get_capabilities(idrac_ip, idrac_username, idrac_password)
+    if not capabilities["TelemetrySupported"]:
         logging.error("Script can not be executed because the Datacenter license is not installed, telemetry is not"
                       " activated or iDRAC firmware does not support Telemetry.")
-        logging.error(pprint.pformat(json.loads(response.text).get("error", {}).get("@Message.ExtendedInfo", [{}])[0].get("Message", "")))
+        logging.error(pprint.pformat(capabilities.get("TelemetryError", "")))
         sys.exit(0)
 
 
-def add_subscription():
-    """Adds a subscription to a target server"""
-    destination = args["d"]
-    context_id = args["c"]
+def filters_requested():
+    return any(args[name] for name in ("metric_report_definitions", "registry_prefixes", "resource_types"))
+
+
+def desired_subscription(event_service=None):
+    """Returns the subscription payload described by the script arguments
+
+    :param event_service: EventService of the target iDRAC, required to add filters the firmware supports
+    """
+    event_format_type = args["event_format_type"]
     payload = {
-        "Destination": destination,
+        "Destination": args["d"],
         "Protocol": "Redfish",
         "SubscriptionType": "RedfishEvent",
-        "Context": context_id,
-        "EventTypes": ["MetricReport"],
-        "EventFormatType": "MetricReport"}
-    url = 'https://{}/redfish/v1/EventService/Subscriptions'.format(idrac_ip)
+        "Context": args["c"],
+        "EventTypes": ["MetricReport" if event_format_type == "MetricReport" else "Alert"],
+        "EventFormatType": event_format_type}
+    if event_service is not None:
+        payload.update(build_subscription_filters(event_service,
+                                                  split_filter_argument(args["metric_report_definitions"]),
+                                                  split_filter_argument(args["registry_prefixes"]),
+                                                  split_filter_argument(args["resource_types"])))
+    return payload
+
+
+def desired_subscription_for(ip, user, pwd):
+    """Returns the desired subscription for a target server, the EventService is only read when filters are used"""
+    if not filters_requested():
+        return desired_subscription()
+    return desired_subscription(get_event_service(ip, user, pwd))
+
+
+def post_subscription(ip, user, pwd, payload):
+    url = 'https://{}/redfish/v1/EventService/Subscriptions'.format(ip)
     headers = {'content-type': 'application/json'}
-    response = requests.post(url, data=json.dumps(payload), headers=headers, verify=False,
-                             auth=(idrac_username, idrac_password))
+    return RedfishResilience.post(url, data=json.dumps(payload), headers=headers, verify=False, auth=(user, pwd))
+
+
+def add_subscription():
+    """Adds a subscription to a target server"""
+    try:
+        payload = desired_subscription_for(idrac_ip, idrac_username, idrac_password)
+    except RuntimeError as e:
+        logging.error("FAIL, {}".format(e))
+        sys.exit()
+    destination = payload["Destination"]
+    context_id = payload["Context"]
+    response = post_subscription(idrac_ip, idrac_username, idrac_password, payload)
     if response.status_code != 201:
         logging.error("FAIL, status code for reading attributes is not 200, code is: {}".format(response.status_code))
         if hasattr(response, 'text'):
@@ -85,6 +146,119 @@ def add_subscription():
                                                                                                         context_id))
 
 
+def list_subscriptions(ip, user, pwd):
+    """Returns the subscriptions of a target server.
+
+    The collection is requested with $expand so that an up to date iDRAC costs a single GET. Firmware without $expand
+    support is read member by member, see RedfishCapabilityCache.read_collection.
+    """
+    return RedfishCapabilityCache.read_collection(ip, user, pwd, '/redfish/v1/EventService/Subscriptions')
+
+
+SUBSCRIPTION_FILTERS = ("MetricReportDefinitions", "RegistryPrefixes", "ResourceTypes")
+
+
+def normalize_filter_values(values):
+    """Returns a sortable list of values, links such as MetricReportDefinitions are compared by their URI"""
+    return sorted(value.get("@odata.id", "") if isinstance(value, dict) else value for value in values or [])
+
+
+def subscription_matches(subscription, desired):
+    """Checks whether an existing subscription delivers the same events as the desired subscription"""
+    # Filters are compared even when not desired, a filtered subscription does not deliver every event
+    for key in SUBSCRIPTION_FILTERS:
+        if normalize_filter_values(subscription.get(key)) != normalize_filter_values(desired.get(key)):
+            return False
+    for key, value in desired.items():
+        if key in SUBSCRIPTION_FILTERS:
+            continue
+        if key == "SubscriptionType" and key not in subscription:
+            continue  # older firmware does not report SubscriptionType
+        if isinstance(value, list):
+            if normalize_filter_values(subscription.get(key)) != normalize_filter_values(value):
+                return False
+        elif subscription.get(key) != value:
+            return False
+    return True
+
+
+def plan_subscription_changes(subscriptions, desired):
+    """Computes the subscriptions to add and delete so that exactly one subscription matches the desired one.
+
+    Only subscriptions to the desired destination are considered, subscriptions of other listeners are never touched,
+    even when they use the same context. The first matching subscription is kept, duplicates and outdated ones are
+    deleted.
+
+    :return: tuple of (payloads to add, subscription URIs to delete)
+    """
+    managed = [subscription for subscription in subscriptions
+               if subscription.get("Destination") == desired["Destination"]]
+    keep = next((subscription for subscription in managed if subscription_matches(subscription, desired)), None)
+    deletes = [subscription["@odata.id"] for subscription in managed if subscription is not keep]
+    adds = [] if keep else [desired]
+    return adds, deletes
+
+
+def reconcile_subscriptions(ip, user, pwd, dry_run=False):
+    """Reconciles the subscriptions of a single iDRAC and returns a report of what was planned and applied"""
+    report = {"iDRAC": ip, "adds": 0, "deletes": 0, "status": "unchanged", "error": ""}
+    try:
+        desired = desired_subscription_for(ip, user, pwd)
+        adds, deletes = plan_subscription_changes(list_subscriptions(ip, user, pwd), desired)
+        report.update({"adds": len(adds), "deletes": len(deletes)})
+        for uri in deletes:
+            logging.info("- PLAN, iDRAC {}: delete subscription {}".format(ip, uri))
+        for payload in adds:
+            logging.info("- PLAN, iDRAC {}: add subscription to '{}' with context id '{}'".format(
+                ip, payload["Destination"], payload["Context"]))
+        if not (adds or deletes):
+            return report
+        if dry_run:
+            report["status"] = "planned"
+            return report
+        # Add first, the listener keeps receiving events through the outdated subscription until the new one exists
+        for payload in adds:
+            response = post_subscription(ip, user, pwd, payload)
+            if response.status_code != 201:
+                raise RuntimeError("status code for adding subscription is not 201, code is: {}, response is: "
+                                   "{}".format(response.status_code, response.text))
+        for uri in deletes:
+            response = RedfishResilience.delete('https://{}{}'.format(ip, uri),
+                                                headers={'content-type': 'application/json'}, verify=False,
+                                                auth=(user, pwd))
+            if response.status_code not in (200, 204):
+                raise RuntimeError("status code for deleting subscription {} is not 200, code is: {}".format(
+                    uri, response.status_code))
+        report["status"] = "changed"
+    except Exception as e:
+        report.update({"status": "failed", "error": str(e)})
+        logging.error("- FAIL, unable to reconcile subscriptions for iDRAC {}: {}".format(ip, e))
+    return report
+
+
+def reconcile_fleet(idracs):
+    """Reconciles all iDRACs concurrently and logs a per iDRAC report
+
+    :param idracs: list of (ip, username, password) tuples
+    """
+    with ThreadPoolExecutor(max_workers=max(1, args["max_workers"])) as executor:
+        reports = list(executor.map(lambda idrac: reconcile_subscriptions(*idrac, args["dry_run"]), idracs))
+    logging.info(" Subscription reconcile report ".center(100, "*"))
+    for report in reports:
+        logging.info("iDRAC: {iDRAC:<20} status: {status:<10} adds: {adds} deletes: {deletes} {error}".format(**report))
+    logging.info("".center(100, "*"))
+    return reports
+
+
 if __name__ == "__main__":
+    if args["f"]:
+        reports = reconcile_fleet(read_idracs_csv(args["f"]))
+        sys.exit(1 if any(report["status"] == "failed" for report in reports) else 0)
+    if not (idrac_ip and idrac_username and idrac_password):
+        logging.error("- ERROR, -ip, -u and -p are required arguments when not using the -f argument")
+        sys.exit(0)
+    if args["reconcile"]:
+        reports = reconcile_fleet([(idrac_ip, idrac_username, idrac_password)])
+        sys.exit(1 if reports[0]["status"] == "failed" else 0)
     validate_telemetry_support()
     add_subscription()
@@ -0,0 +1,210 @@
+#
+# ApplyTelemetryReportProfile.py Python script using Redfish API to apply a declarative telemetry report profile
+# (enabled reports, RecurrenceInterval, Metrics and Wildcards) to one iDRAC or all iDRACs of a CSV file.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import argparse
+import json
+import logging
+import re
+import sys
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import RedfishCapabilityCache
+import RedfishResilience
+from RedfishHelpers import read_idracs_csv
+
+warnings.filterwarnings("ignore")
+logging.basicConfig(format='%(message)s', stream=sys.stdout, level=logging.INFO)
+
+parser = argparse.ArgumentParser(description="Python script using Redfish to apply a telemetry report profile to one "
+                                             "iDRAC using script arguments or multiple iDRACs using CSV file. Only the "
+                                             "metric report definitions which differ from the profile are changed.")
+parser.add_argument('--script-examples', action="store_true", help='Prints script examples')
+parser.add_argument('-ip', help='iDRAC IP address, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-u', help='iDRAC username, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-p', help='iDRAC password, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-f', help='Pass in csv file name. If file is not located in same directory as script, pass in the '
+                               'full directory path with file name. NOTE: Make sure to use iDRACs.csv file from the '
+                               'repo which has the correct format.', required=False)
+parser.add_argument('--profile', help='Pass in the telemetry report profile JSON file. See TelemetryReportProfile.json '
+                                      'in the repo for the format.', required=False)
+parser.add_argument('--dry-run', help='Print the changes for each iDRAC without applying them', action='store_true')
+parser.add_argument('--max-workers', help='Number of iDRACs configured concurrently', type=int, default=16,
+                    required=False)
+
+RedfishResilience.add_arguments(parser)
+args = vars(parser.parse_args())
+RedfishResilience.configure_from_args(args)
+
+headers = {'content-type': 'application/json'}
+
+
+def print_examples():
+    """
+    Print program examples and exit
+    """
+    print(
+        '\n\'ApplyTelemetryReportProfile.py -ip 192.168.0.120 -u root -p calvin --profile TelemetryReportProfile.json\', this example will apply the profile to a single iDRAC\n'
+        '\n\'ApplyTelemetryReportProfile.py -f iDRACs.csv --profile TelemetryReportProfile.json --dry-run\', this example will print the changes the profile would make on all iDRACs in CSV file without applying them.\n')
+
+
+def load_profile(file_name):
+    """Loads the telemetry report profile.
+
+    Format: {"ServiceEnabled": true, "DisableOtherReports": false,
+             "Reports": {"<report Id>": {"Enabled": true, "RecurrenceInterval": "PT60S", "Metrics": ["<MetricId>", ...],
+                                         "Wildcards": [{"Name": ..., "Values": [...]}]}}}
+    """
+    try:
+        with open(file_name, "r") as file:
+            profile = json.load(file)
+    except Exception as e:
+        logging.error("- ERROR, unable to load profile file {}: {}".format(file_name, e))
+        sys.exit(0)
+    if not isinstance(profile.get("Reports"), dict):
+        logging.error("- ERROR, profile file {} has no \"Reports\" object".format(file_name))
+        sys.exit(0)
+    return profile
+
+
+def duration_seconds(duration):
+    """Converts an ISO 8601 duration such as PT0H1M0S or PT60S to seconds so that equal intervals compare equal"""
+    match = re.match(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$', duration or '')
+    if not match:
+        return duration
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 86400 + int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds or 0))
+
+
+def metric_ids(metrics):
+    return sorted(metric.get("MetricId", "") if isinstance(metric, dict) else metric for metric in metrics or [])
+
+
+def wildcards(values):
+    return sorted((wildcard.get("Name", ""), sorted(wildcard.get("Values", []))) for wildcard in values or [])
+
+
+def report_changes(definition, desired):
+    """Returns the PATCH payload needed to make a metric report definition match the profile, empty if it matches"""
+    payload = {}
+    if "Enabled" in desired and definition.get("MetricReportDefinitionEnabled") != desired["Enabled"]:
+        payload["MetricReportDefinitionEnabled"] = desired["Enabled"]
+    current_interval = definition.get("Schedule", {}).get("RecurrenceInterval")
+    if "RecurrenceInterval" in desired and \
+            duration_seconds(current_interval) != duration_seconds(desired["RecurrenceInterval"]):
+        payload["Schedule"] = {"RecurrenceInterval": desired["RecurrenceInterval"]}
+    if "Metrics" in desired and metric_ids(definition.get("Metrics")) != metric_ids(desired["Metrics"]):
+        payload["Metrics"] = [metric if isinstance(metric, dict) else {"MetricId": metric}
+                              for metric in desired["Metrics"]]
+    if "Wildcards" in desired and wildcards(definition.get("Wildcards")) != wildcards(desired["Wildcards"]):
+        payload["Wildcards"] = desired["Wildcards"]
+    return payload
+
+
+def get_report_definitions(ip, user, pwd):
+    """
+    Reads all metric report definitions of an iDRAC, with a single GET when the firmware supports $expand, see
+    RedfishCapabilityCache.read_collection
+    """
+    return RedfishCapabilityCache.read_collection(ip, user, pwd, '/redfish/v1/TelemetryService/MetricReportDefinitions')
+
+
+def plan_profile_changes(definitions, profile):
+    """Computes the PATCH requests needed to apply the profile
+
+    :return: list of (metric report definition URI, payload) tuples
+    """
+    desired_reports = profile["Reports"]
+    changes = []
+    for definition in definitions:
+        desired = desired_reports.get(definition.get("Id"))
+        if desired is None:
+            if not (profile.get("DisableOtherReports") and definition.get("MetricReportDefinitionEnabled")):
+                continue
+            desired = {"Enabled": False}
+        payload = report_changes(definition, desired)
+        if payload:
+            changes.append((definition["@odata.id"], payload))
+    return changes
+
+
+def apply_profile(ip, user, pwd, profile, dry_run=False):
+    """Applies the profile to one iDRAC and returns a report of the changes"""
+    report = {"iDRAC": ip, "changes": 0, "status": "unchanged", "error": ""}
+    try:
+        patches = []
+        if "ServiceEnabled" in profile:
+            url = 'https://{}/redfish/v1/TelemetryService'.format(ip)
+            response = RedfishResilience.get(url, headers=headers, verify=False, auth=(user, pwd))
+            if response.status_code != 200:
+                raise RuntimeError("status code for reading TelemetryService is not 200, code is: {}".format(
+                    response.status_code))
+            if response.json().get("ServiceEnabled") != profile["ServiceEnabled"]:
+                patches.append(('/redfish/v1/TelemetryService', {"ServiceEnabled": profile["ServiceEnabled"]}))
+        definitions = get_report_definitions(ip, user, pwd)
+        missing = set(profile["Reports"]) - set(definition.get("Id") for definition in definitions)
+        if missing:
+            logging.warning("- WARNING, iDRAC {} has no metric report definitions {}".format(ip, sorted(missing)))
+        patches.extend(plan_profile_changes(definitions, profile))
+        # Reports can only be sent once the telemetry service is enabled, and should stop before it is disabled
+        if patches and patches[0][0] == '/redfish/v1/TelemetryService' and not profile["ServiceEnabled"]:
+            patches.append(patches.pop(0))
+        report["changes"] = len(patches)
+        for uri, payload in patches:
+            logging.info("- PLAN, iDRAC {}: PATCH {} {}".format(ip, uri, json.dumps(payload)))
+        if not patches:
+            return report
+        if dry_run:
+            report["status"] = "planned"
+            return report
+        for uri, payload in patches:
+            response = RedfishResilience.patch('https://{}{}'.format(ip, uri), data=json.dumps(payload),
+                                               headers=headers, verify=False, auth=(user, pwd))
+            if response.status_code not in (200, 202, 204):
+                raise RuntimeError("status code for PATCH {} is not 200, code is: {}, response is: {}".format(
+                    uri, response.status_code, response.text))
+        report["status"] = "changed"
+    except Exception as e:
+        report.update({"status": "failed", "error": str(e)})
+        logging.error("- FAIL, unable to apply the telemetry report profile to iDRAC {}: {}".format(ip, e))
+    return report
+
+
+def apply_profile_to_fleet(idracs, profile):
+    """Applies the profile to all iDRACs concurrently and logs a per iDRAC report
+
+    :param idracs: list of (ip, username, password) tuples
+    """
+    with ThreadPoolExecutor(max_workers=max(1, args["max_workers"])) as executor:
+        reports = list(executor.map(lambda idrac: apply_profile(*idrac, profile, args["dry_run"]), idracs))
+    logging.info(" Telemetry report profile report ".center(100, "*"))
+    for report in reports:
+        logging.info("iDRAC: {iDRAC:<20} status: {status:<10} changes: {changes} {error}".format(**report))
+    logging.info("".center(100, "*"))
+    return reports
+
+
+if __name__ == "__main__":
+    if args["script_examples"]:
+        print_examples()
+    elif args["profile"] and (args["f"] or (args["ip"] and args["u"] and args["p"])):
+        idracs = read_idracs_csv(args["f"]) if args["f"] else [(args["ip"], args["u"], args["p"])]
+        reports = apply_profile_to_fleet(idracs, load_profile(args["profile"]))
+        sys.exit(1 if any(report["status"] == "failed" for report in reports) else 0)
+    else:
+        logging.warning("- WARNING, missing or incorrect arguments passed in for executing script")
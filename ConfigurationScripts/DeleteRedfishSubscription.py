@@ -22,7 +22,9 @@ import json
 import logging
 import sys
 import warnings
-import requests
+
+import RedfishCapabilityCache
+import RedfishResilience
 
 warnings.filterwarnings("ignore")
 logging.getLogger().setLevel(logging.INFO)  # Change to logging.DEBUG for detailed logs
@@ -39,7 +41,9 @@ parser.add_argument('-v', help='To view the existing subscription/s', action='st
 parser.add_argument('-d', help='The subscription ID to be deleted', required=False)
 parser.add_argument('-a', help='Delete all subscriptions', action="store_true")
 
+RedfishResilience.add_arguments(parser)
 args = vars(parser.parse_args())
+RedfishResilience.configure_from_args(args)
 
 idrac_ip = args["ip"]
 idrac_username = args["u"]
@@ -48,13 +52,11 @@ headers = {'content-type': 'application/json'}
 
 
 def validate_telemetry_support():
-    url = 'https://{}/redfish/v1/TelemetryService'.format(idrac_ip)
-    response = requests.get(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
-    if response.status_code != 200:
+    capabilities = RedfishCapabilityCache.get_capabilities(idrac_ip, idrac_username, idrac_password)
+    if not capabilities["TelemetrySupported"]:
         logging.error("Script can not be executed because the Datacenter license is not installed, telemetry is not"
                       " activated or iDRAC firmware does not support Telemetry.")
-        logging.error(
-            json.loads(response.text).get("error", {}).get("@Message.ExtendedInfo", [{}])[0].get("Message", ""))
+        logging.error(capabilities.get("TelemetryError", ""))
         sys.exit(0)
 
 
@@ -62,8 +64,8 @@ def log_subscription_details(subscriptions):
     logging.info("The active subscriptions are ".center(100, "*"))
     subscription_ids = []
     for subscription in subscriptions:
-        response = requests.get('https://{}{}'.format(idrac_ip, subscription.get("@odata.id", "")), headers=headers,
-                                verify=False, auth=(idrac_username, idrac_password))
+        response = RedfishResilience.get('https://{}{}'.format(idrac_ip, subscription.get("@odata.id", "")),
+                                         headers=headers, verify=False, auth=(idrac_username, idrac_password))
         if response.status_code == 200:
             response_date = json.loads(response.text)
             subscription_ids.append(response_date.get("Id", ""))
@@ -82,7 +84,7 @@ def log_subscription_details(subscriptions):
 def view_subscriptions():
     if args["v"]:
         url = 'https://{}/redfish/v1/EventService/Subscriptions'.format(idrac_ip)
-        response = requests.get(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
+        response = RedfishResilience.get(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
         if response.status_code == 200:
             response_date = json.loads(response.text)
             subscriptions = response_date.get("Members")
@@ -96,7 +98,7 @@ def view_subscriptions():
 def delete_subscription(subscription_id):
     logging.info("Attempting to delete subscription with ID : {}".format(subscription_id))
     url = 'https://{}/redfish/v1/EventService/Subscriptions/{}'.format(idrac_ip, subscription_id)
-    response = requests.delete(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
+    response = RedfishResilience.delete(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
     if response.status_code == 200:
         logging.info("Successfully deleted subscription with ID : {}".format(subscription_id))
     else:
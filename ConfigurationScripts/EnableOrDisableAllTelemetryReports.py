@@ -22,7 +22,8 @@ import json
 import logging
 import sys
 import warnings
-import requests
+
+import RedfishResilience
 
 warnings.filterwarnings("ignore")
 #logging.getLogger().setLevel(logging.INFO)  # Change to logging.DEBUG for detailed logs
@@ -36,7 +37,9 @@ parser.add_argument('-p', help='iDRAC password, argument only required if config
 parser.add_argument('-s', help='Pass in the report status to be set. Possible values are Enabled/Disabled', default='Enabled', required=False)
 parser.add_argument('-f', help='Pass in csv file name. If file is not located in same directory as script, pass in the full directory path with file name. NOTE: Make sure to use iDRACs.csv file from the repo which has the correct format.', required=False)
 
+RedfishResilience.add_arguments(parser)
 args = vars(parser.parse_args())
+RedfishResilience.configure_from_args(args)
 
 def print_examples():
     """
@@ -55,10 +58,9 @@ def get_attributes(ip, user, pwd):
     # Use redfish API instead of AR
     url = 'https://{}/redfish/v1/TelemetryService/MetricReportDefinitions'.format(ip)
     headers = {'content-type': 'application/json'}
-    response = requests.get(url, headers=headers, verify=False, auth=(user, pwd))
+    response = RedfishResilience.get(url, headers=headers, verify=False, auth=(user, pwd))
     if response.status_code != 200:
-        logging.error("- FAIL, status code for reading attributes is not 200, code is: {}".format(response.status_code))
-        sys.exit()
+        raise RuntimeError("status code for reading attributes is not 200, code is: {}".format(response.status_code))
     try:
         logging.info("- INFO, successfully pulled configuration attributes")
         configurations_dict = json.loads(response.text)
@@ -66,8 +68,7 @@ def get_attributes(ip, user, pwd):
         telemetry_attributes = [map['@odata.id'] for map in attributes]
         logging.debug(telemetry_attributes)
     except Exception as e:
-        logging.error("- FAIL: detailed error message: {0}".format(e))
-        sys.exit()
+        raise RuntimeError("detailed error message: {0}".format(e))
 
 
 def set_attributes(ip, user, pwd):
@@ -86,44 +87,54 @@ def set_attributes(ip, user, pwd):
     # Enable global telemetry service    
     if status_to_set == 'Enabled':
         url = 'https://{}/redfish/v1/TelemetryService'.format(ip)
-        response = requests.patch(url, data=json.dumps({"ServiceEnabled": True}), headers=headers,
-                                verify=False, auth=(user, pwd))
+        response = RedfishResilience.patch(url, data=json.dumps({"ServiceEnabled": True}), headers=headers,
+                                           verify=False, auth=(user, pwd))
         if response.status_code != 200:
-            logging.error("- FAIL, status code for reading attributes is not 200, code is: {}".format(response.status_code))
             logging.debug(str(response))
-            sys.exit()
+            raise RuntimeError("status code for enabling telemetry is not 200, code is: {}".format(
+                response.status_code))
 
     # Go to each metric report definition and enable or disable based on input
     for uri in telemetry_attributes:
         url = 'https://{}{}'.format(ip,uri)
-        response = requests.patch(url, data=json.dumps({"MetricReportDefinitionEnabled": status_to_set=='Enabled'}), headers=headers,
-                              verify=False, auth=(user, pwd))
-
-    if response.status_code != 200:
-        logging.error("- FAIL, status code for reading attributes is not 200, code is: {}".format(response.status_code))
-        logging.debug(str(response))
-        sys.exit()
+        response = RedfishResilience.patch(url,
+                                           data=json.dumps({"MetricReportDefinitionEnabled": status_to_set=='Enabled'}),
+                                           headers=headers, verify=False, auth=(user, pwd))
+        if response.status_code != 200:
+            logging.debug(str(response))
+            raise RuntimeError("status code for setting {} is not 200, code is: {}".format(uri, response.status_code))
 
     # Disable global telemetry service 
     if status_to_set == 'Disabled':
         url = 'https://{}/redfish/v1/TelemetryService'.format(ip)
-        response = requests.patch(url, data=json.dumps({"ServiceEnabled": False}), headers=headers,
-                                verify=False, auth=(user, pwd))
+        response = RedfishResilience.patch(url, data=json.dumps({"ServiceEnabled": False}), headers=headers,
+                                           verify=False, auth=(user, pwd))
 
         if response.status_code != 200:
-            logging.error("- FAIL, status code for reading attributes is not 200, code is: {}".format(response.status_code))
             logging.debug(str(response))
-            sys.exit()
+            raise RuntimeError("status code for disabling telemetry is not 200, code is: {}".format(
+                response.status_code))
     
     logging.info("- INFO, successfully '{}' iDRAC Telemetry and all supported metric reports".format(status_to_set))
 
 
+def configure_idrac(ip, user, pwd):
+    """Sets the report status on one iDRAC and returns False if it failed, so a CSV run continues with the next one"""
+    try:
+        get_attributes(ip, user, pwd)
+        set_attributes(ip, user, pwd)
+    except Exception as e:
+        logging.error("- FAIL, unable to set the report status of iDRAC {}: {}".format(ip, e))
+        return False
+    return True
+
+
 if __name__ == "__main__":
     if args["script_examples"]:
         print_examples()
     elif args["ip"] and args["u"] and args["p"] and args["s"]:
-        get_attributes(args["ip"], args["u"], args["p"])
-        set_attributes(args["ip"], args["u"], args["p"])
+        if not configure_idrac(args["ip"], args["u"], args["p"]):
+            sys.exit(1)
     elif args["s"] and args["f"] and args["s"]:
         try:
             open_csv_file = open(args["f"], encoding='UTF8')
@@ -132,9 +143,13 @@ if __name__ == "__main__":
             sys.exit(0)
         csv_reader = csv.reader(open_csv_file)
         next(csv_reader)
+        failed = 0
         for line in csv_reader:
             logging.info("\n- %s Telemetry attributes for iDRAC %s -\n" % (args["s"], line[0]))
-            get_attributes(line[0], line[1], line[2])
-            set_attributes(line[0], line[1], line[2])
+            if not configure_idrac(line[0], line[1], line[2]):
+                failed += 1
+        if failed:
+            logging.error("- FAIL, unable to set the report status of {} iDRACs".format(failed))
+            sys.exit(1)
     else:
         logging.warning("- WARNING, missing or incorrect arguments passed in for executing script")
@@ -23,11 +23,14 @@ import logging
 import os
 import re
 import sys
-import time
 import warnings
-from datetime import datetime, timedelta
 
 import requests
+import urllib3
+
+import RedfishResilience
+import TelemetryConfigCache
+from RedfishJobTracker import JobTracker
 
 warnings.filterwarnings("ignore")
 logging.getLogger().setLevel(logging.INFO)  # Change to logging.DEBUG for detailed logs
@@ -44,21 +47,31 @@ parser.add_argument('--filename',
                          'the local folder',
                     required=True)
 
+RedfishResilience.add_arguments(parser)
 args = vars(parser.parse_args())
+RedfishResilience.configure_from_args(args)
 
 idrac_ip = args["ip"]
 idrac_username = args["u"]
 idrac_password = args["p"]
 
 
+TELEMETRY_ATTRIBUTE_PATTERN = re.compile('Telemetry', re.IGNORECASE)
+
+
 def export_server_configuration_profile():
     global job_id
     url = 'https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Actions/Oem/EID_674_Manager.ExportSystemConfiguration' % idrac_ip
+    # Telemetry attributes only exist in the iDRAC component, SCP export can not be narrowed further than a component
     payload = {"ExportFormat": "JSON", "ShareParameters": {"Target": "IDRAC"}, "ExportUse": 'Default',
                "IncludeInExport": "Default"}
     headers = {'content-type': 'application/json'}
-    response = requests.post(url, data=json.dumps(payload), headers=headers, verify=False,
-                             auth=(idrac_username, idrac_password))
+    try:
+        response = RedfishResilience.post(url, data=json.dumps(payload), headers=headers, verify=False,
+                                          auth=(idrac_username, idrac_password))
+    except requests.exceptions.RequestException as e:
+        logging.error("FAIL, unable to create the SCP export job on iDRAC {}: {}".format(idrac_ip, e))
+        sys.exit()
     if response.status_code != 202:
         logging.error("FAIL, status code for SCP export is not 202, code is: {}".format(response.status_code))
         sys.exit()
@@ -84,52 +97,71 @@ def save_configurations(configurations):
         logging.exception("Unable to save the Telemetry configuration as JSON file. the Exception is {}".format(str(e)))
 
 
+def iterate_scp_attributes(response):
+    """Yields the attributes of all components of the exported SCP.
+
+    When the optional ijson library is installed the SCP is parsed while it is downloaded, so only one attribute is
+    held in memory at a time. Otherwise the whole document is decoded.
+    """
+    try:
+        import ijson
+    except ImportError:
+        logging.debug("ijson is not installed, decoding the complete SCP. Install it with `pip install ijson` to "
+                      "reduce memory usage")
+        scp_content = json.loads(response.content.decode())
+        for component in scp_content.get('SystemConfiguration', {}).get('Components', []):
+            for attribute in component.get('Attributes', []):
+                yield attribute
+        return
+    response.raw.decode_content = True
+    for attribute in ijson.items(response.raw, 'SystemConfiguration.Components.item.Attributes.item',
+                                 use_float=True):
+        yield attribute
+
+
 def download_scp():
-    response = requests.get('https://%s/redfish/v1/TaskService/Tasks/%s' % (idrac_ip, job_id),
-                            auth=(idrac_username, idrac_password), verify=False)
-    if response.status_code != 200:
-        logging.error(
-            "FAIL, status code while getting the SCP content is not 200, code is: {}".format(response.status_code))
+    try:
+        response = RedfishResilience.get('https://%s/redfish/v1/TaskService/Tasks/%s' % (idrac_ip, job_id),
+                                         auth=(idrac_username, idrac_password), verify=False, stream=True)
+        if response.status_code != 200:
+            logging.error(
+                "FAIL, status code while getting the SCP content is not 200, code is: {}".format(response.status_code))
+            sys.exit()
+        with response:
+            telemetry_componenets = [attribute for attribute in iterate_scp_attributes(response)
+                                     if TELEMETRY_ATTRIBUTE_PATTERN.search(attribute.get('Name', ''))]
+    except RedfishResilience.CircuitOpenError as e:
+        logging.error("FAIL, iDRAC {} is unreachable, SCP content not downloaded: {}".format(idrac_ip, e))
+        sys.exit()
+    except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+        # the SCP is streamed, a read timeout may also come from urllib3 while it is decoded
+        logging.error("FAIL, unable to download the SCP content of iDRAC {}: {}".format(idrac_ip, e))
         sys.exit()
-    scp_content = json.loads(response.content.decode())
-    components = scp_content.get('SystemConfiguration', {}).get('Components', list(dict()))[0].get('Attributes', dict())
-    telemetry_componenets = list(filter(lambda x: re.search('Telemetry', x.get('Name'), re.IGNORECASE), components))
     if not telemetry_componenets:
         logging.error("No Telemetry configurations exist in the exported SCP. Exiting the script")
         sys.exit()
     save_configurations(telemetry_componenets)
+    TelemetryConfigCache.store(idrac_ip, TelemetryConfigCache.canonical_attributes(telemetry_componenets))
 
 
 def loop_job_status():
-    start_time = datetime.now()
-    while True:
-        response = requests.get('https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Jobs/%s' % (idrac_ip, job_id),
-                                auth=(idrac_username, idrac_password), verify=False)
-        status_code = response.status_code
-        if status_code != 200:
-            logging.error("FAIL, Command failed to check job status, return code is {}".format(status_code))
-            logging.debug("Extended Info Message: {0}".format(response.json()))
-            sys.exit()
-        data = response.json()
-        if datetime.now() > (start_time + timedelta(minutes=5)):
-            logging.error("FAIL: Timeout of 5 minutes has been hit, script stopped")
-            sys.exit()
-        elif re.search('Fail', data[u'Message'], re.IGNORECASE):
-            logging.error("FAIL: job ID '{}' failed, failed message is: {}".format(job_id, data['Message']))
-            sys.exit()
-        elif data[u'JobState'] == "Completed":
-            if data[u'Message'] == "Successfully exported Server Configuration Profile":
-                logging.info("PASS: job ID '{}' completed with message is: {}".format(job_id, data['Message']))
-                logging.info("PASS - Final Detailed Job Status {}".format(data[u'JobState']).center(50, '-'))
-            else:
-                logging.error("FAIL - Final Detailed Job Status {}".format(data[u'JobState']).center(50, '-'))
-            logging.debug(data)
-            break
-        else:
-            logging.info(
-                "Job '{}' not completed, current status: '{}', percent complete: '{}'".format(job_id, data[u'Message'],
-                                                                                              data[u'PercentComplete']))
-            time.sleep(1)
+    tracker = JobTracker(timeout=300)
+    tracker.add(idrac_ip, idrac_username, idrac_password, job_id, 'Export')
+    job = tracker.wait_all()[0]
+    tracker.close()
+    data = job.data
+    if job.state == 'TimedOut':
+        logging.error("FAIL: Timeout of 5 minutes has been hit, script stopped")
+        sys.exit()
+    elif job.state == 'Failed':
+        logging.error("FAIL: job ID '{}' failed, failed message is: {}".format(job_id, job.message))
+        sys.exit()
+    if data.get(u'Message') == "Successfully exported Server Configuration Profile":
+        logging.info("PASS: job ID '{}' completed with message is: {}".format(job_id, data['Message']))
+        logging.info("PASS - Final Detailed Job Status {}".format(data[u'JobState']).center(50, '-'))
+    else:
+        logging.error("FAIL - Final Detailed Job Status {}".format(data.get(u'JobState')).center(50, '-'))
+    logging.debug(data)
 
 
 if __name__ == "__main__":
@@ -23,29 +23,46 @@ import logging
 import os
 import re
 import sys
-import time
 import warnings
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
+import RedfishResilience
+import TelemetryConfigCache
+from RedfishHelpers import read_idracs_csv
+from RedfishJobTracker import JobTracker
 
 warnings.filterwarnings("ignore")
 logging.getLogger().setLevel(logging.INFO)  # Change to logging.DEBUG for detailed logs
 
 parser = argparse.ArgumentParser(
     description="Python script using Server Configuration Profile Redfish API to import iDRAC Telemetry configurations")
-parser.add_argument('-ip', help='iDRAC IP address', required=True)
-parser.add_argument('-u', help='iDRAC username', required=True)
-parser.add_argument('-p', help='iDRAC password', required=True)
+parser.add_argument('-ip', help='iDRAC IP address, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-u', help='iDRAC username, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-p', help='iDRAC password, argument only required if configuring one iDRAC', required=False)
+parser.add_argument('-f', help='Pass in csv file name to import the Telemetry configuration to all iDRACs in the file. '
+                               'NOTE: Make sure to use iDRACs.csv file from the repo which has the correct format.',
+                    required=False)
 parser.add_argument('script_examples', action="store_true",
                     help='ImportTelemetryConfigurationUsingScpREDFISH.py -ip 192.168.0.120 -u root -p calvin --filename '
-                         ' SCP_export_R740.json, this example is going to import Telemetry attributes to local folder')
+                         ' SCP_export_R740.json, this example is going to import Telemetry attributes to local folder. '
+                         'Use -f iDRACs.csv instead of -ip, -u and -p to import to all iDRACs in the CSV file at once')
 parser.add_argument('--filename', help='Pass in unique filename for the Telemetry configuration JSON file which was '
                                        'created by ExportTelemetryConfigurationUsingScpREDFISH.py. Make sure that the'
                                        ' file is edited with all the required changes and is a valid JSON file',
                     required=True)
+parser.add_argument('--timeout', help='Minutes to wait for the import jobs to finish', type=int, default=5,
+                    required=False)
+parser.add_argument('--force', help='Import all attributes of the file, even when the iDRAC already has them',
+                    action='store_true')
+parser.add_argument('--use-cache', help='Skip iDRACs whose cached telemetry attributes, from a previous export or '
+                                        'import, already match the file without reading their live attributes',
+                    action='store_true')
+parser.add_argument('--max-workers', help='Number of iDRACs checked for drift concurrently', type=int, default=16,
+                    required=False)
 
+RedfishResilience.add_arguments(parser)
 args = vars(parser.parse_args())
+RedfishResilience.configure_from_args(args)
 
 idrac_ip = args["ip"]
 idrac_username = args["u"]
@@ -53,7 +70,7 @@ idrac_password = args["p"]
 
 
 def load_telemetry_configurations():
-    global configuration_profile
+    global telemetry_attributes
     try:
         json_file_name = args["filename"]
         logging.info("Saving the Telemetry configurations as '{}' in the folder {}".format(json_file_name, os.getcwd()))
@@ -62,22 +79,59 @@ def load_telemetry_configurations():
     except Exception as e:
         logging.exception("Unable to save the Telemetry configuration as JSON file. the Exception is {}".format(str(e)))
         sys.exit()
-    configuration_profile = {
-        'SystemConfiguration': {'Components': [{'FQDD': 'iDRAC.Embedded.1', 'Attributes': data}]}}
+    telemetry_attributes = data
 
 
-def import_server_configuration_profile():
-    global job_id
-    url = 'https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Actions/Oem/EID_674_Manager.ImportSystemConfiguration' % idrac_ip
+def build_configuration_profile(attributes):
+    return {'SystemConfiguration': {'Components': [{'FQDD': 'iDRAC.Embedded.1', 'Attributes': attributes}]}}
+
+
+def plan_import(ip, user, pwd):
+    """Determines which attributes of the file have to be imported to an iDRAC.
+
+    The live attributes are read with one GET and compared with the file, only drifted attributes are imported.
+    With --use-cache an iDRAC whose cached attributes match the file is skipped without any request.
+
+    :return: list of SCP attributes to import, empty if the iDRAC is already in spec
+    """
+    desired = TelemetryConfigCache.canonical_attributes(telemetry_attributes)
+    if args["force"]:
+        return telemetry_attributes
+    if args["use_cache"] and TelemetryConfigCache.cached_in_spec(ip, desired):
+        logging.info("- INFO, cached telemetry configuration of iDRAC {} matches the file, skipping".format(ip))
+        return []
+    try:
+        live = TelemetryConfigCache.read_live_attributes(ip, user, pwd)
+    except Exception as e:
+        logging.warning("- WARNING, unable to check iDRAC {} for drift, importing all attributes: {}".format(ip, e))
+        return telemetry_attributes
+    drifted = TelemetryConfigCache.drifted_attributes(desired, live)
+    TelemetryConfigCache.store(ip, {name: live.get(name) for name in desired if name in live})
+    if not drifted:
+        logging.info("- INFO, telemetry configuration of iDRAC {} matches the file, skipping".format(ip))
+        return []
+    logging.info("- INFO, iDRAC {} has {} drifted attributes: {}".format(ip, len(drifted), ", ".join(sorted(drifted))))
+    return [attribute for attribute in telemetry_attributes if attribute.get('Name') in drifted]
+
+
+def import_server_configuration_profile(ip, user, pwd, attributes):
+    """Creates the ImportSystemConfiguration job and returns its job id, or None if the job could not be created"""
+    url = 'https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Actions/Oem/EID_674_Manager.ImportSystemConfiguration' % ip
+    configuration_profile = build_configuration_profile(attributes)
     payload = {"ImportBuffer": json.dumps(configuration_profile), "ShareParameters": {"Target": "IDRAC"}}
     headers = {'content-type': 'application/json'}
-    response = requests.post(url, data=json.dumps(payload), headers=headers, verify=False,
-                             auth=(idrac_username, idrac_password))
+    try:
+        response = RedfishResilience.post(url, data=json.dumps(payload), headers=headers, verify=False,
+                                          auth=(user, pwd))
+    except Exception as e:
+        logging.error("FAIL, unable to create the SCP import job on iDRAC {}: {}".format(ip, e))
+        return None
     if response.status_code != 202:
-        logging.error("FAIL, status code for SCP import is not 202, code is: {}".format(response.status_code))
-        sys.exit()
+        logging.error("FAIL, status code for SCP import on iDRAC {} is not 202, code is: {}".format(
+            ip, response.status_code))
+        return None
     else:
-        logging.info("Successfully created for ImportSystemConfiguration Job")
+        logging.info("Successfully created for ImportSystemConfiguration Job on iDRAC {}".format(ip))
     try:
         response_output = response.__dict__
         job_id = response_output["headers"]["Location"]
@@ -85,45 +139,77 @@ def import_server_configuration_profile():
         logging.info("The job id for ImportSystemConfiguration Job is  '{}'.".format(job_id))
     except:
         logging.error("FAIL: detailed error message: {0}".format(response.__dict__['_content']))
-        sys.exit()
+        return None
+    return job_id
 
 
-def loop_job_status():
-    start_time = datetime.now()
-    while True:
-        response = requests.get('https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Jobs/%s' % (idrac_ip, job_id),
-                                auth=(idrac_username, idrac_password), verify=False)
-        status_code = response.status_code
-        if status_code != 200:
-            logging.error("FAIL, Command failed to check job status, return code is {}".format(status_code))
-            logging.debug("Extended Info Message: {0}".format(response.json()))
-            sys.exit()
-        data = response.json()
-        if datetime.now() > (start_time + timedelta(minutes=5)):
-            logging.error("FAIL: Timeout of 5 minutes has been hit, script stopped")
-            sys.exit()
-        elif re.search('Fail', data[u'Message'], re.IGNORECASE):
-            logging.error("FAIL: job ID '{}' failed, failed message is: {}".format(job_id, data['Message']))
-            sys.exit()
-        elif re.search('Completed', data[u'JobState'], re.IGNORECASE):
-            if re.search("Successfully imported", data[u'Message'], re.IGNORECASE):
-                logging.info("PASS: job ID '{}' completed with message is: {}".format(job_id, data['Message']))
-                logging.info("PASS - Final Detailed Job Status '{}' and message : '{}'".format(data[u'JobState'],
-                                                                                               data[u'Message']).center(
-                    100, '-'))
-            else:
-                logging.error("FAIL - Final Detailed Job Status '{}' and message : '{}'".format(data[u'JobState'], data[
-                    u'Message']).center(100, '-'))
-            logging.debug(data)
-            break
+def log_job_result(job):
+    """Logs the final status of an import job and returns True if the import succeeded"""
+    data = job.data
+    if job.state == 'TimedOut':
+        logging.error("FAIL: Timeout of {} minutes has been hit for job ID '{}' on iDRAC {}".format(
+            args["timeout"], job.job_id, job.idrac_ip))
+        return False
+    elif job.state == 'Failed':
+        logging.error("FAIL: job ID '{}' on iDRAC {} failed, failed message is: {}".format(job.job_id, job.idrac_ip,
+                                                                                          job.message))
+        return False
+    elif re.search("Successfully imported", data.get(u'Message', ''), re.IGNORECASE):
+        logging.info("PASS: job ID '{}' on iDRAC {} completed with message is: {}".format(job.job_id, job.idrac_ip,
+                                                                                         data['Message']))
+        logging.info("PASS - Final Detailed Job Status '{}' and message : '{}'".format(data[u'JobState'],
+                                                                                       data[u'Message']).center(
+            100, '-'))
+        logging.debug(data)
+        return True
+    logging.error("FAIL - Final Detailed Job Status '{}' and message : '{}'".format(data.get(u'JobState'), data.get(
+        u'Message')).center(100, '-'))
+    logging.debug(data)
+    return False
+
+
+def import_to_idracs(idracs):
+    """Submits the import to every iDRAC, then tracks all jobs together so the run takes as long as the slowest job
+
+    :param idracs: list of (ip, username, password) tuples
+    :return: number of iDRACs on which the import failed
+    """
+    with ThreadPoolExecutor(max_workers=max(1, args["max_workers"])) as executor:
+        plans = list(executor.map(lambda idrac: plan_import(*idrac), idracs))
+    tracker = JobTracker(timeout=args["timeout"] * 60)
+    imported = {}
+    succeeded = failed = 0
+    for (ip, user, pwd), attributes in zip(idracs, plans):
+        if not attributes:
+            continue
+        job_id = import_server_configuration_profile(ip, user, pwd, attributes)
+        if job_id:
+            tracker.add(ip, user, pwd, job_id, 'Import')
+            imported[ip] = attributes
         else:
-            logging.info(
-                "Job '{}' not completed, current status: '{}', percent complete: '{}'".format(job_id, data[u'Message'],
-                                                                                              data[u'PercentComplete']))
-            time.sleep(1)
+            failed += 1
+    while tracker.pending():
+        for job in tracker.wait_any():
+            if log_job_result(job):
+                succeeded += 1
+                TelemetryConfigCache.store(job.idrac_ip,
+                                           TelemetryConfigCache.canonical_attributes(imported[job.idrac_ip]))
+            else:
+                failed += 1
+    tracker.close()
+    logging.info("- INFO, {} iDRACs already in spec, {} imported, {} failed".format(plans.count([]), succeeded,
+                                                                                      failed))
+    return failed
 
 
 if __name__ == "__main__":
+    if args["f"]:
+        idracs = read_idracs_csv(args["f"])
+    elif idrac_ip and idrac_username and idrac_password:
+        idracs = [(idrac_ip, idrac_username, idrac_password)]
+    else:
+        logging.error("- ERROR, -ip, -u and -p are required arguments when not using the -f argument")
+        sys.exit(0)
     load_telemetry_configurations()
-    import_server_configuration_profile()
-    loop_job_status()
+    if import_to_idracs(idracs):
+        sys.exit(1)
@@ -0,0 +1,213 @@
+#
+# RedfishCapabilityCache. Python module shared by the ConfigurationScripts to cache what each iDRAC supports
+# (telemetry license, firmware version, subscription and SSE filters, $expand, subscription limits) between script runs.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import json
+import logging
+import os
+import time
+
+import RedfishResilience
+
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.idrac_telemetry', 'capabilities')
+DEFAULT_TTL = 3600
+EVENT_SERVICE_PROPERTIES = ('SSEFilterPropertiesSupported', 'RegistryPrefixes', 'ResourceTypes', 'EventFormatTypes',
+                            'EventTypesForSubscription', 'ServerSentEventUri')
+# Resources read during discovery, the ETag of each one is kept to revalidate the entry once the TTL expired. $expand
+# support is not read from the service root, read_collection() records it the first time the firmware rejects $expand
+RESOURCES = {'TelemetryService': '/redfish/v1/TelemetryService',
+             'EventService': '/redfish/v1/EventService'}
+# Read during discovery for the firmware version only, its DateTime changes on every read so its ETag is not kept
+MANAGER = '/redfish/v1/Managers/iDRAC.Embedded.1'
+# iDRAC does not publish its subscription limit through Redfish, iDRAC9 accepts up to 8 Redfish event subscriptions
+DEFAULT_MAX_SUBSCRIPTIONS = 8
+
+
+def cache_file(idrac_ip: str, cache_folder=DEFAULT_CACHE_FOLDER):
+    return os.path.join(cache_folder, '%s.json' % idrac_ip.replace(':', '_'))
+
+
+def load(idrac_ip: str, cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    Returns the cached capabilities of an iDRAC regardless of their age, None if there are none
+    """
+    try:
+        with open(cache_file(idrac_ip, cache_folder), 'r') as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return None
+
+
+def save(idrac_ip: str, capabilities: dict, cache_folder=DEFAULT_CACHE_FOLDER):
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+        temporary_file = cache_file(idrac_ip, cache_folder) + '.tmp'
+        with open(temporary_file, 'w') as file:
+            json.dump(capabilities, file, sort_keys=True)
+        os.replace(temporary_file, cache_file(idrac_ip, cache_folder))
+    except OSError as e:
+        logging.warning("Unable to update the capability cache for iDRAC %s: %s" % (idrac_ip, e))
+
+
+def invalidate(idrac_ip: str, cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    Removes the cached capabilities of an iDRAC, for example after a firmware update or license change
+    """
+    try:
+        os.remove(cache_file(idrac_ip, cache_folder))
+    except OSError:
+        pass
+
+
+def _get(idrac_ip, idrac_username, idrac_password, uri, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    return RedfishResilience.get('https://%s%s' % (idrac_ip, uri), headers=headers, verify=False,
+                                 auth=(idrac_username, idrac_password))
+
+
+def _error_message(response):
+    try:
+        return response.json().get("error", {}).get("@Message.ExtendedInfo", [{}])[0].get("Message", "")
+    except ValueError:
+        return ""
+
+
+def discover(idrac_ip: str, idrac_username: str, idrac_password: str):
+    """
+    Reads the capabilities of an iDRAC from the TelemetryService, EventService and Manager resources
+
+    :param idrac_ip: IP address of the target iDRAC
+    :param idrac_username: Username of the target iDRAC
+    :param idrac_password: Password of the target iDRAC
+    """
+    capabilities = {'ETags': {}}
+    responses = {}
+    for name, uri in RESOURCES.items():
+        response = _get(idrac_ip, idrac_username, idrac_password, uri)
+        responses[name] = response
+        if response.status_code == 200 and response.headers.get('ETag'):
+            capabilities['ETags'][name] = response.headers['ETag']
+
+    telemetry = responses['TelemetryService']
+    capabilities['TelemetrySupported'] = telemetry.status_code == 200
+    capabilities['TelemetryStatusCode'] = telemetry.status_code
+    capabilities['TelemetryError'] = '' if telemetry.status_code == 200 else _error_message(telemetry)
+
+    capabilities['EventServiceStatusCode'] = responses['EventService'].status_code
+    event_service = responses['EventService'].json() if responses['EventService'].status_code == 200 else {}
+    capabilities['EventService'] = {name: event_service[name] for name in EVENT_SERVICE_PROPERTIES
+                                    if name in event_service}
+    capabilities['SSEFilterPropertiesSupported'] = event_service.get('SSEFilterPropertiesSupported', {})
+    capabilities['MaxSubscriptions'] = DEFAULT_MAX_SUBSCRIPTIONS
+
+    manager = _get(idrac_ip, idrac_username, idrac_password, MANAGER)
+    capabilities['FirmwareVersion'] = manager.json().get('FirmwareVersion', '') if manager.status_code == 200 else ''
+    capabilities['Updated'] = time.time()
+    return capabilities
+
+
+def revalidate(idrac_ip: str, idrac_username: str, idrac_password: str, capabilities: dict):
+    """
+    Checks with conditional requests whether the resources a cache entry was built from changed. Returns True when
+    every resource answered 304 Not Modified, resources without an ETag can not be revalidated.
+    """
+    etags = capabilities.get('ETags', {})
+    if set(etags) != set(RESOURCES):
+        return False
+    for name, uri in RESOURCES.items():
+        if _get(idrac_ip, idrac_username, idrac_password, uri, etags[name]).status_code != 304:
+            return False
+    return True
+
+
+def read_collection(idrac_ip: str, idrac_username: str, idrac_password: str, uri: str,
+                    cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    Returns the members of a collection such as /redfish/v1/EventService/Subscriptions. The collection is requested
+    with $expand so that an up to date iDRAC costs a single GET, unless the cached capabilities tell the firmware does
+    not support it. When the firmware rejects $expand, the collection is read again without it and ExpandSupported
+    is set to False in the cache entry, so the next runs do not try $expand again. Members returned as links only are
+    read individually.
+    """
+    url = 'https://%s%s' % (idrac_ip, uri)
+    headers = {'content-type': 'application/json'}
+    capabilities = load(idrac_ip, cache_folder)
+    response = None
+    if not capabilities or capabilities.get('ExpandSupported', True):
+        response = RedfishResilience.get(url + '?$expand=*($levels=1)', headers=headers, verify=False,
+                                         auth=(idrac_username, idrac_password))
+        # Firmware without $expand support answers 400, 405 or 501, authentication failures are not worth a retry
+        if response.status_code == 501 or 400 <= response.status_code < 500 and response.status_code not in (401, 403):
+            logging.debug("iDRAC %s rejected $expand with status code %s" % (idrac_ip, response.status_code))
+            # Without an entry only ExpandSupported is stored, its missing Updated makes get_capabilities discover
+            capabilities = capabilities or {}
+            capabilities['ExpandSupported'] = False
+            save(idrac_ip, capabilities, cache_folder)
+            response = None
+    if response is None:
+        response = RedfishResilience.get(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
+    if response.status_code != 200:
+        raise RuntimeError("status code for reading %s is not 200, code is: %s" % (uri, response.status_code))
+    members = []
+    for member in response.json().get('Members', []):
+        if set(member) <= {'@odata.id'}:
+            response = RedfishResilience.get('https://%s%s' % (idrac_ip, member['@odata.id']), headers=headers,
+                                             verify=False, auth=(idrac_username, idrac_password))
+            if response.status_code != 200:
+                raise RuntimeError("status code for reading %s is not 200, code is: %s" % (
+                    member['@odata.id'], response.status_code))
+            member = response.json()
+        members.append(member)
+    return members
+
+
+def get_capabilities(idrac_ip: str, idrac_username: str, idrac_password: str, ttl=DEFAULT_TTL,
+                     cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    Returns the capabilities of an iDRAC. A cache entry younger than ttl seconds is returned without any request, an
+    older one is revalidated with If-None-Match and only rediscovered when the iDRAC reports a change.
+
+    Example:
+
+    {'TelemetrySupported': True, 'TelemetryError': '', 'ExpandSupported': False, 'FirmwareVersion': '6.00.00.00',
+     'MaxSubscriptions': 8,
+     'SSEFilterPropertiesSupported': {'EventFormatType': True, 'MetricReportDefinition': True, ...},
+     'EventService': {'SSEFilterPropertiesSupported': {...}, 'EventFormatTypes': ['Event', 'MetricReport'], ...},
+     'ETags': {...}, 'Updated': 1650000000.0}
+
+    :param idrac_ip: IP address of the target iDRAC
+    :param idrac_username: Username of the target iDRAC
+    :param idrac_password: Password of the target iDRAC
+    :param ttl: Seconds a cache entry is trusted without contacting the iDRAC, 0 to always revalidate
+    """
+    capabilities = load(idrac_ip, cache_folder)
+    if capabilities and time.time() - capabilities.get('Updated', 0) < ttl:
+        logging.debug("Using cached capabilities for iDRAC %s" % idrac_ip)
+        return capabilities
+    if capabilities and revalidate(idrac_ip, idrac_username, idrac_password, capabilities):
+        logging.debug("Cached capabilities for iDRAC %s revalidated" % idrac_ip)
+    else:
+        expand_supported = (capabilities or {}).get('ExpandSupported')
+        capabilities = discover(idrac_ip, idrac_username, idrac_password)
+        if expand_supported is not None:
+            capabilities['ExpandSupported'] = expand_supported
+    capabilities['Updated'] = time.time()
+    # Authentication failures and iDRAC errors are transient, only a definite answer is cached
+    status_code = capabilities.get('TelemetryStatusCode', 200)
+    if status_code not in (401, 403) and status_code < 500 and capabilities.get('EventServiceStatusCode') == 200:
+        save(idrac_ip, capabilities, cache_folder)
+    return capabilities
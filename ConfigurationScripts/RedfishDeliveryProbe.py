@@ -0,0 +1,344 @@
+#
+# RedfishDeliveryProbe. Python module measuring the iDRAC to listener delivery latency and loss of events: tagged
+# test events are submitted to many iDRACs at a bounded rate and a local HTTPS listener timestamps their arrival.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# An iDRAC only sends a test event to the destination of one of its subscriptions, so a subscription to the probe
+# destination <probe url>/probe/<run id> is added to every iDRAC before the probes are sent and deleted once the run
+# ended. Each test event carries its tag probe/<run id>/<probe number> in MessageArgs and Context, the listener matches
+# the arrivals with their probe by this tag. The latency of a probe is the time between sending its SubmitTestEvent
+# request and the arrival of the event, both measured by this process, so the iDRAC clocks do not matter. A probe
+# accepted by the iDRAC which did not arrive within the wait time is lost, a probe whose SubmitTestEvent failed, or
+# whose iDRAC refused the probe subscription, is only counted as failed.
+#
+
+import json
+import logging
+import os
+import re
+import ssl
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit
+
+import RedfishResilience
+from RedfishHelpers import generate_self_signed_certificate
+
+PROBE_TAG = re.compile(r'probe/(?P<run>[0-9a-f]+)/(?P<number>\d+)')
+DEFAULT_RATE = 20
+DEFAULT_WAIT_SECONDS = 30
+SUBMIT_TEST_EVENT = "https://%s/redfish/v1/EventService/Actions/EventService.SubmitTestEvent"
+SUBSCRIPTIONS = "https://%s/redfish/v1/EventService/Subscriptions"
+
+
+class Probe(object):
+    """One tagged test event, times are time.monotonic() values"""
+    __slots__ = ('number', 'idrac_ip', 'sent', 'submitted', 'arrived', 'error', 'duplicates')
+
+    def __init__(self, number, idrac_ip):
+        self.number = number
+        self.idrac_ip = idrac_ip
+        self.sent = None
+        self.submitted = None
+        self.arrived = None
+        self.error = None
+        self.duplicates = 0
+
+
+class CorrelatorRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        arrived = time.monotonic()
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.correlator.arrival(self.path, body, arrived)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logging.debug("Delivery probe listener: " + format % args)
+
+
+class CorrelatorServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+    ssl_context = None
+
+    def finish_request(self, request, client_address):
+        # The TLS handshake runs on the request thread, in the accepting thread it would delay every other event
+        if self.ssl_context is not None:
+            try:
+                request = self.ssl_context.wrap_socket(request, server_side=True)
+            except (ssl.SSLError, OSError) as e:
+                logging.debug("Delivery probe listener: TLS handshake with %s failed: %s" % (client_address[0], e))
+                return
+        super().finish_request(request, client_address)
+
+
+class DeliveryCorrelator(object):
+    """
+    Listener receiving the tagged test events and matching them with their probe
+
+    :param probe_url: base URL the iDRACs reach this listener on, for example https://192.168.0.130:8443
+    :param address: local address to listen on, the port is the one of probe_url
+    :param cert_file: TLS certificate of the listener, a self signed one is generated when not passed with https
+    :param key_file: private key of cert_file
+    """
+
+    def __init__(self, probe_url, address='0.0.0.0', cert_file=None, key_file=None):
+        url = urlsplit(probe_url)
+        self.probe_url = probe_url.rstrip('/')
+        self.run_id = uuid.uuid4().hex[:12]
+        # destination of the probe subscriptions, shared by every probe of the run
+        self.destination_url = '%s/probe/%s' % (self.probe_url, self.run_id)
+        self.probes = []
+        # arrivals which are not probes of this run, for example late events of a previous run
+        self.stray_events = 0
+        self._lock = threading.Lock()
+        self._all_arrived = threading.Condition(self._lock)
+        self._pending = 0
+        self.server = CorrelatorServer((address, url.port or (443 if url.scheme == 'https' else 80)),
+                                       CorrelatorRequestHandler)
+        self.server.correlator = self
+        if url.scheme == 'https':
+            self.server.ssl_context = self._ssl_context(cert_file, key_file)
+        self._thread = threading.Thread(target=self.server.serve_forever, name='delivery-probe-listener', daemon=True)
+
+    @staticmethod
+    def _ssl_context(cert_file, key_file):
+        if not cert_file:
+            folder = tempfile.mkdtemp(prefix='delivery-probe-')
+            cert_file, key_file = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+            generate_self_signed_certificate(cert_file, key_file)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_file, key_file)
+        return context
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def new_probe(self, idrac_ip):
+        """Returns a new Probe of idrac_ip and the tag its test event carries"""
+        with self._lock:
+            probe = Probe(len(self.probes), idrac_ip)
+            self.probes.append(probe)
+        return probe, 'probe/%s/%d' % (self.run_id, probe.number)
+
+    def submitted(self, probe, error=None):
+        """Records the outcome of the SubmitTestEvent request of a probe"""
+        with self._lock:
+            probe.submitted = time.monotonic()
+            probe.error = error
+            if error is None and probe.arrived is None:
+                self._pending += 1
+
+    @staticmethod
+    def tag_matches(body):
+        """Yields the PROBE_TAG match of each event of an Event payload, None for an event without a probe tag"""
+        try:
+            payload = json.loads(body)
+            events = payload.get('Events') or [{}]
+        except (ValueError, AttributeError):
+            yield None
+            return
+        for event in events:
+            values = list((event.get('MessageArgs') or []) if isinstance(event, dict) else [])
+            # Firmware which does not send MessageArgs back still sends the Context of the test event
+            values.append(payload.get('Context'))
+            yield next((match for match in (PROBE_TAG.search(value) for value in values if isinstance(value, str))
+                        if match), None)
+
+    def arrival(self, path, body, arrived):
+        for match in self.tag_matches(body):
+            self._arrival(match, arrived)
+
+    def _arrival(self, match, arrived):
+        with self._lock:
+            number = int(match.group('number')) if match and match.group('run') == self.run_id else -1
+            if not 0 <= number < len(self.probes):
+                self.stray_events += 1
+                return
+            probe = self.probes[number]
+            if probe.arrived is not None:
+                probe.duplicates += 1
+                return
+            probe.arrived = arrived
+            # An event may arrive before the iDRAC answered the SubmitTestEvent request
+            if probe.submitted is not None and probe.error is None:
+                self._pending -= 1
+                if not self._pending:
+                    self._all_arrived.notify_all()
+
+    def wait(self, timeout):
+        """Waits until every submitted probe arrived or timeout seconds passed, returns True if they all arrived"""
+        with self._lock:
+            return self._all_arrived.wait_for(lambda: not self._pending, timeout)
+
+
+def percentile(samples, percent):
+    """Returns the percentile of sorted samples, 0 when there are none"""
+    if not samples:
+        return 0
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+def latency_summary(probes):
+    latencies = sorted(probe.arrived - probe.sent for probe in probes if probe.arrived is not None and
+                       probe.error is None)
+    submitted = [probe for probe in probes if probe.submitted is not None and probe.error is None]
+    lost = len(submitted) - len(latencies)
+    return {'sent': len(probes), 'failed': len(probes) - len(submitted), 'delivered': len(latencies), 'lost': lost,
+            'loss_percent': round(100.0 * lost / len(submitted), 2) if submitted else 0.0,
+            'duplicates': sum(probe.duplicates for probe in probes),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1), 'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0}
+
+
+def add_probe_subscription(correlator, idrac_ip, idrac_username, idrac_password, event_type):
+    """Subscribes an iDRAC to the probe destination, returns the subscription URI"""
+    payload = {"Destination": correlator.destination_url, "EventTypes": [event_type], "Context": "probe/%s" %
+               correlator.run_id, "Protocol": "Redfish", "SubscriptionType": "RedfishEvent", "EventFormatType": "Event"}
+    response = RedfishResilience.post(SUBSCRIPTIONS % idrac_ip, data=json.dumps(payload),
+                                      headers={'content-type': 'application/json'}, verify=False,
+                                      auth=(idrac_username, idrac_password))
+    if response.status_code != 201:
+        raise RuntimeError("status code %s returned adding the probe subscription" % response.status_code)
+    location = response.headers.get('Location')
+    if not location:
+        try:
+            location = response.json()['@odata.id']
+        except (ValueError, KeyError, TypeError):
+            raise RuntimeError("the probe subscription was added without returning its URI")
+    return urlsplit(location).path
+
+
+def delete_probe_subscription(idrac_ip, idrac_username, idrac_password, uri):
+    try:
+        response = RedfishResilience.delete('https://%s%s' % (idrac_ip, uri), verify=False,
+                                            auth=(idrac_username, idrac_password))
+        if response.status_code not in (200, 204):
+            logging.warning("- WARNING, status code %s returned deleting the probe subscription %s of iDRAC %s" %
+                            (response.status_code, uri, idrac_ip))
+    except Exception as e:
+        logging.warning("- WARNING, unable to delete the probe subscription %s of iDRAC %s: %s" % (uri, idrac_ip, e))
+
+
+def submit_probe(correlator, probe, tag, idrac_username, idrac_password, event_type, message_id):
+    payload = {"Destination": correlator.destination_url, "EventTypes": event_type, "Context": tag,
+               "Protocol": "Redfish", "MessageId": message_id, "MessageArgs": [tag]}
+    error = None
+    probe.sent = time.monotonic()
+    try:
+        # Not retried, a retry would be measured as delivery latency
+        response = RedfishResilience.post(SUBMIT_TEST_EVENT % probe.idrac_ip, data=json.dumps(payload),
+                                          headers={'content-type': 'application/json'}, verify=False,
+                                          auth=(idrac_username, idrac_password), retries=0)
+        if response.status_code not in (200, 202, 204):
+            error = "status code %s returned" % response.status_code
+    except Exception as e:
+        error = str(e)
+    correlator.submitted(probe, error)
+
+
+def run_probe(idracs, correlator, count=1, rate=DEFAULT_RATE, max_workers=16, wait_seconds=DEFAULT_WAIT_SECONDS,
+              event_type='Alert', message_id='TMP0118'):
+    """
+    Subscribes every iDRAC to the probe destination, submits count tagged test events to every iDRAC, at most rate per
+    second over the fleet and max_workers at a time, then waits up to wait_seconds for the outstanding events and
+    deletes the probe subscriptions. Returns the summary of the fleet and of each iDRAC.
+
+    :param idracs: list of (ip, username, password) tuples
+    :param correlator: started DeliveryCorrelator
+    """
+    interval = 1.0 / rate if rate else 0
+    slots = threading.BoundedSemaphore(max_workers)
+    next_send = time.monotonic()
+
+    def submit(probe, tag, idrac_username, idrac_password):
+        try:
+            submit_probe(correlator, probe, tag, idrac_username, idrac_password, event_type, message_id)
+        finally:
+            slots.release()
+
+    def subscribe(idrac):
+        try:
+            return add_probe_subscription(correlator, *idrac, event_type), None
+        except Exception as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        subscriptions = dict(zip((idrac[0] for idrac in idracs), executor.map(subscribe, idracs)))
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in range(count):
+                # Rounds go over every iDRAC so the probes of one iDRAC are spread over the run
+                for idrac_ip, idrac_username, idrac_password in idracs:
+                    probe, tag = correlator.new_probe(idrac_ip)
+                    subscription_error = subscriptions[idrac_ip][1]
+                    if subscription_error is not None:
+                        probe.sent = time.monotonic()
+                        correlator.submitted(probe, subscription_error)
+                        continue
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    # After a stall waiting for free workers the rate resumes instead of sending a burst
+                    next_send = max(next_send, time.monotonic() - interval) + interval
+                    slots.acquire()
+                    executor.submit(submit, probe, tag, idrac_username, idrac_password)
+        if not correlator.wait(wait_seconds):
+            logging.warning("- WARNING, probes still missing after waiting %s seconds, they are counted as lost" %
+                            wait_seconds)
+    finally:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for idrac_ip, idrac_username, idrac_password in idracs:
+                uri = subscriptions[idrac_ip][0]
+                if uri is not None:
+                    executor.submit(delete_probe_subscription, idrac_ip, idrac_username, idrac_password, uri)
+    probes_by_idrac = {}
+    for probe in correlator.probes:
+        probes_by_idrac.setdefault(probe.idrac_ip, []).append(probe)
+    errors = {}
+    for probe in correlator.probes:
+        if probe.error is not None:
+            errors.setdefault(probe.idrac_ip, probe.error)
+    summary = {'fleet': latency_summary(correlator.probes), 'stray_events': correlator.stray_events,
+               'idracs': {idrac_ip: dict(latency_summary(probes), error=errors.get(idrac_ip))
+                          for idrac_ip, probes in probes_by_idrac.items()}}
+    return summary
+
+
+def log_summary(summary):
+    logging.info(" Event delivery probe report ".center(100, "*"))
+    line = "{iDRAC:<20} sent: {sent:<5} failed: {failed:<5} lost: {lost:<5} p50: {p50_ms:>8} ms  " \
+           "p99: {p99_ms:>8} ms  max: {max_ms:>8} ms"
+    for idrac_ip, idrac_summary in sorted(summary['idracs'].items(), key=lambda item: -item[1]['p99_ms']):
+        logging.info(line.format(iDRAC=idrac_ip, **idrac_summary) +
+                     ("  error: %s" % idrac_summary['error'] if idrac_summary['error'] else ""))
+    logging.info("".center(100, "*"))
+    logging.info(line.format(iDRAC='Fleet', **summary['fleet']) + "  loss: %s%%" % summary['fleet']['loss_percent'])
+    if summary['stray_events']:
+        logging.info("- INFO, %d events received which were not probes of this run" % summary['stray_events'])
@@ -0,0 +1,142 @@
+#
+# RedfishEventFilters. Python module shared by the subscription scripts to build filtered Redfish event
+# subscriptions and SSE $filter strings based on what the iDRAC EventService supports.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import logging
+
+import RedfishCapabilityCache
+
+METRIC_REPORT_DEFINITIONS_URI = '/redfish/v1/TelemetryService/MetricReportDefinitions'
+
+
+def get_event_service(idrac_ip: str, idrac_username: str, idrac_password: str):
+    """
+    Returns the EventService properties of the target iDRAC which describe the subscription and SSE filters the
+    firmware supports. They are read through the capability cache, so repeated runs do not read the EventService.
+
+    :param idrac_ip: IP address of the target iDRAC
+    :param idrac_username: Username of the target iDRAC
+    :param idrac_password: Password of the target iDRAC
+    """
+    event_service = RedfishCapabilityCache.get_capabilities(idrac_ip, idrac_username, idrac_password).get(
+        'EventService')
+    if not event_service:
+        raise RuntimeError("GET request failed to get EventService details")
+    return event_service
+
+
+def split_filter_argument(value):
+    """
+    Splits a comma separated script argument such as 'PowerMetrics,ThermalSensor' into a list
+    """
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def metric_report_definition_uri(name: str):
+    """
+    Returns the URI of a metric report definition, accepts either a report name such as PowerMetrics or a full URI
+    """
+    return name if name.startswith('/') else '%s/%s' % (METRIC_REPORT_DEFINITIONS_URI, name)
+
+
+def supported_subscription_filters(event_service: dict):
+    """
+    Determines which subscription filters the firmware supports from the EventService properties. RegistryPrefixes
+    and ResourceTypes are advertised as EventService properties by firmware supporting them. There is no dedicated
+    property for MetricReportDefinitions, firmware which can filter SSE streams by report also accepts it on
+    subscriptions.
+
+    :param event_service: EventService resource as returned by get_event_service
+    """
+    sse_filters = event_service.get('SSEFilterPropertiesSupported', {})
+    return {'MetricReportDefinitions': bool(sse_filters.get('MetricReportDefinition')),
+            'RegistryPrefixes': 'RegistryPrefixes' in event_service,
+            'ResourceTypes': 'ResourceTypes' in event_service}
+
+
+def _supported_values(event_service: dict, name: str, values: list):
+    allowed = event_service.get(name) or []
+    unsupported = [value for value in values if allowed and value not in allowed]
+    if unsupported:
+        logging.warning("- WARNING, %s %s not supported by the iDRAC and will be ignored, supported values are %s" %
+                        (name, unsupported, allowed))
+    return [value for value in values if value not in unsupported]
+
+
+def build_subscription_filters(event_service: dict, metric_report_definitions=None, registry_prefixes=None,
+                               resource_types=None):
+    """
+    Returns the filter properties to add to a subscription payload. Filters the firmware does not support are dropped
+    with a warning, in which case the subscription receives the unfiltered events.
+
+    :param event_service: EventService resource as returned by get_event_service
+    :param metric_report_definitions: list of metric report names or URIs, for example ['PowerMetrics']
+    :param registry_prefixes: list of message registry prefixes, for example ['iDRAC']
+    :param resource_types: list of resource types, for example ['Systems']
+    """
+    supported = supported_subscription_filters(event_service)
+    requested = {'MetricReportDefinitions': metric_report_definitions or [],
+                 'RegistryPrefixes': registry_prefixes or [],
+                 'ResourceTypes': resource_types or []}
+    filters = {}
+    for name, values in requested.items():
+        if not values:
+            continue
+        if not supported[name]:
+            logging.warning("- WARNING, iDRAC firmware does not support the %s subscription filter, the subscription "
+                            "will not be filtered by %s" % (name, name))
+            continue
+        if name == 'MetricReportDefinitions':
+            filters[name] = [{'@odata.id': metric_report_definition_uri(value)} for value in values]
+        else:
+            values = _supported_values(event_service, name, values)
+            if values:
+                filters[name] = values
+    return filters
+
+
+def build_sse_filter(event_service: dict, event_format_type='MetricReport', metric_report_definitions=None,
+                     registry_prefixes=None, resource_types=None):
+    """
+    Returns the SSE $filter expression matching the same filter spec as build_subscription_filters, for example
+    'EventFormatType eq MetricReport and (MetricReportDefinition eq /redfish/v1/.../PowerMetrics or ...)'.
+    Filters not listed in SSEFilterPropertiesSupported are dropped with a warning.
+
+    :param event_service: EventService resource as returned by get_event_service
+    :param event_format_type: EventFormatType of the SSE stream, MetricReport or Event
+    :param metric_report_definitions: list of metric report names or URIs, for example ['PowerMetrics']
+    :param registry_prefixes: list of message registry prefixes, for example ['iDRAC']
+    :param resource_types: list of resource types, for example ['Systems']
+    """
+    sse_filters = event_service.get('SSEFilterPropertiesSupported', {})
+    requested = [('EventFormatType', [event_format_type] if event_format_type else []),
+                 ('MetricReportDefinition', [metric_report_definition_uri(value)
+                                             for value in metric_report_definitions or []]),
+                 ('RegistryPrefix', registry_prefixes or []),
+                 ('ResourceType', resource_types or [])]
+    clauses = []
+    for name, values in requested:
+        if not values:
+            continue
+        if not sse_filters.get(name, name == 'EventFormatType'):
+            logging.warning("- WARNING, iDRAC firmware does not support the %s SSE filter, the SSE stream will not be "
+                            "filtered by %s" % (name, name))
+            continue
+        clauses.append(' or '.join('%s eq %s' % (name, value) for value in values))
+    if len(clauses) > 1:
+        clauses = [clause if ' or ' not in clause else '(%s)' % clause for clause in clauses]
+    return ' and '.join(clauses)
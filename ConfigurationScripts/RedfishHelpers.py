@@ -0,0 +1,67 @@
+#
+# RedfishHelpers. Python module with the helpers shared by the ConfigurationScripts which do not send Redfish
+# requests, such as reading the iDRACs.csv file or creating the certificate of a local TLS listener.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import csv
+import logging
+import random
+import subprocess
+import sys
+
+
+def read_idracs_csv(file_name):
+    """
+    Returns the (ip, username, password) of every iDRAC of an iDRACs.csv file, exits when the file does not exist.
+    Columns after the password, such as the Name, Rack and Cluster of the Telemetry group aggregation, are ignored.
+    """
+    try:
+        open_csv_file = open(file_name, encoding='UTF8')
+    except:
+        logging.error("\n- ERROR, unable to locate file %s" % file_name)
+        sys.exit(0)
+    with open_csv_file:
+        csv_reader = csv.reader(open_csv_file)
+        next(csv_reader)
+        return [(line[0], line[1], line[2]) for line in csv_reader if line]
+
+
+def generate_self_signed_certificate(cert_file, key_file, common_name='localhost'):
+    """
+    Creates a self signed certificate for the TLS listeners, using pyOpenSSL from requirements.txt or the openssl
+    command line tool when pyOpenSSL is not installed
+    """
+    try:
+        from OpenSSL import crypto
+    except ImportError:
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '365', '-subj',
+                               '/CN=%s' % common_name, '-keyout', key_file, '-out', cert_file],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    key = crypto.PKey()
+    key.generate_key(crypto.TYPE_RSA, 2048)
+    cert = crypto.X509()
+    cert.get_subject().CN = common_name
+    cert.set_serial_number(random.getrandbits(64))
+    cert.gmtime_adj_notBefore(0)
+    cert.gmtime_adj_notAfter(365 * 24 * 3600)
+    cert.set_issuer(cert.get_subject())
+    cert.set_pubkey(key)
+    cert.sign(key, 'sha256')
+    with open(cert_file, 'wb') as file:
+        file.write(crypto.dump_certificate(crypto.FILETYPE_PEM, cert))
+    with open(key_file, 'wb') as file:
+        file.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
@@ -0,0 +1,236 @@
+#
+# RedfishJobTracker. Python module shared by the Server Configuration Profile scripts to track many iDRAC jobs from
+# one process, polling each job with an adaptive interval instead of once per second.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import heapq
+import itertools
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import RedfishResilience
+
+# First poll delay in seconds per job type, exports finish in seconds while imports take minutes
+INITIAL_POLL_INTERVAL = {'Export': 2, 'Import': 5}
+DEFAULT_INITIAL_POLL_INTERVAL = 3
+JOB_TERMINAL_STATES = ('Completed', 'CompletedWithErrors', 'Failed', 'RebootFailed', 'Stopped')
+TASK_TERMINAL_STATES = ('Completed', 'Exception', 'Killed', 'Cancelled')
+
+
+class TrackedJob(object):
+    """
+    State of one job on one iDRAC. state is Running until the job reaches a terminal state, then Completed, Failed or
+    TimedOut. data holds the last job or task resource read from the iDRAC.
+    """
+
+    def __init__(self, idrac_ip, idrac_username, idrac_password, job_id, job_type, task_monitor):
+        self.idrac_ip = idrac_ip
+        self.auth = (idrac_username, idrac_password)
+        self.job_id = job_id
+        self.job_type = job_type
+        self.task_monitor = task_monitor
+        self.state = 'Running'
+        self.message = ''
+        self.percent_complete = None
+        self.data = {}
+        self.polls = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self.interval = INITIAL_POLL_INTERVAL.get(job_type, DEFAULT_INITIAL_POLL_INTERVAL)
+        self._last_progress = (self.started, 0)
+
+    @property
+    def done(self):
+        return self.state != 'Running'
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def __repr__(self):
+        return "TrackedJob(%s, %s, %s)" % (self.idrac_ip, self.job_id, self.state)
+
+
+class JobTracker(object):
+    """
+    Tracks jobs across many iDRACs. Due jobs are polled concurrently, and each job is rescheduled based on its progress:
+    the next poll is planned at roughly half of the estimated remaining time, clamped between min_interval and
+    max_interval, and a Retry-After header from the iDRAC is honoured. Jobs are polled through their Redfish task
+    monitor when one is given, otherwise through the Dell job resource.
+
+    Usage:
+        tracker = JobTracker()
+        tracker.add(ip, user, password, job_id, 'Import')
+        for job in tracker.wait_all():
+            ...
+    """
+
+    def __init__(self, timeout=300, min_interval=1, max_interval=30, max_workers=32, max_poll_errors=3):
+        """
+        :param timeout: Seconds after which a job which has not finished is marked TimedOut
+        :param min_interval: Minimum seconds between two polls of the same job
+        :param max_interval: Maximum seconds between two polls of the same job
+        :param max_workers: Number of job status requests sent concurrently
+        :param max_poll_errors: Number of consecutive failed status requests after which a job is marked Failed
+        """
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_poll_errors = max_poll_errors
+        self.jobs = []
+        self._queue = []
+        self._counter = itertools.count()
+        self._reported = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def add(self, idrac_ip, idrac_username, idrac_password, job_id, job_type=None, task_monitor=None):
+        """
+        Starts tracking a job
+
+        :param job_id: Job ID such as JID_123456789012
+        :param job_type: Export, Import or None, only used to pick the first poll interval
+        :param task_monitor: Optional task monitor URI returned in the Location header of the action, for example
+                             /redfish/v1/TaskService/Tasks/JID_123456789012
+        """
+        job = TrackedJob(idrac_ip, idrac_username, idrac_password, job_id, job_type, task_monitor)
+        self.jobs.append(job)
+        self._schedule(job, job.interval)
+        return job
+
+    def _schedule(self, job, delay):
+        heapq.heappush(self._queue, (time.monotonic() + delay, next(self._counter), job))
+
+    def _poll(self, job):
+        if job.task_monitor:
+            url = 'https://%s%s' % (job.idrac_ip, job.task_monitor)
+        else:
+            url = 'https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Jobs/%s' % (job.idrac_ip, job.job_id)
+        try:
+            return RedfishResilience.get(url, auth=job.auth, verify=False, retries=0), None
+        except Exception as e:
+            return None, e
+
+    def _next_interval(self, job, retry_after):
+        if retry_after:
+            return min(max(retry_after, self.min_interval), self.max_interval)
+        now = time.monotonic()
+        last_time, last_percent = job._last_progress
+        percent = job.percent_complete
+        if percent is not None and percent > last_percent:
+            rate = (percent - last_percent) / max(now - last_time, 0.001)
+            job._last_progress = (now, percent)
+            interval = (100 - percent) / rate / 2
+        else:
+            interval = job.interval * 1.5
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _poll_failed(self, job, message, circuit_open=False):
+        # an open circuit means the iDRAC already failed repeatedly, there is no point in polling it again
+        job.errors = self.max_poll_errors if circuit_open else job.errors + 1
+        job.message = message
+        if job.errors >= self.max_poll_errors:
+            job.state = 'Failed'
+            logging.error("- FAIL, unable to check status of job %s on iDRAC %s: %s" %
+                          (job.job_id, job.idrac_ip, job.message))
+
+    def _update(self, job, response, error):
+        job.polls += 1
+        if error is not None or response.status_code not in (200, 202):
+            self._poll_failed(job, str(error) if error is not None else "status code %s" % response.status_code,
+                              isinstance(error, RedfishResilience.CircuitOpenError))
+            return None
+        retry_after = response.headers.get('Retry-After', '')
+        retry_after = int(retry_after) if retry_after.isdigit() else None
+        if response.status_code == 202 and not response.content:
+            job.errors = 0
+            return retry_after  # task monitor reports the task is still running
+        try:
+            data = response.json()
+        except ValueError:
+            self._poll_failed(job, "status code %s returned a body which is not JSON" % response.status_code)
+            return None
+        job.errors = 0
+        job.data = data
+        previous_percent = job.percent_complete
+        job.percent_complete = data.get('PercentComplete', job.percent_complete)
+        if 'JobState' in data:
+            job.message = data.get('Message', '')
+            if re.search('Fail', job.message, re.IGNORECASE) or data['JobState'] in ('Failed', 'RebootFailed'):
+                job.state = 'Failed'
+            elif data['JobState'] in JOB_TERMINAL_STATES:
+                job.state = 'Completed'
+        else:
+            messages = data.get('Messages') or [{}]
+            job.message = messages[-1].get('Message', '')
+            if data.get('TaskState') in TASK_TERMINAL_STATES:
+                job.state = 'Completed' if data['TaskState'] == 'Completed' else 'Failed'
+            elif response.status_code == 200 and job.task_monitor and 'TaskState' not in data:
+                job.state = 'Completed'  # task monitor returns the action result once the task is done
+        if not job.done and job.percent_complete != previous_percent:
+            logging.info("Job '%s' on iDRAC %s not completed, current status: '%s', percent complete: '%s'" %
+                         (job.job_id, job.idrac_ip, job.message, job.percent_complete))
+        return retry_after
+
+    def _poll_due_jobs(self, deadline):
+        now = time.monotonic()
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            due.append(heapq.heappop(self._queue)[2])
+        for job, (response, error) in zip(due, self._executor.map(self._poll, due)):
+            retry_after = self._update(job, response, error)
+            if not job.done and job.elapsed > self.timeout:
+                job.state = 'TimedOut'
+                job.message = "Timeout of %s seconds has been hit" % self.timeout
+            if not job.done:
+                job.interval = self._next_interval(job, retry_after)
+                self._schedule(job, job.interval)
+        if self._queue:
+            time.sleep(max(0, min(self._queue[0][0], deadline) - time.monotonic()))
+
+    def pending(self):
+        return [job for job in self.jobs if not job.done]
+
+    def wait_any(self, timeout=None):
+        """
+        Polls until at least one job finishes which was not returned by a previous wait_any call
+
+        :param timeout: Seconds to wait, None to wait until a job finishes
+        :return: list of the jobs which finished, empty if the timeout expired
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else float('inf')
+        while True:
+            finished = [job for job in self.jobs if job.done and id(job) not in self._reported]
+            if finished or not self._queue or time.monotonic() >= deadline:
+                self._reported.update(id(job) for job in finished)
+                return finished
+            self._poll_due_jobs(deadline)
+
+    def wait_all(self, timeout=None):
+        """
+        Polls until all jobs finished
+
+        :param timeout: Seconds to wait, None to wait until all jobs finish or time out
+        :return: list of all tracked jobs
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else float('inf')
+        while self._queue and time.monotonic() < deadline:
+            self._poll_due_jobs(deadline)
+        return self.jobs
+
+    def close(self):
+        self._executor.shutdown(wait=False)
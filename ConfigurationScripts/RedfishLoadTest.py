@@ -0,0 +1,152 @@
+#
+# RedfishLoadTest.py Python script running the ConfigurationScripts against RedfishMockServer.py and reporting wall
+# time, request counts and latency percentiles for each script operation.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import requests
+
+from RedfishHelpers import read_idracs_csv
+
+warnings.filterwarnings("ignore")
+logging.basicConfig(format='%(message)s', stream=sys.stdout, level=logging.INFO)
+
+SCRIPT_FOLDER = os.path.dirname(os.path.abspath(__file__))
+# Script operations, {csv}, {ip}, {user}, {password}, {destination} and {config} are replaced before running them
+OPERATIONS = {
+    'reconcile-subscriptions': ['AddRedfishSubscription.py', '-f', '{csv}', '-d', '{destination}', '-c', 'LoadTest',
+                                '--reconcile'],
+    'filtered-subscriptions': ['AddRedfishSubscription.py', '-f', '{csv}', '-d', '{destination}', '-c', 'LoadTest',
+                               '--reconcile', '--metric-report-definitions', 'PowerMetrics,ThermalSensor'],
+    'apply-profile': ['ApplyTelemetryReportProfile.py', '-f', '{csv}', '--profile',
+                      os.path.join(SCRIPT_FOLDER, 'TelemetryReportProfile.json')],
+    'enable-reports': ['EnableOrDisableAllTelemetryReports.py', '-f', '{csv}', '-s', 'Enabled'],
+    'import-config': ['ImportTelemetryConfigurationUsingScpREDFISH.py', '-f', '{csv}', '--filename', '{config}'],
+    'export-config': ['ExportTelemetryConfigurationUsingScpREDFISH.py', '-ip', '{ip}', '-u', '{user}', '-p',
+                      '{password}', '--filename', '{config}.export'],
+    'delete-subscriptions': ['DeleteRedfishSubscription.py', '-ip', '{ip}', '-u', '{user}', '-p', '{password}', '-a'],
+}
+DEFAULT_OPERATIONS = ['reconcile-subscriptions', 'reconcile-subscriptions', 'apply-profile', 'import-config']
+SAMPLE_CONFIGURATION = [{'Name': 'Telemetry.1#EnableTelemetry', 'Value': 'Enabled', 'Set On Import': 'True',
+                         'Comment Only': 'False'},
+                        {'Name': 'TelemetryPowerMetrics.1#EnableTelemetry', 'Value': 'Enabled',
+                         'Set On Import': 'True', 'Comment Only': 'False'}]
+
+parser = argparse.ArgumentParser(description="Python script running the ConfigurationScripts against "
+                                             "RedfishMockServer.py and reporting wall time, request counts and "
+                                             "latency percentiles for each script operation.")
+parser.add_argument('--script-examples', action="store_true", help='Prints script examples')
+parser.add_argument('-f', help='iDRACs.csv style file written by RedfishMockServer.py', default='iDRACs-mock.csv')
+parser.add_argument('--operations', help='Comma separated operations to run in order, supported values are %s. '
+                                         'Default is %s' % (', '.join(sorted(OPERATIONS)),
+                                                            ','.join(DEFAULT_OPERATIONS)),
+                    required=False)
+parser.add_argument('--destination', help='Destination of the subscriptions created by the subscription operations',
+                    default='https://192.168.0.145')
+parser.add_argument('--cold-cache', help='Run every operation with an empty capability and configuration cache',
+                    action='store_true')
+parser.add_argument('--json', help='Write the results to this JSON file as well', required=False)
+parser.add_argument('--verbose', help='Show the output of the scripts', action='store_true')
+
+args = vars(parser.parse_args())
+
+
+def print_examples():
+    """
+    Print program examples and exit
+    """
+    print(
+        '\n\'RedfishMockServer.py --count 500 --virtual-hosts\' and then \'RedfishLoadTest.py -f iDRACs-mock.csv\', '
+        'this example runs the default operations against 500 simulated iDRACs\n'
+        '\n\'RedfishLoadTest.py --operations reconcile-subscriptions,reconcile-subscriptions --cold-cache\', this '
+        'example compares a first and a repeated subscription reconcile without cached capabilities\n')
+
+
+def mock_request(address, method, path):
+    url = 'https://%s%s' % (address, path)
+    try:
+        response = requests.request(method, url, verify=False)
+    except requests.exceptions.ConnectionError:
+        response = requests.request(method, url.replace('https://', 'http://', 1))
+    return response
+
+
+def run_operation(name, idracs, config_file):
+    """Runs one script operation and returns its wall time together with the statistics of the mock server"""
+    ip, user, password = idracs[0]
+    command = [sys.executable] + [part.format(csv=os.path.abspath(args["f"]), ip=ip, user=user, password=password,
+                                              destination=args["destination"], config=config_file)
+                                  for part in OPERATIONS[name]]
+    command[1] = os.path.join(SCRIPT_FOLDER, command[1])
+    environment = dict(os.environ)
+    if args["cold_cache"]:
+        environment['HOME'] = tempfile.mkdtemp(prefix='redfish-load-test-')
+    mock_request(ip, 'POST', '/mock/reset')
+    started = time.perf_counter()
+    process = subprocess.run(command, cwd=tempfile.gettempdir(), env=environment,
+                             stdout=None if args["verbose"] else subprocess.DEVNULL,
+                             stderr=None if args["verbose"] else subprocess.DEVNULL)
+    wall_time = time.perf_counter() - started
+    stats = mock_request(ip, 'GET', '/mock/stats').json()
+    errors = sum(count for route in stats['routes'].values() for status, count in route['statuses'].items()
+                 if int(status) >= 500 or int(status) == 0)
+    return {'operation': name, 'iDRACs': len(idracs), 'exit_code': process.returncode, 'wall_time_s':
+            round(wall_time, 3), 'requests': stats['requests'], 'requests_per_idrac':
+            round(stats['requests'] / float(len(idracs)), 2), 'server_errors': errors, 'p50_ms': stats['p50_ms'],
+            'p99_ms': stats['p99_ms'], 'routes': stats['routes']}
+
+
+if __name__ == "__main__":
+    if args["script_examples"]:
+        print_examples()
+        sys.exit(0)
+    operations = [name.strip() for name in (args["operations"] or ','.join(DEFAULT_OPERATIONS)).split(',')]
+    unknown = [name for name in operations if name not in OPERATIONS]
+    if unknown:
+        logging.error("- ERROR, unknown operations %s, supported values are %s" % (unknown, sorted(OPERATIONS)))
+        sys.exit(0)
+    if not os.path.isfile(args["f"]):
+        logging.error("\n- ERROR, unable to read file %s, start RedfishMockServer.py first" % args["f"])
+        sys.exit(0)
+    idracs = read_idracs_csv(args["f"])
+    config_file = os.path.join(tempfile.mkdtemp(prefix='redfish-load-test-'), 'telemetry_config.json')
+    with open(config_file, 'w') as file:
+        json.dump(SAMPLE_CONFIGURATION, file)
+
+    results = []
+    logging.info("%-26s %8s %6s %10s %9s %10s %8s %9s %9s" % ('operation', 'iDRACs', 'exit', 'wall (s)', 'requests',
+                                                              'req/iDRAC', 'errors', 'p50 (ms)', 'p99 (ms)'))
+    for name in operations:
+        result = run_operation(name, idracs, config_file)
+        results.append(result)
+        logging.info("%-26s %8d %6d %10.2f %9d %10.2f %8d %9.1f %9.1f" % (
+            name, result['iDRACs'], result['exit_code'], result['wall_time_s'], result['requests'],
+            result['requests_per_idrac'], result['server_errors'], result['p50_ms'], result['p99_ms']))
+        for route, route_stats in sorted(result['routes'].items() if args["verbose"] else []):
+            logging.info("    %-90s %6d %9.1f %9.1f" % (route, route_stats['count'], route_stats['p50_ms'],
+                                                         route_stats['p99_ms']))
+    if args["json"]:
+        with open(args["json"], 'w') as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,652 @@
+#
+# RedfishMockServer.py Python script simulating many iDRACs locally, implementing the Redfish endpoints used by the
+# ConfigurationScripts, so they can be exercised and load tested without hardware.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import argparse
+import base64
+import collections
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import selectors
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from RedfishHelpers import generate_self_signed_certificate
+
+METRIC_REPORT_IDS = ['AggregationMetrics', 'CPUMemMetrics', 'CPURegisters', 'CPUSensor', 'FanSensor', 'FCSensor',
+                     'GPUMetrics', 'GPUStatistics', 'MemorySensor', 'NICSensor', 'NICStatistics', 'NVMeSMARTData',
+                     'PowerMetrics', 'PowerStatistics', 'PSUMetrics', 'SerialLog', 'StorageDiskSMARTData',
+                     'StorageSensor', 'SystemUsage', 'ThermalMetrics', 'ThermalSensor']
+EXPORT_MESSAGE = "Successfully exported Server Configuration Profile"
+IMPORT_MESSAGE = "Successfully imported and applied Server Configuration Profile."
+
+
+def timestamp():
+    return datetime.now(timezone.utc).astimezone().isoformat(timespec='seconds')
+
+
+class MockStats(object):
+    """Request counts, status codes and latencies per route, shared by all simulated iDRACs"""
+
+    def __init__(self, max_samples=200000):
+        self.lock = threading.Lock()
+        self.max_samples = max_samples
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.routes = collections.defaultdict(lambda: {'count': 0, 'statuses': collections.Counter(),
+                                                           'latencies': collections.deque(maxlen=self.max_samples)})
+            self.started = time.time()
+
+    def record(self, route, status, latency):
+        with self.lock:
+            entry = self.routes[route]
+            entry['count'] += 1
+            entry['statuses'][status] += 1
+            entry['latencies'].append(latency)
+
+    @staticmethod
+    def percentile(samples, percent):
+        if not samples:
+            return 0
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def snapshot(self):
+        with self.lock:
+            routes = {}
+            all_latencies = []
+            for route, entry in self.routes.items():
+                latencies = sorted(entry['latencies'])
+                all_latencies.extend(latencies)
+                routes[route] = {'count': entry['count'], 'statuses': dict(entry['statuses']),
+                                 'p50_ms': round(self.percentile(latencies, 50) * 1000, 2),
+                                 'p99_ms': round(self.percentile(latencies, 99) * 1000, 2)}
+            all_latencies.sort()
+            return {'elapsed': round(time.time() - self.started, 3),
+                    'requests': sum(entry['count'] for entry in routes.values()),
+                    'p50_ms': round(self.percentile(all_latencies, 50) * 1000, 2),
+                    'p99_ms': round(self.percentile(all_latencies, 99) * 1000, 2),
+                    'routes': routes}
+
+
+class MockIdrac(object):
+    """State of one simulated iDRAC"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(config['max_concurrent'])
+        self.licensed = random.random() >= config['unlicensed_rate']
+        self.telemetry_enabled = True
+        self.subscriptions = collections.OrderedDict()
+        self.sessions = {}
+        self.jobs = {}
+        self.definitions = collections.OrderedDict(
+            (report_id, {'MetricReportDefinitionEnabled': report_id in ('PowerMetrics', 'ThermalSensor'),
+                         'Schedule': {'RecurrenceInterval': 'PT0H1M0S'}, 'Metrics': [], 'Wildcards': []})
+            for report_id in METRIC_REPORT_IDS)
+        self.attributes = {'Telemetry.1.EnableTelemetry': 'Enabled', 'Telemetry.1.RSyslogServer1': '',
+                           'Telemetry.1.RSyslogServer1Port': 514, 'IPMILan.1.AlertEnable': 'Disabled'}
+        for report_id in METRIC_REPORT_IDS:
+            self.attributes['Telemetry%s.1.EnableTelemetry' % report_id] = 'Disabled'
+            self.attributes['Telemetry%s.1.ReportInterval' % report_id] = 60
+
+    def definition_resource(self, report_id):
+        uri = '/redfish/v1/TelemetryService/MetricReportDefinitions/%s' % report_id
+        resource = {'@odata.id': uri, '@odata.type': '#MetricReportDefinition.v1_4_1.MetricReportDefinition',
+                    'Id': report_id, 'Name': '%s Metric Report Definition' % report_id,
+                    'MetricReportDefinitionType': 'Periodic'}
+        resource.update(self.definitions[report_id])
+        return resource
+
+    def subscription_resource(self, subscription_id):
+        resource = {'@odata.id': '/redfish/v1/EventService/Subscriptions/%s' % subscription_id,
+                    '@odata.type': '#EventDestination.v1_9_0.EventDestination', 'Id': subscription_id,
+                    'Name': 'EventSubscription %s' % subscription_id}
+        resource.update(self.subscriptions[subscription_id])
+        return resource
+
+    def create_job(self, job_type, payload):
+        job_id = 'JID_%012d' % random.randrange(10 ** 12)
+        duration = self.config['job_seconds'] * random.uniform(0.5, 1.5)
+        self.jobs[job_id] = {'type': job_type, 'started': time.time(), 'duration': duration, 'payload': payload,
+                             'applied': False}
+        return job_id
+
+    def job_progress(self, job_id):
+        job = self.jobs[job_id]
+        percent = min(100, int((time.time() - job['started']) * 100 / job['duration']))
+        if percent == 100 and job['type'] == 'Import' and not job['applied']:
+            job['applied'] = True
+            self.apply_import(job['payload'])
+        return job, percent
+
+    def apply_import(self, payload):
+        try:
+            profile = json.loads(payload.get('ImportBuffer', ''))
+        except ValueError:
+            return  # XML profiles such as the one of scp_set_idrac_attribute are accepted without being applied
+        for component in profile.get('SystemConfiguration', {}).get('Components', []):
+            for attribute in component.get('Attributes', []):
+                group, _, name = attribute.get('Name', '').rpartition('#')
+                if group:
+                    self.attributes['%s.%s' % (group, name)] = attribute.get('Value')
+
+    def export_scp(self):
+        attributes = [{'Name': '%s#%s' % tuple(name.rsplit('.', 1)), 'Value': str(value), 'Set On Import': 'True',
+                       'Comment Only': 'False'} for name, value in sorted(self.attributes.items())]
+        return {'SystemConfiguration': {'Model': 'PowerEdge Mock', 'ServiceTag': self.name,
+                                        'Components': [{'FQDD': 'iDRAC.Embedded.1', 'Attributes': attributes}]}}
+
+    def metric_report(self, report_id, sequence):
+        return {'@odata.id': '/redfish/v1/TelemetryService/MetricReports/%s' % report_id,
+                '@odata.type': '#MetricReport.v1_4_2.MetricReport', 'Id': report_id, 'Name': '%s Metric Report' %
+                report_id, 'ReportSequence': str(sequence), 'Timestamp': timestamp(),
+                'MetricReportDefinition': {'@odata.id': '/redfish/v1/TelemetryService/MetricReportDefinitions/%s' %
+                                                        report_id},
+                'MetricValues': [{'MetricId': '%sValue%d' % (report_id, index), 'Timestamp': timestamp(),
+                                  'MetricValue': str(round(random.uniform(20, 80), 2)),
+                                  'Oem': {'Dell': {'ContextID': 'Mock.%d' % index, 'Label': 'Mock %d' % index}}}
+                                 for index in range(8)],
+                'MetricValues@odata.count': 8}
+
+
+class MockRedfishHandler(BaseHTTPRequestHandler):
+    """Handles the requests of one connection, self.server is the MockServer which routes them to a MockIdrac"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'iDRAC-Mock'
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s" % (self.address_string(), format % args))
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def send_json(self, status, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        etag = 'W/"%s"' % hashlib.md5(data).hexdigest()[:16] if body is not None else None
+        if status == 200 and etag and self.headers.get('If-None-Match') == etag:
+            status, data = 304, b''
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if data:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.status = status
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {'error': {'code': 'Base.1.8.GeneralError', 'message': message,
+                                          '@Message.ExtendedInfo': [{'Message': message}]}}, headers)
+
+    def read_body(self):
+        if not self.raw_body:
+            return {}
+        try:
+            return json.loads(self.raw_body)
+        except ValueError:
+            return {}
+
+    def authorized(self, idrac):
+        token = self.headers.get('X-Auth-Token')
+        if token:
+            return token in idrac.sessions
+        authorization = self.headers.get('Authorization', '')
+        if not authorization.startswith('Basic '):
+            return False
+        user, _, password = base64.b64decode(authorization[6:]).decode().partition(':')
+        return (user, password) == (self.server.config['username'], self.server.config['password'])
+
+    def dispatch(self, method):
+        started = time.perf_counter()
+        self.status = 0
+        url = urlsplit(self.path)
+        path = unquote(url.path).rstrip('/') or '/'
+        query = parse_qs(url.query)
+        route = '%s %s' % (method, re.sub(r'/(JID_\w+|[0-9a-f]{8}-[0-9a-f-]{27}|%s)$' % '|'.join(METRIC_REPORT_IDS),
+                                          '/{id}', path))
+        config = self.server.config
+        # the body is read before any error response, otherwise it would be parsed as the next request of the
+        # persistent connection
+        length = int(self.headers.get('Content-Length') or 0)
+        self.raw_body = self.rfile.read(length) if length else b''
+        if path.startswith('/mock/'):
+            return self.mock_admin(method, path)
+        try:
+            idrac = self.server.resolve(self.headers.get('Host', ''), self.connection)
+            if idrac is None:
+                return self.send_error_json(404, 'Unknown simulated iDRAC')
+            delay = config['latency'] + random.uniform(0, config['jitter'])
+            if not idrac.slots.acquire(blocking=False):
+                time.sleep(delay)
+                return self.send_error_json(503, 'The iDRAC is busy, retry later', {'Retry-After': '1'})
+            try:
+                time.sleep(delay)
+                if random.random() < config['error_rate']:
+                    return self.send_error_json(random.choice((500, 503)), 'Simulated iDRAC error',
+                                                {'Retry-After': '1'})
+                if path == '/redfish/v1/SessionService/Sessions' and method == 'POST':
+                    return self.create_session(idrac)
+                if path != '/redfish/v1' and not self.authorized(idrac):
+                    return self.send_error_json(401, 'Unauthorized')
+                if path == '/redfish/v1/SSE':
+                    idrac.slots.release()  # streams are long lived and do not hold a request slot
+                    try:
+                        return self.stream_sse(idrac, query)
+                    finally:
+                        idrac.slots.acquire()
+                with idrac.lock:
+                    self.route(idrac, method, path, query)
+            finally:
+                idrac.slots.release()
+        except (BrokenPipeError, ConnectionResetError, ssl.SSLError):
+            self.close_connection = True
+        finally:
+            self.server.stats.record(route, self.status, time.perf_counter() - started)
+
+    def mock_admin(self, method, path):
+        if path == '/mock/stats':
+            return self.send_json(200, self.server.stats.snapshot())
+        if path == '/mock/reset' and method == 'POST':
+            self.server.stats.reset()
+            return self.send_json(204)
+        return self.send_error_json(404, 'Unknown mock endpoint')
+
+    def create_session(self, idrac):
+        body = self.read_body()
+        if (body.get('UserName'), body.get('Password')) != (self.server.config['username'],
+                                                            self.server.config['password']):
+            return self.send_error_json(401, 'Unauthorized')
+        token = uuid.uuid4().hex
+        session_id = str(len(idrac.sessions) + 1)
+        idrac.sessions[token] = session_id
+        uri = '/redfish/v1/SessionService/Sessions/%s' % session_id
+        self.send_json(201, {'@odata.id': uri, 'Id': session_id, 'UserName': body['UserName']},
+                       {'X-Auth-Token': token, 'Location': uri})
+
+    def collection(self, uri, members, query):
+        expand = '$expand' in query
+        return {'@odata.id': uri, 'Members': [member if expand else {'@odata.id': member['@odata.id']}
+                                              for member in members],
+                'Members@odata.count': len(members)}
+
+    def route(self, idrac, method, path, query):
+        parts = path.split('/')
+        if path == '/redfish/v1':
+            return self.send_json(200, {'@odata.id': '/redfish/v1', 'RedfishVersion': '1.11.0',
+                                        'ProtocolFeaturesSupported': {'ExpandQuery': {'ExpandAll': True,
+                                                                                      'Levels': True,
+                                                                                      'MaxLevels': 1}}})
+        if path == '/redfish/v1/SessionService':
+            return self.send_json(200, {'@odata.id': path, 'ServiceEnabled': True, 'SessionTimeout': 1800,
+                                        'Sessions': {'@odata.id': '/redfish/v1/SessionService/Sessions'}})
+        if path.startswith('/redfish/v1/SessionService/Sessions/') and method == 'DELETE':
+            token = self.headers.get('X-Auth-Token')
+            idrac.sessions.pop(token, None)
+            return self.send_json(200, {})
+        if path == '/redfish/v1/Managers/iDRAC.Embedded.1':
+            return self.send_json(200, {'@odata.id': path, 'Id': 'iDRAC.Embedded.1', 'FirmwareVersion': '6.00.00.00',
+                                        'Model': '15G Monolithic'})
+        if path.startswith('/redfish/v1/TelemetryService'):
+            return self.telemetry_service(idrac, method, path, parts, query)
+        if path.startswith('/redfish/v1/EventService'):
+            return self.event_service(idrac, method, path, parts, query)
+        if path == '/redfish/v1/Managers/iDRAC.Embedded.1/Attributes':
+            if method == 'PATCH':
+                idrac.attributes.update(self.read_body().get('Attributes', {}))
+                return self.send_json(200, {})
+            return self.send_json(200, {'@odata.id': path, 'Id': 'iDRAC.Embedded.1',
+                                        'Attributes': idrac.attributes})
+        if path.endswith('EID_674_Manager.ExportSystemConfiguration') and method == 'POST':
+            job_id = idrac.create_job('Export', self.read_body())
+            return self.send_json(202, None, {'Location': '/redfish/v1/TaskService/Tasks/%s' % job_id})
+        if path.endswith('EID_674_Manager.ImportSystemConfiguration') and method == 'POST':
+            job_id = idrac.create_job('Import', self.read_body())
+            return self.send_json(202, None, {'Location': '/redfish/v1/TaskService/Tasks/%s' % job_id})
+        if path.startswith('/redfish/v1/Managers/iDRAC.Embedded.1/Jobs/') and parts[-1] in idrac.jobs:
+            job, percent = idrac.job_progress(parts[-1])
+            message = (EXPORT_MESSAGE if job['type'] == 'Export' else IMPORT_MESSAGE) if percent == 100 else \
+                'Job in progress.'
+            return self.send_json(200, {'@odata.id': path, 'Id': parts[-1], 'JobState': 'Completed' if percent == 100
+                                        else 'Running', 'PercentComplete': percent, 'Message': message,
+                                        'JobType': '%sConfiguration' % job['type']})
+        if path.startswith('/redfish/v1/TaskService/Tasks/') and parts[-1] in idrac.jobs:
+            job, percent = idrac.job_progress(parts[-1])
+            if percent == 100 and job['type'] == 'Export':
+                return self.send_json(200, idrac.export_scp())
+            message = IMPORT_MESSAGE if percent == 100 else 'Job in progress.'
+            return self.send_json(200 if percent == 100 else 202,
+                                  {'@odata.id': path, 'Id': parts[-1], 'Name': '%s Configuration' % job['type'],
+                                   'TaskState': 'Completed' if percent == 100 else 'Running',
+                                   'PercentComplete': percent, 'Messages': [{'Message': message}]},
+                                  {} if percent == 100 else {'Retry-After': '2'})
+        return self.send_error_json(404, 'Resource %s not found' % path)
+
+    def telemetry_service(self, idrac, method, path, parts, query):
+        if not idrac.licensed:
+            return self.send_error_json(400, 'Unable to complete the operation because the iDRAC Datacenter license '
+                                             'is not installed.')
+        if path == '/redfish/v1/TelemetryService':
+            if method == 'PATCH':
+                idrac.telemetry_enabled = self.read_body().get('ServiceEnabled', idrac.telemetry_enabled)
+                return self.send_json(200, {})
+            return self.send_json(200, {'@odata.id': path, 'Id': 'TelemetryService',
+                                        'ServiceEnabled': idrac.telemetry_enabled,
+                                        'MetricReportDefinitions': {'@odata.id': path + '/MetricReportDefinitions'}})
+        if path == '/redfish/v1/TelemetryService/MetricReportDefinitions':
+            return self.send_json(200, self.collection(path, [idrac.definition_resource(report_id)
+                                                              for report_id in idrac.definitions], query))
+        if len(parts) == 6 and parts[4] == 'MetricReportDefinitions' and parts[5] in idrac.definitions:
+            if method == 'PATCH':
+                body = self.read_body()
+                idrac.definitions[parts[5]].update({key: value for key, value in body.items()
+                                                    if key in ('MetricReportDefinitionEnabled', 'Schedule',
+                                                               'Metrics', 'Wildcards')})
+                return self.send_json(200, {})
+            return self.send_json(200, idrac.definition_resource(parts[5]))
+        return self.send_error_json(404, 'Resource %s not found' % path)
+
+    def event_service(self, idrac, method, path, parts, query):
+        if path == '/redfish/v1/EventService':
+            return self.send_json(200, {
+                '@odata.id': path, 'Id': 'EventService', 'ServiceEnabled': True,
+                'EventFormatTypes': ['Event', 'MetricReport'], 'EventTypesForSubscription': ['Alert', 'MetricReport',
+                                                                                             'Other'],
+                'RegistryPrefixes': ['iDRAC', 'EventRegistry'], 'ResourceTypes': ['Systems', 'Chassis', 'Managers'],
+                'SSEFilterPropertiesSupported': {'EventFormatType': True, 'EventType': True, 'MessageId': True,
+                                                 'MetricReportDefinition': True, 'OriginResource': True,
+                                                 'RegistryPrefix': False, 'ResourceType': True,
+                                                 'SubordinateResources': False},
+                'ServerSentEventUri': '/redfish/v1/SSE',
+                'Subscriptions': {'@odata.id': '/redfish/v1/EventService/Subscriptions'}})
+        if path == '/redfish/v1/EventService/Subscriptions':
+            if method == 'POST':
+                if len(idrac.subscriptions) >= self.server.config['max_subscriptions']:
+                    return self.send_error_json(400, 'The maximum number of subscriptions has been reached')
+                subscription_id = str(uuid.uuid1())
+                idrac.subscriptions[subscription_id] = self.read_body()
+                uri = '%s/%s' % (path, subscription_id)
+                return self.send_json(201, idrac.subscription_resource(subscription_id), {'Location': uri})
+            return self.send_json(200, self.collection(path, [idrac.subscription_resource(subscription_id)
+                                                              for subscription_id in idrac.subscriptions], query))
+        if len(parts) == 6 and parts[4] == 'Subscriptions' and parts[5] in idrac.subscriptions:
+            if method == 'DELETE':
+                del idrac.subscriptions[parts[5]]
+                return self.send_json(200, {})
+            return self.send_json(200, idrac.subscription_resource(parts[5]))
+        if path.endswith('EventService.SubmitTestEvent') and method == 'POST':
+            body = self.read_body()
+            # like an iDRAC, test events only go to the destination of a subscription
+            if body.get('Destination') and not any(subscription.get('Destination') == body['Destination']
+                                                   for subscription in list(idrac.subscriptions.values())):
+                return self.send_error_json(400, 'No subscription to the destination %s' % body['Destination'])
+            if self.server.config['deliver_events'] and body.get('Destination'):
+                threading.Thread(target=deliver_test_event, args=(idrac, body), daemon=True).start()
+            return self.send_json(204)
+        return self.send_error_json(404, 'Resource %s not found' % path)
+
+    def stream_sse(self, idrac, query):
+        report_filter = ' '.join(query.get('$filter', []))
+        report_ids = re.findall(r'MetricReportDefinition eq \S*/(\w+)', report_filter) or \
+            [report_id for report_id, definition in idrac.definitions.items()
+             if definition['MetricReportDefinitionEnabled']]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.status = 200
+        self.close_connection = True
+        sequence = 0
+        while not self.server.stopping.is_set():
+            for report_id in report_ids:
+                sequence += 1
+                event = json.dumps(idrac.metric_report(report_id, sequence))
+                self.wfile.write(('id: %d\ndata: %s\n\n' % (sequence, event)).encode())
+            self.wfile.flush()
+            self.server.stopping.wait(self.server.config['sse_interval'])
+
+
+def deliver_test_event(idrac, body):
+    """Sends the test event to its destination like an iDRAC does, used to measure delivery latency locally"""
+    event_type = body.get('EventTypes') or 'Alert'
+    if isinstance(event_type, list):
+        # a subscription lists several event types, an event has exactly one
+        event_type = event_type[0] if event_type else 'Alert'
+    event = {'@odata.type': '#Event.v1_6_0.Event', 'Id': str(uuid.uuid4()), 'Name': 'Event Array',
+             'Context': body.get('Context', ''),
+             'Events': [{'EventType': event_type, 'MessageId': body.get('MessageId', ''),
+                         'MessageArgs': body.get('MessageArgs', []), 'EventTimestamp': timestamp(),
+                         'OriginOfCondition': {'@odata.id': '/redfish/v1'},
+                         'Message': 'Test event from simulated iDRAC %s' % idrac.name}]}
+    request = urllib.request.Request(body['Destination'], data=json.dumps(event).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        urllib.request.urlopen(request, timeout=10, context=context).close()
+    except Exception as e:
+        logging.debug("Unable to deliver test event of %s to %s: %s" % (idrac.name, body['Destination'], e))
+
+
+class MockServer(object):
+    """
+    Accepts connections for all simulated iDRACs with a single selector loop, either one listening port per iDRAC or
+    one port on the loopback address of each iDRAC (virtual hosts). Virtual hosts listening on another address share
+    one socket and are told apart by the Host header. Each connection is served by its own thread.
+    """
+
+    def __init__(self, config, ssl_context):
+        self.config = config
+        self.ssl_context = ssl_context
+        self.stats = MockStats()
+        self.stopping = threading.Event()
+        self.selector = selectors.DefaultSelector()
+        self.idracs = {}
+        self.addresses = []
+
+    def listen(self, address, port, idrac):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((address, port))
+        listener.listen(256)
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ, idrac)
+
+    def add_idracs(self):
+        config = self.config
+        for index in range(config['count']):
+            if config['virtual_hosts']:
+                # 127.0.0.0/8 is routed to loopback, every simulated iDRAC gets its own loopback address
+                host = '127.%d.%d.%d' % loopback_octets(index)
+                address = '%s:%d' % (host, config['port'])
+                self.idracs[host] = MockIdrac(host, config)
+                if config['address'] == '127.0.0.1':
+                    # listening on each loopback address keeps the simulated iDRACs off the network
+                    self.listen(host, config['port'], self.idracs[host])
+            else:
+                address = '%s:%d' % (config['address'], config['port'] + index)
+                idrac = MockIdrac(address, config)
+                self.idracs[address] = idrac
+                self.listen(config['address'], config['port'] + index, idrac)
+            self.addresses.append(address)
+        if config['virtual_hosts'] and config['address'] != '127.0.0.1':
+            self.listen(config['address'], config['port'], None)
+
+    def resolve(self, host_header, connection):
+        return self.idracs.get(host_header.rsplit(':', 1)[0]) or self.idracs.get(connection.getsockname()[0])
+
+    def serve_connection(self, connection, client_address, idrac):
+        try:
+            if self.ssl_context:
+                connection = self.ssl_context.wrap_socket(connection, server_side=True)
+        except (ssl.SSLError, OSError):
+            connection.close()
+            return
+        try:
+            MockRedfishHandler(connection, client_address, MockConnection(self, idrac))
+        except (ConnectionError, ssl.SSLError, OSError):
+            pass
+        finally:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def serve_forever(self):
+        while not self.stopping.is_set():
+            for key, _ in self.selector.select(timeout=0.5):
+                try:
+                    connection, client_address = key.fileobj.accept()
+                except (BlockingIOError, OSError):
+                    continue
+                connection.setblocking(True)
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(target=self.serve_connection, args=(connection, client_address, key.data),
+                                 daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+
+
+class MockConnection(object):
+    """Passed to MockRedfishHandler as its server, carries the iDRAC a connection was accepted for"""
+
+    def __init__(self, server, idrac):
+        self.server = server
+        self.idrac = idrac
+        self.config = server.config
+        self.stats = server.stats
+        self.stopping = server.stopping
+
+    def resolve(self, host_header, connection):
+        return self.idrac or self.server.resolve(host_header, connection)
+
+
+def loopback_octets(index):
+    """Returns the last three octets of the loopback address of the simulated iDRAC with the given index"""
+    return 1 + index // 65024, (index // 254) % 256, index % 254 + 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Python script simulating many iDRACs locally for testing and load "
+                                                 "testing the ConfigurationScripts without hardware.")
+    parser.add_argument('--script-examples', action="store_true", help='Prints script examples')
+    parser.add_argument('--count', help='Number of simulated iDRACs', type=int, default=10)
+    parser.add_argument('--address', help='Address to listen on. With --virtual-hosts the default listens on the '
+                                          'loopback address of each simulated iDRAC, any other address is shared by '
+                                          'all of them', default='127.0.0.1')
+    parser.add_argument('--port', help='First port, simulated iDRAC N listens on port + N unless --virtual-hosts is '
+                                       'used', type=int, default=8443)
+    parser.add_argument('--virtual-hosts', help='Serve all simulated iDRACs on one port, each iDRAC is reached through '
+                                                'its own 127.x.y.z loopback address', action='store_true')
+    parser.add_argument('--csv', help='Write an iDRACs.csv style file listing the simulated iDRACs',
+                        default='iDRACs-mock.csv')
+    parser.add_argument('-u', help='Username accepted by the simulated iDRACs', default='root')
+    parser.add_argument('-p', help='Password accepted by the simulated iDRACs', default='calvin')
+    parser.add_argument('--latency-ms', help='Latency added to every response', type=float, default=20)
+    parser.add_argument('--jitter-ms', help='Random latency added on top of --latency-ms', type=float, default=10)
+    parser.add_argument('--error-rate', help='Fraction of requests failing with 500 or 503', type=float, default=0)
+    parser.add_argument('--unlicensed-rate', help='Fraction of simulated iDRACs without Datacenter license',
+                        type=float, default=0)
+    parser.add_argument('--max-concurrent', help='Requests one simulated iDRAC serves at the same time, further '
+                                                 'requests get 503 like a busy BMC', type=int, default=4)
+    parser.add_argument('--max-subscriptions', help='Subscriptions one simulated iDRAC accepts', type=int, default=8)
+    parser.add_argument('--job-seconds', help='Average duration of SCP import and export jobs', type=float, default=10)
+    parser.add_argument('--sse-interval', help='Seconds between metric reports on SSE streams', type=float, default=5)
+    parser.add_argument('--deliver-events', help='POST test events to their destination like an iDRAC does',
+                        action='store_true')
+    parser.add_argument('--no-tls', help='Serve plain HTTP instead of HTTPS', action='store_true')
+    parser.add_argument('--cert', help='TLS certificate file, a self signed one is generated if not passed')
+    parser.add_argument('--key', help='TLS private key file of --cert')
+    parser.add_argument('--debug', help='Log every request', action='store_true')
+    args = vars(parser.parse_args())
+    logging.basicConfig(format='%(message)s', stream=sys.stdout, level=logging.DEBUG if args["debug"] else
+                        logging.INFO)
+
+    if args["script_examples"]:
+        print('\n\'RedfishMockServer.py --count 1000 --virtual-hosts --latency-ms 50 --error-rate 0.01\', this example '
+              'simulates 1000 iDRACs on port 8443, each reachable on its own loopback address listed in '
+              'iDRACs-mock.csv.\n'
+              '\n\'RedfishMockServer.py --count 20 --port 9000\', this example simulates 20 iDRACs on ports 9000 to '
+              '9019, run the ConfigurationScripts with -ip 127.0.0.1:9000.\n')
+        sys.exit(0)
+
+    ssl_context = None
+    if not args["no_tls"]:
+        cert_file, key_file = args["cert"], args["key"]
+        if not cert_file:
+            folder = tempfile.mkdtemp(prefix='redfish-mock-')
+            cert_file, key_file = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+            generate_self_signed_certificate(cert_file, key_file)
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(cert_file, key_file)
+
+    server = MockServer({'count': args["count"], 'address': args["address"], 'port': args["port"],
+                         'virtual_hosts': args["virtual_hosts"], 'username': args["u"], 'password': args["p"],
+                         'latency': args["latency_ms"] / 1000, 'jitter': args["jitter_ms"] / 1000,
+                         'error_rate': args["error_rate"], 'unlicensed_rate': args["unlicensed_rate"],
+                         'max_concurrent': args["max_concurrent"], 'max_subscriptions': args["max_subscriptions"],
+                         'job_seconds': args["job_seconds"], 'sse_interval': args["sse_interval"],
+                         'deliver_events': args["deliver_events"]}, ssl_context)
+    try:
+        server.add_idracs()
+    except OSError as e:
+        logging.error("- ERROR, unable to listen for %d simulated iDRACs: %s. Raise the open files limit with "
+                      "'ulimit -n'" % (args["count"], e))
+        sys.exit(1)
+    with open(args["csv"], 'w') as file:
+        file.write('iDRAC IP,Username,Password\n')
+        for address in server.addresses:
+            file.write('%s,%s,%s\n' % (address, args["u"], args["p"]))
+    logging.info("- INFO, simulating %d iDRACs from %s to %s, listed in %s. Statistics are available on "
+                 "/mock/stats of any simulated iDRAC" % (len(server.addresses), server.addresses[0],
+                                                        server.addresses[-1], args["csv"]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,374 @@
+#
+# RedfishResilience. Python module shared by the ConfigurationScripts to send Redfish requests with connect and read
+# timeouts, bounded retries of transient failures, a per-iDRAC circuit breaker and a failure summary.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import atexit
+import importlib.util
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1
+DEFAULT_MAX_BACKOFF = 30
+# Retries sent by the whole run are limited to a ratio of all requests plus a fixed allowance, so a fleet wide
+# outage does not multiply the load on the iDRACs or the run time
+DEFAULT_RETRY_BUDGET_RATIO = 0.2
+DEFAULT_RETRY_BUDGET_MIN = 20
+DEFAULT_BREAKER_THRESHOLD = 3
+DEFAULT_BREAKER_COOLDOWN = 60
+# iDRAC answers 503 while it is busy or restarting and 429 when too many sessions are open, in both cases the request
+# was not processed and is retried for every method
+RETRY_STATUS_CODES = (429, 503)
+# Internal and gateway errors may be returned after the request was processed, they are only retried for idempotent
+# methods. Redfish PATCH sets properties to absolute values and is idempotent.
+IDEMPOTENT_RETRY_STATUS_CODES = (500, 502, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH', 'DELETE')
+
+# The profiling hooks are shared with the Telemetry report processor, they are only loaded with --profiling
+PROFILING_MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                                'TelemetryReportProcessingScripts', 'TelemetryProfiling.py')
+
+settings = {'connect_timeout': DEFAULT_CONNECT_TIMEOUT, 'read_timeout': DEFAULT_READ_TIMEOUT,
+            'retries': DEFAULT_RETRIES, 'backoff': DEFAULT_BACKOFF, 'max_backoff': DEFAULT_MAX_BACKOFF,
+            'retry_budget_ratio': DEFAULT_RETRY_BUDGET_RATIO, 'retry_budget_min': DEFAULT_RETRY_BUDGET_MIN,
+            'breaker_threshold': DEFAULT_BREAKER_THRESHOLD, 'breaker_cooldown': DEFAULT_BREAKER_COOLDOWN,
+            'summary_file': None}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without contacting an iDRAC whose circuit breaker is open after repeated connection failures"""
+
+
+class HostState:
+    """Circuit breaker and failure counters of one iDRAC"""
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.fast_failures = 0
+        self.last_error = ''
+
+    def allow(self):
+        """Returns True when a request may be sent, an open circuit lets one probe through once the cooldown passed"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= settings['breaker_cooldown']:
+                self.probing = True
+                return True
+            self.fast_failures += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_connection_failure(self, error):
+        with self.lock:
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.probing or self.consecutive_failures >= settings['breaker_threshold']:
+                if self.opened_at is None or self.probing:
+                    logging.warning("- WARNING, iDRAC %s unreachable after %d attempts, failing its requests fast for "
+                                    "%ds: %s" % (self.host, self.consecutive_failures, settings['breaker_cooldown'],
+                                                 error))
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    @property
+    def circuit_open(self):
+        return self.opened_at is not None
+
+
+class RetryBudget:
+    """Retries allowed for the whole run, shared by all threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def acquire(self):
+        with self.lock:
+            if self.retries < settings['retry_budget_min'] + settings['retry_budget_ratio'] * self.requests:
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+budget = RetryBudget()
+# TelemetryProfiling module once enable_profiling() was called, the requests are timed during its captures
+profiling = None
+hosts = {}
+hosts_lock = threading.Lock()
+local = threading.local()
+
+
+def host_state(url):
+    host = urlsplit(url).netloc
+    with hosts_lock:
+        if host not in hosts:
+            hosts[host] = HostState(host)
+        return hosts[host]
+
+
+def session():
+    """Returns the requests session of the calling thread, connections to an iDRAC are reused between requests"""
+    if getattr(local, 'session', None) is None:
+        local.session = requests.Session()
+    return local.session
+
+
+def send(method, url, **kwargs):
+    if profiling is None or not profiling.active:
+        return session().request(method, url, **kwargs)
+    with profiling.timed('redfish %s' % method):
+        return session().request(method, url, **kwargs)
+
+
+def retry_after_seconds(response):
+    """Returns the delay requested by a Retry-After header in seconds, None when there is none"""
+    value = response.headers.get('Retry-After', '') if response is not None else ''
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt, response=None):
+    """Exponential backoff with jitter, a Retry-After header takes precedence. Both are capped by max_backoff."""
+    delay = retry_after_seconds(response)
+    if delay is None:
+        delay = settings['backoff'] * 2 ** attempt
+        delay = delay / 2 + random.uniform(0, delay / 2)
+    return min(delay, settings['max_backoff'])
+
+
+def is_retryable(method, response=None, error=None):
+    if error is not None:
+        # A request whose connection timed out never reached the iDRAC, other connection errors may have
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        return method in IDEMPOTENT_METHODS and isinstance(error, (requests.exceptions.ConnectionError,
+                                                                   requests.exceptions.Timeout))
+    if response.status_code in RETRY_STATUS_CODES:
+        return True
+    return method in IDEMPOTENT_METHODS and response.status_code in IDEMPOTENT_RETRY_STATUS_CODES
+
+
+def request(method, url, retries=None, timeout=None, **kwargs):
+    """
+    Sends a Redfish request like requests.request does, with a timeout and retries of transient failures. Connection
+    failures count towards the circuit breaker of the iDRAC, once it is open the requests to the iDRAC raise
+    CircuitOpenError without being sent until the cooldown passed.
+
+    :param method: HTTP method, for example GET
+    :param url: URL of the Redfish resource, for example https://192.168.0.120/redfish/v1/TelemetryService
+    :param retries: Number of retries, defaults to the configured number. Use 0 for requests polled by the caller.
+    :param timeout: (connect, read) timeout in seconds, defaults to the configured timeouts
+    """
+    method = method.upper()
+    retries = settings['retries'] if retries is None else retries
+    kwargs['timeout'] = timeout or (settings['connect_timeout'], settings['read_timeout'])
+    state = host_state(url)
+    attempt = 0
+    while True:
+        if not state.allow():
+            raise CircuitOpenError("iDRAC %s is unreachable, request not sent: %s" % (state.host, state.last_error))
+        budget.record_request()
+        with state.lock:
+            state.requests += 1
+        response, error = None, None
+        try:
+            response = send(method, url, **kwargs)
+            state.record_success()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+            state.record_connection_failure('%s: %s' % (type(e).__name__, e))
+        retryable = is_retryable(method, response, error)
+        if not retryable or attempt >= retries or state.circuit_open or not budget.acquire():
+            break
+        delay = backoff_seconds(attempt, response)
+        logging.debug("Retrying %s %s in %.1fs after %s" % (method, url, delay, error or response.status_code))
+        if response is not None:
+            response.close()
+        with state.lock:
+            state.retries += 1
+        attempt += 1
+        time.sleep(delay)
+    if error is not None or retryable:
+        with state.lock:
+            state.failures += 1
+            if error is None:
+                state.last_error = 'status code %s returned by %s %s' % (response.status_code, method,
+                                                                          urlsplit(url).path)
+    if error is not None:
+        raise error
+    return response
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+def configure(**options):
+    """
+    Changes the timeouts, retries and circuit breaker settings, for example configure(connect_timeout=3, retries=1).
+    Options set to None keep their current value.
+    """
+    unknown = set(options) - set(settings)
+    if unknown:
+        raise ValueError("unknown options %s" % sorted(unknown))
+    settings.update({name: value for name, value in options.items() if value is not None})
+
+
+def add_arguments(parser):
+    """Adds the timeout, retry and failure summary arguments to the argument parser of a script"""
+    parser.add_argument('--connect-timeout', help='Seconds to wait for a connection to an iDRAC. Default is %s' %
+                        DEFAULT_CONNECT_TIMEOUT, type=float, required=False)
+    parser.add_argument('--read-timeout', help='Seconds to wait for an iDRAC response. Default is %s' %
+                        DEFAULT_READ_TIMEOUT, type=float, required=False)
+    parser.add_argument('--retries', help='Retries of requests failing with a connection error, 429 or 503 status. '
+                        'Default is %s' % DEFAULT_RETRIES, type=int, required=False)
+    parser.add_argument('--failure-summary', help='Write the summary of failed iDRACs to this JSON file',
+                        required=False)
+    parser.add_argument('--profiling', help='Enable the profiling hooks: kill -USR1 <pid> profiles the threads and '
+                        'times the Redfish requests for 30 seconds, kill -USR2 <pid> writes the memory growth since '
+                        'the previous USR2. Requires TelemetryReportProcessingScripts/TelemetryProfiling.py',
+                        action='store_true', required=False)
+    parser.add_argument('--profiling-port', help='With --profiling, also serve /profile?seconds=N, /memory and '
+                        '/stages on this port of 127.0.0.1', type=int, required=False)
+
+
+def configure_from_args(args):
+    """Applies the arguments added by add_arguments, args is the dict returned by vars(parser.parse_args())"""
+    configure(connect_timeout=args.get('connect_timeout'), read_timeout=args.get('read_timeout'),
+              retries=args.get('retries'), summary_file=args.get('failure_summary'))
+    if args.get('profiling'):
+        enable_profiling(port=args.get('profiling_port'))
+
+
+def enable_profiling(port=None):
+    """
+    Loads TelemetryProfiling, from the import path or the TelemetryReportProcessingScripts folder of the repository,
+    and installs its signal triggers. Returns False with a warning when the module is not available.
+    """
+    global profiling
+    try:
+        import TelemetryProfiling
+    except ImportError:
+        if not os.path.exists(PROFILING_MODULE):
+            logging.warning("- WARNING, profiling disabled, TelemetryProfiling.py not found in %s" %
+                            os.path.dirname(PROFILING_MODULE))
+            return False
+        spec = importlib.util.spec_from_file_location('TelemetryProfiling', PROFILING_MODULE)
+        TelemetryProfiling = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(TelemetryProfiling)
+        sys.modules['TelemetryProfiling'] = TelemetryProfiling
+    TelemetryProfiling.enable(port=port)
+    profiling = TelemetryProfiling
+    return True
+
+
+def failure_summary():
+    """
+    Returns the request, retry and failure counters of the run, with one entry per iDRAC which had failures
+
+    {'requests': 1200, 'retries': 35, 'retry_budget_exhausted': 0, 'failed_idracs': 1,
+     'idracs': [{'iDRAC': '192.168.0.120', 'requests': 3, 'retries': 2, 'failures': 1, 'fast_failures': 4,
+                 'circuit_open': True, 'last_error': 'ConnectTimeout: ...'}]}
+    """
+    with hosts_lock:
+        states = list(hosts.values())
+    failed = [state for state in states if state.failures or state.fast_failures]
+    return {'requests': budget.requests, 'retries': budget.retries, 'retry_budget_exhausted': budget.exhausted,
+            'failed_idracs': len(failed),
+            'idracs': [{'iDRAC': state.host, 'requests': state.requests, 'retries': state.retries,
+                        'failures': state.failures, 'fast_failures': state.fast_failures,
+                        'circuit_open': state.circuit_open, 'last_error': state.last_error}
+                       for state in sorted(failed, key=lambda state: state.host)]}
+
+
+def log_failure_summary():
+    summary = failure_summary()
+    if not summary['failed_idracs'] and not summary['retries']:
+        return
+    logging.info(" Redfish failure summary ".center(100, "*"))
+    logging.info("requests: {requests} retries: {retries} retry budget exhausted: {retry_budget_exhausted} "
+                 "failed iDRACs: {failed_idracs}".format(**summary))
+    for entry in summary['idracs']:
+        logging.info("iDRAC: {iDRAC:<20} failures: {failures} fast failures: {fast_failures} retries: {retries} "
+                     "circuit open: {circuit_open} last error: {last_error}".format(**entry))
+    logging.info("".center(100, "*"))
+
+
+def write_failure_summary(file_name):
+    try:
+        with open(file_name, 'w') as file:
+            json.dump(failure_summary(), file, indent=2)
+    except OSError as e:
+        logging.error("- ERROR, unable to write the failure summary to %s: %s" % (file_name, e))
+
+
+@atexit.register
+def report_at_exit():
+    log_failure_summary()
+    if settings['summary_file']:
+        write_failure_summary(settings['summary_file'])
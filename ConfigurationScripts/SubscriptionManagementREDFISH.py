@@ -25,12 +25,17 @@ import logging
 import os
 import platform
 import re
-import requests
 import sys
-import time
 import warnings
 from pprint import pprint
 from pprint import pformat
+from urllib.parse import quote
+
+import RedfishDeliveryProbe
+import RedfishResilience
+from RedfishHelpers import read_idracs_csv
+from RedfishJobTracker import JobTracker
+from RedfishEventFilters import build_sse_filter, build_subscription_filters, get_event_service, split_filter_argument
 
 warnings.filterwarnings("ignore")
 
@@ -60,9 +65,42 @@ parser.add_argument('--event-type', '-E', help='The EventType value for either c
                     'Alert, MetricReport.', required=False, dest='event_type')
 parser.add_argument('--message-id', '-M', help='Pass in MessageID for sending test event. Example: TMP0118',
                     required=False, dest='message_id')
+parser.add_argument('--metric-report-definitions', help='Comma separated metric report names to limit a new POST or '
+                    'SSE subscription to, for example PowerMetrics,ThermalSensor. Default is all metric reports',
+                    required=False, dest='metric_report_definitions')
+parser.add_argument('--registry-prefixes', help='Comma separated message registry prefixes to limit a new POST or SSE '
+                    'subscription to, for example iDRAC', required=False, dest='registry_prefixes')
+parser.add_argument('--resource-types', help='Comma separated resource types to limit a new POST or SSE subscription '
+                    'to, for example Systems', required=False, dest='resource_types')
+parser.add_argument('--probe', action="store_true", help='Measure the event delivery latency and loss: submit '
+                    '--probe-count uniquely tagged test events to the iDRAC, or to every iDRAC of the -f CSV file, '
+                    'and time their arrival on a listener started by this script at --probe-url', required=False)
+parser.add_argument('-f', help='Pass in csv file name to probe all iDRACs of the file with --probe. NOTE: Make sure to '
+                    'use iDRACs.csv file from the repo which has the correct format.', required=False)
+parser.add_argument('--probe-url', help='HTTPS URL the iDRACs reach this host on, for example '
+                    'https://192.168.0.130:8443. The listener uses its port', required=False)
+parser.add_argument('--probe-listen', help='Local address of the probe listener, default is all addresses',
+                    default='0.0.0.0', required=False)
+parser.add_argument('--probe-count', help='Test events submitted to each iDRAC, default is 5', type=int, default=5,
+                    required=False)
+parser.add_argument('--probe-rate', help='Test events submitted per second over all iDRACs, default is %s' %
+                    RedfishDeliveryProbe.DEFAULT_RATE, type=float, default=RedfishDeliveryProbe.DEFAULT_RATE,
+                    required=False)
+parser.add_argument('--probe-wait', help='Seconds to wait for the last events before they are counted as lost, '
+                    'default is %s' % RedfishDeliveryProbe.DEFAULT_WAIT_SECONDS, type=float,
+                    default=RedfishDeliveryProbe.DEFAULT_WAIT_SECONDS, required=False)
+parser.add_argument('--probe-cert', help='TLS certificate of the probe listener, a self signed one is generated if '
+                    'not passed', required=False)
+parser.add_argument('--probe-key', help='TLS private key file of --probe-cert', required=False)
+parser.add_argument('--probe-report', help='Write the per iDRAC and fleet probe results to this JSON file',
+                    required=False)
+parser.add_argument('--max-workers', help='Test event requests sent concurrently with --probe, default is 16',
+                    type=int, default=16, required=False)
 parser.add_argument('--delete', help='Pass in complete service subscription URI to delete. Execute -s argument if '
                     'needed to get subscription URIs', required=False)
+RedfishResilience.add_arguments(parser)
 args = vars(parser.parse_args())
+RedfishResilience.configure_from_args(args)
 logging.basicConfig(format='%(message)s', stream=sys.stdout, level=logging.INFO)            
 
 def get_event_service_properties(idrac_ip: str, idrac_username: str, idrac_password: str):
@@ -109,8 +147,8 @@ def get_event_service_properties(idrac_ip: str, idrac_username: str, idrac_passw
     :param idrac_password: Password of the target iDRAC
     """
     print("\n- EventService URI property details for iDRAC %s -\n"  % idrac_ip)
-    response = requests.get('https://%s/redfish/v1/EventService' % idrac_ip, verify=False,
-                            auth=(idrac_username, idrac_password))
+    response = RedfishResilience.get('https://%s/redfish/v1/EventService' % idrac_ip, verify=False,
+                                     auth=(idrac_username, idrac_password))
     if response.status_code == 200:
         logging.info("- PASS, GET command passed to get EventService URI details\n")
     else:
@@ -130,8 +168,8 @@ def get_event_service_subscriptions(idrac_ip: str, idrac_username: str, idrac_pa
                                 detail to print for the user. Passed as the argument to --get-subscriptions
     """
 
-    response = requests.get('https://%s/redfish/v1/EventService/Subscriptions' % idrac_ip, verify=False,
-                            auth=(idrac_username, idrac_password))
+    response = RedfishResilience.get('https://%s/redfish/v1/EventService/Subscriptions' % idrac_ip, verify=False,
+                                     auth=(idrac_username, idrac_password))
     data = response.json()
     if response.status_code != 200:
         logging.error("- ERROR, GET request failed to get subscription details, status code %s returned" % response.status_code)
@@ -144,7 +182,8 @@ def get_event_service_subscriptions(idrac_ip: str, idrac_username: str, idrac_pa
     for subscription in data["Members"]:
         print("%s" % subscription['@odata.id'])
         if subscription_detail == "detailed":
-            response = requests.get('https://%s%s' % (idrac_ip, subscription['@odata.id']), verify=False,auth=(idrac_username, idrac_password))
+            response = RedfishResilience.get('https://%s%s' % (idrac_ip, subscription['@odata.id']), verify=False,
+                                             auth=(idrac_username, idrac_password))
             if response.status_code != 200:
                 logging.error("- ERROR, GET request failed to get subscription details, status code %s returned" % response.status_code)
                 sys.exit(0) 
@@ -165,7 +204,7 @@ def delete_subscriptions(idrac_ip: str, idrac_username: str, idrac_password: str
     """
     url = "https://%s%s" % (idrac_ip, subscription_uri)
     headers = {'content-type': 'application/json'}
-    response = requests.delete(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
+    response = RedfishResilience.delete(url, headers=headers, verify=False, auth=(idrac_username, idrac_password))
     if response.__dict__["status_code"] == 200:
         logging.info("\n- PASS, DELETE command successfully deleted subscription %s" % args["delete"])
     else:
@@ -189,7 +228,8 @@ def scp_set_idrac_attribute(idrac_ip: str, idrac_username: str, idrac_password:
         "ImportBuffer": "<SystemConfiguration><Component FQDD=\"iDRAC.Embedded.1\"><Attribute Name=\"IPMILan.1#AlertEnable\">Enabled</Attribute></Component></SystemConfiguration>",
         "ShareParameters": {"Target": "All"}}
     headers = {'content-type': 'application/json'}
-    response = requests.post(url, data=json.dumps(payload), headers=headers, verify=False, auth=(idrac_username, idrac_password))
+    response = RedfishResilience.post(url, data=json.dumps(payload), headers=headers, verify=False,
+                                      auth=(idrac_username, idrac_password))
     response_output = response.__dict__
     try:
         job_id = response_output["headers"]["Location"].split("/")[-1]
@@ -197,44 +237,24 @@ def scp_set_idrac_attribute(idrac_ip: str, idrac_username: str, idrac_password:
         logging.error("\n- FAIL: detailed error message: {0}".format(response.__dict__['_content']))
         sys.exit(0)
     logging.info("- PASS, job ID %s successfully created" % job_id)
-    while True:
-        response = requests.get('https://%s/redfish/v1/TaskService/Tasks/%s' % (idrac_ip, job_id), auth=(idrac_username, idrac_password), verify=False)
-        data = response.json()
-        message_string = data["Messages"]
-        final_message_string = str(message_string)
-        if response.status_code == 202 or response.status_code == 200:
-            logging.info("- PASS, GET command to get job status details")
-            time.sleep(1)
-        else:
-            logging.error("- ERROR, query job ID command failed, error code %s returned" % status_code)
-            sys.exit(0)
-        if "failed" in final_message_string or "completed with errors" in final_message_string or\
-                "Not one" in final_message_string:
-            logging.error("- FAIL, detailed job message is: %s" % data["Messages"])
-            sys.exit(0)
-        elif "Successfully imported" in final_message_string or "completed with errors" in final_message_string or\
-                "Successfully imported" in final_message_string:
-            logging.info("Job ID = " + data["Id"])
-            logging.info("Name = " + data["Name"])
-            try:
-                logging.info("- INFO, Message = \n" + message_string[0]["Message"])
-            except:
-                logging.info("- INFO, Message = %s\n" % message_string[len(message_string) - 1]["Message"])
-            break
-        elif "No changes" in final_message_string:
-            logging.info("Job ID = " + data["Id"])
-            logging.info("Name = " + data["Name"])
-            try:
-                logging.info("Message = " + message_string[0]["Message"])
-            except:
-                logging.info("Message = %s" % message_string[len(message_string) - 1]["Message"])
-                sys.exit(0)
-            break
-        else:
-            logging.info("Job not marked completed, current status is: %s" % data["TaskState"])
-            logging.info("Message: %s\n" % message_string[0]["Message"])
-            time.sleep(1)
-            continue
+    tracker = JobTracker(timeout=300)
+    job = tracker.add(idrac_ip, idrac_username, idrac_password, job_id, 'Import',
+                      task_monitor='/redfish/v1/TaskService/Tasks/%s' % job_id)
+    tracker.wait_all()
+    tracker.close()
+    data = job.data
+    message_string = data.get("Messages") or [{"Message": job.message}]
+    final_message_string = str(message_string)
+    if job.state == 'TimedOut':
+        logging.error("- FAIL, job ID %s did not complete: %s" % (job_id, job.message))
+        sys.exit(0)
+    if job.state == 'Failed' or "failed" in final_message_string or "completed with errors" in final_message_string or\
+            "Not one" in final_message_string:
+        logging.error("- FAIL, detailed job message is: %s" % message_string)
+        sys.exit(0)
+    logging.info("Job ID = " + data.get("Id", job_id))
+    logging.info("Name = " + data.get("Name", ""))
+    logging.info("- INFO, Message = \n" + message_string[0].get("Message", ""))
 
 
 def get_set_ipmi_alert_idrac_setting(idrac_ip: str, idrac_username: str, idrac_password: str):
@@ -246,7 +266,8 @@ def get_set_ipmi_alert_idrac_setting(idrac_ip: str, idrac_username: str, idrac_p
     :param idrac_password: Password of the target iDRAC
     """
 
-    response = requests.get('https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Attributes' % idrac_ip, verify=False, auth=(idrac_username, idrac_password))
+    response = RedfishResilience.get('https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Attributes' % idrac_ip,
+                                     verify=False, auth=(idrac_username, idrac_password))
     data = response.json()
     if response.status_code != 200:
             logging.error("- ERROR, GET command failed to get iDRAC attributes, status code %s returned" % status_code)
@@ -269,15 +290,16 @@ def get_set_ipmi_alert_idrac_setting(idrac_ip: str, idrac_username: str, idrac_p
             payload = {"Attributes": {"IPMILan.1.AlertEnable": "Enabled"}}
             headers = {'content-type': 'application/json'}
             url = 'https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Attributes' % idrac_ip
-            response = requests.patch(url, data=json.dumps(payload), headers=headers, verify=False, auth=(idrac_username, idrac_password))
+            response = RedfishResilience.patch(url, data=json.dumps(payload), headers=headers, verify=False,
+                                               auth=(idrac_username, idrac_password))
             status_code = response.status_code
             if status_code == 200:
                 logging.info("- PASS, PATCH command succeeded and set iDRAC attribute \"IPMILan.1.AlertEnable\" to enabled")
             else:
                 logging.error("FAIL. PATCH command failed to set iDRAC attribute \"IPMILan.1.AlertEnable\" to enabled")
                 sys.exit(0)
-            response = requests.get('https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Attributes' % idrac_ip,
-                                    verify=False, auth=(idrac_username, idrac_password))
+            response = RedfishResilience.get('https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Attributes' % idrac_ip,
+                                             verify=False, auth=(idrac_username, idrac_password))
             data = response.json()
             attributes_dict = data['Attributes']
             if attributes_dict["IPMILan.1.AlertEnable"] == "Enabled":
@@ -292,10 +314,33 @@ def get_set_ipmi_alert_idrac_setting(idrac_ip: str, idrac_username: str, idrac_p
             break
 
 
+def get_filter_spec():
+    """
+    Returns the subscription filters passed in as script arguments as keyword arguments for RedfishEventFilters
+    """
+    return {"metric_report_definitions": split_filter_argument(args["metric_report_definitions"]),
+            "registry_prefixes": split_filter_argument(args["registry_prefixes"]),
+            "resource_types": split_filter_argument(args["resource_types"])}
+
+
+def read_event_service_for_filters(idrac_ip: str, idrac_username: str, idrac_password: str, filter_spec: dict):
+    """
+    Reads the EventService to discover which filters the firmware supports, only when any filter is requested
+    """
+    if not any(filter_spec.values()):
+        return {}
+    try:
+        return get_event_service(idrac_ip, idrac_username, idrac_password)
+    except RuntimeError as e:
+        logging.error("- ERROR, %s" % e)
+        sys.exit(0)
+
+
 def create_post_subscription(idrac_ip: str, idrac_username: str, idrac_password: str, destination_url: str,
-                             event_type: str, format_type: str):
+                             event_type: str, format_type: str, filter_spec: dict = None):
     """
-    Creates a subscription to the target iDRAC based on HTTP POST
+    Creates a subscription to the target iDRAC based on HTTP POST. The subscription is limited to the metric reports,
+    registry prefixes and resource types of filter_spec where the firmware supports it.
 
     :param idrac_ip: IP address of the target iDRAC
     :param idrac_username: Username of the target iDRAC
@@ -305,14 +350,19 @@ def create_post_subscription(idrac_ip: str, idrac_username: str, idrac_password:
                        ResourceUpdated, ResourceAdded, ResourceRemoved, Alert, and MetricReport.
     :param format_type: The format in which you want to receive the subscription data. This can be Event, MetricReport,
                         or None
+    :param filter_spec: Optional filters as returned by get_filter_spec
     """
 
     url = "https://%s/redfish/v1/EventService/Subscriptions" % idrac_ip
     headers = {'content-type': 'application/json'}
     payload = {"Destination": destination_url, "EventTypes": [event_type], "Context": "root", "Protocol": "Redfish",
                "EventFormatType": format_type}
-    response = requests.post(url, data=json.dumps(payload), headers=headers, verify=False,
-                             auth=(idrac_username, idrac_password))
+    filter_spec = filter_spec or {}
+    if any(filter_spec.values()):
+        event_service = read_event_service_for_filters(idrac_ip, idrac_username, idrac_password, filter_spec)
+        payload.update(build_subscription_filters(event_service, **filter_spec))
+    response = RedfishResilience.post(url, data=json.dumps(payload), headers=headers, verify=False,
+                                      auth=(idrac_username, idrac_password))
     if response.__dict__["status_code"] == 201:
         logging.info("- PASS, POST command passed to create new subscription")
     else:
@@ -329,23 +379,32 @@ def launch_sse_subscription(idrac_ip: str, idrac_username: str, idrac_password:
     :param idrac_username: Username of the target iDRAC
     :param idrac_password: Password of the target iDRAC
     """
+    filter_arguments = "".join(" --%s %s" % (name.replace("_", "-"), args[name]) for name in
+                               ("metric_report_definitions", "registry_prefixes", "resource_types") if args[name])
     if platform.system().lower() == "windows":   
-        os.system("start cmd /k python SubscriptionManagementREDFISH.py -ip %s -u %s -p %s --create-sse-subscription" % (idrac_ip, idrac_username, idrac_password))
+        os.system("start cmd /k python SubscriptionManagementREDFISH.py -ip %s -u %s -p %s --create-sse-subscription%s" % (idrac_ip, idrac_username, idrac_password, filter_arguments))
     elif platform.system().lower() == "linux":
         if platform.python_version()[0] == "2":
-            os.system("gnome-terminal --command=\"bash -c 'python SubscriptionManagementREDFISH.py -ip %s -u %s -p %s --create-sse-subscription; $SHELL'\"" % (idrac_ip, idrac_username, idrac_password))
+            os.system("gnome-terminal --command=\"bash -c 'python SubscriptionManagementREDFISH.py -ip %s -u %s -p %s --create-sse-subscription%s; $SHELL'\"" % (idrac_ip, idrac_username, idrac_password, filter_arguments))
         elif platform.python_version()[0] == "3":
-            os.system("gnome-terminal --command=\"bash -c 'python3 SubscriptionManagementREDFISH.py -ip %s -u %s -p %s --create-sse-subscription; $SHELL'\"" % (idrac_ip, idrac_username, idrac_password))
-def create_sse_subscription(idrac_ip: str, idrac_username: str, idrac_password: str):
+            os.system("gnome-terminal --command=\"bash -c 'python3 SubscriptionManagementREDFISH.py -ip %s -u %s -p %s --create-sse-subscription%s; $SHELL'\"" % (idrac_ip, idrac_username, idrac_password, filter_arguments))
+def create_sse_subscription(idrac_ip: str, idrac_username: str, idrac_password: str, filter_spec: dict = None):
     """
-    Creates an SSE subscription to the iDRAC. It will print all output to console in the foreground.
+    Creates an SSE subscription to the iDRAC. It will print all output to console in the foreground. The $filter is
+    built from the same filter spec as create_post_subscription, limited to SSEFilterPropertiesSupported.
 
     :param idrac_ip: IP address of the target iDRAC
     :param idrac_username: Username of the target iDRAC
     :param idrac_password: Password of the target iDRAC
+    :param filter_spec: Optional filters as returned by get_filter_spec
     """
+    filter_spec = filter_spec or {}
+    sse_filter = "EventFormatType eq MetricReport"
+    if any(filter_spec.values()):
+        event_service = read_event_service_for_filters(idrac_ip, idrac_username, idrac_password, filter_spec)
+        sse_filter = build_sse_filter(event_service, "MetricReport", **filter_spec)
     print("\n- INFO, starting SSE client, this may take a few seconds")
-    messages = SSEClient("https://%s/redfish/v1/SSE?$filter=EventFormatType eq MetricReport" % idrac_ip,
+    messages = SSEClient("https://%s/redfish/v1/SSE?$filter=%s" % (idrac_ip, quote(sse_filter)),
                          headers={'content-type': 'application/json'},
                          verify=False,
                          auth=(idrac_username, idrac_password))
@@ -371,8 +430,8 @@ def submit_test_event(idrac_ip: str, idrac_username: str, idrac_password: str, d
                "MessageId": message_id}
     url = "https://%s/redfish/v1/EventService/Actions/EventService.SubmitTestEvent" % idrac_ip
     headers = {'content-type': 'application/json'}
-    response = requests.post(url, data=json.dumps(payload), headers=headers, verify=False,
-                             auth=(idrac_username, idrac_password))
+    response = RedfishResilience.post(url, data=json.dumps(payload), headers=headers, verify=False,
+                                      auth=(idrac_username, idrac_password))
     if response.__dict__["status_code"] == 204:
         logging.info("\n- PASS, POST command succeeded, status code %s returned, event type \"%s\" successfully sent to " 
                      "destination \"%s\"" % (response.status_code, event_type, destination_url))
@@ -382,6 +441,35 @@ def submit_test_event(idrac_ip: str, idrac_username: str, idrac_password: str, d
         sys.exit(0)
 
 
+def probe_event_delivery(idracs):
+    """
+    Submits tagged test events to the iDRACs and reports the delivery latency and loss per iDRAC and for the fleet
+
+    :param idracs: list of (ip, username, password) tuples
+    """
+    try:
+        correlator = RedfishDeliveryProbe.DeliveryCorrelator(args["probe_url"], args["probe_listen"],
+                                                             args["probe_cert"], args["probe_key"]).start()
+    except OSError as e:
+        logging.error("- FAIL, unable to start the probe listener for %s: %s" % (args["probe_url"], e))
+        sys.exit(1)
+    logging.info("- INFO, probing %d iDRACs with %d test events each, listening for them on %s" %
+                 (len(idracs), args["probe_count"], args["probe_url"]))
+    try:
+        summary = RedfishDeliveryProbe.run_probe(idracs, correlator, count=args["probe_count"],
+                                                 rate=args["probe_rate"], max_workers=max(1, args["max_workers"]),
+                                                 wait_seconds=args["probe_wait"],
+                                                 event_type=args["event_type"] or 'Alert',
+                                                 message_id=args["message_id"] or 'TMP0118')
+    finally:
+        correlator.stop()
+    RedfishDeliveryProbe.log_summary(summary)
+    if args["probe_report"]:
+        with open(args["probe_report"], 'w') as file:
+            json.dump(summary, file, indent=2)
+    return summary
+
+
 def print_examples():
     """
     Print program examples and exit
@@ -389,14 +477,16 @@ def print_examples():
     print(
         '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --get-subscriptions detailed\' - Get current subscription URIs and details.\n'
         '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --create-subscription --destination-url https://192.168.0.130 --event-type Alert --format-type MetricReport\' - Create a metric report subscription for alert events to destination https://192.168.0.130.\n'
+        '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --create-subscription --destination-url https://192.168.0.130 --event-type MetricReport --format-type MetricReport --metric-report-definitions PowerMetrics,ThermalSensor\' - Create a subscription which only receives the PowerMetrics and ThermalSensor metric reports.\n'
         '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --delete /redfish/v1/EventService/Subscriptions/c1a71140-ba1d-11e9-842f-d094662a05e6\' - Delete subscription URI.\n'
         '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --create-sse-subscription\' - Create and start SSE subscription which will run in the foreground for current command window.\n'
         '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --launch-sse-subscription\' - Create and start SSE subscription which will launch a command window session to run the SSE subscription (recommended to use for SSE).\n'
-        '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --test-event --destination-url https://192.168.0.130 --event-type Alert --message-id TMP0118 - Submit test event TPM0118 to subscription destination URI https://192.168.0.130.')
+        '\n\'SubscriptionManagementREDFISH.py -ip 192.168.0.120 -u root -p calvin --test-event --destination-url https://192.168.0.130 --event-type Alert --message-id TMP0118 - Submit test event TPM0118 to subscription destination URI https://192.168.0.130.\n'
+        '\n\'SubscriptionManagementREDFISH.py -f iDRACs.csv --probe --probe-url https://192.168.0.130:8443 --probe-count 10 --probe-rate 50\' - Submit 10 tagged test events to every iDRAC of the CSV file, 50 per second at most, and report the p50/p99 delivery latency and loss of each iDRAC and of the fleet. Run it on the collector host with port 8443 free.')
     sys.exit(0)
 
 
-if not args["script_examples"]:
+if not args["script_examples"] and not (args["probe"] and args["f"]):
     if not args["idrac_ip"] or not args["idrac_username"] or not args["idrac_password"]:
         logging.error("- ERROR, when not using the --script-examples argument -ip, -u, and -p are required arguments.")
         sys.exit(0)
@@ -419,13 +509,18 @@ if __name__ == "__main__":
         get_event_service_subscriptions(args["idrac_ip"], args["idrac_username"], args["idrac_password"], args["get_subscriptions"])
     elif args["create_subscription"] and args["destination_url"] and args["event_type"] and args["format_type"]:
         get_set_ipmi_alert_idrac_setting(args["idrac_ip"], args["idrac_username"], args["idrac_password"])
-        create_post_subscription(args["idrac_ip"], args["idrac_username"], args["idrac_password"], args["destination_url"], args["event_type"], args["format_type"])
+        create_post_subscription(args["idrac_ip"], args["idrac_username"], args["idrac_password"], args["destination_url"], args["event_type"], args["format_type"], get_filter_spec())
     elif args["create_sse_subscription"]:
-        create_sse_subscription(args["idrac_ip"], args["idrac_username"], args["idrac_password"])
+        create_sse_subscription(args["idrac_ip"], args["idrac_username"], args["idrac_password"], get_filter_spec())
     elif args["launch_sse_subscription"]:
         launch_sse_subscription(args["idrac_ip"], args["idrac_username"], args["idrac_password"])
     elif args["test_event"] and args["destination_url"] and args["event_type"] and args["message_id"]:
         submit_test_event(args["idrac_ip"], args["idrac_username"], args["idrac_password"],args["destination_url"], args["event_type"], args["message_id"])
+    elif args["probe"] and args["probe_url"]:
+        idracs = read_idracs_csv(args["f"]) if args["f"] else \
+            [(args["idrac_ip"], args["idrac_username"], args["idrac_password"])]
+        summary = probe_event_delivery(idracs)
+        sys.exit(1 if summary['fleet']['lost'] or summary['fleet']['failed'] else 0)
     elif args["delete"]:
         delete_subscriptions(args["idrac_ip"], args["idrac_username"], args["idrac_password"], args["delete"])
     else:
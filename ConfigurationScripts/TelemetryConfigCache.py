@@ -0,0 +1,123 @@
+#
+# TelemetryConfigCache. Python module shared by the Server Configuration Profile scripts to cache the last known
+# telemetry attributes of each iDRAC and to detect which attributes drifted from a desired configuration.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+import RedfishResilience
+
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.idrac_telemetry', 'config_cache')
+
+
+def canonical_attributes(attributes):
+    """
+    Converts a list of SCP attributes ({"Name": "Telemetry.1#EnableTelemetry", "Value": "Enabled", ...}) into a
+    {name: value} dict. Attributes which are not applied on import are ignored.
+
+    :param attributes: list of SCP attributes as saved by ExportTelemetryConfigurationUsingScpREDFISH.py
+    """
+    return {attribute['Name']: str(attribute.get('Value', '')) for attribute in attributes
+            if attribute.get('Name') and attribute.get('Set On Import', 'True') != 'False'
+            and attribute.get('Comment Only', 'False') != 'True'}
+
+
+def content_hash(attributes: dict):
+    """
+    Returns a hash of the canonical attributes which does not depend on attribute order or JSON formatting
+    """
+    canonical = json.dumps(attributes, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def cache_file(idrac_ip: str, cache_folder=DEFAULT_CACHE_FOLDER):
+    return os.path.join(cache_folder, '%s.json' % idrac_ip.replace(':', '_'))
+
+
+def load(idrac_ip: str, cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    Returns the cache entry {"hash": ..., "attributes": {...}, "updated": ...} of an iDRAC, None if there is none
+    """
+    try:
+        with open(cache_file(idrac_ip, cache_folder), 'r') as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return None
+
+
+def store(idrac_ip: str, attributes: dict, cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    Stores the canonical telemetry attributes of an iDRAC, merged into the existing cache entry
+
+    :param attributes: {name: value} dict as returned by canonical_attributes
+    """
+    entry = load(idrac_ip, cache_folder) or {'attributes': {}}
+    entry['attributes'].update(attributes)
+    entry['hash'] = content_hash(entry['attributes'])
+    entry['updated'] = time.time()
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+        temporary_file = cache_file(idrac_ip, cache_folder) + '.tmp'
+        with open(temporary_file, 'w') as file:
+            json.dump(entry, file, sort_keys=True)
+        os.replace(temporary_file, cache_file(idrac_ip, cache_folder))
+    except OSError as e:
+        logging.warning("Unable to update the telemetry configuration cache for iDRAC %s: %s" % (idrac_ip, e))
+
+
+def cached_in_spec(idrac_ip: str, desired: dict, cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    Checks whether the cached attributes of an iDRAC already contain the desired attributes, without contacting it.
+    When the desired attributes are the cached ones, as for a profile imported again, the stored hash is compared.
+    """
+    entry = load(idrac_ip, cache_folder)
+    if not entry:
+        return False
+    cached = entry.get('attributes', {})
+    if entry.get('hash') and set(cached) == set(desired):
+        return entry['hash'] == content_hash(desired)
+    return all(cached.get(name) == value for name, value in desired.items())
+
+
+def read_live_attributes(idrac_ip: str, idrac_username: str, idrac_password: str):
+    """
+    Reads the current iDRAC attributes with a single GET and returns them with SCP attribute names, for example
+    Telemetry.1.EnableTelemetry is returned as Telemetry.1#EnableTelemetry. Raises RuntimeError when the firmware
+    does not expose the attributes through Redfish.
+    """
+    response = RedfishResilience.get('https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Attributes' % idrac_ip,
+                                     verify=False, auth=(idrac_username, idrac_password))
+    if response.status_code != 200 or 'Attributes' not in response.json():
+        raise RuntimeError("unable to read iDRAC attributes, status code %s returned" % response.status_code)
+    live = {}
+    for name, value in response.json()['Attributes'].items():
+        group, _, attribute = name.rpartition('.')
+        live['%s#%s' % (group, attribute) if group else name] = str(value) if value is not None else ''
+    return live
+
+
+def drifted_attributes(desired: dict, live: dict):
+    """
+    Returns the desired attributes whose live value differs
+
+    :param desired: {name: value} dict as returned by canonical_attributes
+    :param live: {name: value} dict as returned by read_live_attributes
+    """
+    return {name: value for name, value in desired.items() if live.get(name) != value}
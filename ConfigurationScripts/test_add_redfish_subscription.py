@@ -0,0 +1,78 @@
+#
+# test_add_redfish_subscription. Tests of the AddRedfishSubscription reconcile plan, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import importlib
+import sys
+
+import pytest
+import requests
+
+import RedfishResilience
+
+LISTENER = 'https://192.168.0.145'
+SUBSCRIPTIONS = '/redfish/v1/EventService/Subscriptions/'
+
+
+@pytest.fixture(scope='module')
+def script():
+    """Imports the script, its arguments are parsed at import time"""
+    argv = sys.argv
+    sys.argv = ['AddRedfishSubscription.py', '-d', LISTENER]
+    try:
+        return importlib.import_module('AddRedfishSubscription')
+    finally:
+        sys.argv = argv
+
+
+def subscription(number, destination, context='LMEpzC', **properties):
+    result = {'@odata.id': SUBSCRIPTIONS + str(number), 'Destination': destination, 'Protocol': 'Redfish',
+              'SubscriptionType': 'RedfishEvent', 'Context': context, 'EventTypes': ['MetricReport'],
+              'EventFormatType': 'MetricReport'}
+    result.update(properties)
+    return result
+
+
+def response(status_code):
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = b'{}'
+    result._content_consumed = True
+    return result
+
+
+def test_matching_subscription_is_kept(script):
+    subscriptions = [subscription(1, LISTENER), subscription(2, LISTENER)]
+    assert script.plan_subscription_changes(subscriptions, script.desired_subscription()) == (
+        [], [SUBSCRIPTIONS + '2'])
+
+
+def test_subscriptions_of_other_listeners_with_the_same_context_are_not_touched(script):
+    subscriptions = [subscription(1, 'https://other-listener'), subscription(2, LISTENER, EventFormatType='Event')]
+    desired = script.desired_subscription()
+    assert script.plan_subscription_changes(subscriptions, desired) == ([desired], [SUBSCRIPTIONS + '2'])
+
+
+def test_reconcile_adds_before_deleting(script, monkeypatch):
+    calls = []
+    monkeypatch.setattr(script, 'list_subscriptions', lambda *args: [
+        subscription(1, 'https://other-listener'), subscription(2, LISTENER, context='Old')])
+    monkeypatch.setattr(script, 'post_subscription', lambda ip, user, pwd, payload: calls.append(
+        ('POST', payload['Destination'])) or response(201))
+    monkeypatch.setattr(RedfishResilience, 'delete', lambda url, **kwargs: calls.append(('DELETE', url)) or
+                        response(204))
+    report = script.reconcile_subscriptions('192.168.0.120', 'root', 'calvin')
+    assert (report['status'], report['adds'], report['deletes']) == ('changed', 1, 1)
+    assert calls == [('POST', LISTENER), ('DELETE', 'https://192.168.0.120' + SUBSCRIPTIONS + '2')]
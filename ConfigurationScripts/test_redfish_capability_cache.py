@@ -0,0 +1,83 @@
+#
+# test_redfish_capability_cache. Tests of the RedfishCapabilityCache discovery and $expand recording, run with:
+# python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import json
+
+import requests
+
+import RedfishCapabilityCache
+import RedfishResilience
+
+IDRAC_IP = '192.168.0.120'
+SUBSCRIPTIONS = '/redfish/v1/EventService/Subscriptions'
+RESOURCES = {'/redfish/v1/TelemetryService': {'Id': 'TelemetryService'},
+             '/redfish/v1/EventService': {'Id': 'EventService', 'EventFormatTypes': ['Event', 'MetricReport']},
+             '/redfish/v1/Managers/iDRAC.Embedded.1': {'Id': 'iDRAC.Embedded.1', 'FirmwareVersion': '6.00.00.00'},
+             SUBSCRIPTIONS: {'Members': [{'@odata.id': SUBSCRIPTIONS + '/1'}]},
+             SUBSCRIPTIONS + '/1': {'Id': '1', 'Destination': 'https://192.168.0.145'}}
+
+
+def response(status_code, body=None, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = json.dumps(body or {}).encode()
+    result._content_consumed = True
+    return result
+
+
+class FakeIdrac(object):
+    """Serves RESOURCES, with a firmware rejecting $expand"""
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        uri = '/' + url.split('/', 3)[3]
+        if '?$expand' in uri:
+            return response(400)
+        if uri not in RESOURCES:
+            return response(404)
+        return response(200, RESOURCES[uri], {'ETag': '"%s"' % uri})
+
+
+def install(monkeypatch):
+    idrac = FakeIdrac()
+    monkeypatch.setattr(RedfishResilience, 'get', idrac.get)
+    return idrac
+
+
+def test_discovery_records_firmware_version_and_subscription_limit(monkeypatch, tmp_path):
+    install(monkeypatch)
+    capabilities = RedfishCapabilityCache.get_capabilities(IDRAC_IP, 'root', 'calvin', cache_folder=str(tmp_path))
+    assert (capabilities['FirmwareVersion'], capabilities['MaxSubscriptions']) == ('6.00.00.00', 8)
+    assert capabilities['TelemetrySupported'] and capabilities['EventService']['EventFormatTypes']
+    assert RedfishCapabilityCache.load(IDRAC_IP, str(tmp_path)) == capabilities
+
+
+def test_rejected_expand_is_recorded_without_a_cache_entry(monkeypatch, tmp_path):
+    idrac = install(monkeypatch)
+    members = RedfishCapabilityCache.read_collection(IDRAC_IP, 'root', 'calvin', SUBSCRIPTIONS, str(tmp_path))
+    assert members == [RESOURCES[SUBSCRIPTIONS + '/1']]
+    assert RedfishCapabilityCache.load(IDRAC_IP, str(tmp_path)) == {'ExpandSupported': False}
+    del idrac.urls[:]
+    RedfishCapabilityCache.read_collection(IDRAC_IP, 'root', 'calvin', SUBSCRIPTIONS, str(tmp_path))
+    assert not [url for url in idrac.urls if '$expand' in url]
+    # the partial entry is rediscovered, keeping what read_collection learned
+    capabilities = RedfishCapabilityCache.get_capabilities(IDRAC_IP, 'root', 'calvin', cache_folder=str(tmp_path))
+    assert (capabilities['ExpandSupported'], capabilities['FirmwareVersion']) == (False, '6.00.00.00')
@@ -0,0 +1,125 @@
+#
+# test_redfish_delivery_probe. Tests of the RedfishDeliveryProbe subscriptions and correlation, run with:
+# python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import json
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+import RedfishDeliveryProbe
+import RedfishResilience
+
+IDRACS = [('192.168.0.120', 'root', 'calvin'), ('192.168.0.121', 'root', 'calvin')]
+
+
+def free_port():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        return listener.getsockname()[1]
+
+
+def response(status_code, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = b'{}'
+    result._content_consumed = True
+    return result
+
+
+class FakeIdracs(object):
+    """Keeps the subscriptions of each iDRAC and sends test events only to a subscribed destination, like an iDRAC"""
+
+    def __init__(self, correlator, full=()):
+        self.correlator = correlator
+        self.full = full
+        self.subscriptions = {}
+        self.test_events = []
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, **kwargs):
+        idrac_ip = url.split('/')[2]
+        payload = json.loads(data)
+        with self._lock:
+            subscriptions = self.subscriptions.setdefault(idrac_ip, {})
+            if url.endswith('/Subscriptions'):
+                if idrac_ip in self.full:
+                    return response(400)
+                uri = '/redfish/v1/EventService/Subscriptions/%d' % len(subscriptions)
+                subscriptions[uri] = payload
+                return response(201, {'Location': uri})
+            self.test_events.append((idrac_ip, payload))
+            if payload['Destination'] not in [subscription['Destination'] for subscription in subscriptions.values()]:
+                return response(400)
+        event = {'Context': payload['Context'], 'Events': [{'EventType': payload['EventTypes'],
+                                                            'MessageId': payload['MessageId'],
+                                                            'MessageArgs': payload['MessageArgs']}]}
+        self.correlator.arrival('/', json.dumps(event).encode(), time.monotonic())
+        return response(204)
+
+    def delete(self, url, **kwargs):
+        idrac_ip, uri = url.split('/')[2], '/' + url.split('/', 3)[3]
+        with self._lock:
+            del self.subscriptions[idrac_ip][uri]
+        return response(200)
+
+
+@pytest.fixture
+def correlator():
+    correlator = RedfishDeliveryProbe.DeliveryCorrelator('http://127.0.0.1:%d' % free_port(), '127.0.0.1').start()
+    yield correlator
+    correlator.stop()
+
+
+def install(monkeypatch, correlator, **kwargs):
+    idracs = FakeIdracs(correlator, **kwargs)
+    monkeypatch.setattr(RedfishResilience, 'post', idracs.post)
+    monkeypatch.setattr(RedfishResilience, 'delete', idracs.delete)
+    return idracs
+
+
+def test_probes_go_to_one_subscribed_destination_which_is_deleted_after_the_run(monkeypatch, correlator):
+    idracs = install(monkeypatch, correlator)
+    summary = RedfishDeliveryProbe.run_probe(IDRACS, correlator, count=3, rate=0, wait_seconds=5)
+    assert (summary['fleet']['delivered'], summary['fleet']['lost'], summary['stray_events']) == (6, 0, 0)
+    assert {payload['Destination'] for _, payload in idracs.test_events} == {correlator.destination_url}
+    assert sorted(payload['MessageArgs'][0] for _, payload in idracs.test_events) == \
+        ['probe/%s/%d' % (correlator.run_id, number) for number in range(6)]
+    assert idracs.subscriptions == {'192.168.0.120': {}, '192.168.0.121': {}}
+
+
+def test_idrac_refusing_the_subscription_is_reported_as_failed(monkeypatch, correlator):
+    idracs = install(monkeypatch, correlator, full=('192.168.0.121',))
+    summary = RedfishDeliveryProbe.run_probe(IDRACS, correlator, count=2, rate=0, wait_seconds=5)
+    assert (summary['fleet']['delivered'], summary['fleet']['failed'], summary['fleet']['lost']) == (2, 2, 0)
+    assert 'status code 400' in summary['idracs']['192.168.0.121']['error']
+    assert [idrac_ip for idrac_ip, _ in idracs.test_events] == ['192.168.0.120'] * 2
+
+
+def test_arrivals_are_matched_by_their_tag(correlator):
+    probe, tag = correlator.new_probe('192.168.0.120')
+    correlator.submitted(probe)
+    correlator.arrival('/', b'not an event', time.monotonic())
+    correlator.arrival('/', json.dumps({'Context': 'probe/000000000000/0', 'Events': [{}]}).encode(), time.monotonic())
+    assert correlator.stray_events == 2 and not correlator.wait(0)
+    event = json.dumps({'Context': 'probe/%s' % correlator.run_id, 'Events': [{'MessageArgs': [tag]}]}).encode()
+    correlator.arrival('/', event, time.monotonic())
+    correlator.arrival('/', event, time.monotonic())
+    assert correlator.wait(0) and probe.duplicates == 1
@@ -0,0 +1,79 @@
+#
+# test_redfish_event_filters. Tests of the RedfishEventFilters subscription and SSE filters, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import pytest
+
+import RedfishCapabilityCache
+import RedfishEventFilters
+
+POWER_METRICS = '/redfish/v1/TelemetryService/MetricReportDefinitions/PowerMetrics'
+EVENT_SERVICE = {'SSEFilterPropertiesSupported': {'EventFormatType': True, 'MetricReportDefinition': True,
+                                                  'RegistryPrefix': True, 'ResourceType': False},
+                 'RegistryPrefixes': ['iDRAC', 'Base'], 'ResourceTypes': ['Systems', 'Chassis']}
+# Event service of a firmware without any filter support
+OLD_EVENT_SERVICE = {'EventFormatTypes': ['Event', 'MetricReport']}
+
+
+def test_split_filter_argument():
+    assert RedfishEventFilters.split_filter_argument(' PowerMetrics, ,ThermalSensor ') == ['PowerMetrics',
+                                                                                          'ThermalSensor']
+    assert RedfishEventFilters.split_filter_argument(None) == []
+
+
+def test_metric_report_definition_uri():
+    assert RedfishEventFilters.metric_report_definition_uri('PowerMetrics') == POWER_METRICS
+    assert RedfishEventFilters.metric_report_definition_uri(POWER_METRICS) == POWER_METRICS
+
+
+def test_subscription_filters():
+    filters = RedfishEventFilters.build_subscription_filters(
+        EVENT_SERVICE, metric_report_definitions=['PowerMetrics'], registry_prefixes=['iDRAC', 'Unknown'],
+        resource_types=['Systems'])
+    assert filters == {'MetricReportDefinitions': [{'@odata.id': POWER_METRICS}], 'RegistryPrefixes': ['iDRAC'],
+                       'ResourceTypes': ['Systems']}
+    assert RedfishEventFilters.build_subscription_filters(EVENT_SERVICE) == {}
+
+
+def test_unsupported_subscription_filters_are_dropped():
+    assert RedfishEventFilters.build_subscription_filters(
+        OLD_EVENT_SERVICE, metric_report_definitions=['PowerMetrics'], registry_prefixes=['iDRAC'],
+        resource_types=['Systems']) == {}
+    # all requested values unsupported, the filter is left out rather than sent empty
+    assert RedfishEventFilters.build_subscription_filters(EVENT_SERVICE, registry_prefixes=['Unknown']) == {}
+
+
+def test_sse_filter():
+    assert RedfishEventFilters.build_sse_filter(EVENT_SERVICE) == 'EventFormatType eq MetricReport'
+    assert RedfishEventFilters.build_sse_filter(EVENT_SERVICE, metric_report_definitions=['PowerMetrics']) == \
+        'EventFormatType eq MetricReport and MetricReportDefinition eq %s' % POWER_METRICS
+    assert RedfishEventFilters.build_sse_filter(
+        EVENT_SERVICE, 'Event', registry_prefixes=['iDRAC', 'Base'], resource_types=['Systems']) == \
+        'EventFormatType eq Event and (RegistryPrefix eq iDRAC or RegistryPrefix eq Base)'
+    assert RedfishEventFilters.build_sse_filter(EVENT_SERVICE, None, registry_prefixes=['iDRAC', 'Base']) == \
+        'RegistryPrefix eq iDRAC or RegistryPrefix eq Base'
+
+
+def test_sse_filter_without_filter_support():
+    assert RedfishEventFilters.build_sse_filter(OLD_EVENT_SERVICE, metric_report_definitions=['PowerMetrics']) == \
+        'EventFormatType eq MetricReport'
+
+
+def test_get_event_service(monkeypatch):
+    monkeypatch.setattr(RedfishCapabilityCache, 'get_capabilities', lambda *args: {'EventService': EVENT_SERVICE})
+    assert RedfishEventFilters.get_event_service('192.168.0.120', 'root', 'calvin') == EVENT_SERVICE
+    monkeypatch.setattr(RedfishCapabilityCache, 'get_capabilities', lambda *args: {'EventService': {}})
+    with pytest.raises(RuntimeError):
+        RedfishEventFilters.get_event_service('192.168.0.120', 'root', 'calvin')
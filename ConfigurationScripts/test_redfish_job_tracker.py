@@ -0,0 +1,161 @@
+#
+# test_redfish_job_tracker. Tests of the RedfishJobTracker polling of jobs and task monitors, run with:
+# python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import json
+
+import pytest
+import requests
+
+import RedfishJobTracker
+import RedfishResilience
+
+
+def response(status_code, body=None, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8') if body else b''
+    result._content_consumed = True
+    return result
+
+
+def job(state, percent=None, message=''):
+    return response(200, {'JobState': state, 'PercentComplete': percent, 'Message': message})
+
+
+class FakeIdracs(object):
+    """Answers the job polls with the scripted responses of each URL, the last one is repeated"""
+
+    def __init__(self, answers):
+        self.answers = {url: list(url_answers) for url, url_answers in answers.items()}
+        self.polls = []
+
+    def __call__(self, url, **kwargs):
+        self.polls.append(url)
+        answers = self.answers[url]
+        answer = answers.pop(0) if len(answers) > 1 else answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def job_url(idrac_ip, job_id):
+    return 'https://%s/redfish/v1/Managers/iDRAC.Embedded.1/Jobs/%s' % (idrac_ip, job_id)
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    monkeypatch.setattr(RedfishJobTracker, 'DEFAULT_INITIAL_POLL_INTERVAL', 0)
+    tracker = RedfishJobTracker.JobTracker(timeout=5, min_interval=0, max_interval=0.01, max_workers=4)
+    yield tracker
+    tracker.close()
+
+
+def install(monkeypatch, answers):
+    idracs = FakeIdracs(answers)
+    monkeypatch.setattr(RedfishResilience, 'get', idracs)
+    return idracs
+
+
+def test_jobs_on_several_idracs(monkeypatch, tracker):
+    install(monkeypatch, {
+        job_url('192.168.0.120', 'JID_1'): [job('Running', 10), job('Running', 60), job('Completed', 100)],
+        job_url('192.168.0.121', 'JID_2'): [job('Running', 0), job('Failed', 100, 'Unable to import')],
+        job_url('192.168.0.122', 'JID_3'): [job('Completed', 100, 'Successfully exported')]})
+    for number, idrac_ip in enumerate(('192.168.0.120', '192.168.0.121', '192.168.0.122'), 1):
+        tracker.add(idrac_ip, 'root', 'calvin', 'JID_%d' % number)
+    jobs = tracker.wait_all()
+    assert [(tracked.job_id, tracked.state) for tracked in jobs] == [('JID_1', 'Completed'), ('JID_2', 'Failed'),
+                                                                     ('JID_3', 'Completed')]
+    assert [tracked.polls for tracked in jobs] == [3, 2, 1]
+    assert jobs[2].message == 'Successfully exported'
+    assert tracker.pending() == []
+
+
+def test_failure_message_fails_a_completed_job(monkeypatch, tracker):
+    install(monkeypatch, {job_url('192.168.0.120', 'JID_1'): [job('Completed', 100, 'Import failed')]})
+    tracker.add('192.168.0.120', 'root', 'calvin', 'JID_1')
+    assert tracker.wait_all()[0].state == 'Failed'
+
+
+def test_task_monitor(monkeypatch, tracker):
+    monitor = '/redfish/v1/TaskService/Tasks/JID_1'
+    install(monkeypatch, {'https://192.168.0.120' + monitor: [
+        response(202), response(202, {'TaskState': 'Running', 'PercentComplete': 50}),
+        response(200, {'TaskState': 'Completed', 'Messages': [{'Message': 'Done'}]})]})
+    tracked = tracker.add('192.168.0.120', 'root', 'calvin', 'JID_1', task_monitor=monitor)
+    tracker.wait_all()
+    assert (tracked.state, tracked.message, tracked.polls, tracked.percent_complete) == ('Completed', 'Done', 3, 50)
+
+
+def test_task_monitor_returning_the_action_result(monkeypatch, tracker):
+    monitor = '/redfish/v1/TaskService/Tasks/JID_1'
+    result = response(200, {'SystemConfiguration': {}})
+    install(monkeypatch, {'https://192.168.0.120' + monitor: [response(202), result]})
+    tracked = tracker.add('192.168.0.120', 'root', 'calvin', 'JID_1', task_monitor=monitor)
+    tracker.wait_all()
+    assert tracked.state == 'Completed' and 'SystemConfiguration' in tracked.data
+
+
+def test_poll_errors_fail_the_job_after_max_poll_errors(monkeypatch, tracker):
+    idracs = install(monkeypatch, {job_url('192.168.0.120', 'JID_1'): [response(500)],
+                                   job_url('192.168.0.121', 'JID_2'): [response(200, b'<html>busy</html>')],
+                                   job_url('192.168.0.122', 'JID_3'): [response(503), job('Completed', 100)]})
+    for number, idrac_ip in enumerate(('192.168.0.120', '192.168.0.121', '192.168.0.122'), 1):
+        tracker.add(idrac_ip, 'root', 'calvin', 'JID_%d' % number)
+    jobs = tracker.wait_all()
+    assert [tracked.state for tracked in jobs] == ['Failed', 'Failed', 'Completed']
+    assert idracs.polls.count(job_url('192.168.0.120', 'JID_1')) == tracker.max_poll_errors
+    assert jobs[0].message == 'status code 500'
+    assert 'not JSON' in jobs[1].message
+
+
+def test_open_circuit_fails_the_job_at_once(monkeypatch, tracker):
+    idracs = install(monkeypatch, {job_url('192.168.0.120', 'JID_1'): [
+        RedfishResilience.CircuitOpenError('iDRAC 192.168.0.120 is unreachable')]})
+    tracked = tracker.add('192.168.0.120', 'root', 'calvin', 'JID_1')
+    tracker.wait_all()
+    assert tracked.state == 'Failed' and len(idracs.polls) == 1
+
+
+def test_job_times_out(monkeypatch):
+    monkeypatch.setattr(RedfishJobTracker, 'DEFAULT_INITIAL_POLL_INTERVAL', 0)
+    install(monkeypatch, {job_url('192.168.0.120', 'JID_1'): [job('Running', 10)]})
+    tracker = RedfishJobTracker.JobTracker(timeout=0.05, min_interval=0, max_interval=0.01)
+    tracked = tracker.add('192.168.0.120', 'root', 'calvin', 'JID_1')
+    tracker.wait_all()
+    tracker.close()
+    assert tracked.state == 'TimedOut'
+
+
+def test_wait_any_returns_each_finished_job_once(monkeypatch, tracker):
+    install(monkeypatch, {job_url('192.168.0.120', 'JID_1'): [job('Completed', 100)],
+                          job_url('192.168.0.121', 'JID_2'): [job('Running', 10), job('Running', 20),
+                                                              job('Completed', 100)]})
+    tracker.add('192.168.0.120', 'root', 'calvin', 'JID_1')
+    tracker.add('192.168.0.121', 'root', 'calvin', 'JID_2')
+    assert [tracked.job_id for tracked in tracker.wait_any()] == ['JID_1']
+    assert [tracked.job_id for tracked in tracker.wait_any()] == ['JID_2']
+    assert tracker.wait_any() == []
+
+
+def test_next_interval_follows_the_progress(tracker):
+    tracker.min_interval, tracker.max_interval = 1, 30
+    tracked = RedfishJobTracker.TrackedJob('192.168.0.120', 'root', 'calvin', 'JID_1', 'Import', None)
+    assert tracker._next_interval(tracked, 12) == 12
+    assert tracker._next_interval(tracked, 120) == 30
+    assert tracker._next_interval(tracked, None) == tracked.interval * 1.5
@@ -0,0 +1,158 @@
+#
+# test_redfish_resilience. Tests of the RedfishResilience retries and circuit breaker, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import pytest
+import requests
+
+import RedfishResilience
+
+URL = 'https://192.168.0.120/redfish/v1/TelemetryService'
+
+
+def response(status_code, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = b'{}'
+    result._content_consumed = True
+    return result
+
+
+class FakeIdrac(object):
+    """Stands in for the requests session, answers with the scripted responses or errors, the last one is repeated"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return response(answer)
+
+
+@pytest.fixture(autouse=True)
+def resilience(monkeypatch):
+    """Runs each test with the default settings, no backoff and fresh host states and retry budget"""
+    monkeypatch.setattr(RedfishResilience, 'settings', dict(RedfishResilience.settings, backoff=0))
+    monkeypatch.setattr(RedfishResilience, 'hosts', {})
+    monkeypatch.setattr(RedfishResilience, 'budget', RedfishResilience.RetryBudget())
+
+
+def install(monkeypatch, *answers):
+    idrac = FakeIdrac(*answers)
+    monkeypatch.setattr(RedfishResilience, 'session', lambda: idrac)
+    return idrac
+
+
+def test_success_is_not_retried(monkeypatch):
+    idrac = install(monkeypatch, 200)
+    assert RedfishResilience.get(URL).status_code == 200
+    assert len(idrac.requests) == 1
+    assert idrac.requests[0][2]['timeout'] == (RedfishResilience.DEFAULT_CONNECT_TIMEOUT,
+                                               RedfishResilience.DEFAULT_READ_TIMEOUT)
+
+
+def test_busy_idrac_is_retried(monkeypatch):
+    idrac = install(monkeypatch, 503, 429, 200)
+    assert RedfishResilience.post(URL, json={}).status_code == 200
+    assert len(idrac.requests) == 3
+    assert RedfishResilience.host_state(URL).retries == 2
+
+
+def test_internal_errors_are_only_retried_for_idempotent_methods(monkeypatch):
+    idrac = install(monkeypatch, 500, 200)
+    assert RedfishResilience.patch(URL, json={}).status_code == 200
+    idrac = install(monkeypatch, 500, 200)
+    assert RedfishResilience.post(URL, json={}).status_code == 500
+    assert len(idrac.requests) == 1
+    # the caller handles the status, the iDRAC is not counted as failed
+    assert RedfishResilience.failure_summary()['failed_idracs'] == 0
+
+
+def test_retries_are_limited(monkeypatch):
+    idrac = install(monkeypatch, 503)
+    assert RedfishResilience.get(URL, retries=2).status_code == 503
+    assert len(idrac.requests) == 3
+    install(monkeypatch, 503)
+    assert RedfishResilience.get(URL, retries=0).status_code == 503
+    summary = RedfishResilience.failure_summary()
+    assert summary['failed_idracs'] == 1 and summary['idracs'][0]['failures'] == 2
+    assert summary['idracs'][0]['last_error'] == 'status code 503 returned by GET /redfish/v1/TelemetryService'
+
+
+def test_connection_errors(monkeypatch):
+    install(monkeypatch, requests.exceptions.ConnectTimeout('timed out'), 200)
+    assert RedfishResilience.post(URL, json={}).status_code == 200
+    idrac = install(monkeypatch, requests.exceptions.ReadTimeout('timed out'))
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        RedfishResilience.post(URL, json={})
+    # the iDRAC may have processed the POST, it is not sent again
+    assert len(idrac.requests) == 1
+
+
+def test_circuit_opens_after_repeated_connection_failures(monkeypatch):
+    RedfishResilience.configure(breaker_threshold=2, breaker_cooldown=60)
+    idrac = install(monkeypatch, requests.exceptions.ConnectionError('refused'))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        RedfishResilience.get(URL, retries=5)
+    assert len(idrac.requests) == 2
+    with pytest.raises(RedfishResilience.CircuitOpenError):
+        RedfishResilience.get(URL)
+    assert len(idrac.requests) == 2
+    state = RedfishResilience.host_state(URL)
+    assert state.circuit_open and state.fast_failures == 1
+    # other iDRACs are not affected
+    install(monkeypatch, 200)
+    assert RedfishResilience.get('https://192.168.0.121/redfish/v1').status_code == 200
+
+
+def test_circuit_lets_one_probe_through_after_the_cooldown(monkeypatch):
+    RedfishResilience.configure(breaker_threshold=1, breaker_cooldown=0)
+    install(monkeypatch, requests.exceptions.ConnectionError('refused'))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        RedfishResilience.get(URL)
+    install(monkeypatch, 200)
+    assert RedfishResilience.get(URL).status_code == 200
+    assert not RedfishResilience.host_state(URL).circuit_open
+
+
+def test_retry_budget_is_shared_by_all_requests(monkeypatch):
+    RedfishResilience.configure(retry_budget_min=2, retry_budget_ratio=0)
+    idrac = install(monkeypatch, 503)
+    RedfishResilience.get(URL, retries=5)
+    RedfishResilience.get('https://192.168.0.121/redfish/v1', retries=5)
+    assert len(idrac.requests) == 4
+    assert RedfishResilience.failure_summary()['retry_budget_exhausted'] == 2
+
+
+def test_backoff_seconds(monkeypatch):
+    RedfishResilience.configure(backoff=1, max_backoff=30)
+    assert all(2 <= RedfishResilience.backoff_seconds(2) <= 4 for _ in range(100))
+    assert RedfishResilience.backoff_seconds(10) == 30
+    assert RedfishResilience.backoff_seconds(0, response(503, {'Retry-After': '7'})) == 7
+    assert RedfishResilience.retry_after_seconds(response(503, {'Retry-After': 'soon'})) is None
+    assert RedfishResilience.retry_after_seconds(response(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0
+
+
+def test_configure_rejects_unknown_options():
+    with pytest.raises(ValueError):
+        RedfishResilience.configure(retry=1)
+    RedfishResilience.configure(connect_timeout=None, retries=1)
+    assert RedfishResilience.settings['connect_timeout'] == RedfishResilience.DEFAULT_CONNECT_TIMEOUT
+    assert RedfishResilience.settings['retries'] == 1
@@ -0,0 +1,55 @@
+#
+# test_telemetry_config_cache. Tests of the TelemetryConfigCache in-spec check, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import json
+
+import TelemetryConfigCache
+
+IDRAC_IP = '192.168.0.120'
+ATTRIBUTES = {'Telemetry.1#EnableTelemetry': 'Enabled', 'TelemetryPowerMetrics.1#EnableTelemetry': 'Enabled',
+              'TelemetryThermalSensor.1#ReportInterval': '60'}
+
+
+def test_canonical_attributes_skip_attributes_not_set_on_import():
+    attributes = [{'Name': 'Telemetry.1#EnableTelemetry', 'Value': 'Enabled'},
+                  {'Name': 'Telemetry.1#RsyslogServer1', 'Value': '', 'Set On Import': 'False'},
+                  {'Name': 'Telemetry.1#Comment', 'Value': 'x', 'Comment Only': 'True'},
+                  {'Name': 'TelemetryThermalSensor.1#ReportInterval', 'Value': 60}]
+    assert TelemetryConfigCache.canonical_attributes(attributes) == {
+        'Telemetry.1#EnableTelemetry': 'Enabled', 'TelemetryThermalSensor.1#ReportInterval': '60'}
+
+
+def test_cached_in_spec(tmp_path):
+    folder = str(tmp_path)
+    assert not TelemetryConfigCache.cached_in_spec(IDRAC_IP, ATTRIBUTES, folder)
+    TelemetryConfigCache.store(IDRAC_IP, ATTRIBUTES, folder)
+    assert TelemetryConfigCache.cached_in_spec(IDRAC_IP, dict(reversed(list(ATTRIBUTES.items()))), folder)
+    assert TelemetryConfigCache.cached_in_spec(IDRAC_IP, {'Telemetry.1#EnableTelemetry': 'Enabled'}, folder)
+    assert not TelemetryConfigCache.cached_in_spec(IDRAC_IP, dict(ATTRIBUTES, **{
+        'TelemetryThermalSensor.1#ReportInterval': '30'}), folder)
+    assert not TelemetryConfigCache.cached_in_spec(IDRAC_IP, {'TelemetryCPUSensor.1#EnableTelemetry': 'Enabled'},
+                                                   folder)
+
+
+def test_cached_in_spec_compares_the_stored_hash_for_the_same_attributes(tmp_path):
+    folder = str(tmp_path)
+    TelemetryConfigCache.store(IDRAC_IP, ATTRIBUTES, folder)
+    entry = TelemetryConfigCache.load(IDRAC_IP, folder)
+    assert entry['hash'] == TelemetryConfigCache.content_hash(ATTRIBUTES)
+    entry['hash'] = TelemetryConfigCache.content_hash({})
+    with open(TelemetryConfigCache.cache_file(IDRAC_IP, folder), 'w') as file:
+        json.dump(entry, file)
+    assert not TelemetryConfigCache.cached_in_spec(IDRAC_IP, ATTRIBUTES, folder)
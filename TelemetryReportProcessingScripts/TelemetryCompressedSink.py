@@ -0,0 +1,335 @@
+#
+# TelemetryCompressedSink. Python module writing reconstructed Telemetry reports to compressed segment files, with
+# one independently compressed frame per batch and an index of the frames for random access.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Layout of the destination folder, reports of all iDRACs with the same report Id share a segment since they repeat
+# the same MetricIds and properties:
+#
+#   <destination>/<report Id>/<report Id>_<start time>.jsonl.zst    concatenated frames, each one a JSON line per report
+#   <destination>/<report Id>/<report Id>_<start time>.jsonl.idx    one JSON line per frame: offset, length, times...
+#   <destination>/<report Id>/dictionary_<id>.zdict                 trained zstd dictionary, when enabled
+#
+# A segment is a valid zstd or gzip stream, 'zstdcat' or 'zcat' prints all its reports. Each line of a segment is
+# {"iDRAC": "<idrac name>", "Index": <report index>, "Report": {...}}.
+#
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from TelemetryStreamHealth import report_time
+
+logger = logging.getLogger('RsysLogProcessor')
+
+DEFAULT_BATCH_REPORTS = 256
+DEFAULT_BATCH_BYTES = 4 * 1024 * 1024
+DEFAULT_LINGER_SECONDS = 5
+DEFAULT_SEGMENT_BYTES = 256 * 1024 * 1024
+DEFAULT_SEGMENT_SECONDS = 3600
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_DICTIONARY_SIZE = 64 * 1024
+# Reports of a report Id collected before its dictionary is trained
+DEFAULT_DICTIONARY_SAMPLES = 500
+EXTENSIONS = {'zstd': '.jsonl.zst', 'gzip': '.jsonl.gz'}
+
+
+def load_zstandard():
+    """Returns the zstandard module, None if the optional zstandard library is not installed"""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def resolve_codec(codec):
+    """Returns the codec to use for 'zstd', 'gzip' or 'auto', zstd falls back to gzip when zstandard is missing"""
+    if codec not in ('zstd', 'gzip', 'auto'):
+        raise ValueError("unsupported codec {}, supported values are zstd, gzip and auto".format(codec))
+    if codec != 'gzip' and load_zstandard() is None:
+        if codec == 'zstd':
+            logger.warning("The zstandard library is not installed, writing gzip segments instead. Install it with "
+                           "`pip install zstandard`")
+        return 'gzip'
+    return 'gzip' if codec == 'gzip' else 'zstd'
+
+
+class Segment(object):
+    """Compressed segment file of one report Id and its frame index"""
+
+    def __init__(self, folder, report_id, codec):
+        name = '{}_{}_{}'.format(report_id, datetime.now().strftime('%Y-%m-%d_%H-%M-%S'), os.getpid())
+        self.path = os.path.join(folder, name + EXTENSIONS[codec])
+        self.index_path = os.path.join(folder, name + '.jsonl.idx')
+        self.file = open(self.path, 'ab')
+        self.index_file = open(self.index_path, 'a')
+        self.created = time.monotonic()
+        self.size = self.file.tell()
+
+    def append(self, frame, index_entry):
+        index_entry['offset'] = self.size
+        index_entry['length'] = len(frame)
+        self.file.write(frame)
+        self.file.flush()
+        # The index entry is written after its frame, a reader never sees an entry for an incomplete frame
+        self.index_file.write(json.dumps(index_entry) + '\n')
+        self.index_file.flush()
+        self.size += len(frame)
+
+    def close(self):
+        self.file.close()
+        self.index_file.close()
+
+
+class ReportIdStream(object):
+    """Pending batch, current segment and dictionary of one report Id"""
+
+    def __init__(self, report_id):
+        self.report_id = report_id
+        self.lines = []
+        self.batch_bytes = 0
+        self.batch_started = None
+        # oldest and newest report Timestamp of the batch, in epoch seconds
+        self.min_time = None
+        self.max_time = None
+        self.segment = None
+        self.compressor = None
+        self.dictionary_id = 0
+        self.samples = []
+
+
+class CompressedSink(object):
+    """
+    Pipeline sink compressing reports on a background thread. write() only queues the report, the queue is bounded so
+    a pipeline producing faster than the reports can be compressed is slowed down instead of using unbounded memory.
+    write() may be called from several threads, one sink can be shared by all pipelines of a process.
+
+    :param destination_folder: folder where the segments are written
+    :param codec: 'zstd', 'gzip' or 'auto', zstd requires the optional zstandard library and falls back to gzip
+    :param level: compression level, default is 3 for zstd and 6 for gzip
+    :param batch_reports: reports per frame, a frame is also written once it holds batch_bytes of JSON
+    :param linger_seconds: seconds a report waits for its batch to fill before the frame is written anyway
+    :param segment_bytes: size after which a new segment file is started
+    :param segment_seconds: age after which a new segment file is started
+    :param train_dictionaries: train a zstd dictionary per report Id from its first reports. It mostly helps small
+                               batches, for example with batch_reports=1 for the lowest latency.
+    """
+
+    def __init__(self, destination_folder, codec='auto', level=None, batch_reports=DEFAULT_BATCH_REPORTS,
+                 batch_bytes=DEFAULT_BATCH_BYTES, linger_seconds=DEFAULT_LINGER_SECONDS,
+                 segment_bytes=DEFAULT_SEGMENT_BYTES, segment_seconds=DEFAULT_SEGMENT_SECONDS,
+                 train_dictionaries=False, dictionary_samples=DEFAULT_DICTIONARY_SAMPLES,
+                 dictionary_size=DEFAULT_DICTIONARY_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+        self.destination_folder = destination_folder
+        self.codec = resolve_codec(codec)
+        self.level = level if level is not None else (3 if self.codec == 'zstd' else 6)
+        self.batch_reports = max(1, batch_reports)
+        self.batch_bytes = batch_bytes
+        self.linger_seconds = linger_seconds
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.train_dictionaries = train_dictionaries and self.codec == 'zstd'
+        if train_dictionaries and self.codec != 'zstd':
+            logger.warning("Dictionaries are only supported with zstd, writing gzip segments without dictionaries")
+        self.dictionary_samples = dictionary_samples
+        self.dictionary_size = dictionary_size
+        self.zstandard = load_zstandard() if self.codec == 'zstd' else None
+        self.streams = {}
+        self.reports = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='CompressedSink', daemon=True)
+        self._thread.start()
+
+    def write(self, telemetry_report):
+        if self._closed:
+            raise ValueError("write to a closed CompressedSink")
+        self._queue.put(telemetry_report)
+
+    def close(self):
+        """Compresses and writes the queued reports and closes the segments, waits for the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    @property
+    def ratio(self):
+        return self.raw_bytes / float(self.compressed_bytes) if self.compressed_bytes else 0.0
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.1, self.linger_seconds / 2.0))
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            try:
+                if item:
+                    self._add(item)
+                self._flush_expired()
+            except Exception as e:
+                logger.exception("Unable to write compressed reports: {}".format(e))
+        for stream in self.streams.values():
+            try:
+                self._flush(stream)
+            except Exception as e:
+                logger.exception("Unable to write compressed reports: {}".format(e))
+            if stream.segment:
+                stream.segment.close()
+        logger.info("Compressed {} reports from {} to {} bytes, ratio {:.1f}".format(
+            self.reports, self.raw_bytes, self.compressed_bytes, self.ratio))
+
+    def _add(self, telemetry_report):
+        report = telemetry_report.report
+        report_id = report.get('Id', 'UnknownId')
+        stream = self.streams.get(report_id)
+        if stream is None:
+            stream = self.streams[report_id] = ReportIdStream(report_id)
+        line = json.dumps({'iDRAC': telemetry_report.idrac_name, 'Index': telemetry_report.index,
+                           'Report': report}, separators=(',', ':')).encode('utf-8') + b'\n'
+        if not stream.lines:
+            stream.batch_started = time.monotonic()
+            stream.min_time = stream.max_time = None
+        epoch = report_time(report.get('Timestamp'))
+        if epoch is not None:
+            # the reports of several iDRACs share a batch, they are not in Timestamp order
+            stream.min_time = epoch if stream.min_time is None else min(stream.min_time, epoch)
+            stream.max_time = epoch if stream.max_time is None else max(stream.max_time, epoch)
+        stream.lines.append(line)
+        stream.batch_bytes += len(line)
+        if self.train_dictionaries and not stream.dictionary_id and stream.samples is not None:
+            stream.samples.append(line)
+            if len(stream.samples) >= self.dictionary_samples:
+                self._train_dictionary(stream)
+        if len(stream.lines) >= self.batch_reports or stream.batch_bytes >= self.batch_bytes:
+            self._flush(stream)
+
+    def _flush_expired(self):
+        now = time.monotonic()
+        for stream in self.streams.values():
+            if stream.lines and now - stream.batch_started >= self.linger_seconds:
+                self._flush(stream)
+
+    def _train_dictionary(self, stream):
+        samples, stream.samples = stream.samples, None
+        try:
+            dictionary = self.zstandard.train_dictionary(self.dictionary_size, samples)
+        except Exception as e:
+            logger.warning("Unable to train a dictionary for report {}, compressing without: {}".format(
+                stream.report_id, e))
+            return
+        folder = os.path.join(self.destination_folder, stream.report_id)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, 'dictionary_{}.zdict'.format(dictionary.dict_id())), 'wb') as file:
+            file.write(dictionary.as_bytes())
+        stream.dictionary_id = dictionary.dict_id()
+        stream.compressor = self.zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        logger.debug("Trained dictionary {} for report {}".format(stream.dictionary_id, stream.report_id))
+
+    def _compress(self, stream, data):
+        if self.codec == 'gzip':
+            return gzip.compress(data, compresslevel=self.level)
+        if stream.compressor is None:
+            stream.compressor = self.zstandard.ZstdCompressor(level=self.level)
+        return stream.compressor.compress(data)
+
+    def _segment(self, stream):
+        segment = stream.segment
+        if segment and (segment.size >= self.segment_bytes or
+                        time.monotonic() - segment.created >= self.segment_seconds):
+            segment.close()
+            segment = None
+        if segment is None:
+            folder = os.path.join(self.destination_folder, stream.report_id)
+            os.makedirs(folder, exist_ok=True)
+            segment = stream.segment = Segment(folder, stream.report_id, self.codec)
+        return segment
+
+    def _flush(self, stream):
+        if not stream.lines:
+            return
+        data = b''.join(stream.lines)
+        frame = self._compress(stream, data)
+        self._segment(stream).append(frame, {'reports': len(stream.lines), 'raw_bytes': len(data),
+                                             'dictionary': stream.dictionary_id, 'min_time': stream.min_time,
+                                             'max_time': stream.max_time})
+        self.reports += len(stream.lines)
+        self.raw_bytes += len(data)
+        self.compressed_bytes += len(frame)
+        stream.lines = []
+        stream.batch_bytes = 0
+
+
+def read_index(segment_path):
+    """Returns the index entries of a segment, one per frame"""
+    index_path = segment_path.rsplit('.jsonl', 1)[0] + '.jsonl.idx'
+    with open(index_path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def read_frame(segment_path, index_entry):
+    """Reads and decompresses a single frame of a segment, returns its list of {"iDRAC", "Index", "Report"} records"""
+    with open(segment_path, 'rb') as file:
+        file.seek(index_entry['offset'])
+        frame = file.read(index_entry['length'])
+    if segment_path.endswith(EXTENSIONS['gzip']):
+        data = gzip.decompress(frame)
+    else:
+        zstandard = load_zstandard()
+        if zstandard is None:
+            raise RuntimeError("the zstandard library is required to read {}".format(segment_path))
+        dictionary = None
+        if index_entry.get('dictionary'):
+            dictionary_path = os.path.join(os.path.dirname(segment_path),
+                                           'dictionary_{}.zdict'.format(index_entry['dictionary']))
+            with open(dictionary_path, 'rb') as file:
+                dictionary = zstandard.ZstdCompressionDict(file.read())
+        data = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(frame)
+    return [json.loads(line) for line in data.splitlines() if line]
+
+
+def _epoch_bound(timestamp):
+    if not isinstance(timestamp, str):
+        return timestamp
+    epoch = report_time(timestamp)
+    if epoch is None:
+        raise ValueError("invalid Timestamp {}, expected ISO 8601 such as 2022-04-20T10:00:00-05:00".format(timestamp))
+    return epoch
+
+
+def read_segment(segment_path, start=None, end=None):
+    """
+    Yields the records of a segment, only decompressing the frames which may hold reports between the start and end
+    Timestamps, ISO 8601 strings such as '2022-04-20T10:00:00-05:00' or epoch seconds. Frames without report
+    Timestamps in their index entry are always read.
+    """
+    start, end = _epoch_bound(start), _epoch_bound(end)
+    for index_entry in read_index(segment_path):
+        if start is not None and index_entry.get('max_time') is not None and index_entry['max_time'] < start:
+            continue
+        if end is not None and index_entry.get('min_time') is not None and index_entry['min_time'] > end:
+            continue
+        for record in read_frame(segment_path, index_entry):
+            yield record
@@ -0,0 +1,374 @@
+#
+# TelemetryDeltaEncoding. Python module encoding consecutive Telemetry reports of an iDRAC as periodic keyframes and
+# deltas holding only the changed metric values, and decoding them back to full reports.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# A keyframe is the report itself. A delta is relative to the last keyframe of its (iDRAC, report Id) stream, not to
+# the previous report, so any report is reconstructed from its keyframe and its own delta:
+#
+#   {"Id": "PowerMetrics", "ReportSequence": "1042", "Timestamp": "2022-04-20T10:11:12-05:00",
+#    "@Delta": {"Keyframe": "1040",                      ReportSequence of the keyframe
+#               "Header": {...},                         other report properties which differ from the keyframe
+#               "Values": [[3, "251"], [7, "40.5"]],     position and MetricValue of the changed metric values
+#               "ValueTimestamp": "2022-04-20T10:11:12-05:00"}}   Timestamp shared by all metric values
+#
+# Metric values without a common Timestamp are listed in "Timestamps" as [position, Timestamp] pairs instead. A report
+# whose metric values are not the same as the keyframe's, apart from MetricValue and Timestamp, starts a new keyframe.
+#
+import collections
+import json
+import logging
+import os
+import threading
+
+from TelemetryPipeline import TelemetryReport
+from TelemetryStreamHealth import report_time
+
+logger = logging.getLogger('RsysLogProcessor')
+
+DEFAULT_KEYFRAME_INTERVAL = 60
+DEFAULT_MAX_STREAMS = 100000
+DELTA_KEY = '@Delta'
+# Report properties kept in every delta record, the rest of the report header is only stored when it changes
+RECORD_PROPERTIES = ('Id', 'ReportSequence', 'Timestamp')
+VARYING_VALUE_PROPERTIES = ('MetricValue', 'Timestamp')
+
+
+def is_delta(record):
+    return DELTA_KEY in record
+
+
+def _static_properties(metric_value):
+    return {name: value for name, value in metric_value.items() if name not in VARYING_VALUE_PROPERTIES}
+
+
+def _header(report):
+    return {name: value for name, value in report.items() if name != 'MetricValues'}
+
+
+class StreamState(object):
+    """Keyframe of one (iDRAC, report Id) stream, the metric value template is shared between streams"""
+    __slots__ = ('keyframe_sequence', 'header', 'template', 'values', 'timestamps', 'reports_since_keyframe')
+
+    def __init__(self, report, template):
+        metric_values = report.get('MetricValues') or []
+        self.keyframe_sequence = report.get('ReportSequence')
+        self.header = _header(report)
+        self.template = template
+        self.values = [metric_value.get('MetricValue') for metric_value in metric_values]
+        self.timestamps = [metric_value.get('Timestamp') for metric_value in metric_values]
+        self.reports_since_keyframe = 0
+
+
+class DeltaEncoder(object):
+    """
+    Encodes reports as keyframes and deltas. The keyframe of each (iDRAC, report Id) stream is kept in a least recently
+    used table of max_streams entries, a stream evicted from it restarts with a keyframe. encode() may be called from
+    several threads, the reports of one stream must be encoded in order.
+
+    :param keyframe_interval: number of reports between two keyframes of a stream
+    :param max_streams: maximum number of streams whose keyframe is kept
+    """
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, max_streams=DEFAULT_MAX_STREAMS):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.max_streams = max_streams
+        self._streams = collections.OrderedDict()
+        # Reports of the same Id from servers of the same model share their metric value template
+        self._templates = {}
+        self.keyframes = 0
+        self.deltas = 0
+        self._lock = threading.Lock()
+
+    def _template(self, metric_values):
+        template = [_static_properties(metric_value) for metric_value in metric_values]
+        key = json.dumps(template, sort_keys=True)
+        if key not in self._templates:
+            if len(self._templates) >= self.max_streams:
+                self._templates.clear()
+            self._templates[key] = template
+        return self._templates[key]
+
+    def _keyframe(self, key, report):
+        self._streams[key] = StreamState(report, self._template(report.get('MetricValues') or []))
+        self._streams.move_to_end(key)
+        while len(self._streams) > self.max_streams:
+            self._streams.popitem(last=False)
+        self.keyframes += 1
+        return report
+
+    def encode(self, idrac_name, report):
+        """Returns the keyframe or delta record of a report"""
+        with self._lock:
+            return self._encode(idrac_name, report)
+
+    def _encode(self, idrac_name, report):
+        key = (idrac_name, report.get('Id', 'UnknownId'))
+        state = self._streams.get(key)
+        if state is None or state.reports_since_keyframe + 1 >= self.keyframe_interval:
+            return self._keyframe(key, report)
+        self._streams.move_to_end(key)
+        metric_values = report.get('MetricValues') or []
+        if len(metric_values) != len(state.template):
+            return self._keyframe(key, report)
+        header = _header(report)
+        if header.keys() != state.header.keys():
+            return self._keyframe(key, report)
+        changed_values = []
+        changed_timestamps = []
+        values, timestamps = state.values, state.timestamps
+        for position, (metric_value, template) in enumerate(zip(metric_values, state.template)):
+            if _static_properties(metric_value) != template:
+                return self._keyframe(key, report)
+            value = metric_value.get('MetricValue')
+            if value != values[position]:
+                changed_values.append([position, value])
+            timestamp = metric_value.get('Timestamp')
+            if timestamp != timestamps[position]:
+                changed_timestamps.append([position, timestamp])
+        delta = {'Keyframe': state.keyframe_sequence, 'Values': changed_values}
+        changed_header = {name: value for name, value in header.items()
+                          if name not in RECORD_PROPERTIES and value != state.header[name]}
+        if changed_header:
+            delta['Header'] = changed_header
+        shared_timestamps = set(timestamp for _, timestamp in changed_timestamps)
+        if changed_timestamps and len(changed_timestamps) == len(metric_values) and len(shared_timestamps) == 1:
+            delta['ValueTimestamp'] = changed_timestamps[0][1]
+        elif changed_timestamps:
+            delta['Timestamps'] = changed_timestamps
+        state.reports_since_keyframe += 1
+        self.deltas += 1
+        record = {name: report[name] for name in RECORD_PROPERTIES if name in report}
+        record[DELTA_KEY] = delta
+        return record
+
+
+def reconstruct(keyframe, record):
+    """
+    Returns the report of a delta record from its keyframe, or the record itself if it is a keyframe
+
+    :param keyframe: keyframe report whose ReportSequence is the Keyframe of the delta
+    :param record: keyframe or delta record
+    """
+    if not is_delta(record):
+        return record
+    delta = record[DELTA_KEY]
+    if keyframe.get('ReportSequence') != delta['Keyframe']:
+        raise ValueError("delta of report {} needs keyframe {}, got {}".format(
+            record.get('ReportSequence'), delta['Keyframe'], keyframe.get('ReportSequence')))
+    report = dict(keyframe)
+    report.update(delta.get('Header', {}))
+    report.update({name: value for name, value in record.items() if name != DELTA_KEY})
+    metric_values = [dict(metric_value) for metric_value in keyframe.get('MetricValues') or []]
+    for position, value in delta['Values']:
+        metric_values[position]['MetricValue'] = value
+    if 'ValueTimestamp' in delta:
+        for metric_value in metric_values:
+            metric_value['Timestamp'] = delta['ValueTimestamp']
+    for position, timestamp in delta.get('Timestamps', []):
+        metric_values[position]['Timestamp'] = timestamp
+    if 'MetricValues' in keyframe:
+        report['MetricValues'] = metric_values
+    return report
+
+
+class DeltaDecoder(object):
+    """
+    Decodes a sequence of keyframe and delta records back to reports, keeping the last keyframe of each stream
+
+    :param max_streams: maximum number of streams whose keyframe is kept
+    """
+
+    def __init__(self, max_streams=DEFAULT_MAX_STREAMS):
+        self.max_streams = max_streams
+        self._keyframes = collections.OrderedDict()
+
+    def decode(self, idrac_name, record):
+        """Returns the report of a record, raises KeyError when the keyframe of a delta was not decoded before"""
+        key = (idrac_name, record.get('Id', 'UnknownId'))
+        if not is_delta(record):
+            self._keyframes[key] = record
+            self._keyframes.move_to_end(key)
+            while len(self._keyframes) > self.max_streams:
+                self._keyframes.popitem(last=False)
+            return record
+        return reconstruct(self._keyframes[key], record)
+
+
+def delta_encode(reports, encoder=None):
+    """
+    Pipeline stage yielding a TelemetryReport holding the keyframe or delta record of each report
+
+    :param reports: iterable of TelemetryReport
+    :param encoder: DeltaEncoder to use, a new one by default
+    """
+    encoder = encoder or DeltaEncoder()
+    for telemetry_report in reports:
+        yield TelemetryReport(telemetry_report.idrac_name, telemetry_report.index,
+                              encoder.encode(telemetry_report.idrac_name, telemetry_report.report))
+
+
+def delta_decode(records, decoder=None):
+    """
+    Pipeline stage yielding the full report of each keyframe or delta record, deltas whose keyframe is missing are
+    logged and skipped
+
+    :param records: iterable of TelemetryReport holding keyframe or delta records
+    :param decoder: DeltaDecoder to use, a new one by default
+    """
+    decoder = decoder or DeltaDecoder()
+    for telemetry_report in records:
+        try:
+            report = decoder.decode(telemetry_report.idrac_name, telemetry_report.report)
+        except (KeyError, ValueError):
+            logger.warning("Skipping report {} of iDRAC {}, its keyframe is missing".format(
+                telemetry_report.report.get('ReportSequence'), telemetry_report.idrac_name))
+            continue
+        yield TelemetryReport(telemetry_report.idrac_name, telemetry_report.index, report)
+
+
+class DeltaFileSink(object):
+    """
+    Writes keyframe and delta records as JSON lines, one file per report Id, together with a keyframe index:
+
+      <destination>/<report Id>.delta.jsonl      {"iDRAC": "<idrac name>", "Index": <report index>, "Report": {...}}
+      <destination>/<report Id>.keyframes.idx    {"iDRAC": ..., "ReportSequence": ..., "Timestamp": ..., "offset": ...}
+
+    Use read_report to reconstruct a single report from its nearest keyframe. write() may be called from several
+    threads.
+    """
+
+    def __init__(self, destination_folder):
+        self.destination_folder = destination_folder
+        self._files = {}
+        self._lock = threading.Lock()
+        os.makedirs(destination_folder, exist_ok=True)
+
+    def _open(self, report_id):
+        if report_id not in self._files:
+            path = os.path.join(self.destination_folder, report_id)
+            self._files[report_id] = (open(path + '.delta.jsonl', 'ab'), open(path + '.keyframes.idx', 'a'))
+        return self._files[report_id]
+
+    def write(self, telemetry_report):
+        record = telemetry_report.report
+        line = json.dumps({'iDRAC': telemetry_report.idrac_name, 'Index': telemetry_report.index, 'Report': record},
+                          separators=(',', ':')).encode('utf-8') + b'\n'
+        with self._lock:
+            data_file, index_file = self._open(record.get('Id', 'UnknownId'))
+            offset = data_file.tell()
+            data_file.write(line)
+            data_file.flush()
+            if not is_delta(record):
+                index_file.write(json.dumps({'iDRAC': telemetry_report.idrac_name,
+                                             'ReportSequence': record.get('ReportSequence'),
+                                             'Timestamp': record.get('Timestamp'), 'offset': offset}) + '\n')
+                index_file.flush()
+
+    def close(self):
+        with self._lock:
+            for data_file, index_file in self._files.values():
+                data_file.close()
+                index_file.close()
+            self._files = {}
+
+
+def read_keyframe_index(delta_path):
+    """Returns {iDRAC name: [(offset, ReportSequence, Timestamp), ...]} from the keyframe index of a delta file"""
+    keyframes = collections.defaultdict(list)
+    with open(delta_path.rsplit('.delta.jsonl', 1)[0] + '.keyframes.idx', 'r') as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                keyframes[entry['iDRAC']].append((entry['offset'], entry['ReportSequence'], entry['Timestamp']))
+    return keyframes
+
+
+def _sequence_number(sequence):
+    try:
+        return int(sequence)
+    except (TypeError, ValueError):
+        return None
+
+
+def _keyframe_segments(keyframes, report_sequence, timestamp=None):
+    """
+    Returns the (start offset, end offset) of the segments of an iDRAC which may hold a report, the most recent first.
+    A segment starts at a keyframe and ends at the next keyframe of the iDRAC, the end of the last one is None.
+
+    With the report Timestamp the segment is the one of the last keyframe at or before it, otherwise the segments are
+    chosen by their ReportSequence range. A stream whose sequence wrapped around may have several segments holding
+    the sequence, the sequence is only searched after the last keyframe if it is not below its ReportSequence.
+    """
+    report_epoch = report_time(timestamp) if timestamp else None
+    target = _sequence_number(report_sequence)
+    segments = []
+    for position, (offset, sequence, keyframe_timestamp) in enumerate(keyframes):
+        next_entry = keyframes[position + 1] if position + 1 < len(keyframes) else None
+        if report_epoch is not None:
+            keyframe_epoch = report_time(keyframe_timestamp)
+            next_epoch = report_time(next_entry[2]) if next_entry else None
+            if (keyframe_epoch is not None and keyframe_epoch > report_epoch) or \
+                    (next_epoch is not None and next_epoch <= report_epoch):
+                continue
+        else:
+            start = _sequence_number(sequence)
+            end = _sequence_number(next_entry[1]) if next_entry else None
+            if target is not None and start is not None:
+                if end is not None and end > start:
+                    if not start <= target < end:
+                        continue
+                # The sequence wrapped around within the segment when the next keyframe has a lower sequence
+                elif target < start and (end is None or target >= end):
+                    continue
+        segments.append((offset, next_entry[0] if next_entry else None))
+    segments.reverse()
+    return segments
+
+
+def read_report(delta_path, idrac_name, report_sequence, keyframes=None, timestamp=None):
+    """
+    Reconstructs one report of a delta file written by DeltaFileSink. The keyframe index gives the keyframe preceding
+    the report, only the records from this keyframe to the next keyframe of the iDRAC are read, at most one keyframe
+    interval of its records. Returns None if the report is not in the file.
+
+    Report sequences wrap around, the most recent report with the sequence is returned. Pass the Timestamp of the
+    report to read an older one, it also finds a report whose sequence wrapped around after the last keyframe.
+
+    :param keyframes: keyframe index as returned by read_keyframe_index, read from the file when not passed
+    :param timestamp: Timestamp of the report, used to choose the keyframe when the sequence wrapped around
+    """
+    keyframes = (keyframes or read_keyframe_index(delta_path)).get(idrac_name, [])
+    report_sequence = str(report_sequence)
+    # DeltaFileSink writes the iDRAC name first, the records of the other iDRACs are skipped without decoding them
+    prefix = b'{"iDRAC":' + json.dumps(idrac_name).encode('utf-8') + b','
+    with open(delta_path, 'rb') as file:
+        for start, end in _keyframe_segments(keyframes, report_sequence, timestamp):
+            file.seek(start)
+            keyframe = None
+            while end is None or file.tell() < end:
+                line = file.readline()
+                if not line:
+                    break
+                if not line.startswith(prefix):
+                    continue
+                record = json.loads(line)['Report']
+                if keyframe is None:
+                    keyframe = record
+                elif not is_delta(record):
+                    break  # next keyframe of the stream, the report is not after this keyframe
+                if record.get('ReportSequence') == report_sequence:
+                    return reconstruct(keyframe, record)
+    return None
@@ -0,0 +1,298 @@
+#
+# TelemetryFairScheduler. Python module sharing the decode and write workers of the Telemetry report pipeline fairly
+# between iDRACs, so an iDRAC sending large reports every second does not delay the reports of the others.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# The readers put each reassembled report in the queue of its iDRAC, the workers take them with deficit round robin:
+# the iDRACs with queued reports take turns, each turn adds quantum bytes times the weight of the iDRAC to its deficit
+# once and the iDRAC is served until its deficit no longer covers the size of its next report, the rest of the deficit
+# is kept for its next turn. While they have reports queued, the iDRACs get shares of the processed report bytes
+# proportional to their weights whatever the size and rate of their reports, and an iDRAC waits at most one turn of
+# the other iDRACs. An iDRAC is served by one worker at a time so its reports keep their order through the following
+# stages, once a worker is done with one of its reports the iDRAC goes back to the head of the turns if its turn is
+# not over.
+#
+# An iDRAC whose queue exceeds host_queue_bytes loses its oldest reports, only the noisy iDRAC pays for falling behind.
+# The readers wait once all queues together hold total_queue_bytes.
+#
+import collections
+import fnmatch
+import logging
+import threading
+import time
+
+logger = logging.getLogger('RsysLogProcessor')
+
+DEFAULT_QUANTUM_BYTES = 64 * 1024
+DEFAULT_HOST_QUEUE_BYTES = 64 * 1024 * 1024
+DEFAULT_TOTAL_QUEUE_BYTES = 512 * 1024 * 1024
+# Weight of the last measure in the exponentially weighted moving averages
+EWMA_WEIGHT = 0.2
+# Queue waits kept per iDRAC for the percentiles
+WAIT_SAMPLES = 256
+DROP_LOG_INTERVAL = 60
+
+
+def parse_weights(value):
+    """
+    Returns the [(pattern, weight)] of a comma separated list such as 'idrac-gpu-*=2,idrac-7=0.25', the first
+    pattern matching an iDRAC name gives its weight
+    """
+    weights = []
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        pattern, _, weight = item.rpartition('=')
+        if not pattern or float(weight) <= 0:
+            raise ValueError("invalid weight {}, expected <iDRAC name pattern>=<positive number>".format(item))
+        weights.append((pattern.strip(), float(weight)))
+    return weights
+
+
+def percentile(samples, percent):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+class ScheduledItem(object):
+    __slots__ = ('item', 'cost', 'queued')
+
+    def __init__(self, item, cost, queued):
+        self.item = item
+        self.cost = cost
+        self.queued = queued
+
+
+class HostQueue(object):
+    """Queue, deficit and counters of one iDRAC"""
+    __slots__ = ('name', 'weight', 'items', 'bytes', 'deficit', 'in_turn', 'busy', 'active', 'received',
+                 'received_bytes',
+                 'served', 'served_bytes', 'dropped', 'dropped_bytes', 'dropped_logged', 'waits', 'wait_max',
+                 'report_rate', 'byte_rate', 'rate_received', 'rate_received_bytes')
+
+    def __init__(self, name, weight):
+        self.name = name
+        self.weight = weight
+        self.items = collections.deque()
+        self.bytes = 0
+        self.deficit = 0
+        # True from the quantum added to the deficit until the deficit no longer covers the next report
+        self.in_turn = False
+        self.busy = False
+        self.active = False
+        self.received = 0
+        self.received_bytes = 0
+        self.served = 0
+        self.served_bytes = 0
+        self.dropped = 0
+        self.dropped_bytes = 0
+        self.dropped_logged = None
+        self.waits = collections.deque(maxlen=WAIT_SAMPLES)
+        self.wait_max = 0.0
+        self.report_rate = 0.0
+        self.byte_rate = 0.0
+        self.rate_received = 0
+        self.rate_received_bytes = 0
+
+    def as_dict(self):
+        waits = sorted(self.waits)
+        return {'iDRAC': self.name, 'weight': self.weight, 'queued': len(self.items), 'queued_bytes': self.bytes,
+                'received': self.received, 'received_bytes': self.received_bytes, 'served': self.served,
+                'dropped': self.dropped, 'dropped_bytes': self.dropped_bytes,
+                'reports_per_second': round(self.report_rate, 2), 'bytes_per_second': round(self.byte_rate),
+                'wait_p50_seconds': round(percentile(waits, 50), 4),
+                'wait_p99_seconds': round(percentile(waits, 99), 4), 'wait_max_seconds': round(self.wait_max, 4)}
+
+
+class FairScheduler(object):
+    """
+    Per iDRAC queues drained with weighted deficit round robin. put() is called by the readers, get() and done(), or
+    drain(), by the workers, all of them may be called from several threads.
+
+    :param weights: [(iDRAC name pattern, weight)], see parse_weights(). iDRACs matching no pattern have weight 1
+    :param quantum_bytes: bytes added to the deficit of an iDRAC of weight 1 at each turn
+    :param host_queue_bytes: queue size of one iDRAC above which its oldest reports are dropped
+    :param total_queue_bytes: size of all queues above which put() waits
+    """
+
+    def __init__(self, weights=None, quantum_bytes=DEFAULT_QUANTUM_BYTES, host_queue_bytes=DEFAULT_HOST_QUEUE_BYTES,
+                 total_queue_bytes=DEFAULT_TOTAL_QUEUE_BYTES):
+        self.weights = list(weights or [])
+        self.quantum_bytes = quantum_bytes
+        self.host_queue_bytes = host_queue_bytes
+        self.total_queue_bytes = total_queue_bytes
+        self.hosts = {}
+        self.bytes = 0
+        # iDRACs with queued reports which are not being served, in turn order
+        self._active = collections.deque()
+        self._closed = False
+        self._rates_updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _weight(self, idrac_name):
+        for pattern, weight in self.weights:
+            if fnmatch.fnmatchcase(idrac_name, pattern):
+                return weight
+        return 1.0
+
+    def _activate(self, host):
+        if host.items and not host.busy and not host.active:
+            host.active = True
+            if host.in_turn and host.deficit >= host.items[0].cost:
+                # the iDRAC continues its turn before the others
+                self._active.appendleft(host)
+            else:
+                host.in_turn = False
+                self._active.append(host)
+            self._condition.notify()
+
+    def put(self, idrac_name, item, cost):
+        """Queues an item of an iDRAC, cost is its size in bytes. Waits while all queues are full"""
+        with self._condition:
+            host = self.hosts.get(idrac_name)
+            if host is None:
+                host = self.hosts[idrac_name] = HostQueue(idrac_name, self._weight(idrac_name))
+            host.received += 1
+            host.received_bytes += cost
+            # The workers may serve the queue of the iDRAC during the wait, its reports are only dropped after it
+            while self.bytes + cost > self.total_queue_bytes and self.bytes and not self._closed:
+                self._condition.wait(1)
+            while host.bytes + cost > self.host_queue_bytes and host.items:
+                self._drop_oldest(host)
+            host.items.append(ScheduledItem(item, cost, time.monotonic()))
+            host.bytes += cost
+            self.bytes += cost
+            self._activate(host)
+
+    def _drop_oldest(self, host):
+        dropped = host.items.popleft()
+        host.bytes -= dropped.cost
+        self.bytes -= dropped.cost
+        host.dropped += 1
+        host.dropped_bytes += dropped.cost
+        if not host.items and host.active:
+            # get() only finds iDRACs with queued reports in the turn order
+            self._active.remove(host)
+            host.active = False
+            host.deficit = 0
+            host.in_turn = False
+        now = time.monotonic()
+        if host.dropped_logged is None or now - host.dropped_logged >= DROP_LOG_INTERVAL:
+            host.dropped_logged = now
+            logger.warning("iDRAC {} sends more than its share of the workers can process, {} of its {} reports "
+                           "dropped so far".format(host.name, host.dropped, host.received))
+
+    def get(self):
+        """Returns the (iDRAC name, item) to process next, waits for one, None once closed and empty"""
+        with self._condition:
+            while True:
+                while not self._active:
+                    if self._closed:
+                        return None
+                    self._condition.wait(1)
+                host = self._active[0]
+                cost = host.items[0].cost
+                if not host.in_turn:
+                    host.deficit += self.quantum_bytes * host.weight
+                    host.in_turn = True
+                if host.deficit < cost:
+                    # the turn is over, the iDRAC goes to the back with the rest of its deficit
+                    host.in_turn = False
+                    self._active.rotate(-1)
+                    continue
+                scheduled = host.items.popleft()
+                host.deficit -= cost
+                host.bytes -= cost
+                self.bytes -= cost
+                host.served += 1
+                host.served_bytes += cost
+                wait = time.monotonic() - scheduled.queued
+                host.waits.append(wait)
+                host.wait_max = max(host.wait_max, wait)
+                self._active.popleft()
+                host.active = False
+                host.busy = True
+                if not host.items:
+                    # an iDRAC does not save up deficit while it has nothing to send
+                    host.deficit = 0
+                    host.in_turn = False
+                self._condition.notify_all()
+                return host.name, scheduled.item
+
+    def done(self, idrac_name):
+        """Ends the processing of the item returned by get(), the iDRAC may be served again"""
+        with self._condition:
+            host = self.hosts[idrac_name]
+            host.busy = False
+            self._activate(host)
+
+    def drain(self):
+        """Yields the items to process until closed, each one is done once the next one is requested"""
+        while True:
+            scheduled = self.get()
+            if scheduled is None:
+                return
+            try:
+                yield scheduled[1]
+            finally:
+                self.done(scheduled[0])
+
+    def close(self):
+        """Lets the workers finish the queued items and stop"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def update_rates(self):
+        """Updates the per iDRAC report and byte rates, call it periodically"""
+        with self._condition:
+            now = time.monotonic()
+            elapsed = now - self._rates_updated
+            if elapsed <= 0:
+                return
+            self._rates_updated = now
+            for host in self.hosts.values():
+                report_rate = (host.received - host.rate_received) / elapsed
+                byte_rate = (host.received_bytes - host.rate_received_bytes) / elapsed
+                host.report_rate += EWMA_WEIGHT * (report_rate - host.report_rate)
+                host.byte_rate += EWMA_WEIGHT * (byte_rate - host.byte_rate)
+                host.rate_received, host.rate_received_bytes = host.received, host.received_bytes
+
+    def stats(self):
+        """Returns the counters of every iDRAC, the iDRACs sending the most bytes first"""
+        with self._condition:
+            hosts = [host.as_dict() for host in self.hosts.values()]
+        return sorted(hosts, key=lambda host: -host['bytes_per_second'])
+
+    def log_stats(self, top=5):
+        hosts = self.stats()
+        if not hosts:
+            return
+        waits = sorted(host['wait_p99_seconds'] for host in hosts)
+        logger.info("Fair scheduler: {} iDRACs, {} bytes queued, median iDRAC wait p99 {}s, dropped {} reports".format(
+            len(hosts), self.bytes, percentile(waits, 50), sum(host['dropped'] for host in hosts)))
+        for host in hosts[:top]:
+            logger.info("  {iDRAC}: {reports_per_second} reports/s, {bytes_per_second} B/s, weight {weight}, queued "
+                        "{queued}, wait p99 {wait_p99_seconds}s, dropped {dropped}".format(**host))
+
+
+def schedule_reports(raw_reports, scheduler):
+    """
+    Pipeline end putting each RawReport in the queue of its iDRAC, the workers continue the pipeline from
+    scheduler.drain()
+    """
+    for raw_report in raw_reports:
+        scheduler.put(raw_report.idrac_name, raw_report, sum(len(chunk) for chunk in raw_report.chunks))
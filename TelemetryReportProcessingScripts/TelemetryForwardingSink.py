@@ -0,0 +1,712 @@
+#
+# TelemetryForwardingSink. Python module forwarding reconstructed Telemetry reports to a downstream collector in
+# compressed batches over persistent HTTP or TCP connections, spooling them to disk while the collector is slow or down.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# A batch is the JSON lines of its reports, {"iDRAC": "<idrac name>", "Index": <report index>, "Report": {...}} like
+# the CompressedSink segments, compressed as a whole. Batches are numbered in the order they were made:
+#
+#   http(s)://host:port/path   POST, Content-Type application/x-ndjson, Content-Encoding gzip or zstd, the batch number
+#                              and report count in the X-Telemetry-Batch and X-Telemetry-Reports headers. Any 2xx status
+#                              acknowledges the batch, 408, 429 and 5xx are retried, other statuses drop it.
+#   tcp://host:port            TCP_HEADER followed by the batch, the receiver answers with the batch number (TCP_ACK)
+#
+# Each connection has one batch in flight, so connections batches are sent at the same time. Once the batches waiting
+# in memory reach twice the number of connections, or the collector stopped answering, new batches are written to the
+# spool folder, one file per batch named after its number, and sent from there once the collector keeps up again.
+# Spooled batches left by a previous run are sent first. Batches are sent at least once, the receiver may use the
+# batch number to drop the duplicates of a batch sent again after a lost acknowledgement.
+#
+# The batches are handed to the connections in batch number order, retried ones first, but with several connections
+# they are not received in that order: a small batch overtakes a large one, a retried batch arrives after the next
+# ones. A receiver which needs the batches in order reorders them by batch number, or the sink uses one connection.
+#
+# Running this module starts a stand-in receiver counting, and optionally saving, the forwarded reports:
+#
+#   python TelemetryForwardingSink.py --listen http://127.0.0.1:9880 -d /tmp/forwarded --delay-ms 20
+#
+import argparse
+import collections
+import gzip
+import heapq
+import http.client
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import socketserver
+import ssl
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit
+
+from TelemetryCompressedSink import load_zstandard, resolve_codec
+from TelemetryPipeline import JsonFileSink, TelemetryReport
+
+logger = logging.getLogger('RsysLogProcessor')
+
+DEFAULT_BATCH_REPORTS = 500
+DEFAULT_BATCH_BYTES = 1024 * 1024
+DEFAULT_LINGER_SECONDS = 1.0
+DEFAULT_CONNECTIONS = 4
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_SPOOL_FOLDER = os.path.join(os.path.expanduser('~'), '.idrac_telemetry', 'forward_spool')
+DEFAULT_SPOOL_BYTES = 1024 * 1024 * 1024
+DEFAULT_TIMEOUT = 30
+MAX_BACKOFF_SECONDS = 30
+LATENCY_SAMPLES = 1000
+# magic, codec, batch number, batch length
+TCP_HEADER = struct.Struct('>4sB3xQI')
+TCP_ACK = struct.Struct('>Q')
+TCP_MAGIC = b'ITF1'
+CODEC_IDS = {'none': 0, 'gzip': 1, 'zstd': 2}
+CODEC_NAMES = {codec_id: codec for codec, codec_id in CODEC_IDS.items()}
+RETRY_STATUS_CODES = (408, 429)
+
+
+class ForwardingError(Exception):
+    """A batch could not be sent, retry is False when sending it again would fail the same way"""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class Batch(object):
+    __slots__ = ('sequence', 'codec', 'payload', 'compressed', 'reports', 'raw_bytes', 'size', 'spool_path')
+
+    def __init__(self, sequence, codec, payload, reports, raw_bytes=0, compressed=True, spool_path=None):
+        self.sequence = sequence
+        self.codec = codec
+        self.payload = payload
+        self.compressed = compressed
+        self.reports = reports
+        self.raw_bytes = raw_bytes
+        self.size = len(payload)
+        self.spool_path = spool_path
+
+    def __lt__(self, other):
+        return self.sequence < other.sequence
+
+    def compress(self, level=None):
+        """Compresses the JSON lines of a new batch, on the thread sending or spooling it"""
+        if not self.compressed:
+            self.payload = compress(self.codec, self.payload, level)
+            self.size = len(self.payload)
+            self.compressed = True
+
+
+def compress(codec, data, level=None):
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=level if level is not None else 6)
+    if codec == 'zstd':
+        return load_zstandard().ZstdCompressor(level=level if level is not None else 3).compress(data)
+    return data
+
+
+def decompress(codec, payload):
+    if codec == 'gzip':
+        return gzip.decompress(payload)
+    if codec == 'zstd':
+        zstandard = load_zstandard()
+        if zstandard is None:
+            raise RuntimeError("the zstandard library is required to read zstd batches")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return payload
+
+
+def batch_records(codec, payload):
+    """Returns the {"iDRAC", "Index", "Report"} records of a batch"""
+    return [json.loads(line) for line in decompress(codec, payload).splitlines() if line]
+
+
+class Spool(object):
+    """
+    Batches waiting on disk, one <batch number>-<reports>-<raw bytes>.<codec> file per batch, handed to the senders
+    in batch number order. The files of the previous version, without the raw bytes, are still read.
+
+    :param folder: spool folder, created when missing
+    :param max_bytes: size of the spooled batches above which no batch is added
+    """
+
+    def __init__(self, folder, max_bytes=DEFAULT_SPOOL_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+        entries = []
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if name.endswith('.tmp'):
+                # left by an interrupted write, the batch was never added to the spool
+                os.remove(path)
+                continue
+            counts, _, codec = name.partition('.')
+            counts = counts.split('-')
+            if len(counts) == 2:
+                counts.append('0')
+            if len(counts) == 3 and all(count.isdigit() for count in counts) and codec in CODEC_IDS:
+                sequence, reports, raw_bytes = (int(count) for count in counts)
+                entries.append((sequence, reports, codec, path, os.path.getsize(path), raw_bytes))
+        entries.sort()
+        self.entries = collections.deque(entries)
+        self.bytes = sum(entry[4] for entry in entries)
+        self.last_sequence = entries[-1][0] if entries else 0
+        if entries:
+            logger.info("Forwarding {} batches left in the spool folder {} first".format(len(entries), folder))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def has_room(self, size):
+        return self.bytes + size <= self.max_bytes
+
+    def write(self, batch):
+        """Writes a batch to its file, returns its spool entry. Does not change the spool, see add()"""
+        path = os.path.join(self.folder, '{:016d}-{}-{}.{}'.format(batch.sequence, batch.reports, batch.raw_bytes,
+                                                                  batch.codec))
+        with open(path + '.tmp', 'wb') as file:
+            file.write(batch.payload)
+        os.replace(path + '.tmp', path)
+        return batch.sequence, batch.reports, batch.codec, path, batch.size, batch.raw_bytes
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self.bytes += entry[4]
+
+    def pop(self):
+        """Returns the entry of the oldest batch, its file stays until remove() once the batch was sent"""
+        return self.entries.popleft()
+
+    @staticmethod
+    def load(entry):
+        sequence, reports, codec, path, size, raw_bytes = entry
+        with open(path, 'rb') as file:
+            return Batch(sequence, codec, file.read(), reports, raw_bytes, spool_path=path)
+
+    def remove(self, batch):
+        try:
+            os.remove(batch.spool_path)
+        except FileNotFoundError:
+            pass
+        self.bytes -= batch.size
+
+
+class HttpTransport(object):
+    """Persistent HTTP(S) connection POSTing one batch at a time"""
+
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT):
+        self.url = urlsplit(url)
+        self.path = self.url.path or '/'
+        self.timeout = timeout
+        self.connection = None
+
+    def _connect(self):
+        if self.url.scheme == 'https':
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            return http.client.HTTPSConnection(self.url.hostname, self.url.port or 443, timeout=self.timeout,
+                                               context=context)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+
+    def send(self, batch):
+        headers = {'Content-Type': 'application/x-ndjson', 'X-Telemetry-Batch': str(batch.sequence),
+                   'X-Telemetry-Reports': str(batch.reports)}
+        if batch.codec != 'none':
+            headers['Content-Encoding'] = batch.codec
+        if self.connection is None:
+            self.connection = self._connect()
+        try:
+            self.connection.request('POST', self.path, body=batch.payload, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise ForwardingError("{}: {}".format(type(e).__name__, e))
+        if 200 <= response.status < 300:
+            return
+        if response.will_close:
+            self.close()
+        raise ForwardingError("status code {} returned".format(response.status),
+                              retry=response.status in RETRY_STATUS_CODES or response.status >= 500)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class TcpTransport(object):
+    """Persistent TCP connection sending one framed batch at a time and waiting for its acknowledgement"""
+
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT):
+        url = urlsplit(url)
+        self.address = (url.hostname, url.port)
+        self.timeout = timeout
+        self.socket = None
+
+    def send(self, batch):
+        try:
+            if self.socket is None:
+                self.socket = socket.create_connection(self.address, timeout=self.timeout)
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket.sendall(TCP_HEADER.pack(TCP_MAGIC, CODEC_IDS[batch.codec], batch.sequence, batch.size) +
+                                batch.payload)
+            ack = read_exactly(self.socket, TCP_ACK.size)
+        except OSError as e:
+            self.close()
+            raise ForwardingError("{}: {}".format(type(e).__name__, e))
+        if TCP_ACK.unpack(ack)[0] != batch.sequence:
+            self.close()
+            raise ForwardingError("acknowledgement of batch {} instead of {}".format(TCP_ACK.unpack(ack)[0],
+                                                                                   batch.sequence))
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+def read_exactly(connection, size):
+    data = b''
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionResetError("connection closed by the peer")
+        data += chunk
+    return data
+
+
+def create_transport(url, timeout=DEFAULT_TIMEOUT):
+    scheme = urlsplit(url).scheme
+    if scheme in ('http', 'https'):
+        return HttpTransport(url, timeout)
+    if scheme == 'tcp':
+        return TcpTransport(url, timeout)
+    raise ValueError("unsupported forwarding URL {}, use http://, https:// or tcp://".format(url))
+
+
+class ForwardingSink(object):
+    """
+    Pipeline sink forwarding reports to a collector. write() only queues the report, the queue is bounded so a pipeline
+    producing faster than the reports can be sent, or spooled, is slowed down instead of using unbounded memory.
+    write() may be called from several threads, one sink can be shared by all pipelines of a process.
+
+    :param url: collector URL, http://, https:// or tcp://
+    :param codec: 'gzip', 'zstd', 'auto' or 'none', zstd requires the optional zstandard library
+    :param batch_reports: reports per batch, a batch is also sent once it holds batch_bytes of JSON
+    :param linger_seconds: seconds a report waits for its batch to fill before the batch is sent anyway
+    :param connections: connections to the collector, each one with one batch in flight
+    :param spool_folder: folder of the batches waiting on disk, None to wait in memory only
+    :param spool_bytes: size of the spool above which write() blocks until batches are sent
+    """
+
+    def __init__(self, url, codec='gzip', level=None, batch_reports=DEFAULT_BATCH_REPORTS,
+                 batch_bytes=DEFAULT_BATCH_BYTES, linger_seconds=DEFAULT_LINGER_SECONDS,
+                 connections=DEFAULT_CONNECTIONS, queue_size=DEFAULT_QUEUE_SIZE, spool_folder=DEFAULT_SPOOL_FOLDER,
+                 spool_bytes=DEFAULT_SPOOL_BYTES, timeout=DEFAULT_TIMEOUT, close_timeout=DEFAULT_TIMEOUT):
+        create_transport(url, timeout)
+        self.url = url
+        self.codec = 'none' if codec == 'none' else resolve_codec(codec)
+        self.level = level
+        self.batch_reports = max(1, batch_reports)
+        self.batch_bytes = batch_bytes
+        self.linger_seconds = linger_seconds
+        self.timeout = timeout
+        self.close_timeout = close_timeout
+        self.max_pending = 2 * max(1, connections)
+        self.spool = Spool(spool_folder, spool_bytes) if spool_folder else None
+        # Batch numbers keep growing over restarts, a receiver dropping duplicates does not drop the next run's batches
+        self.sequence = max(self.spool.last_sequence if self.spool else 0, int(time.time() * 1000000))
+        self.stats = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = collections.deque()
+        # failed batches, sent again before any other in batch number order
+        self._retry = []
+        # batches taken by the senders, by batch number, spooled by close() when their sender does not finish in time
+        self._sending = {}
+        self._in_flight = 0
+        self._down_until = 0
+        self._backoff = 0
+        self._stopping = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._batcher = threading.Thread(target=self._run_batcher, name='ForwardingSink', daemon=True)
+        self._senders = [threading.Thread(target=self._run_sender, name='ForwardingSink-%d' % number, daemon=True)
+                         for number in range(max(1, connections))]
+        self._batcher.start()
+        for sender in self._senders:
+            sender.start()
+
+    def write(self, telemetry_report):
+        if self._closed:
+            raise ValueError("write to a closed ForwardingSink")
+        self._queue.put(telemetry_report)
+
+    def close(self):
+        """
+        Batches the queued reports and waits up to close_timeout seconds for the batches to be sent, the batches still
+        waiting are left in the spool for the next run. So are the batches of the senders which failed or did not
+        finish sending while they were stopped, the receiver drops such a batch if it was received after all.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._batcher.join()
+        deadline = time.monotonic() + self.close_timeout
+        with self._condition:
+            self._condition.wait_for(lambda: not self._waiting_batches() and not self._in_flight,
+                                     max(0.0, deadline - time.monotonic()))
+            self._stopping = True
+            self._condition.notify_all()
+        for sender in self._senders:
+            sender.join(self.timeout)
+        with self._condition:
+            left = sorted(self._retry + list(self._pending) + list(self._sending.values()))
+            self._retry, self._pending, self._sending = [], collections.deque(), {}
+        self._spool_left(left)
+        logger.info("Forwarded {reports_sent} reports in {batches_sent} batches to {url}, {bytes_sent} bytes sent, "
+                    "{spooled} batches spooled, {dropped} batches dropped".format(url=self.url, **self.summary()))
+
+    def _spool_left(self, batches):
+        if not batches:
+            return
+        if self.spool is None:
+            logger.warning("{} batches of {} reports were not forwarded to {}".format(
+                len(batches), sum(batch.reports for batch in batches), self.url))
+            return
+        for batch in batches:
+            if batch.spool_path is None:
+                batch.compress(self.level)
+                self.spool.write(batch)
+        logger.warning("{} batches were not forwarded to {}, they are sent first by the next run from {}".format(
+            len(batches) + len(self.spool), self.url, self.spool.folder))
+
+    def summary(self):
+        """Returns the forwarding counters and the p50/p99 batch send latency in milliseconds"""
+        with self._condition:
+            latencies = sorted(self.latencies)
+            summary = {name: self.stats[name] for name in ('reports_sent', 'batches_sent', 'bytes_sent', 'raw_bytes',
+                                                           'spooled', 'retries', 'dropped')}
+            summary.update({'queued_reports': self._queue.qsize(), 'pending_batches': len(self._pending),
+                            'spool_batches': len(self.spool) if self.spool else 0,
+                            'spool_bytes': self.spool.bytes if self.spool else 0, 'down': self._backoff > 0})
+        if latencies:
+            summary['p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 1)
+            summary['p99_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1)
+        return summary
+
+    def _waiting_batches(self):
+        return self._retry or self._pending or (self.spool is not None and len(self.spool))
+
+    def _run_batcher(self):
+        lines, size, started = [], 0, None
+        while True:
+            timeout = self.linger_seconds - (time.monotonic() - started) if lines else None
+            try:
+                item = self._queue.get(timeout=max(0.01, timeout) if timeout is not None else None)
+            except queue.Empty:
+                item = False
+            if item:
+                line = json.dumps({'iDRAC': item.idrac_name, 'Index': item.index, 'Report': item.report},
+                                  separators=(',', ':')).encode('utf-8') + b'\n'
+                if not lines:
+                    started = time.monotonic()
+                lines.append(line)
+                size += len(line)
+            if lines and (item is None or item is False or len(lines) >= self.batch_reports or
+                          size >= self.batch_bytes or time.monotonic() - started >= self.linger_seconds):
+                try:
+                    self._dispatch(lines, size)
+                except Exception as e:
+                    logger.exception("Unable to forward {} reports: {}".format(len(lines), e))
+                lines, size = [], 0
+            if item is None:
+                break
+
+    def _dispatch(self, lines, size):
+        """Hands a new batch to the senders, or to the spool when they fall behind, blocks while both are full"""
+        data = b''.join(lines)
+        self.sequence += 1
+        # compressed by the senders, zlib and zstd release the GIL so the connections compress in parallel
+        batch = Batch(self.sequence, self.codec, data, len(lines), size, compressed=False)
+        warned = False
+        while True:
+            with self._condition:
+                # Once a batch was spooled the next ones follow it, the batches are sent in order
+                if (self.spool is None or not len(self.spool)) and len(self._pending) < self.max_pending:
+                    self._pending.append(batch)
+                    self._condition.notify_all()
+                    return
+                if self.spool is not None and self.spool.has_room(batch.size):
+                    break
+                if not warned:
+                    warned = True
+                    logger.warning("Forwarding to {} fell behind and the spool is full, waiting".format(self.url))
+                self._condition.wait(1)
+        batch.compress(self.level)
+        entry = self.spool.write(batch)
+        with self._condition:
+            self.spool.add(entry)
+            self.stats['spooled'] += 1
+            self._condition.notify_all()
+
+    def _next_batch(self):
+        while True:
+            batch, entry = self._claim_batch()
+            if entry is None:
+                return batch
+            try:
+                return Spool.load(entry)
+            except OSError as e:
+                logger.error("Unable to read the spooled batch {}, dropped: {}".format(entry[3], e))
+                with self._condition:
+                    self._in_flight -= 1
+                    self.stats['dropped'] += 1
+                    self.spool.bytes -= entry[4]
+                    self._condition.notify_all()
+
+    def _claim_batch(self):
+        """Returns the next batch to send or the spool entry of that batch, (None, None) once the sink is closed"""
+        with self._condition:
+            while True:
+                if self._stopping:
+                    return None, None
+                wait = self._down_until - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                batch, entry = None, None
+                if self._retry:
+                    batch = heapq.heappop(self._retry)
+                elif self._pending:
+                    batch = self._pending.popleft()
+                elif self.spool is not None and len(self.spool):
+                    entry = self.spool.pop()
+                else:
+                    self._condition.wait(1)
+                    continue
+                self._in_flight += 1
+                if batch is not None:
+                    self._sending[batch.sequence] = batch
+                self._condition.notify_all()
+                return batch, entry
+
+    def _run_sender(self):
+        transport = create_transport(self.url, self.timeout)
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            started = time.monotonic()
+            try:
+                batch.compress(self.level)
+                transport.send(batch)
+            except ForwardingError as e:
+                self._failed(batch, e)
+                continue
+            except Exception as e:
+                transport.close()
+                self._failed(batch, ForwardingError(str(e)))
+                continue
+            with self._condition:
+                if batch.spool_path:
+                    self.spool.remove(batch)
+                self._sending.pop(batch.sequence, None)
+                self._in_flight -= 1
+                self.latencies.append(time.monotonic() - started)
+                self.stats['reports_sent'] += batch.reports
+                self.stats['batches_sent'] += 1
+                self.stats['bytes_sent'] += batch.size
+                self.stats['raw_bytes'] += batch.raw_bytes
+                if self._backoff:
+                    logger.info("Forwarding to {} recovered, {} batches spooled".format(
+                        self.url, len(self.spool) if self.spool else 0))
+                    self._backoff = 0
+                self._condition.notify_all()
+        transport.close()
+
+    def _failed(self, batch, error):
+        with self._condition:
+            self._sending.pop(batch.sequence, None)
+            self._in_flight -= 1
+            if not error.retry:
+                self.stats['dropped'] += 1
+                logger.error("Batch {} of {} reports dropped by {}: {}".format(batch.sequence, batch.reports,
+                                                                               self.url, error))
+                if batch.spool_path:
+                    self.spool.remove(batch)
+            else:
+                self.stats['retries'] += 1
+                heapq.heappush(self._retry, batch)
+                if not self._backoff:
+                    logger.warning("Unable to forward to {}, retrying: {}".format(self.url, error))
+                # every sender waits, a collector which is down is not hammered by all connections
+                self._backoff = min(MAX_BACKOFF_SECONDS, max(0.5, self._backoff * 2))
+                self._down_until = time.monotonic() + self._backoff * random.uniform(0.8, 1.2)
+            self._condition.notify_all()
+
+
+class ReceiverStats(object):
+    """Counters of a StandInReceiver, batches received again or out of order are counted separately"""
+
+    def __init__(self):
+        self.batches = 0
+        self.reports = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.last_sequence = 0
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def record(self, sequence, reports, size):
+        with self._lock:
+            if sequence in self._seen:
+                self.duplicates += 1
+                return False
+            self._seen.add(sequence)
+            if sequence < self.last_sequence:
+                self.out_of_order += 1
+            self.last_sequence = max(self.last_sequence, sequence)
+            self.batches += 1
+            self.reports += reports
+            self.bytes += size
+            return True
+
+    def as_dict(self):
+        with self._lock:
+            return {'batches': self.batches, 'reports': self.reports, 'bytes': self.bytes,
+                    'duplicates': self.duplicates, 'out_of_order': self.out_of_order}
+
+
+class ReceiverHttpHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        payload = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status = self.server.receiver.receive(int(self.headers.get('X-Telemetry-Batch') or 0),
+                                              self.headers.get('Content-Encoding') or 'none', payload)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug("Stand-in receiver: " + format % args)
+
+
+class ReceiverTcpHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                magic, codec_id, sequence, length = TCP_HEADER.unpack(read_exactly(self.request, TCP_HEADER.size))
+                if magic != TCP_MAGIC:
+                    return
+                payload = read_exactly(self.request, length)
+                if self.server.receiver.receive(sequence, CODEC_NAMES.get(codec_id, 'none'), payload) != 200:
+                    return
+                self.request.sendall(TCP_ACK.pack(sequence))
+            except OSError:
+                return
+
+
+class ReceiverHttpServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ReceiverTcpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StandInReceiver(object):
+    """
+    Local collector accepting the batches of a ForwardingSink, to test the forwarding without the aggregation tier
+
+    :param url: http:// or tcp:// address to listen on, for example http://127.0.0.1:9880
+    :param sink: sink writing the received reports, for example a JsonFileSink, None to only count them
+    :param delay: seconds added before answering each batch, to simulate a slow collector
+    :param error_rate: fraction of the batches answered with a 503 status, or a closed connection with tcp://
+    """
+
+    def __init__(self, url, sink=None, delay=0, error_rate=0):
+        url = urlsplit(url)
+        self.sink = sink
+        self.delay = delay
+        self.error_rate = error_rate
+        self.stats = ReceiverStats()
+        server_class, handler_class = (ReceiverTcpServer, ReceiverTcpHandler) if url.scheme == 'tcp' else \
+            (ReceiverHttpServer, ReceiverHttpHandler)
+        self.server = server_class((url.hostname, url.port), handler_class)
+        self.server.receiver = self
+        self._thread = threading.Thread(target=self.server.serve_forever, name='StandInReceiver', daemon=True)
+
+    def receive(self, sequence, codec, payload):
+        """Returns the HTTP status answering a batch"""
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return 503
+        try:
+            if self.sink is None:
+                # Only counted, a stand-in receiver parsing every report would be the slowest part of a test
+                records = decompress(codec, payload).count(b'\n')
+            else:
+                records = batch_records(codec, payload)
+        except Exception as e:
+            logger.error("Stand-in receiver: unable to decode batch {}: {}".format(sequence, e))
+            return 400
+        if self.stats.record(sequence, records if self.sink is None else len(records), len(payload)) and \
+                self.sink is not None:
+            for record in records:
+                self.sink.write(TelemetryReport(record['iDRAC'], record['Index'], record['Report']))
+        return 200
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in collector receiving the reports of a ForwardingSink")
+    parser.add_argument('--listen', help='Address to listen on, http://127.0.0.1:9880 or tcp://127.0.0.1:9881',
+                        default='http://127.0.0.1:9880')
+    parser.add_argument('-d', help='Save the received reports as JSON files in this folder', required=False)
+    parser.add_argument('--delay-ms', help='Delay before answering each batch', type=float, default=0)
+    parser.add_argument('--error-rate', help='Fraction of the batches refused with a 503 status', type=float, default=0)
+    parser.add_argument('--interval', help='Seconds between two logs of the received counters', type=float, default=5)
+    args = vars(parser.parse_args())
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s', stream=sys.stdout)
+    receiver = StandInReceiver(args["listen"], JsonFileSink(args["d"]) if args["d"] else None,
+                               delay=args["delay_ms"] / 1000.0, error_rate=args["error_rate"]).start()
+    logger.info("Stand-in receiver listening on {}".format(args["listen"]))
+    try:
+        while True:
+            time.sleep(args["interval"])
+            logger.info("Received {}".format(receiver.stats.as_dict()))
+    except KeyboardInterrupt:
+        receiver.stop()
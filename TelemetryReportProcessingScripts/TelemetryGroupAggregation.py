@@ -0,0 +1,321 @@
+#
+# TelemetryGroupAggregation. Python module aggregating the metric values of the iDRACs of a rack or cluster into sum,
+# min, max and average per group, MetricId and time bucket while the reports are reconstructed.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# The groups come from the iDRACs.csv file of the ConfigurationScripts extended with optional columns, the scripts
+# only read the first three:
+#
+#   iDRAC IP,Username,Password,Name,Rack,Cluster
+#   192.168.0.120,root,calvin,idrac-r12-01,R12,ClusterA
+#
+# Name is the iDRAC name sent in the Rsyslog messages, the IP is used when it is empty. Within a bucket the last value
+# of each sensor of each iDRAC is kept, so a sum adds every sensor of every iDRAC once even when an iDRAC sends several
+# reports per bucket. Each iDRAC has its own watermark, the newest timestamp of its reports. A bucket of a group is
+# emitted once the oldest watermark of the group members which reported in the last lateness seconds is lateness
+# seconds past its end, or by expire() once no report arrived for lateness seconds. Values arriving after that are
+# counted as late and dropped. An iDRAC whose clock runs behind delays the buckets of its groups instead of losing its
+# values, timestamps ahead of the local clock are counted at the local time so a clock running ahead neither closes
+# the buckets of the other iDRACs early nor opens buckets they have not reached.
+#
+import collections
+import csv
+import fnmatch
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from TelemetryLatestValues import metric_number, series_labels
+from TelemetryPipeline import TelemetryReport
+from TelemetryStreamHealth import report_time
+
+logger = logging.getLogger('RsysLogProcessor')
+
+DEFAULT_LEVELS = ('Rack', 'Cluster')
+DEFAULT_BUCKET_SECONDS = 60
+DEFAULT_LATENESS_SECONDS = 120
+# Missing iDRACs are listed by name up to this number, only counted above
+MAX_MISSING_NAMES = 20
+REPORT_ID_PREFIX = 'GroupAggregates'
+STATISTICS = ('sum', 'min', 'max', 'avg', 'count')
+
+
+def read_group_mapping(file_name, levels=DEFAULT_LEVELS):
+    """
+    Returns {iDRAC name: {level: group}} read from an extended iDRACs.csv file, the iDRACs without a group at a level
+    are left out of that level
+
+    :param levels: group columns to read, for example ('Rack', 'Cluster')
+    """
+    mapping = {}
+    with open(file_name, encoding='utf-8-sig', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = [column.strip().lower() for column in next(reader)]
+        columns = {level: header.index(level.lower()) for level in levels if level.lower() in header}
+        missing = [level for level in levels if level not in columns]
+        if missing:
+            raise ValueError("{} has no {} column".format(file_name, ', '.join(missing)))
+        name_column = header.index('name') if 'name' in header else None
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+            name = (row[name_column].strip() if name_column is not None and len(row) > name_column else '') or \
+                row[0].strip()
+            mapping[name] = {level: row[column].strip() for level, column in columns.items()
+                             if len(row) > column and row[column].strip()}
+    return mapping
+
+
+def _timestamp(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class MetricAggregate(object):
+    """Last value of each (iDRAC, sensor) of a group for one MetricId and bucket, with their running sum"""
+    __slots__ = ('values', 'total', 'idracs')
+
+    def __init__(self):
+        self.values = {}
+        self.total = 0.0
+        self.idracs = set()
+
+    def update(self, idrac_name, labels, value):
+        key = (idrac_name, labels)
+        previous = self.values.get(key)
+        self.total += value - (previous or 0.0)
+        self.values[key] = value
+        self.idracs.add(idrac_name)
+
+
+class GroupBucket(object):
+    __slots__ = ('level', 'group', 'start', 'metrics')
+
+    def __init__(self, level, group, start):
+        self.level = level
+        self.group = group
+        self.start = start
+        self.metrics = {}
+
+
+class GroupAggregator(object):
+    """
+    Maintains the aggregates of every group, MetricId and bucket. update() may be called from several threads.
+
+    :param mapping: {iDRAC name: {level: group}}, see read_group_mapping()
+    :param levels: group levels to aggregate, each one produces its own aggregates
+    :param bucket_seconds: length of the time buckets, aligned on the epoch
+    :param lateness_seconds: time a bucket stays open after its end for late reports
+    :param metric_ids: MetricIds to aggregate, shell style patterns are supported. Default is all numeric metrics
+    """
+
+    def __init__(self, mapping, levels=DEFAULT_LEVELS, bucket_seconds=DEFAULT_BUCKET_SECONDS,
+                 lateness_seconds=DEFAULT_LATENESS_SECONDS, metric_ids=None):
+        self.levels = tuple(levels)
+        self.bucket_seconds = bucket_seconds
+        self.lateness_seconds = lateness_seconds
+        self.metric_ids = list(metric_ids or [])
+        # iDRAC name -> ((level, group), ...) and (level, group) -> expected iDRAC names
+        self.groups = {}
+        self.members = collections.defaultdict(set)
+        for idrac_name, groups in mapping.items():
+            self.groups[idrac_name] = tuple((level, groups[level]) for level in self.levels if level in groups)
+            for level_group in self.groups[idrac_name]:
+                self.members[level_group].add(idrac_name)
+        self.buckets = {}
+        # (level, group) -> heap of the (bucket end, start) of its open buckets, the first one closes first
+        self.closing = collections.defaultdict(list)
+        # (level, group) -> end of its last emitted bucket
+        self.closed_until = {}
+        # iDRAC name -> newest timestamp of its reports, and monotonic time of its last report
+        self.watermarks = {}
+        self.last_seen = {}
+        self.last_update = None
+        self.sequences = collections.Counter()
+        self.late_values = collections.Counter()
+        self.clock_ahead_idracs = set()
+        self.unmapped_idracs = set()
+        self._accepted_metrics = {}
+        self._epochs = {}
+        self._lock = threading.Lock()
+
+    def _accepts_metric(self, metric_id):
+        accepted = self._accepted_metrics.get(metric_id)
+        if accepted is None:
+            accepted = self._accepted_metrics[metric_id] = not self.metric_ids or any(
+                fnmatch.fnmatchcase(metric_id, pattern) for pattern in self.metric_ids)
+        return accepted
+
+    def _epoch(self, timestamp):
+        epoch = self._epochs.get(timestamp)
+        if epoch is None:
+            if len(self._epochs) > 1024:
+                self._epochs.clear()
+            epoch = self._epochs[timestamp] = report_time(timestamp) or math.nan
+        return epoch
+
+    def update(self, idrac_name, report):
+        """Adds the metric values of a report, returns the aggregate reports of the buckets it closed"""
+        groups = self.groups.get(idrac_name)
+        if not groups:
+            if idrac_name not in self.unmapped_idracs:
+                self.unmapped_idracs.add(idrac_name)
+                logger.warning("iDRAC %s is not in the group mapping, its reports are not aggregated", idrac_name)
+            return []
+        now = time.time()
+        with self._lock:
+            newest = None
+            for metric_value in report.get('MetricValues') or ():
+                metric_id = metric_value.get('MetricId', '')
+                if not self._accepts_metric(metric_id):
+                    continue
+                value = metric_number(metric_value.get('MetricValue'))
+                epoch = self._epoch(metric_value.get('Timestamp') or report.get('Timestamp'))
+                # NaN for values which are not numbers and unparsable timestamps
+                if value != value or epoch != epoch:
+                    continue
+                if epoch > now:
+                    epoch = now
+                    if idrac_name not in self.clock_ahead_idracs:
+                        self.clock_ahead_idracs.add(idrac_name)
+                        logger.warning("iDRAC %s sends timestamps ahead of the local clock, they are aggregated at "
+                                       "the local time", idrac_name)
+                newest = epoch if newest is None or epoch > newest else newest
+                start = epoch - epoch % self.bucket_seconds
+                labels = series_labels(metric_value)
+                for level, group in groups:
+                    key = (level, group, start)
+                    bucket = self.buckets.get(key)
+                    if bucket is None:
+                        end = start + self.bucket_seconds
+                        if end <= self.closed_until.get((level, group), -math.inf):
+                            self.late_values[(level, group)] += 1
+                            continue
+                        bucket = self.buckets[key] = GroupBucket(level, group, start)
+                        heapq.heappush(self.closing[(level, group)], (end, start))
+                    aggregate = bucket.metrics.get(metric_id)
+                    if aggregate is None:
+                        aggregate = bucket.metrics[metric_id] = MetricAggregate()
+                    aggregate.update(idrac_name, labels, value)
+            self.last_update = self.last_seen[idrac_name] = time.monotonic()
+            if newest is not None and newest > self.watermarks.get(idrac_name, -math.inf):
+                self.watermarks[idrac_name] = newest
+            watermark = self.watermarks.get(idrac_name)
+            reports = []
+            for level_group in groups:
+                closing = self.closing.get(level_group)
+                # The group watermark is at most the one of this iDRAC, it is only computed when it may close a bucket
+                if closing and watermark is not None and closing[0][0] + self.lateness_seconds <= watermark:
+                    reports.extend(self._close(level_group, self._group_watermark(level_group)))
+            return reports
+
+    def _group_watermark(self, level_group):
+        """Returns the oldest watermark of the members of a group which reported in the last lateness seconds"""
+        now = time.monotonic()
+        watermarks = [self.watermarks[idrac_name] for idrac_name in self.members[level_group]
+                      if idrac_name in self.watermarks and now - self.last_seen[idrac_name] < self.lateness_seconds]
+        return min(watermarks) if watermarks else None
+
+    def expire(self, now=None):
+        """Closes every open bucket once no report arrived for lateness seconds, call it periodically"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if self.last_update is None or now - self.last_update < self.lateness_seconds:
+                return []
+            return self._close_all()
+
+    def flush(self):
+        """Closes every open bucket, returns their aggregate reports"""
+        with self._lock:
+            return self._close_all()
+
+    def _close(self, level_group, watermark):
+        if watermark is None:
+            return []
+        reports = []
+        closing = self.closing[level_group]
+        while closing and closing[0][0] + self.lateness_seconds <= watermark:
+            end, start = heapq.heappop(closing)
+            bucket = self.buckets.pop(level_group + (start,))
+            self.closed_until[level_group] = end
+            reports.append(self._aggregate_report(bucket))
+        return reports
+
+    def _close_all(self):
+        """Closes the open buckets of every group, the oldest buckets first"""
+        buckets = []
+        for level_group, closing in self.closing.items():
+            while closing:
+                end, start = heapq.heappop(closing)
+                buckets.append(self.buckets.pop(level_group + (start,)))
+                self.closed_until[level_group] = end
+        buckets.sort(key=lambda bucket: bucket.start)
+        return [self._aggregate_report(bucket) for bucket in buckets]
+
+    def _aggregate_report(self, bucket):
+        level_group = (bucket.level, bucket.group)
+        expected = self.members[level_group]
+        self.sequences[level_group] += 1
+        metric_values = []
+        for metric_id, aggregate in sorted(bucket.metrics.items()):
+            values = aggregate.values.values()
+            missing = sorted(expected - aggregate.idracs)
+            dell = {'GroupType': bucket.level, 'Group': bucket.group, 'iDRACsReporting': len(aggregate.idracs),
+                    'iDRACsExpected': len(expected), 'MissingiDRACsCount': len(missing)}
+            if missing and len(missing) <= MAX_MISSING_NAMES:
+                dell['MissingiDRACs'] = missing
+            statistics = {'sum': aggregate.total, 'min': min(values), 'max': max(values),
+                          'avg': aggregate.total / len(values), 'count': len(values)}
+            for statistic in STATISTICS:
+                metric_values.append({'MetricId': metric_id, 'MetricValue': str(round(statistics[statistic], 6)),
+                                      'Timestamp': _timestamp(bucket.start),
+                                      'Oem': {'Dell': dict(dell, ContextID=statistic, Aggregation=statistic)}})
+        report_id = '{}{}'.format(REPORT_ID_PREFIX, bucket.level)
+        report = {'@odata.type': '#MetricReport.v1_4_2.MetricReport',
+                  '@odata.id': '/redfish/v1/TelemetryService/MetricReports/{}'.format(report_id),
+                  'Id': report_id, 'Name': '{} {} aggregates'.format(bucket.level, bucket.group),
+                  'ReportSequence': str(self.sequences[level_group]),
+                  'Timestamp': _timestamp(bucket.start + self.bucket_seconds),
+                  'MetricValues': metric_values, 'MetricValues@odata.count': len(metric_values),
+                  'Oem': {'Dell': {'GroupType': bucket.level, 'Group': bucket.group,
+                                   'BucketStart': _timestamp(bucket.start), 'BucketSeconds': self.bucket_seconds,
+                                   'LateValuesDropped': self.late_values.pop(level_group, 0)}}}
+        return TelemetryReport(group_name(bucket.level, bucket.group), self.sequences[level_group], report)
+
+
+def group_name(level, group):
+    """Name under which the aggregates of a group are written, in place of an iDRAC name"""
+    return '{}-{}'.format(level.lower(), group.replace('/', '_').replace(' ', '_'))
+
+
+def aggregate_groups(reports, aggregator, emit=None):
+    """
+    Pipeline stage passing every report through and adding the aggregate reports of the buckets they close
+
+    :param reports: iterable of TelemetryReport
+    :param emit: callable receiving the list of aggregate reports instead of the stage yielding them, for pipelines
+        sharing the aggregator whose later stages keep per pipeline state such as delta encoding
+    """
+    for telemetry_report in reports:
+        yield telemetry_report
+        aggregate_reports = aggregator.update(telemetry_report.idrac_name, telemetry_report.report)
+        if not aggregate_reports:
+            continue
+        if emit is not None:
+            emit(aggregate_reports)
+        else:
+            yield from aggregate_reports
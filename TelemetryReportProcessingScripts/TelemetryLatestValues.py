@@ -0,0 +1,306 @@
+#
+# TelemetryLatestValues. Python module publishing the latest value of every Telemetry metric series in a shared memory
+# table, read by other local processes without parsing the JSON reports.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# The table is a file mapped in memory by the writer and the readers, /dev/shm keeps it in RAM on Linux. Layout, all
+# integers little endian:
+#
+#   header   64 bytes    magic 'IDRACLV1', version, capacity, name size, state, series count
+#   records  capacity x 32 bytes, one per series id: sequence, value, timestamp, updates
+#   names    capacity x name size bytes, one per series id: 2 bytes length and 'iDRAC\x1fMetricId\x1flabels' in UTF-8
+#
+# A series id is given to each (iDRAC, MetricId, labels) the first time it is seen and never changes while the writer
+# runs. The writer makes the sequence of a record odd while it updates it and even again afterwards, a reader retries
+# until it reads the same even sequence before and after the value (seqlock), so it never sees a half written record.
+#
+import argparse
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger('RsysLogProcessor')
+
+MAGIC = b'IDRACLV1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIII')
+HEADER_SIZE = 64
+SERIES_COUNT = struct.Struct('<Q')
+SERIES_COUNT_OFFSET = 32
+SEQUENCE = struct.Struct('<Q')
+RECORD_VALUES = struct.Struct('<ddQ')
+RECORD_SIZE = 32
+NAME_LENGTH = struct.Struct('<H')
+SEPARATOR = '\x1f'
+STATE_OPEN = 1
+STATE_CLOSED = 2
+DEFAULT_CAPACITY = 262144
+DEFAULT_NAME_SIZE = 192
+DEFAULT_TABLE_PATH = '/dev/shm/idrac_telemetry_latest' if os.path.isdir('/dev/shm') else \
+    os.path.join(os.path.expanduser('~'), '.idrac_telemetry', 'latest_values')
+# Attempts of a reader to get a consistent record before giving up, a writer killed during an update leaves it odd
+MAX_READ_ATTEMPTS = 1000
+
+
+def series_labels(metric_value):
+    """Returns the labels telling apart the values of a MetricId, the Dell ContextID or FQDD, else the MetricProperty"""
+    dell = (metric_value.get('Oem') or {}).get('Dell') or {}
+    return dell.get('ContextID') or dell.get('FQDD') or metric_value.get('MetricProperty') or ''
+
+
+def series_name(idrac_name, metric_id, labels):
+    return SEPARATOR.join((idrac_name, metric_id, labels))
+
+
+def metric_number(value):
+    """Returns a MetricValue as a float, NaN when it is not a number such as 'Enabled'"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def table_size(capacity, name_size):
+    return HEADER_SIZE + capacity * (RECORD_SIZE + name_size)
+
+
+class LatestValuesTable(object):
+    """
+    Writer of the latest values table. The file is created again by each writer, readers of a previous table see its
+    state change to closed.
+
+    :param path: file of the table, for example /dev/shm/idrac_telemetry_latest
+    :param capacity: maximum number of series, new series are ignored once it is reached
+    :param name_size: bytes reserved for each series name, longer names are ignored
+    """
+
+    def __init__(self, path=DEFAULT_TABLE_PATH, capacity=DEFAULT_CAPACITY, name_size=DEFAULT_NAME_SIZE):
+        self.path = path
+        self.capacity = capacity
+        self.name_size = name_size
+        self.series_ids = {}
+        self.series_count = 0
+        self.dropped_series = 0
+        self._timestamps = {}
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # The new table replaces the previous file, readers still mapping the previous one are not disturbed
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary_path, 'wb') as file:
+            file.truncate(table_size(capacity, name_size))
+        with open(temporary_path, 'r+b') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0)
+        HEADER.pack_into(self.buffer, 0, MAGIC, VERSION, capacity, name_size, STATE_OPEN)
+        self._names_offset = HEADER_SIZE + capacity * RECORD_SIZE
+        self._replace_previous_table()
+        os.replace(temporary_path, path)
+
+    def _replace_previous_table(self):
+        """Marks the table being replaced as closed for the readers which still map it"""
+        try:
+            with open(self.path, 'r+b') as file:
+                previous = mmap.mmap(file.fileno(), 0)
+        except (OSError, ValueError):
+            return
+        if previous[:len(MAGIC)] == MAGIC:
+            struct.pack_into('<I', previous, 20, STATE_CLOSED)
+        previous.close()
+
+    def _timestamp(self, timestamp):
+        """Epoch time of a metric Timestamp, the values of a report share a few timestamps so they are cached"""
+        epoch = self._timestamps.get(timestamp)
+        if epoch is None:
+            try:
+                epoch = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+            except (AttributeError, ValueError):
+                epoch = math.nan
+            if len(self._timestamps) > 1024:
+                self._timestamps.clear()
+            self._timestamps[timestamp] = epoch
+        return epoch
+
+    def _add_series(self, name):
+        series_id = self.series_count
+        encoded = name.encode('utf-8')
+        if series_id >= self.capacity or len(encoded) > self.name_size - NAME_LENGTH.size:
+            self.dropped_series += 1
+            if self.dropped_series == 1:
+                logger.warning("Latest values table %s is full or the series name is too long, series %s and the "
+                               "next new series are not published", self.path, name.replace(SEPARATOR, ' '))
+            self.series_ids[name] = None
+            return None
+        offset = self._names_offset + series_id * self.name_size
+        NAME_LENGTH.pack_into(self.buffer, offset, len(encoded))
+        self.buffer[offset + NAME_LENGTH.size:offset + NAME_LENGTH.size + len(encoded)] = encoded
+        RECORD_VALUES.pack_into(self.buffer, HEADER_SIZE + series_id * RECORD_SIZE + SEQUENCE.size, math.nan,
+                                math.nan, 0)
+        # The count is written last, readers only look at the series whose name is complete
+        SERIES_COUNT.pack_into(self.buffer, SERIES_COUNT_OFFSET, series_id + 1)
+        self.series_count += 1
+        self.series_ids[name] = series_id
+        return series_id
+
+    def _update(self, name, value, timestamp):
+        series_id = self.series_ids.get(name, -1)
+        if series_id == -1:
+            series_id = self._add_series(name)
+        if series_id is None:
+            return
+        offset = HEADER_SIZE + series_id * RECORD_SIZE
+        buffer = self.buffer
+        sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+        updates = RECORD_VALUES.unpack_from(buffer, offset + SEQUENCE.size)[2]
+        SEQUENCE.pack_into(buffer, offset, sequence + 1)
+        RECORD_VALUES.pack_into(buffer, offset + SEQUENCE.size, value, timestamp, updates + 1)
+        SEQUENCE.pack_into(buffer, offset, sequence + 2)
+
+    def update(self, idrac_name, metric_id, labels, value, timestamp):
+        """Sets the latest value of a series, value and timestamp are floats"""
+        with self._lock:
+            self._update(series_name(idrac_name, metric_id, labels), value, timestamp)
+
+    def update_report(self, idrac_name, report):
+        """Publishes every MetricValue of a report"""
+        with self._lock:
+            for metric_value in report.get('MetricValues') or ():
+                self._update(series_name(idrac_name, metric_value.get('MetricId', ''), series_labels(metric_value)),
+                             metric_number(metric_value.get('MetricValue')),
+                             self._timestamp(metric_value.get('Timestamp') or report.get('Timestamp')))
+
+    def close(self):
+        with self._lock:
+            struct.pack_into('<I', self.buffer, 20, STATE_CLOSED)
+            self.buffer.close()
+
+
+def publish_latest_values(reports, table):
+    """
+    Pipeline stage passing every report through unchanged while publishing its values in a LatestValuesTable
+
+    :param reports: iterable of TelemetryReport
+    """
+    for telemetry_report in reports:
+        table.update_report(telemetry_report.idrac_name, telemetry_report.report)
+        yield telemetry_report
+
+
+class LatestValuesReader(object):
+    """
+    Reader of the latest values table, reading a value is a memory access, there is no system call or parsing.
+
+        reader = LatestValuesReader()
+        series_id = reader.series_id('idrac-1', 'SystemInputPower', 'System.Embedded.1#Sensor0')
+        value, timestamp, updates = reader.read(series_id)
+
+    :param path: file of the table written by LatestValuesTable
+    """
+
+    def __init__(self, path=DEFAULT_TABLE_PATH):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.capacity, self.name_size, _ = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError("{} is not a latest values table".format(path))
+        self._names_offset = HEADER_SIZE + self.capacity * RECORD_SIZE
+        self.series_ids = {}
+        self.names = []
+
+    @property
+    def closed(self):
+        """True once the writer stopped or replaced the table, open a new reader to follow the new table"""
+        return struct.unpack_from('<I', self.buffer, 20)[0] == STATE_CLOSED
+
+    def refresh(self):
+        """Loads the names of the series added since the last call, returns the number of series"""
+        count = SERIES_COUNT.unpack_from(self.buffer, SERIES_COUNT_OFFSET)[0]
+        for series_id in range(len(self.names), count):
+            offset = self._names_offset + series_id * self.name_size
+            length = NAME_LENGTH.unpack_from(self.buffer, offset)[0]
+            name = self.buffer[offset + NAME_LENGTH.size:offset + NAME_LENGTH.size + length].decode('utf-8')
+            self.names.append(name)
+            self.series_ids[name] = series_id
+        return count
+
+    def series_id(self, idrac_name, metric_id, labels=''):
+        """Returns the id of a series, None when it was not published yet"""
+        name = series_name(idrac_name, metric_id, labels)
+        if name not in self.series_ids:
+            self.refresh()
+        return self.series_ids.get(name)
+
+    def series(self):
+        """Returns the (iDRAC, MetricId, labels) of every series id"""
+        self.refresh()
+        return [tuple(name.split(SEPARATOR, 2)) for name in self.names]
+
+    def read(self, series_id):
+        """Returns (value, epoch timestamp, updates) of a series, None if the writer did not finish its update"""
+        offset = HEADER_SIZE + series_id * RECORD_SIZE
+        buffer = self.buffer
+        for _ in range(MAX_READ_ATTEMPTS):
+            sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+            if sequence & 1:
+                continue
+            values = RECORD_VALUES.unpack_from(buffer, offset + SEQUENCE.size)
+            if SEQUENCE.unpack_from(buffer, offset)[0] == sequence:
+                return values
+        return None
+
+    def get(self, idrac_name, metric_id, labels=''):
+        """Returns (value, epoch timestamp, updates) of a series, None when it is unknown"""
+        series_id = self.series_id(idrac_name, metric_id, labels)
+        return None if series_id is None else self.read(series_id)
+
+    def snapshot(self):
+        """Returns {(iDRAC, MetricId, labels): (value, timestamp, updates)} of every series"""
+        self.refresh()
+        return {tuple(name.split(SEPARATOR, 2)): self.read(series_id) for series_id, name in enumerate(self.names)}
+
+    def close(self):
+        self.buffer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Python script to print the latest metric values published by "
+                                                 "TelemetryRsysLogProcessor.py --latest-values.")
+    parser.add_argument('-f', help='Latest values table, default is %s' % DEFAULT_TABLE_PATH,
+                        default=DEFAULT_TABLE_PATH, required=False)
+    parser.add_argument('--idrac-name', help='Print only the series of this iDRAC', required=False)
+    parser.add_argument('--metric-id', help='Print only the series of this MetricId', required=False)
+    args = vars(parser.parse_args())
+    logging.basicConfig(format='%(message)s', stream=sys.stdout, level=logging.INFO)
+    try:
+        reader = LatestValuesReader(args["f"])
+    except (OSError, ValueError) as e:
+        logging.error("- FAIL, unable to open the latest values table: %s" % e)
+        sys.exit(1)
+    for (idrac_name, metric_id, labels), values in sorted(reader.snapshot().items()):
+        if values is None or args["idrac_name"] not in (None, idrac_name) or args["metric_id"] not in (None, metric_id):
+            continue
+        value, timestamp, updates = values
+        age = time.time() - timestamp if not math.isnan(timestamp) else math.nan
+        logging.info("%s %s %s %s (%.0fs ago, %d updates)" % (idrac_name, metric_id, labels, value, age, updates))
+    if reader.closed:
+        logging.info("- INFO, the writer of this table stopped, the values are not updated anymore")
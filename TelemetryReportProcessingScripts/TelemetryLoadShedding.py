@@ -0,0 +1,216 @@
+#
+# TelemetryLoadShedding. Python module shedding the low priority Telemetry reports while the processing falls behind,
+# so the reports which matter, such as PowerMetrics and the thermal reports, keep being written on time.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# The backlog is the sum of the bytes of the followed Rsyslog files not read yet and of the reports queued inside the
+# processor. Each report Id has a priority, low, normal, high or critical, and the shedding has levels:
+#
+#   level 0   every report is processed
+#   level 1   one low report out of sample_every of each iDRAC is processed
+#   level 2   low reports are dropped, one normal report out of sample_every is processed
+#   level 3   low and normal reports are dropped, one high report out of sample_every is processed
+#
+# Critical reports are never shed. The level goes up one step per update() while the backlog is above shed_bytes and
+# not shrinking, and down one step each recover_seconds the backlog stays below recover_bytes. The reports are shed
+# on their first chunk, before their chunks are buffered and decoded, and counted per report Id.
+#
+import collections
+import fnmatch
+import logging
+import threading
+import time
+
+from TelemetryPipeline import ReportFilter
+
+logger = logging.getLogger('RsysLogProcessor')
+
+PRIORITIES = ('low', 'normal', 'high', 'critical')
+DEFAULT_PRIORITY = 'normal'
+DEFAULT_PRIORITIES = 'PowerMetrics=critical,Thermal*=critical,Sensor=high,NICStatistics=low,FCPortStatistics=low,' \
+                     'StorageDiskSMARTData=low'
+MAX_LEVEL = len(PRIORITIES) - 1
+DEFAULT_SHED_BYTES = 64 * 1024 * 1024
+DEFAULT_RECOVER_BYTES = 8 * 1024 * 1024
+DEFAULT_SAMPLE_EVERY = 4
+DEFAULT_RECOVER_SECONDS = 30
+# (iDRAC name, index) of the shed reports whose remaining chunks are still expected, per pipeline
+MAX_DROPPING_REPORTS = 1024
+
+
+def parse_priorities(value):
+    """
+    Returns the [(pattern, priority rank)] of a comma separated list such as 'PowerMetrics=critical,NIC*=low', the
+    first pattern matching a report Id gives its priority
+    """
+    priorities = []
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        pattern, _, priority = item.rpartition('=')
+        priority = priority.strip().lower()
+        if not pattern or priority not in PRIORITIES:
+            raise ValueError("invalid priority {}, expected <report Id pattern>=<{}>".format(
+                item, '|'.join(PRIORITIES)))
+        priorities.append((pattern.strip(), PRIORITIES.index(priority)))
+    return priorities
+
+
+class OverloadController(object):
+    """
+    Measures the backlog and decides which reports to shed. accepts() may be called from several threads, update()
+    is called periodically by one thread.
+
+    :param priorities: [(report Id pattern, priority rank)], see parse_priorities(). Other reports are normal
+    :param shed_bytes: backlog above which the shedding level goes up
+    :param recover_bytes: backlog below which the shedding level goes down
+    :param sample_every: one report of the sampled priority out of sample_every is kept per iDRAC and report Id
+    :param recover_seconds: time the backlog stays below recover_bytes before each step down
+    """
+
+    def __init__(self, priorities=None, shed_bytes=DEFAULT_SHED_BYTES, recover_bytes=DEFAULT_RECOVER_BYTES,
+                 sample_every=DEFAULT_SAMPLE_EVERY, recover_seconds=DEFAULT_RECOVER_SECONDS):
+        self.priorities = list(priorities or [])
+        self.shed_bytes = shed_bytes
+        self.recover_bytes = min(recover_bytes, shed_bytes)
+        self.sample_every = max(1, sample_every)
+        self.recover_seconds = recover_seconds
+        self.level = 0
+        self.backlog = 0
+        self.shed_reports = collections.Counter()
+        self.shed_chunks = 0
+        self._sources = []
+        self._ranks = {}
+        self._samples = collections.Counter()
+        self._below_since = None
+        self._lock = threading.Lock()
+
+    def add_source(self, backlog_bytes):
+        """Adds a callable returning a part of the backlog in bytes, for example FilePosition.bytes_behind"""
+        with self._lock:
+            self._sources.append(backlog_bytes)
+
+    def rank(self, report_id):
+        rank = self._ranks.get(report_id)
+        if rank is None:
+            rank = PRIORITIES.index(DEFAULT_PRIORITY)
+            for pattern, pattern_rank in self.priorities:
+                if report_id is not None and fnmatch.fnmatchcase(report_id, pattern):
+                    rank = pattern_rank
+                    break
+            self._ranks[report_id] = rank
+        return rank
+
+    def accepts(self, idrac_name, report_id):
+        """Decides whether a report is processed at the current level, counts it when it is shed"""
+        level = self.level
+        if not level:
+            return True
+        rank = self.rank(report_id)
+        if rank >= level:
+            return True
+        with self._lock:
+            if rank == level - 1:
+                key = (idrac_name, report_id)
+                self._samples[key] += 1
+                if (self._samples[key] - 1) % self.sample_every == 0:
+                    return True
+            self.shed_reports[report_id or 'UnknownId'] += 1
+            return False
+
+    def count_shed_chunks(self, chunks=1):
+        with self._lock:
+            self.shed_chunks += chunks
+
+    def update(self, now=None):
+        """Measures the backlog and moves the shedding level, returns the level"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            sources = list(self._sources)
+        backlog = sum(source() for source in sources)
+        previous, self.backlog = self.backlog, backlog
+        if backlog > self.shed_bytes:
+            self._below_since = None
+            if self.level < MAX_LEVEL and backlog >= previous:
+                self._set_level(self.level + 1)
+        elif backlog <= self.recover_bytes and self.level:
+            if self._below_since is None:
+                self._below_since = now
+            elif now - self._below_since >= self.recover_seconds:
+                self._below_since = now
+                self._set_level(self.level - 1)
+        else:
+            self._below_since = None
+        return self.level
+
+    def _set_level(self, level):
+        if level > self.level:
+            logger.warning("Processing {} bytes behind, shedding level {}: {}".format(
+                self.backlog, level, self.describe_level(level)))
+        else:
+            logger.info("Backlog down to {} bytes, shedding level {}: {}, {} reports shed so far".format(
+                self.backlog, level, self.describe_level(level), sum(self.shed_reports.values())))
+        with self._lock:
+            self.level = level
+            if not level:
+                self._samples.clear()
+
+    def describe_level(self, level):
+        if not level:
+            return 'every report is processed'
+        dropped = PRIORITIES[:level - 1]
+        description = 'one {} report out of {} kept'.format(PRIORITIES[level - 1], self.sample_every)
+        return description + (', {} reports dropped'.format(' and '.join(dropped)) if dropped else '')
+
+    def stats(self):
+        with self._lock:
+            return {'level': self.level, 'backlog_bytes': self.backlog, 'shed_chunks': self.shed_chunks,
+                    'shed_reports': dict(self.shed_reports)}
+
+    def log_stats(self):
+        stats = self.stats()
+        if stats['shed_reports']:
+            logger.info("Load shedding level {}, {} bytes behind, reports shed: {}".format(
+                stats['level'], stats['backlog_bytes'], ', '.join('{} {}'.format(report, count) for report, count in
+                                                                 sorted(stats['shed_reports'].items()))))
+
+
+def shed_reports(chunks, controller):
+    """
+    Pipeline stage between parse_chunks() and assemble_reports() dropping the chunks of the reports the controller
+    sheds, decided on their first chunk
+    """
+    # (iDRAC name, index) of shed reports -> number of chunks still expected
+    dropping = collections.OrderedDict()
+    for chunk in chunks:
+        if dropping:
+            key = (chunk.idrac_name, chunk.index)
+            remaining = dropping.get(key)
+            if remaining is not None:
+                controller.count_shed_chunks()
+                if remaining > 1:
+                    dropping[key] = remaining - 1
+                else:
+                    del dropping[key]
+                continue
+        if chunk.chunk_id == 1 and controller.level and \
+                not controller.accepts(chunk.idrac_name, ReportFilter.report_id(chunk.message)):
+            controller.count_shed_chunks()
+            if chunk.chunks_count > 1:
+                if len(dropping) >= MAX_DROPPING_REPORTS:
+                    dropping.popitem(last=False)
+                dropping[(chunk.idrac_name, chunk.index)] = chunk.chunks_count - 1
+            continue
+        yield chunk
@@ -0,0 +1,472 @@
+#
+# TelemetryPipeline. Python module reconstructing the Telemetry reports from Rsyslog messages with composable
+# streaming stages, usable in-process by collectors as well as by TelemetryRsysLogProcessor.py.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# The stages are generators, each one pulls from the previous one so nothing is buffered between them:
+#
+#   lines -> parse_chunks() -> assemble_reports() -> decode_reports() -> sink.write()
+#
+# Example:
+#
+#   parser = TelemetryRsyslogParser()
+#   sink = JsonFileSink('/tmp/Rsyslogs')
+#   with open('/var/log/idrac.log', 'rb') as file:
+#       write_reports(decode_reports(assemble_reports(parse_chunks(file, parser))), sink)
+#
+import collections
+import fnmatch
+import glob
+import json
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger('RsysLogProcessor')
+
+# Reports whose chunks are still arriving, the oldest one is dropped when a pipeline holds more
+DEFAULT_MAX_PENDING_REPORTS = 64
+
+# The report Id is read from the start of the first chunk, iDRAC puts @odata.id and Id before the metric values
+REPORT_ID_PATTERN = re.compile(r'"Id"\s*:\s*"([^"]*)"')
+REPORT_URI_PATTERN = re.compile(r'"@odata.id"\s*:\s*"[^"]*/MetricReports/([^"/]+)"')
+# Same fields as the pyparsing grammar, used for the bytes lines of follow_binary_lines()
+RSYSLOG_BYTES_PATTERN = re.compile(rb'(\S+)\s+([A-Za-z0-9.-]+)\s+([A-Za-z0-9-]+):\s*#[A-Za-z]+#:(\d+)-(\d+)-(\d+):\s*(.*)')
+# Bytes read from a followed file at once
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# One Rsyslog message carrying a chunk of a Telemetry report
+Chunk = collections.namedtuple('Chunk', ['time_stamp', 'host_name', 'idrac_name', 'index', 'chunks_count',
+                                         'chunk_id', 'message'])
+# All chunks of a Telemetry report in order, not decoded yet
+RawReport = collections.namedtuple('RawReport', ['idrac_name', 'index', 'chunks'])
+# A decoded Telemetry report
+TelemetryReport = collections.namedtuple('TelemetryReport', ['idrac_name', 'index', 'report'])
+
+
+class TelemetryRsyslogParser(object):
+    """Parses the Rsyslog messages sent by the iDRAC, the pyparsing grammar is built on first use"""
+
+    def __init__(self):
+        self.__pattern = None
+
+    def generate_Rsyslog_message_pattern(self):
+        from pyparsing import Combine, Regex, Suppress, Word, alphas, nums
+        ints = Word(nums)
+        timestamp = Combine(ints + "-" + ints + "-" + ints + 'T' + ints + ":" + ints + ":" + ints + "." + ints +
+                            "-" + ints + ":" + ints)
+        hostname = Word(alphas + nums + "-" + ".")  # pyparsing_common.ipv4_address
+        appname = Word(alphas + "-" + nums) + Suppress(":")
+        context = Suppress("#") + Word(alphas) + Suppress("#") + Suppress(":") + Word(nums) + "-" + Word(
+            nums) + "-" + Word(nums) + Suppress(":")
+        message = Regex(".*")
+        return timestamp + hostname + appname + context + message
+
+    def parse(self, line):
+        """Returns the fields of a Rsyslog message as a dict, an empty dict if the line does not match"""
+        if self.__pattern is None:
+            self.__pattern = self.generate_Rsyslog_message_pattern()
+        payload = {}
+        try:
+            parsed = self.__pattern.parseString(line)
+            payload["time_stamp"] = parsed[0]
+            payload["host_name"] = parsed[1]
+            payload["idrac_name"] = parsed[2]
+            payload["index"] = parsed[4]
+            payload["chunks_count"] = parsed[6]
+            payload["chunkId"] = parsed[8]
+            payload["message"] = parsed[9]
+        except:
+            logger.exception("Unable to parse line '{}'".format(line))
+        return payload
+
+    def parse_chunk(self, line):
+        """Returns the Rsyslog message as a Chunk, None if the line does not match"""
+        fields = self.parse(line)
+        if not fields:
+            return None
+        return Chunk(fields["time_stamp"], fields["host_name"], fields["idrac_name"], int(fields["index"]),
+                     int(fields["chunks_count"]), int(fields["chunkId"]), fields["message"])
+
+    @staticmethod
+    def parse_chunk_bytes(line):
+        """
+        Returns a bytes Rsyslog line as a Chunk, None if it is not a Telemetry message. A regular expression is used
+        instead of the pyparsing grammar and only the fields of matching lines are decoded.
+        """
+        match = RSYSLOG_BYTES_PATTERN.match(line)
+        if match is None:
+            return None
+        time_stamp, host_name, idrac_name, index, chunks_count, chunk_id, message = match.groups()
+        return Chunk(time_stamp.decode('ascii'), host_name.decode('ascii'), idrac_name.decode('ascii'), int(index),
+                     int(chunks_count), int(chunk_id), message.decode('utf-8', 'replace'))
+
+
+class ReportFilter(object):
+    """
+    Selects the reports and metrics to reconstruct. Each filter is applied by the earliest stage able to decide it:
+    the iDRAC name before a line is parsed, the report Id on the first chunk of a report so the other chunks of a
+    dropped report are never buffered, and the MetricIds while the report is decoded. Names are matched with shell
+    style patterns, for example 'PowerMetrics' or 'idrac-rack1-*'.
+
+    :param include_reports: report Ids to keep, all reports by default
+    :param exclude_reports: report Ids to drop
+    :param include_metrics: MetricIds to keep in the MetricValues of a report, all metrics by default
+    :param exclude_metrics: MetricIds to drop from the MetricValues of a report
+    :param idrac_names: iDRAC names, as sent in the Rsyslog messages, to keep. All iDRACs by default
+    """
+
+    def __init__(self, include_reports=None, exclude_reports=None, include_metrics=None, exclude_metrics=None,
+                 idrac_names=None):
+        self.include_reports = list(include_reports or [])
+        self.exclude_reports = list(exclude_reports or [])
+        self.include_metrics = list(include_metrics or [])
+        self.exclude_metrics = list(exclude_metrics or [])
+        self.idrac_names = list(idrac_names or [])
+        self.filters_metrics = bool(self.include_metrics or self.exclude_metrics)
+        # Decisions are cached, a fleet only has a few distinct iDRAC names, report Ids and MetricIds
+        self._idracs = {}
+        self._reports = {}
+        self._metrics = {}
+        self.dropped_lines = 0
+        self.dropped_reports = 0
+        self.dropped_chunks = 0
+        self.pruned_metrics = 0
+
+    @staticmethod
+    def _matches(name, include, exclude):
+        if include and not any(fnmatch.fnmatchcase(name, pattern) for pattern in include):
+            return False
+        return not any(fnmatch.fnmatchcase(name, pattern) for pattern in exclude)
+
+    def accepts_idrac(self, idrac_name):
+        if not self.idrac_names:
+            return True
+        if idrac_name not in self._idracs:
+            self._idracs[idrac_name] = self._matches(idrac_name, self.idrac_names, [])
+        return self._idracs[idrac_name]
+
+    def accepts_line(self, line):
+        """Checks the iDRAC name of a Rsyslog line without parsing it, the name is the third field of the line"""
+        if not self.idrac_names:
+            return True
+        fields = line.split(None, 3)
+        if len(fields) < 3 or self.accepts_idrac(fields[2].rstrip(':')):
+            return True
+        self.dropped_lines += 1
+        return False
+
+    def accepts_report(self, report_id):
+        if report_id not in self._reports:
+            self._reports[report_id] = self._matches(report_id, self.include_reports, self.exclude_reports)
+        return self._reports[report_id]
+
+    def accepts_metric(self, metric_id):
+        if metric_id not in self._metrics:
+            self._metrics[metric_id] = self._matches(metric_id, self.include_metrics, self.exclude_metrics)
+        return self._metrics[metric_id]
+
+    @staticmethod
+    def report_id(first_chunk):
+        """Returns the report Id found at the start of the first chunk of a report, None if it is not in the chunk"""
+        match = REPORT_ID_PATTERN.search(first_chunk) or REPORT_URI_PATTERN.search(first_chunk)
+        return match.group(1) if match else None
+
+    def accepts_first_chunk(self, first_chunk):
+        """Decides whether a report is kept from its first chunk, undecided reports are kept until they are decoded"""
+        if not (self.include_reports or self.exclude_reports):
+            return True
+        report_id = self.report_id(first_chunk)
+        return report_id is None or self.accepts_report(report_id)
+
+    def prune_metrics(self, report):
+        """Removes the MetricValues whose MetricId is filtered out, returns the report"""
+        metric_values = report.get('MetricValues')
+        if self.filters_metrics and metric_values:
+            kept = [value for value in metric_values if self.accepts_metric(value.get('MetricId', ''))]
+            self.pruned_metrics += len(metric_values) - len(kept)
+            report['MetricValues'] = kept
+            if 'MetricValues@odata.count' in report:
+                report['MetricValues@odata.count'] = len(kept)
+        return report
+
+
+class FilePosition(object):
+    """Read offset of a file followed by follow_binary_lines(), tells how far behind the end of the file it is"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.offset = 0
+        # (st_dev, st_ino) of the file being read, the offset is in that file
+        self.identity = None
+
+    def bytes_behind(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return 0
+        if self.identity is not None and (stat.st_dev, stat.st_ino) != self.identity:
+            # a log rotation created a new file which is not followed yet, none of it was read
+            return stat.st_size
+        return max(0, stat.st_size - self.offset)
+
+
+def follow_binary_lines(filename, from_end=True, poll_interval=1, reopen_after=60, stop_event=None,
+                        block_size=DEFAULT_BLOCK_SIZE, position=None):
+    """
+    Yields the lines appended to a file as bytes without their line feed, like tail -F. The file is read in blocks of
+    block_size bytes, a partial last line is kept until the rest of it is written. A new file created at the path by a
+    log rotation is followed from its start, as is a truncated file. While the path does not exist, between the
+    rotation and the creation of the new file, the generator keeps polling. The file is also reopened when it was not
+    modified for reopen_after seconds, the reading continues at the same offset if it is still the same file.
+
+    :param filename: Rsyslog file to follow
+    :param from_end: Only yield lines written after the call, set to False to also yield the existing lines
+    :param poll_interval: Seconds to wait for new lines, the generator only sleeps when the end of the file is reached
+    :param stop_event: threading.Event ending the generator once set
+    :param position: FilePosition updated with the offset read so far
+    """
+    position = position or FilePosition(filename)
+    file = open(filename, 'rb', buffering=0)
+    file_stat = os.fstat(file.fileno())
+    file_identity = position.identity = (file_stat.st_dev, file_stat.st_ino)
+    if from_end:
+        position.offset = file.seek(file_stat.st_size)
+    partial_line = b''
+    file_modified_time = time.time()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            block = file.read(block_size)
+            if not block:
+                time.sleep(poll_interval)
+                try:
+                    path_stat = os.stat(filename)
+                except OSError:
+                    # Renamed by the log rotation and not created again yet
+                    continue
+                offset = file.tell()
+                rotated = (path_stat.st_dev, path_stat.st_ino) != file_identity
+                truncated = not rotated and path_stat.st_size < offset
+                if rotated or truncated or time.time() - file_modified_time > reopen_after:
+                    try:
+                        reopened = open(filename, 'rb', buffering=0)
+                    except OSError:
+                        continue
+                    file.close()
+                    file = reopened
+                    file_stat = os.fstat(file.fileno())
+                    if (file_stat.st_dev, file_stat.st_ino) == file_identity and file_stat.st_size >= offset:
+                        # Still the same file, the lines already read are not yielded again
+                        position.offset = file.seek(offset)
+                    else:
+                        file_identity = position.identity = (file_stat.st_dev, file_stat.st_ino)
+                        position.offset = 0
+                        partial_line = b''
+                    file_modified_time = time.time()
+                continue
+            position.offset += len(block)
+            file_modified_time = time.time()
+            last_line_feed = block.rfind(b'\n')
+            if last_line_feed < 0:
+                partial_line += block
+                continue
+            lines = block[:last_line_feed].split(b'\n')
+            if partial_line:
+                lines[0] = partial_line + lines[0]
+            partial_line = block[last_line_feed + 1:]
+            yield from lines
+    finally:
+        file.close()
+
+
+def follow_lines(filename, from_end=True, poll_interval=1, reopen_after=60, stop_event=None):
+    """
+    Yields the lines appended to a file as strings ending with a line feed, see follow_binary_lines(). Prefer
+    follow_binary_lines() with parse_chunks(), only the Telemetry messages are decoded then.
+    """
+    for line in follow_binary_lines(filename, from_end, poll_interval, reopen_after, stop_event):
+        yield line.decode('utf-8', 'replace') + '\n'
+
+
+def parse_chunks(lines, parser=None, report_filter=None):
+    """
+    Yields a Chunk for each line which is a Telemetry report Rsyslog message, other lines are ignored. Bytes lines,
+    for example from follow_binary_lines() or a file opened in binary mode, are parsed by the faster
+    TelemetryRsyslogParser.parse_chunk_bytes().
+
+    :param lines: iterable of Rsyslog lines, for example an open file or follow_binary_lines()
+    :param parser: TelemetryRsyslogParser to use, a new one by default
+    :param report_filter: ReportFilter, lines of filtered out iDRACs are dropped without being parsed
+    """
+    parser = parser or TelemetryRsyslogParser()
+    for line in lines:
+        if isinstance(line, bytes):
+            chunk = parser.parse_chunk_bytes(line)
+            if chunk is not None and report_filter is not None and not report_filter.accepts_idrac(chunk.idrac_name):
+                report_filter.dropped_lines += 1
+                continue
+        else:
+            if report_filter is not None and not report_filter.accepts_line(line):
+                continue
+            chunk = parser.parse_chunk(line)
+        if chunk is not None:
+            yield chunk
+
+
+def assemble_reports(chunks, max_pending=DEFAULT_MAX_PENDING_REPORTS, report_filter=None):
+    """
+    Yields a RawReport as soon as all chunks of a report arrived, chunks of several iDRACs and reports may be
+    interleaved. The message strings are passed on as they are, they are only joined when the report is decoded.
+
+    :param chunks: iterable of Chunk
+    :param max_pending: Maximum number of incomplete reports kept, the oldest one is dropped to make room
+    :param report_filter: ReportFilter, a report filtered out by its first chunk is dropped and only the number of
+                          its remaining chunks is kept
+    """
+    pending = collections.OrderedDict()
+    # (iDRAC name, index) of dropped reports -> number of chunks still expected
+    dropping = collections.OrderedDict()
+    for chunk in chunks:
+        key = (chunk.idrac_name, chunk.index)
+        if key in dropping:
+            report_filter.dropped_chunks += 1
+            dropping[key] -= 1
+            if not dropping[key]:
+                del dropping[key]
+            continue
+        if report_filter is not None and chunk.chunk_id == 1 and not report_filter.accepts_first_chunk(chunk.message):
+            report_filter.dropped_reports += 1
+            received = pending.pop(key, {})
+            report_filter.dropped_chunks += len(received) + 1
+            remaining = chunk.chunks_count - len(received) - 1
+            if remaining > 0:
+                if len(dropping) >= max_pending:
+                    dropping.popitem(last=False)
+                dropping[key] = remaining
+            continue
+        if chunk.chunks_count <= 1:
+            yield RawReport(chunk.idrac_name, chunk.index, [chunk.message])
+            continue
+        parts = pending.get(key)
+        if parts is None:
+            if len(pending) >= max_pending:
+                (idrac_name, index), dropped = pending.popitem(last=False)
+                logger.warning("Dropping incomplete report with index {} of iDRAC {}, {} chunks received".format(
+                    index, idrac_name, len(dropped)))
+            parts = pending[key] = {}
+        parts[chunk.chunk_id] = chunk.message
+        if len(parts) == chunk.chunks_count:
+            del pending[key]
+            yield RawReport(chunk.idrac_name, chunk.index, [parts[chunk_id] for chunk_id in sorted(parts)])
+
+
+def decode_reports(raw_reports, report_filter=None):
+    """
+    Yields a TelemetryReport for each RawReport, reports which are not valid JSON are logged and skipped
+
+    :param raw_reports: iterable of RawReport
+    :param report_filter: ReportFilter, reports whose Id could not be read from their first chunk are filtered here
+                          and the filtered out MetricIds are removed from the MetricValues
+    """
+    for raw_report in raw_reports:
+        try:
+            report = json.loads("".join(raw_report.chunks))
+        except ValueError as e:
+            logger.error("Unable to decode report with index {} of iDRAC {}: {}".format(raw_report.index,
+                                                                                        raw_report.idrac_name, e))
+            continue
+        if report_filter is not None:
+            if not report_filter.accepts_report(report.get('Id', 'UnknownId')):
+                report_filter.dropped_reports += 1
+                continue
+            report_filter.prune_metrics(report)
+        yield TelemetryReport(raw_report.idrac_name, raw_report.index, report)
+
+
+def report_stream(lines, parser=None, max_pending=DEFAULT_MAX_PENDING_REPORTS, report_filter=None):
+    """
+    Yields the decoded TelemetryReport of Rsyslog lines, composing parse_chunks, assemble_reports and decode_reports
+    """
+    return decode_reports(assemble_reports(parse_chunks(lines, parser, report_filter), max_pending, report_filter),
+                          report_filter)
+
+
+class JsonFileSink(object):
+    """Writes each report to <destination_folder>/<idrac name>/<Id>_<ReportSequence>_<Timestamp>.json"""
+
+    def __init__(self, destination_folder):
+        self.destination_folder = destination_folder
+
+    def write(self, telemetry_report):
+        self.write_telemetry_report_json(telemetry_report.idrac_name, telemetry_report.report, telemetry_report.index)
+
+    def write_telemetry_report_json(self, idrac_name, report, report_index):
+        id = report.get('Id', 'UnknownId')
+        report_folder = os.path.join(self.destination_folder, idrac_name)
+        report_sequence = report.get('ReportSequence', '00000')
+        report_timestamp = report.get('Timestamp', '00000')
+        file_name = str("_".join([id, report_sequence, report_timestamp.replace(":", "-")])) + ".json"
+        if not os.path.exists(report_folder):
+            os.makedirs(report_folder)
+        logger.debug("Saving the Telemetry report {} for iDRAC {}".format(file_name, idrac_name))
+        with open(os.path.join(report_folder, file_name), "w") as file:
+            file.write(json.dumps(report))
+
+    def close(self):
+        pass
+
+
+class TeeSink(object):
+    """Writes each report to several sinks, for example the JSON files and a ForwardingSink"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, telemetry_report):
+        for sink in self.sinks:
+            sink.write(telemetry_report)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def write_reports(reports, sink, close=True):
+    """
+    Writes every report of a stream to a sink, an object with write(report) and close() methods. A report failing to
+    be written is logged and skipped. Returns the number of reports written.
+
+    :param close: close the sink once the stream ends, pass False for a sink shared by several streams
+    """
+    written = 0
+    try:
+        for report in reports:
+            try:
+                sink.write(report)
+                written += 1
+            except Exception as e:
+                logger.exception("Unable to write report with index {} of iDRAC {}: {}".format(report.index,
+                                                                                              report.idrac_name, e))
+    finally:
+        if close:
+            sink.close()
+    return written
+
+
+def find_rsyslog_files(rsyslog_path):
+    """Returns the iDRAC Rsyslog files matching a glob pattern such as '/var/log/**/*.log'"""
+    return [log_file for log_file in glob.glob(rsyslog_path, recursive=True)
+            if 'idrac' in str(log_file).lower() and str(log_file).endswith('.log')]
@@ -0,0 +1,389 @@
+#
+# TelemetryProfiling. Python module with opt-in profiling hooks for the Telemetry report processor and the Redfish
+# calls of the ConfigurationScripts: cProfile windows, tracemalloc snapshot diffs and per stage wall time histograms,
+# triggered at runtime by a signal or a local admin endpoint.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Nothing is measured until a capture is triggered, the hooks then only cost a test of the module level 'active' flag:
+#
+#   kill -USR1 <pid>                                  profile all pipeline threads for 30 seconds
+#   kill -USR2 <pid>                                  write the memory growth since the previous USR2
+#   curl 'http://127.0.0.1:<port>/profile?seconds=10'
+#   curl 'http://127.0.0.1:<port>/memory'
+#   curl 'http://127.0.0.1:<port>/stages'
+#
+# cProfile only sees the thread which enabled it, so each thread running a hook enables its own profiler while a
+# capture is running and the profiles of all threads are merged when it ends.
+#
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger('RsysLogProcessor')
+
+DEFAULT_WINDOW_SECONDS = 30
+DEFAULT_OUTPUT_FOLDER = os.path.join(os.path.expanduser('~'), '.idrac_telemetry', 'profiles')
+# Seconds the end of a capture waits for the threads to hand in their profile, the profiles of idle threads are then
+# taken while still enabled
+THREAD_GRACE_SECONDS = 2
+TRACEMALLOC_FRAMES = 10
+TOP_ENTRIES = 40
+# Histogram buckets are powers of two microseconds, bucket n counts the durations below 2 ** n microseconds
+HISTOGRAM_BUCKETS = 32
+
+settings = {'output_folder': DEFAULT_OUTPUT_FOLDER, 'window_seconds': DEFAULT_WINDOW_SECONDS}
+
+# True while a capture runs or a thread still has a profiler enabled, the only value read by idle hooks
+active = False
+capturing = False
+_capture_lock = threading.Lock()
+_capture = None
+_local = threading.local()
+_stages = {}
+_stages_lock = threading.Lock()
+_memory_baseline = None
+_END = object()
+
+
+class StageHistogram(object):
+    """Count, total, maximum and log2 histogram of the wall time of a stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def as_dict(self):
+        return {'count': self.count, 'total_seconds': round(self.total, 6), 'max_seconds': round(self.maximum, 6),
+                'mean_seconds': round(self.total / self.count, 9) if self.count else 0,
+                'histogram_us': {'<{}'.format(2 ** index): count for index, count in enumerate(self.buckets)
+                                 if count}}
+
+
+class Capture(object):
+    """A cProfile window, the profilers of the threads which ran a hook while it was open"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = time.time()
+        self.profilers = []
+        # profiler -> thread of the profilers not handed in yet
+        self.threads = {}
+        self.enabled_profilers = 0
+        self.finished = threading.Event()
+        self.threads_done = threading.Event()
+        self.report = None
+
+    def hand_in(self, profiler, enabled=False):
+        """
+        Adds a profiler, disabled unless enabled is True, called with _capture_lock held. A profiler already taken
+        while enabled is only counted as disabled.
+        """
+        if profiler in self.threads:
+            del self.threads[profiler]
+            self.profilers.append(profiler)
+            if not self.threads:
+                self.threads_done.set()
+        if not enabled:
+            self.enabled_profilers -= 1
+
+    def collect_finished_threads(self):
+        """Adds the profilers of the threads which ended without handing them in, called with _capture_lock held"""
+        for profiler, thread in list(self.threads.items()):
+            if not thread.is_alive():
+                self.hand_in(profiler)
+
+    def collect_idle_threads(self):
+        """
+        Adds the profilers of the threads which ran no hook since the end of the capture, called with _capture_lock
+        held. They stay enabled until their thread runs a hook again, returns their number.
+        """
+        idle = len(self.threads)
+        for profiler in list(self.threads):
+            self.hand_in(profiler, enabled=True)
+        return idle
+
+
+def record(stage, seconds):
+    """Adds a wall time measure to the histogram of a stage"""
+    histogram = _stages.get(stage)
+    if histogram is None:
+        with _stages_lock:
+            histogram = _stages.setdefault(stage, StageHistogram())
+    histogram.add(seconds)
+
+
+def stage_histograms(reset=False):
+    """Returns the histograms of every stage measured during captures, as a dict"""
+    global _stages
+    with _stages_lock:
+        stages = _stages
+        if reset:
+            _stages = {}
+    return {stage: histogram.as_dict() for stage, histogram in sorted(stages.items())}
+
+
+def _update_thread_profiler():
+    """Enables the profiler of the calling thread during a capture and hands it in once the capture ended"""
+    global active
+    profiler_capture = getattr(_local, 'capture', None)
+    if capturing and profiler_capture is None:
+        with _capture_lock:
+            if _capture is not None:
+                _local.profiler = cProfile.Profile()
+                _local.capture = _capture
+                _capture.enabled_profilers += 1
+                _capture.threads[_local.profiler] = threading.current_thread()
+                _local.profiler.enable()
+    elif profiler_capture is not None and (not capturing or profiler_capture is not _capture):
+        _local.profiler.disable()
+        with _capture_lock:
+            profiler_capture.hand_in(_local.profiler)
+            if not profiler_capture.enabled_profilers:
+                active = capturing
+        _local.profiler = _local.capture = None
+
+
+def profile_stage(stage, iterable):
+    """
+    Pipeline stage passing every item of iterable through, the time spent producing each item is recorded under the
+    stage name during captures. The time of the profiled stages upstream is not counted, only the stage's own time.
+    """
+    iterator = iter(iterable)
+    while True:
+        if not active:
+            item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+            continue
+        _update_thread_profiler()
+        outer = getattr(_local, 'inner', 0.0)
+        _local.inner = 0.0
+        start = time.perf_counter()
+        item = next(iterator, _END)
+        elapsed = time.perf_counter() - start
+        if capturing:
+            record(stage, elapsed - _local.inner)
+        _local.inner = outer + elapsed
+        if item is _END:
+            return
+        yield item
+
+
+class timed(object):
+    """Context manager recording the wall time of its block under a stage name during captures"""
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        if active:
+            _update_thread_profiler()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None and capturing:
+            record(self.stage, time.perf_counter() - self.start)
+
+
+class ProfiledSink(object):
+    """Sink wrapper recording the time of each write() under the 'write' stage during captures"""
+
+    def __init__(self, sink, stage='write'):
+        self.sink = sink
+        self.stage = stage
+
+    def write(self, telemetry_report):
+        if not active:
+            return self.sink.write(telemetry_report)
+        with timed(self.stage):
+            return self.sink.write(telemetry_report)
+
+    def close(self):
+        self.sink.close()
+
+
+def _output_file(prefix, extension):
+    os.makedirs(settings['output_folder'], exist_ok=True)
+    return os.path.join(settings['output_folder'], '{}_{}_{}.{}'.format(
+        prefix, datetime.now().strftime('%Y-%m-%d_%H-%M-%S'), os.getpid(), extension))
+
+
+def _finish_capture(capture):
+    global capturing, active, _capture
+    time.sleep(capture.seconds)
+    with _capture_lock:
+        capturing = False
+        _capture = None
+        capture.collect_finished_threads()
+        active = capture.enabled_profilers > 0
+        waiting = bool(capture.threads)
+    if waiting:
+        capture.threads_done.wait(THREAD_GRACE_SECONDS)
+    with _capture_lock:
+        capture.collect_finished_threads()
+        # active stays set until the idle threads run a hook and disable their profiler
+        idle = capture.collect_idle_threads()
+        if not capture.enabled_profilers:
+            active = capturing
+        profilers = list(capture.profilers)
+    report = io.StringIO()
+    report.write("Profile of {} threads over {}s{}\n".format(
+        len(profilers), capture.seconds, ', {} of them idle at the end'.format(idle) if idle else ''))
+    if profilers:
+        stats = pstats.Stats(*profilers, stream=report)
+        profile_file = _output_file('profile', 'pstats')
+        stats.dump_stats(profile_file)
+        report.write("Full profile written to {}, open it with python -m pstats\n".format(profile_file))
+        stats.sort_stats('cumulative').print_stats(TOP_ENTRIES)
+    report.write("Stages:\n{}\n".format(json.dumps(stage_histograms(reset=True), indent=2)))
+    capture.report = report.getvalue()
+    report_file = _output_file('profile', 'txt')
+    with open(report_file, 'w') as file:
+        file.write(capture.report)
+    logger.info("Profile capture finished, report written to %s", report_file)
+    capture.finished.set()
+
+
+def start_capture(seconds=None):
+    """Starts a cProfile and stage timer window of seconds, returns its Capture or None if one is already running"""
+    global capturing, active, _capture
+    with _capture_lock:
+        if capturing:
+            return None
+        _capture = Capture(seconds or settings['window_seconds'])
+        capturing = active = True
+    logger.info("Profiling the threads running the hooks for %ss", _capture.seconds)
+    threading.Thread(target=_finish_capture, args=(_capture,), name='profile-capture', daemon=True).start()
+    return _capture
+
+
+def memory_diff():
+    """
+    Returns the allocations which grew the most since the previous call as text. The first call starts tracemalloc,
+    which slows down allocations until stop_memory_tracing() is called.
+    """
+    global _memory_baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        _memory_baseline = tracemalloc.take_snapshot()
+        return "tracemalloc started, the next snapshot is compared to this one\n"
+    snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    current, peak = tracemalloc.get_traced_memory()
+    lines = ["Traced memory {:.1f} MB, peak {:.1f} MB, growth since the previous snapshot:".format(
+        current / 1e6, peak / 1e6)]
+    lines += [str(statistic) for statistic in snapshot.compare_to(_memory_baseline, 'lineno')[:TOP_ENTRIES]]
+    _memory_baseline = snapshot
+    return '\n'.join(lines) + '\n'
+
+
+def stop_memory_tracing():
+    global _memory_baseline
+    tracemalloc.stop()
+    _memory_baseline = None
+
+
+def _write_memory_diff():
+    memory_file = _output_file('memory', 'txt')
+    with open(memory_file, 'w') as file:
+        file.write(memory_diff())
+    logger.info("Memory snapshot written to %s", memory_file)
+
+
+class AdminRequestHandler(BaseHTTPRequestHandler):
+    """GET /profile?seconds=N, /memory, /memory?stop=1 and /stages?reset=1 of the admin endpoint"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path == '/profile':
+            capture = start_capture(float(query['seconds']) if 'seconds' in query else None)
+            if capture is None:
+                return self._reply(409, "A capture is already running\n")
+            capture.finished.wait(capture.seconds + THREAD_GRACE_SECONDS + 30)
+            return self._reply(200, capture.report or "The capture did not finish\n")
+        if url.path == '/memory':
+            if query.get('stop'):
+                stop_memory_tracing()
+                return self._reply(200, "tracemalloc stopped\n")
+            return self._reply(200, memory_diff())
+        if url.path == '/stages':
+            return self._reply(200, json.dumps(stage_histograms(reset=bool(query.get('reset'))), indent=2) + '\n')
+        self._reply(404, "Use /profile?seconds=N, /memory or /stages\n")
+
+    def _reply(self, status, text):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Profiling endpoint: " + format, *args)
+
+
+class AdminServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def enable(output_folder=None, window_seconds=None, signals=True, port=None):
+    """
+    Installs the triggers. With signals, SIGUSR1 starts a capture and SIGUSR2 writes a memory diff, both to
+    output_folder. With port, the admin endpoint listens on 127.0.0.1:port. Must be called from the main thread when
+    signals is True.
+
+    :param output_folder: folder of the profile and memory files, default is ~/.idrac_telemetry/profiles
+    :param window_seconds: length of the captures started by a signal, default is 30
+    """
+    settings.update({name: value for name, value in (('output_folder', output_folder),
+                                                     ('window_seconds', window_seconds)) if value is not None})
+    if signals and hasattr(signal, 'SIGUSR1'):
+        # The handlers run between two bytecodes of the main thread, which may hold _capture_lock at that point, the
+        # capture is started and the snapshot is taken on another thread
+        signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(target=start_capture,
+                                                                             daemon=True).start())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(target=_write_memory_diff,
+                                                                             daemon=True).start())
+        logger.info("Profiling hooks enabled, kill -USR1 %s to profile for %ss, kill -USR2 %s for a memory diff",
+                    os.getpid(), settings['window_seconds'], os.getpid())
+    if port:
+        server = AdminServer(('127.0.0.1', port), AdminRequestHandler)
+        threading.Thread(target=server.serve_forever, name='profiling-endpoint', daemon=True).start()
+        logger.info("Profiling endpoint listening on http://127.0.0.1:%s/profile?seconds=N, /memory and /stages",
+                    port)
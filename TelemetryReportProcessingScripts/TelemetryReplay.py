@@ -0,0 +1,698 @@
+#
+# TelemetryReplay.py Python script to capture Telemetry traffic with its timing and replay it faster than real time,
+# optionally multiplied to many simulated iDRACs, against a Telemetry receiver to size it.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# A capture is a JSON lines file, gzip compressed when its name ends with .gz, with one record per line:
+#
+#   {"t": 12.5, "line": "2022-04-20T10:11:12.123-05:00 10.0.0.1 idrac-1: #Telemetry#:3-2-1: {..."}
+#   {"t": 12.5, "iDRAC": "idrac-1", "Report": {"Id": "PowerMetrics", ...}}
+#
+# t is the number of seconds since the first record. Raw Rsyslog lines are replayed as they were captured, reports
+# are sent as Rsyslog lines, syslog messages, HTTP POST or SSE events depending on the target.
+#
+import argparse
+import collections
+import gzip
+import heapq
+import http.client
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import ssl
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+from TelemetryPipeline import TelemetryRsyslogParser, follow_binary_lines, report_stream
+
+logger = logging.getLogger('RsysLogProcessor')
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_SPREAD_SECONDS = 1.0
+DEFAULT_NAME_FORMAT = '{name}-{copy:04d}'
+DEFAULT_HTTP_WORKERS = 16
+DEFAULT_QUEUE_SIZE = 10000
+# Latencies kept to compute the HTTP percentiles
+LATENCY_SAMPLES = 100000
+
+
+def open_capture(file_name, mode):
+    return gzip.open(file_name, mode + 't') if file_name.endswith('.gz') else open(file_name, mode)
+
+
+def line_time(line):
+    """Returns the epoch time of the timestamp starting a Rsyslog line, None if there is none"""
+    try:
+        return datetime.fromisoformat(line.split(' ', 1)[0].replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def now_timestamp():
+    return datetime.now().astimezone().isoformat(timespec='milliseconds')
+
+
+def capture(source, capture_file, reports=False, from_start=False, duration=None, stop_event=None):
+    """
+    Writes the Telemetry traffic of a Rsyslog file to a capture file, returns the number of records
+
+    :param source: Rsyslog file, followed like tail -F
+    :param reports: capture the reconstructed reports instead of the raw Rsyslog lines
+    :param from_start: capture the lines already in the file, timed by their own timestamps, instead of the lines
+                       appended during duration seconds timed by their arrival
+    """
+    stop_event = stop_event or threading.Event()
+    lines = follow_binary_lines(source, from_end=not from_start, poll_interval=0.2, stop_event=stop_event)
+    if from_start:
+        lines = _until_end_of_file(source, lines)
+    if duration:
+        timer = threading.Timer(duration, stop_event.set)
+        timer.daemon = True
+        timer.start()
+    first_time = None
+    count = 0
+    with open_capture(capture_file, 'w') as file:
+        if reports:
+            records = ({'iDRAC': telemetry_report.idrac_name, 'Report': telemetry_report.report}
+                       for telemetry_report in report_stream(lines, TelemetryRsyslogParser()))
+        else:
+            records = ({'line': line.decode('utf-8', 'replace')} for line in lines if b'#:' in line)
+        for record in records:
+            if from_start:
+                record_time = (line_time(record['line']) if 'line' in record else
+                               _report_time(record['Report'])) or first_time or 0.0
+            else:
+                record_time = time.monotonic()
+            first_time = record_time if first_time is None else first_time
+            record['t'] = round(max(0.0, record_time - first_time), 6)
+            file.write(json.dumps(record) + '\n')
+            count += 1
+    return count
+
+
+def _until_end_of_file(source, lines):
+    """Stops the lines of a followed file once the size it had at the start was read"""
+    remaining = os.stat(source).st_size
+    for line in lines:
+        yield line
+        remaining -= len(line) + 1
+        if remaining <= 0:
+            return
+
+
+def _report_time(report):
+    try:
+        return datetime.fromisoformat(report.get('Timestamp', '').replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def load_capture(capture_file):
+    """Returns the records of a capture ordered by time"""
+    with open_capture(capture_file, 'r') as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    records.sort(key=lambda record: record['t'])
+    return records
+
+
+class Copy(object):
+    """Names of one simulated iDRAC replaying the captured traffic of an iDRAC"""
+    __slots__ = ('idrac_name', 'host_name', 'index')
+
+    def __init__(self, idrac_name, host_name):
+        self.idrac_name = idrac_name
+        self.host_name = host_name
+        self.index = 0
+
+
+class PreparedRecord(object):
+    """A record ready to send, serialized once for all its copies"""
+    __slots__ = ('line_fields', 'idrac_name', 'report_id', 'payload', 'chunks')
+
+    def __init__(self):
+        self.line_fields = self.idrac_name = self.report_id = self.payload = self.chunks = None
+
+
+class FileTarget(object):
+    """Appends Rsyslog lines to a file, for example the file followed by TelemetryRsysLogProcessor.py"""
+    accepts_lines = True
+
+    def __init__(self, file_name, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.file = open(file_name, 'ab', buffering=1024 * 1024)
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+
+    def send_line(self, line, copy):
+        data = (line + '\n').encode('utf-8')
+        self.file.write(data)
+        self.bytes_sent += len(data)
+
+    def send_report(self, prepared, copy):
+        copy.index = (copy.index + 1) % 1000
+        for chunk_id, chunk in enumerate(prepared.chunks, 1):
+            self.send_line('{} {} {}: #Telemetry#:{}-{}-{}: {}'.format(
+                now_timestamp(), copy.host_name, copy.idrac_name, copy.index, len(prepared.chunks), chunk_id, chunk),
+                copy)
+
+    def flush(self):
+        self.file.flush()
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        self.file.close()
+
+
+class SyslogTarget(FileTarget):
+    """Sends each Rsyslog line as a syslog message over UDP or TCP, TCP messages are separated by line feeds"""
+
+    def __init__(self, url, chunk_size=DEFAULT_CHUNK_SIZE):
+        address = urlsplit(url)
+        self.protocol = address.scheme
+        family = socket.SOCK_STREAM if self.protocol == 'tcp' else socket.SOCK_DGRAM
+        self.socket = socket.socket(socket.AF_INET, family)
+        self.address = (address.hostname, address.port or 514)
+        if self.protocol == 'tcp':
+            self.socket.connect(self.address)
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+        self.errors = 0
+        self.buffer = []
+
+    def send_line(self, line, copy):
+        # Facility local use 0, severity informational
+        data = ('<134>' + line).encode('utf-8')
+        self.bytes_sent += len(data)
+        if self.protocol == 'tcp':
+            self.buffer.append(data + b'\n')
+            if len(self.buffer) >= 64:
+                self.flush()
+            return
+        try:
+            self.socket.sendto(data, self.address)
+        except OSError:
+            self.errors += 1
+
+    def flush(self):
+        if self.buffer:
+            try:
+                self.socket.sendall(b''.join(self.buffer))
+            except OSError:
+                self.errors += len(self.buffer)
+            self.buffer = []
+
+    def stats(self):
+        return {'errors': self.errors}
+
+    def close(self):
+        self.flush()
+        self.socket.close()
+
+
+class HttpTarget(object):
+    """
+    POSTs each report to a URL like an iDRAC delivers a subscription event, from worker threads keeping their
+    connection open. The iDRAC name is sent in the X-Replay-iDRAC header.
+    """
+    accepts_lines = False
+
+    def __init__(self, url, workers=DEFAULT_HTTP_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, timeout=30):
+        self.url = urlsplit(url)
+        self.timeout = timeout
+        self.queue = queue.Queue(queue_size)
+        self.bytes_sent = 0
+        self.responses = collections.Counter()
+        self.errors = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def _connect(self):
+        if self.url.scheme == 'https':
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            return http.client.HTTPSConnection(self.url.hostname, self.url.port or 443, timeout=self.timeout,
+                                               context=context)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+
+    def _work(self):
+        connection = self._connect()
+        path = self.url.path or '/'
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            payload, idrac_name = item
+            start = time.monotonic()
+            try:
+                connection.request('POST', path, body=payload, headers={'Content-Type': 'application/json',
+                                                                       'X-Replay-iDRAC': idrac_name})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = self._connect()
+                status = None
+            latency = time.monotonic() - start
+            with self._lock:
+                if status is None:
+                    self.errors += 1
+                else:
+                    self.responses[status] += 1
+                    self.latencies.append(latency)
+        connection.close()
+
+    def send_report(self, prepared, copy):
+        # Blocks when the workers fall behind, the replay schedule lag then shows the receiver is too slow
+        self.queue.put((prepared.payload, copy.idrac_name))
+        self.bytes_sent += len(prepared.payload)
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            self.latencies.clear()
+            responses = dict(self.responses)
+        stats = {'queued': self.queue.qsize(), 'errors': self.errors, 'responses': responses}
+        if latencies:
+            stats['p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 1)
+            stats['p99_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1)
+        return stats
+
+    def close(self):
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+
+class SseClient(object):
+    __slots__ = ('idrac_name', 'queue', 'dropped')
+
+    def __init__(self, idrac_name, queue_size):
+        self.idrac_name = idrac_name
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+
+
+class SseRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.endswith('/SSE'):
+            self.send_error(404)
+            return
+        client = SseClient(parse_qs(url.query).get('idrac', [None])[0], self.server.queue_size)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.server.target.add_client(client)
+        try:
+            while True:
+                event = client.queue.get()
+                if event is None:
+                    break
+                self.wfile.write(event)
+        except OSError:
+            pass
+        finally:
+            self.server.target.remove_client(client)
+
+    def log_message(self, format, *args):
+        logger.debug("SSE target: " + format, *args)
+
+
+class SseServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SseTarget(object):
+    """
+    Serves the reports as a Redfish SSE stream on http://<address>:<port>/redfish/v1/SSE, all simulated iDRACs are
+    sent to every client unless it asks for one with ?idrac=<name>. Events are dropped for clients which do not keep up.
+    """
+    accepts_lines = False
+
+    def __init__(self, address, port, queue_size=DEFAULT_QUEUE_SIZE):
+        self.server = SseServer((address, port), SseRequestHandler)
+        self.server.target = self
+        self.server.queue_size = queue_size
+        self.clients = []
+        self.bytes_sent = 0
+        self.sequence = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info("SSE target listening on http://%s:%s/redfish/v1/SSE", address, port)
+
+    def add_client(self, client):
+        with self._lock:
+            self.clients = self.clients + [client]
+
+    def remove_client(self, client):
+        with self._lock:
+            self.clients = [other for other in self.clients if other is not client]
+            self.dropped += client.dropped
+
+    def send_report(self, prepared, copy):
+        self.sequence += 1
+        event = b'id: %d\ndata: ' % self.sequence + prepared.payload + b'\n\n'
+        for client in self.clients:
+            if client.idrac_name not in (None, copy.idrac_name):
+                continue
+            try:
+                client.queue.put_nowait(event)
+                self.bytes_sent += len(event)
+            except queue.Full:
+                client.dropped += 1
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        clients = self.clients
+        return {'clients': len(clients), 'queued': sum(client.queue.qsize() for client in clients),
+                'dropped': self.dropped + sum(client.dropped for client in clients)}
+
+    def close(self):
+        for client in self.clients:
+            client.queue.put(None)
+        self.server.shutdown()
+
+
+def create_target(target, chunk_size=DEFAULT_CHUNK_SIZE, http_workers=DEFAULT_HTTP_WORKERS):
+    """
+    Returns the target of a --target argument:
+    file:/var/log/replay/idrac.log, udp://127.0.0.1:514, tcp://127.0.0.1:514, http(s)://host:port/path or
+    sse://0.0.0.0:8443
+    """
+    scheme = urlsplit(target).scheme
+    if scheme == 'file':
+        return FileTarget(target[len('file:'):], chunk_size)
+    if scheme in ('udp', 'tcp'):
+        return SyslogTarget(target, chunk_size)
+    if scheme in ('http', 'https'):
+        return HttpTarget(target, workers=http_workers)
+    if scheme == 'sse':
+        address = urlsplit(target)
+        return SseTarget(address.hostname or '127.0.0.1', address.port or 8443)
+    raise ValueError("unsupported target %s, use file:, udp://, tcp://, http(s):// or sse://" % target)
+
+
+class Replayer(object):
+    """
+    Replays the records of a capture against a target. Each captured iDRAC is replayed fanout times under the names
+    given by name_format, the copies of a record are spread over spread seconds of capture time so they do not all
+    send at the same instant.
+
+    :param speed: speed multiplier, 10 replays 10 minutes of capture in 1 minute
+    :param rewrite_timestamps: set the report and metric Timestamps to the time they are sent, so the receiver lag can
+                               be measured from the Timestamps the receiver sees
+    """
+
+    def __init__(self, records, target, speed=1.0, fanout=1, name_format=DEFAULT_NAME_FORMAT,
+                 spread=DEFAULT_SPREAD_SECONDS, chunk_size=DEFAULT_CHUNK_SIZE, rewrite_timestamps=True):
+        self.records = records
+        self.target = target
+        self.speed = speed
+        self.fanout = fanout
+        self.name_format = name_format if fanout > 1 else '{name}'
+        self.spread = spread if fanout > 1 else 0.0
+        self.chunk_size = chunk_size
+        self.rewrite_timestamps = rewrite_timestamps
+        self.copies = {}
+        self.sent_records = 0
+        self.sent_reports = 0
+        self.schedule_lag = 0.0
+        self.max_schedule_lag = 0.0
+        self.last_report_sent = None
+        self.stop_event = threading.Event()
+        if records and not target.accepts_lines and 'line' in records[0]:
+            raise ValueError("HTTP and SSE targets replay reports, capture the reports with --reports")
+        self.sequence_stride = 1 + max([int(record['Report'].get('ReportSequence', 0) or 0)
+                                        for record in records if 'Report' in record] or [0])
+
+    def copies_of(self, idrac_name, host_name):
+        key = (idrac_name, host_name)
+        copies = self.copies.get(key)
+        if copies is None:
+            copies = self.copies[key] = [
+                Copy(self.name_format.format(name=idrac_name, copy=copy), self.name_format.format(name=host_name,
+                                                                                               copy=copy))
+                for copy in range(self.fanout)]
+        return copies
+
+    def prepare(self, record, loop):
+        prepared = PreparedRecord()
+        if 'line' in record:
+            fields = record['line'].split(' ', 3)
+            if len(fields) < 4:
+                return None
+            prepared.line_fields = fields
+            prepared.idrac_name = fields[2].rstrip(':')
+            return prepared
+        report = record['Report']
+        if self.rewrite_timestamps:
+            report = dict(report)
+            timestamp = now_timestamp()
+            report['Timestamp'] = timestamp
+            report['MetricValues'] = [dict(metric_value, Timestamp=timestamp)
+                                      for metric_value in report.get('MetricValues') or ()]
+            if loop and str(report.get('ReportSequence', '')).isdigit():
+                report['ReportSequence'] = str(int(report['ReportSequence']) + loop * self.sequence_stride)
+        text = json.dumps(report)
+        prepared.idrac_name = record['iDRAC']
+        prepared.report_id = report.get('Id')
+        prepared.payload = text.encode('utf-8')
+        prepared.chunks = [text[start:start + self.chunk_size] for start in range(0, len(text), self.chunk_size)]
+        return prepared
+
+    def send(self, prepared, copy):
+        if prepared.line_fields is not None:
+            time_stamp, _, _, message = prepared.line_fields
+            if self.rewrite_timestamps:
+                time_stamp = now_timestamp()
+            self.target.send_line('{} {} {}: {}'.format(time_stamp, copy.host_name, copy.idrac_name, message), copy)
+        else:
+            self.target.send_report(prepared, copy)
+            self.sent_reports += 1
+            self.last_report_sent = time.time()
+        self.sent_records += 1
+
+    def run(self, loops=1):
+        """Replays the capture loops times, returns when done or stop() was called"""
+        if not self.records:
+            return
+        duration = self.records[-1]['t'] + (self.records[-1]['t'] / max(1, len(self.records) - 1))
+        copy_interval = self.spread / self.fanout / self.speed
+        start = time.monotonic()
+        # (due time, order, copy number, prepared record, copies) of the records being sent, next copy first
+        pending = []
+        order = 0
+        position = 0
+        total = len(self.records) * loops
+        while (position < total or pending) and not self.stop_event.is_set():
+            now = time.monotonic() - start
+            while position < total:
+                loop, index = divmod(position, len(self.records))
+                record = self.records[index]
+                due = (loop * duration + record['t']) / self.speed
+                if due > now:
+                    break
+                prepared = self.prepare(record, loop)
+                position += 1
+                if prepared is None:
+                    continue
+                host_name = prepared.line_fields[1] if prepared.line_fields else prepared.idrac_name
+                heapq.heappush(pending, (due, order, 0, prepared, self.copies_of(prepared.idrac_name, host_name)))
+                order += 1
+            while pending and pending[0][0] <= now:
+                due, record_order, copy, prepared, copies = heapq.heappop(pending)
+                self.send(prepared, copies[copy])
+                self.schedule_lag = now - due
+                self.max_schedule_lag = max(self.max_schedule_lag, self.schedule_lag)
+                if copy + 1 < len(copies):
+                    heapq.heappush(pending, (due + copy_interval, record_order, copy + 1, prepared, copies))
+            self.target.flush()
+            next_due = pending[0][0] if pending else None
+            if position < total:
+                loop, index = divmod(position, len(self.records))
+                record_due = (loop * duration + self.records[index]['t']) / self.speed
+                next_due = record_due if next_due is None else min(next_due, record_due)
+            if next_due is not None:
+                delay = next_due - (time.monotonic() - start)
+                if delay > 0:
+                    self.stop_event.wait(min(delay, 0.1))
+        self.target.flush()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def receiver_lag(reader, replayer):
+    """
+    Seconds between the last report sent and the newest value the receiver published in its latest values table,
+    None before the receiver published anything
+    """
+    if replayer.last_report_sent is None:
+        return None
+    # NaN timestamps, of values without a valid Timestamp, are not equal to themselves
+    newest = max((values[1] for values in reader.snapshot().values() if values is not None and
+                  values[1] == values[1]), default=None)
+    return None if newest is None else max(0.0, replayer.last_report_sent - newest)
+
+
+def report_progress(replayer, interval, latest_values=None, summary=None):
+    """Logs the achieved send rate, the schedule lag and the target statistics every interval seconds"""
+    reader = None
+    previous_records, previous_bytes, previous_time = 0, 0, time.monotonic()
+    while not replayer.stop_event.wait(interval):
+        now = time.monotonic()
+        records, bytes_sent = replayer.sent_records, replayer.target.bytes_sent
+        elapsed = now - previous_time
+        progress = {'records_per_second': round((records - previous_records) / elapsed, 1),
+                    'megabytes_per_second': round((bytes_sent - previous_bytes) / elapsed / 1e6, 2),
+                    'sent_records': records, 'schedule_lag_seconds': round(replayer.schedule_lag, 3)}
+        progress.update(replayer.target.stats())
+        if latest_values:
+            try:
+                from TelemetryLatestValues import LatestValuesReader
+                reader = reader or LatestValuesReader(latest_values)
+                lag = receiver_lag(reader, replayer)
+                progress['receiver_lag_seconds'] = None if lag is None else round(lag, 3)
+            except (OSError, ValueError) as e:
+                progress['receiver_lag_seconds'] = 'unavailable: %s' % e
+        logger.info(' '.join('{}={}'.format(name, value) for name, value in progress.items()))
+        if summary is not None:
+            summary.append(progress)
+        previous_records, previous_bytes, previous_time = records, bytes_sent, now
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Python script to capture Telemetry traffic with its timing and "
+                                                 "replay it at a speed multiplier, optionally fanned out to many "
+                                                 "simulated iDRACs, against a Telemetry receiver.")
+    parser.add_argument('script_examples', action="store_true",
+                        help="'python TelemetryReplay.py --capture capture.jsonl.gz -s /var/log/idrac.log --duration "
+                             "600' captures the Rsyslog lines appended in the next 10 minutes. "
+                             "'python TelemetryReplay.py --replay capture.jsonl.gz --target "
+                             "file:/var/log/replay/idrac-replay.log --speed 10 --fanout 2000' replays them 10 times "
+                             "faster for 2000 iDRACs per captured iDRAC into a file followed by "
+                             "TelemetryRsysLogProcessor.py -s '/var/log/replay/*.log'.")
+    parser.add_argument('--capture', help='Capture file to write, .gz to compress it', required=False)
+    parser.add_argument('-s', help='Rsyslog file to capture', required=False)
+    parser.add_argument('--reports', help='Capture the reconstructed reports instead of the raw Rsyslog lines, '
+                        'required for the HTTP and SSE targets', action='store_true', required=False)
+    parser.add_argument('--from-start', help='Capture the lines already in the Rsyslog file, timed by their own '
+                        'timestamps, instead of the lines appended while capturing', action='store_true',
+                        required=False)
+    parser.add_argument('--duration', help='Seconds to capture, default is until the script is stopped', type=float,
+                        required=False)
+    parser.add_argument('--replay', help='Capture file to replay', required=False)
+    parser.add_argument('--target', help='file:<path>, udp://host:port, tcp://host:port, http(s)://host:port/path or '
+                        'sse://address:port', required=False)
+    parser.add_argument('--speed', help='Speed multiplier, default is 1', type=float, default=1.0, required=False)
+    parser.add_argument('--fanout', help='Simulated iDRACs per captured iDRAC, default is 1', type=int, default=1,
+                        required=False)
+    parser.add_argument('--name-format', help='Names of the simulated iDRACs, default is %s' % DEFAULT_NAME_FORMAT,
+                        default=DEFAULT_NAME_FORMAT, required=False)
+    parser.add_argument('--spread', help='Capture seconds over which the copies of a record are sent, default is %s'
+                        % DEFAULT_SPREAD_SECONDS, type=float, default=DEFAULT_SPREAD_SECONDS, required=False)
+    parser.add_argument('--loops', help='Number of times the capture is replayed, default is 1', type=int, default=1,
+                        required=False)
+    parser.add_argument('--keep-timestamps', help='Keep the captured timestamps instead of the time of sending',
+                        action='store_true', required=False)
+    parser.add_argument('--chunk-size', help='Characters of a report per Rsyslog line, default is %s' %
+                        DEFAULT_CHUNK_SIZE, type=int, default=DEFAULT_CHUNK_SIZE, required=False)
+    parser.add_argument('--http-workers', help='Concurrent HTTP connections, default is %s' % DEFAULT_HTTP_WORKERS,
+                        type=int, default=DEFAULT_HTTP_WORKERS, required=False)
+    parser.add_argument('--latest-values', help='Latest values table published by the receiver with '
+                        'TelemetryRsysLogProcessor.py --latest-values, used to report the receiver lag',
+                        required=False)
+    parser.add_argument('--report-interval', help='Seconds between two progress lines, default is 5', type=float,
+                        default=5, required=False)
+    parser.add_argument('--summary-file', help='Write the progress measures to this JSON file', required=False)
+    args = vars(parser.parse_args())
+    if bool(args["capture"]) == bool(args["replay"]):
+        parser.error("pass either --capture or --replay")
+    if args["capture"] and not args["s"]:
+        parser.error("--capture requires -s")
+    if args["replay"] and not args["target"]:
+        parser.error("--replay requires --target")
+    return args
+
+
+def run_replay(args):
+    records = load_capture(args["replay"])
+    target = create_target(args["target"], args["chunk_size"], args["http_workers"])
+    replayer = Replayer(records, target, speed=args["speed"], fanout=args["fanout"], name_format=args["name_format"],
+                        spread=args["spread"], chunk_size=args["chunk_size"],
+                        rewrite_timestamps=not args["keep_timestamps"])
+    idracs = len({record.get('iDRAC') or record['line'].split(' ', 3)[2] for record in records})
+    logger.info("Replaying %d records of %d iDRACs %d times at %sx for %d simulated iDRACs", len(records), idracs,
+                args["loops"], args["speed"], idracs * args["fanout"])
+    summary = []
+    reporter = threading.Thread(target=report_progress, daemon=True,
+                                args=(replayer, args["report_interval"], args["latest_values"], summary))
+    reporter.start()
+    signal.signal(signal.SIGINT, lambda signum, frame: replayer.stop())
+    started = time.monotonic()
+    replayer.run(args["loops"])
+    elapsed = time.monotonic() - started
+    target.close()
+    replayer.stop()
+    result = {'records': replayer.sent_records, 'reports': replayer.sent_reports, 'seconds': round(elapsed, 3),
+              'records_per_second': round(replayer.sent_records / elapsed, 1) if elapsed else 0,
+              'megabytes': round(target.bytes_sent / 1e6, 2),
+              'max_schedule_lag_seconds': round(replayer.max_schedule_lag, 3), 'target': target.stats(),
+              'progress': summary}
+    logger.info("Sent %(records)d records (%(reports)d reports, %(megabytes)s MB) in %(seconds)ss, "
+                "%(records_per_second)s records/s, maximum schedule lag %(max_schedule_lag_seconds)ss" % result)
+    if args["summary_file"]:
+        with open(args["summary_file"], 'w') as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s', stream=sys.stdout)
+    args = parse_arguments()
+    if args["capture"]:
+        stop_event = threading.Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+        logger.info("Capturing %s from %s", 'reports' if args["reports"] else 'Rsyslog lines', args["s"])
+        count = capture(args["s"], args["capture"], reports=args["reports"], from_start=args["from_start"],
+                        duration=args["duration"], stop_event=stop_event)
+        logger.info("Captured %d records to %s", count, args["capture"])
+    else:
+        try:
+            run_replay(args)
+        except (OSError, ValueError) as e:
+            logger.error("Replay failed: %s" % e)
+            sys.exit(1)
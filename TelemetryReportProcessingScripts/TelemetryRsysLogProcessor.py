@@ -16,8 +16,6 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 #
 import argparse
-import glob
-import json
 import logging
 import os
 import sys
@@ -25,144 +23,372 @@ import threading
 import time
 from datetime import datetime
 from logging import handlers
-from pyparsing import *
-
-parser = argparse.ArgumentParser(description="Python script to reconstruct the Telemetry reports from Rsyslogfiles.")
-parser.add_argument('-s', help='Folder path to Rsyslog files. Example \'/var/log/**/*.log\'', required=True)
-parser.add_argument('-d', help='Destination folder where the JSON reports files to be saved.', default=os.getcwd(),
-                    required=False)
-parser.add_argument('script_examples', action="store_true",
-                    help="'python TelemetryRsysLogProcessor.py -s /var/log/**/*.log -d /tmp/Rsyslogs/' to process the Rsyslogfiles "
-                         "'from /var/log/**/ folder and save them under /tmp/Rsyslogs/'. The script will continue to execute and process all new messages.' "
-                         "Kill the scriot to stop processing. The log files will be rotated every day.")
-args = vars(parser.parse_args())
-
-LOG_PATH = os.path.join(os.getcwd(), '{}_{}.txt'.format('MultiThreadRsyslogProcessor_log',
-                                                        (datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))))
-file_handler = logging.handlers.TimedRotatingFileHandler(filename=LOG_PATH, when='d', interval=1, backupCount=0,
-                                                         encoding=None, delay=False, utc=False, atTime=None)
-stdout_handler = logging.StreamHandler(sys.stdout)
-handlers = [file_handler, stdout_handler]
-logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s',
-                    handlers=handlers)  # set logging level to DEBUG to have complete processing logs
+
+import TelemetryProfiling
+from TelemetryCompressedSink import CompressedSink, DEFAULT_BATCH_REPORTS
+from TelemetryDeltaEncoding import DeltaEncoder, DeltaFileSink, delta_encode
+from TelemetryFairScheduler import DEFAULT_HOST_QUEUE_BYTES, DEFAULT_QUANTUM_BYTES, FairScheduler, parse_weights, \
+    schedule_reports
+from TelemetryForwardingSink import DEFAULT_CONNECTIONS, DEFAULT_LINGER_SECONDS, DEFAULT_SPOOL_FOLDER, \
+    ForwardingSink
+from TelemetryGroupAggregation import DEFAULT_BUCKET_SECONDS, DEFAULT_LATENESS_SECONDS, GroupAggregator, \
+    aggregate_groups, read_group_mapping
+from TelemetryLoadShedding import DEFAULT_PRIORITIES, DEFAULT_RECOVER_SECONDS, DEFAULT_SAMPLE_EVERY, \
+    OverloadController, parse_priorities, shed_reports
+from TelemetryLatestValues import DEFAULT_CAPACITY, DEFAULT_TABLE_PATH, LatestValuesTable, publish_latest_values
+from TelemetryPipeline import FilePosition, JsonFileSink, ReportFilter, TeeSink, TelemetryRsyslogParser, \
+    assemble_reports, decode_reports, find_rsyslog_files, follow_binary_lines, parse_chunks, write_reports
+from TelemetryStreamHealth import DEFAULT_MIN_SILENCE_SECONDS, JsonLinesEventWriter, StreamHealthTracker, \
+    log_event, track_health
+
 logger = logging.getLogger('RsysLogProcessor')
 
-rsyslog_path = args["s"]
-destination_folder = args["d"]
-
-
-class TelemetryRsyslogParser(object):
-    def __init__(self):
-        self.__pattern = self.generate_Rsyslog_message_pattern()
-
-    def generate_Rsyslog_message_pattern(self):
-        ints = Word(nums)
-        timestamp = Combine(ints + "-" + ints + "-" + ints + 'T' + ints + ":" + ints + ":" + ints + "." + ints +
-                            "-" + ints + ":" + ints)
-        hostname = Word(alphas + nums + "-" + ".")  # pyparsing_common.ipv4_address
-        appname = Word(alphas + "-" + nums) + Suppress(":")
-        context = Suppress("#") + Word(alphas) + Suppress("#") + Suppress(":") + Word(nums) + "-" + Word(
-            nums) + "-" + Word(nums) + Suppress(":")
-        message = Regex(".*")
-        return timestamp + hostname + appname + context + message
-
-    def parse(self, line):
-        payload = {}
-        try:
-            parsed = self.__pattern.parseString(line)
-            payload["time_stamp"] = parsed[0]
-            payload["host_name"] = parsed[1]
-            payload["idrac_name"] = parsed[2]
-            payload["index"] = parsed[4]
-            payload["chunks_count"] = parsed[6]
-            payload["chunkId"] = parsed[8]
-            payload["message"] = parsed[9]
-        except:
-            logger.exception("Unable to parse line '{}'".format(line))
-        return payload
-
-    def save_telemetry_report(self, idrac_name, report, report_index):
-        try:
-            telemetry_report = json.loads("".join(report))
-            self.write_telemetry_report_json(idrac_name, telemetry_report, report_index)
-            return True
-        except Exception as e:
-            logger.exception(str(e))
-            return False
-
-    def write_telemetry_report_json(self, idrac_name, report, report_index):
-        id = report.get('Id', 'UnknownId')
-        report_folder = os.path.join(destination_folder, idrac_name)
-        report_sequence = report.get('ReportSequence', '00000')
-        report_timestamp = report.get('Timestamp', '00000')
-        file_name = str("_".join([id, report_sequence, report_timestamp.replace(":", "-")])) + ".json"
-        if not os.path.exists(report_folder):
-            os.makedirs(report_folder)
-        logging.debug("Saving the Telemetry report {} for iDRAC {}".format(file_name, idrac_name))
-        with open(os.path.join(report_folder, file_name), "w") as file:
-            file.write(json.dumps(report))
-
-    def monitor_Rsyslog_files(self, filename):
-        file = open(filename, 'r')
-        st_results = os.stat(filename)
-        st_size = st_results[6]
-        file_modified_time = time.time()
-        file.seek(st_size)
-        currently_processing_index = -1
-        reports_dict = {}
-        raw_report = []
-        while 1:
-            where = file.tell()
-            line = file.readline()
-            if not line:
-                time.sleep(1)
-                file.seek(where)
-                if time.time() - file_modified_time > 60:
-                    file.close()
-                    file = open(filename, 'r')
-            else:
-                file_modified_time = time.time()
-                fields = self.parse(line)
-                if not fields:
-                    continue  # ignore any lines not matching the pattern
-                idrac_name = fields.get("idrac_name")
-                current_report_index = int(fields.get('index', -1))
-                time_stamp = fields.get("time_stamp")
-                chunk_id = int(fields.get("chunkId", 0))
-                chunks_count = int(fields.get("chunks_count", 1))
-                raw_report = [] if currently_processing_index != current_report_index else raw_report
-                logger.debug("Processing Time stamp {}  and Index: {}".format(time_stamp, current_report_index))
-                if idrac_name not in reports_dict:
-                    reports_dict.update({idrac_name: dict()})
-                current_report_message = reports_dict[idrac_name].get(current_report_index, dict())
-                current_report_message.update({chunk_id: fields.get("message", '')})
-                reports_dict[idrac_name][current_report_index] = current_report_message
-                if len(reports_dict[idrac_name][current_report_index]) == int(chunks_count):
-                    for chunk_ids in sorted(reports_dict[idrac_name][current_report_index].keys()):
-                        raw_report.append(reports_dict[idrac_name][current_report_index][chunk_ids])
-                if raw_report and self.save_telemetry_report(idrac_name, raw_report, current_report_index):
-                    logger.debug("Finished processing Index: {} of idrac {}".format(current_report_index, idrac_name))
-                    del reports_dict[idrac_name][current_report_index]
-                time.sleep(0.001)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Python script to reconstruct the Telemetry reports from Rsyslogfiles.")
+    parser.add_argument('-s', help='Folder path to Rsyslog files. Example \'/var/log/**/*.log\'', required=True)
+    parser.add_argument('-d', help='Destination folder where the JSON reports files to be saved.', default=os.getcwd(),
+                        required=False)
+    parser.add_argument('script_examples', action="store_true",
+                        help="'python TelemetryRsysLogProcessor.py -s /var/log/**/*.log -d /tmp/Rsyslogs/' to process the Rsyslogfiles "
+                             "'from /var/log/**/ folder and save them under /tmp/Rsyslogs/'. The script will continue to execute and process all new messages.' "
+                             "Kill the scriot to stop processing. The log files will be rotated every day.")
+    parser.add_argument('--include-reports', help='Comma separated report Ids to save, for example '
+                        'PowerMetrics,ThermalSensor,CPUSensor. Default is all reports', required=False)
+    parser.add_argument('--exclude-reports', help='Comma separated report Ids not to save', required=False)
+    parser.add_argument('--include-metrics', help='Comma separated MetricIds to keep in the saved reports, shell style '
+                        'patterns such as \'*Temp*\' are supported. Default is all metrics', required=False)
+    parser.add_argument('--exclude-metrics', help='Comma separated MetricIds to remove from the saved reports',
+                        required=False)
+    parser.add_argument('--idrac-names', help='Comma separated iDRAC names, as sent in the Rsyslog messages, to save '
+                        'the reports of. Shell style patterns such as \'idrac-rack1-*\' are supported. Default is all '
+                        'iDRACs', required=False)
+    parser.add_argument('--compress', help='Write the reports to compressed segment files instead of one JSON file per '
+                        'report. zstd requires the zstandard library, pip install zstandard, and falls back to gzip.',
+                        choices=['zstd', 'gzip'], required=False)
+    parser.add_argument('--compression-level', help='Compression level, default is 3 for zstd and 6 for gzip',
+                        type=int, required=False)
+    parser.add_argument('--batch-reports', help='Reports per compressed frame, default is %s' % DEFAULT_BATCH_REPORTS,
+                        type=int, default=DEFAULT_BATCH_REPORTS, required=False)
+    parser.add_argument('--train-dictionaries', help='Train a zstd dictionary per report Id, improves the compression '
+                        'of small batches', action='store_true', required=False)
+    parser.add_argument('--delta', help='Store only the metric values which changed since the last keyframe report of '
+                        'each iDRAC and report Id, with a full keyframe report every DELTA reports, for example 60. '
+                        'Without --compress the records are written to <report Id>.delta.jsonl files.', type=int,
+                        required=False)
+    parser.add_argument('--forward', help='Also forward the reports to a collector in compressed batches, '
+                        'http://host:port/path, https:// or tcp://host:port. Batches are spooled to --forward-spool '
+                        'while the collector is slow or down', required=False)
+    parser.add_argument('--forward-only', help='With --forward, do not write the reports to -d', action='store_true',
+                        required=False)
+    parser.add_argument('--forward-codec', help='Compression of the forwarded batches, gzip, zstd or none, default is '
+                        'gzip', choices=['gzip', 'zstd', 'none'], default='gzip', required=False)
+    parser.add_argument('--forward-batch-reports', help='Reports per forwarded batch, default is 500', type=int,
+                        default=500, required=False)
+    parser.add_argument('--forward-linger', help='Seconds a report waits for its batch to fill, default is %s' %
+                        DEFAULT_LINGER_SECONDS, type=float, default=DEFAULT_LINGER_SECONDS, required=False)
+    parser.add_argument('--forward-connections', help='Connections to the collector, each with one batch in flight, '
+                        'default is %s' % DEFAULT_CONNECTIONS, type=int, default=DEFAULT_CONNECTIONS, required=False)
+    parser.add_argument('--forward-spool', help='Folder of the batches waiting for the collector, default is %s. '
+                        'Pass none to only wait in memory' % DEFAULT_SPOOL_FOLDER, default=DEFAULT_SPOOL_FOLDER,
+                        required=False)
+    parser.add_argument('--forward-spool-mb', help='Spool size above which the processing waits for the collector, '
+                        'default is 1024', type=int, default=1024, required=False)
+    parser.add_argument('--track-health', help='Track the sequence gaps, duplicates, delivery latency and silence of '
+                        'every iDRAC and report Id, the problems are logged as warnings', action='store_true',
+                        required=False)
+    parser.add_argument('--health-metrics', help='With --track-health, write the per stream metrics to this file in '
+                        'the Prometheus text format every --health-interval seconds', required=False)
+    parser.add_argument('--health-events', help='With --track-health, append the gap, duplicate, reset, silent and '
+                        'recovered events to this JSON lines file instead of logging them', required=False)
+    parser.add_argument('--health-interval', help='Seconds between two writes of --health-metrics, default is 30',
+                        type=int, default=30, required=False)
+    parser.add_argument('--silence-seconds', help='Minimum seconds without reports before a stream is reported silent, '
+                        'default is %s' % DEFAULT_MIN_SILENCE_SECONDS, type=int, default=DEFAULT_MIN_SILENCE_SECONDS,
+                        required=False)
+    parser.add_argument('--latest-values', help='Publish the latest value of every iDRAC, MetricId and sensor in a '
+                        'shared memory table read by local processes with TelemetryLatestValues.LatestValuesReader. '
+                        'Default file is %s' % DEFAULT_TABLE_PATH, nargs='?', const=DEFAULT_TABLE_PATH, required=False)
+    parser.add_argument('--latest-values-capacity', help='Maximum number of series in the latest values table, default '
+                        'is %s' % DEFAULT_CAPACITY, type=int, default=DEFAULT_CAPACITY, required=False)
+    parser.add_argument('--aggregate-groups', help='iDRACs.csv file with the extra columns Name, Rack and Cluster, '
+                        'also write the sum, min, max, avg and count of the metric values of each rack and cluster '
+                        'per MetricId and --aggregate-seconds bucket', required=False)
+    parser.add_argument('--aggregate-levels', help='Comma separated group columns of --aggregate-groups to aggregate, '
+                        'default is Rack,Cluster', default='Rack,Cluster', required=False)
+    parser.add_argument('--aggregate-seconds', help='Length of the aggregation buckets, default is %s' %
+                        DEFAULT_BUCKET_SECONDS, type=int, default=DEFAULT_BUCKET_SECONDS, required=False)
+    parser.add_argument('--aggregate-lateness', help='Seconds a bucket waits for late reports after its end, later '
+                        'values are counted in LateValuesDropped, default is %s' % DEFAULT_LATENESS_SECONDS,
+                        type=int, default=DEFAULT_LATENESS_SECONDS, required=False)
+    parser.add_argument('--aggregate-metrics', help='Comma separated MetricIds to aggregate, shell style patterns '
+                        'such as \'*Temp*\' are supported. Default is every numeric metric', required=False)
+    parser.add_argument('--fair-workers', help='Decode and write the reports of all files with this number of worker '
+                        'threads sharing them fairly between iDRACs, an iDRAC sending large reports at a high rate '
+                        'then only delays its own reports. Default is 0, each file thread processes its own reports',
+                        type=int, default=0, required=False)
+    parser.add_argument('--fair-weights', help='With --fair-workers, comma separated iDRAC name patterns and their '
+                        'share of the workers, for example \'idrac-gpu-*=2,idrac-lab-*=0.25\'. Default share is 1',
+                        required=False)
+    parser.add_argument('--fair-quantum-kb', help='Report kilobytes an iDRAC of share 1 is served per turn, default is '
+                        '%s' % (DEFAULT_QUANTUM_BYTES // 1024), type=int, default=DEFAULT_QUANTUM_BYTES // 1024,
+                        required=False)
+    parser.add_argument('--fair-host-queue-mb', help='Queued report megabytes of one iDRAC above which its oldest '
+                        'reports are dropped, default is %s' % (DEFAULT_HOST_QUEUE_BYTES // 1024 // 1024), type=int,
+                        default=DEFAULT_HOST_QUEUE_BYTES // 1024 // 1024, required=False)
+    parser.add_argument('--fair-stats-interval', help='Seconds between two logs of the iDRACs sending the most, their '
+                        'rate, queue and wait, default is 300. 0 disables them', type=int, default=300, required=False)
+    parser.add_argument('--load-shedding', help='Shed the low priority reports before they are decoded while the '
+                        'processing is more than --shed-backlog-mb behind the Rsyslog files, so the critical reports '
+                        'stay on time. The shed reports are counted per report Id', action='store_true',
+                        required=False)
+    parser.add_argument('--shed-priorities', help='Comma separated report Id patterns and their priority, low, normal, '
+                        'high or critical. Critical reports are never shed, other reports are normal. Default is %s'
+                        % DEFAULT_PRIORITIES, default=DEFAULT_PRIORITIES, required=False)
+    parser.add_argument('--shed-backlog-mb', help='Megabytes not processed yet above which more reports are shed, '
+                        'default is 64', type=int, default=64, required=False)
+    parser.add_argument('--recover-backlog-mb', help='Megabytes not processed yet below which fewer reports are shed, '
+                        'default is 8', type=int, default=8, required=False)
+    parser.add_argument('--shed-sample-every', help='While a priority is sampled, one report out of this number is '
+                        'kept per iDRAC and report Id, default is %s' % DEFAULT_SAMPLE_EVERY, type=int,
+                        default=DEFAULT_SAMPLE_EVERY, required=False)
+    parser.add_argument('--recover-seconds', help='Seconds the backlog stays below --recover-backlog-mb before each '
+                        'step back, default is %s' % DEFAULT_RECOVER_SECONDS, type=int,
+                        default=DEFAULT_RECOVER_SECONDS, required=False)
+    parser.add_argument('--profiling', help='Enable the profiling hooks: kill -USR1 <pid> profiles the pipeline '
+                        'threads and times each stage for --profiling-seconds, kill -USR2 <pid> writes the memory '
+                        'growth since the previous USR2. The reports are written to %s' %
+                        TelemetryProfiling.DEFAULT_OUTPUT_FOLDER,
+                        action='store_true', required=False)
+    parser.add_argument('--profiling-seconds', help='Length of a profile capture, default is %s' %
+                        TelemetryProfiling.DEFAULT_WINDOW_SECONDS, type=float, required=False)
+    parser.add_argument('--profiling-port', help='With --profiling, also serve /profile?seconds=N, /memory and '
+                        '/stages on this port of 127.0.0.1', type=int, required=False)
+    return vars(parser.parse_args())
+
+
+def split_argument(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def report_filter_from_args(args):
+    """Returns the ReportFilter of the filter arguments, None when no filter was passed"""
+    names = ('include_reports', 'exclude_reports', 'include_metrics', 'exclude_metrics', 'idrac_names')
+    if not any(args[name] for name in names):
+        return None
+    return ReportFilter(**{name: split_argument(args[name]) for name in names})
+
+
+def setup_logging():
+    log_path = os.path.join(os.getcwd(), '{}_{}.txt'.format('MultiThreadRsyslogProcessor_log',
+                                                            (datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))))
+    file_handler = handlers.TimedRotatingFileHandler(filename=log_path, when='d', interval=1, backupCount=0,
+                                                     encoding=None, delay=False, utc=False, atTime=None)
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s',
+                        handlers=[file_handler, stdout_handler])  # set logging level to DEBUG to have complete processing logs
+
+
+def create_file_sink(args):
+    if args["delta"] and not args["compress"]:
+        return DeltaFileSink(args["d"])
+    if not args["compress"]:
+        return JsonFileSink(args["d"])
+    return CompressedSink(args["d"], codec=args["compress"], level=args["compression_level"],
+                          batch_reports=args["batch_reports"], train_dictionaries=args["train_dictionaries"])
+
+
+def create_sink(args):
+    """Returns the sink shared by all monitored files"""
+    if not args["forward"]:
+        return create_file_sink(args)
+    spool_folder = None if args["forward_spool"].lower() == 'none' else args["forward_spool"]
+    forwarding_sink = ForwardingSink(args["forward"], codec=args["forward_codec"],
+                                     batch_reports=args["forward_batch_reports"],
+                                     linger_seconds=args["forward_linger"], connections=args["forward_connections"],
+                                     spool_folder=spool_folder, spool_bytes=args["forward_spool_mb"] * 1024 * 1024)
+    return forwarding_sink if args["forward_only"] else TeeSink(create_file_sink(args), forwarding_sink)
+
+
+def create_health_tracker(args):
+    """Returns the StreamHealthTracker shared by all monitored files, None without --track-health"""
+    if not args["track_health"]:
+        return None
+    on_event = JsonLinesEventWriter(args["health_events"]) if args["health_events"] else log_event
+    return StreamHealthTracker(min_silence_seconds=args["silence_seconds"], on_event=on_event)
+
+
+def create_group_aggregator(args):
+    """Returns the GroupAggregator shared by all monitored files, None without --aggregate-groups"""
+    if not args["aggregate_groups"]:
+        return None
+    levels = split_argument(args["aggregate_levels"])
+    return GroupAggregator(read_group_mapping(args["aggregate_groups"], levels), levels,
+                           bucket_seconds=args["aggregate_seconds"], lateness_seconds=args["aggregate_lateness"],
+                           metric_ids=split_argument(args["aggregate_metrics"]))
+
+
+def aggregate_writer(sink, latest_values=None):
+    """Returns the callable writing the aggregate reports closed by any monitored file, outside the delta encoding"""
+    def write_aggregates(aggregate_reports):
+        for telemetry_report in aggregate_reports:
+            if latest_values is not None:
+                latest_values.update_report(telemetry_report.idrac_name, telemetry_report.report)
+            sink.write(telemetry_report)
+    return write_aggregates
+
+
+def unprofiled_stage(stage, iterable):
+    return iterable
+
+
+def process_reports(raw_reports, sink, report_filter=None, delta_encoder=None, health_tracker=None,
+                    latest_values=None, profile=False, group_aggregator=None):
+    """Decodes reassembled reports, passes them through the enabled stages and writes them to the sink"""
+    # The stages are only wrapped with --profiling, the hooks cost nothing otherwise
+    stage = TelemetryProfiling.profile_stage if profile else unprofiled_stage
+    reports = stage('decode', decode_reports(raw_reports, report_filter))
+    if group_aggregator is not None:
+        reports = stage('aggregate', aggregate_groups(reports, group_aggregator,
+                                                      emit=aggregate_writer(sink, latest_values)))
+    if health_tracker is not None:
+        reports = stage('health', track_health(reports, health_tracker))
+    if latest_values is not None:
+        reports = stage('latest values', publish_latest_values(reports, latest_values))
+    if delta_encoder is not None:
+        reports = stage('delta', delta_encode(reports, delta_encoder))
+    write_reports(reports, TelemetryProfiling.ProfiledSink(sink) if profile else sink, close=False)
+
+
+def monitor_Rsyslog_files(filename, sink, report_filter=None, keyframe_interval=None, health_tracker=None,
+                          latest_values=None, profile=False, group_aggregator=None, scheduler=None,
+                          overload_controller=None):
+    """
+    Reconstructs the reports appended to one Rsyslog file and writes them to the sink, runs until killed. With a
+    scheduler the reports are queued for the fair share workers instead, see process_scheduled_reports()
+    """
+    stage = TelemetryProfiling.profile_stage if profile else unprofiled_stage
+    position = FilePosition(filename)
+    lines = stage('read', follow_binary_lines(filename, position=position))
+    chunks = stage('parse', parse_chunks(lines, TelemetryRsyslogParser(), report_filter))
+    if overload_controller is not None:
+        overload_controller.add_source(position.bytes_behind)
+        chunks = stage('shed', shed_reports(chunks, overload_controller))
+    raw_reports = stage('reassemble', assemble_reports(chunks, report_filter=report_filter))
+    if scheduler is not None:
+        schedule_reports(raw_reports, scheduler)
+        return
+    process_reports(raw_reports, sink, report_filter, DeltaEncoder(keyframe_interval) if keyframe_interval else None,
+                    health_tracker, latest_values, profile, group_aggregator)
+
+
+def process_scheduled_reports(scheduler, sink, report_filter=None, delta_encoder=None, health_tracker=None,
+                              latest_values=None, profile=False, group_aggregator=None):
+    """Fair share worker processing the reports of every monitored file in the order given by the scheduler"""
+    stage = TelemetryProfiling.profile_stage if profile else unprofiled_stage
+    process_reports(stage('schedule', scheduler.drain()), sink, report_filter, delta_encoder, health_tracker,
+                    latest_values, profile, group_aggregator)
+
+
+def create_scheduler(args):
+    """Returns the FairScheduler shared by all monitored files, None without --fair-workers"""
+    if not args["fair_workers"]:
+        return None
+    return FairScheduler(parse_weights(args["fair_weights"]), quantum_bytes=args["fair_quantum_kb"] * 1024,
+                         host_queue_bytes=args["fair_host_queue_mb"] * 1024 * 1024)
+
+
+def create_overload_controller(args, scheduler=None):
+    """Returns the OverloadController shared by all monitored files, None without --load-shedding"""
+    if not args["load_shedding"]:
+        return None
+    overload_controller = OverloadController(parse_priorities(args["shed_priorities"]),
+                                             shed_bytes=args["shed_backlog_mb"] * 1024 * 1024,
+                                             recover_bytes=args["recover_backlog_mb"] * 1024 * 1024,
+                                             sample_every=args["shed_sample_every"],
+                                             recover_seconds=args["recover_seconds"])
+    if scheduler is not None:
+        # the reports waiting for the fair share workers are behind too
+        overload_controller.add_source(lambda: scheduler.bytes)
+    return overload_controller
+
+
+def start_fair_workers(args, scheduler, sink, health_tracker, latest_values, group_aggregator):
+    # One DeltaEncoder for all workers, the scheduler hands the reports of an iDRAC to one worker at a time
+    delta_encoder = DeltaEncoder(args["delta"]) if args["delta"] else None
+    workers = []
+    for number in range(args["fair_workers"]):
+        worker = threading.Thread(target=process_scheduled_reports, name='fair-worker-{}'.format(number), daemon=True,
+                                  args=(scheduler, sink, report_filter_from_args(args), delta_encoder, health_tracker,
+                                        latest_values, args["profiling"], group_aggregator))
+        worker.start()
+        workers.append(worker)
+    return workers
 
 
 if __name__ == "__main__":
-    parser = TelemetryRsyslogParser()
+    args = parse_arguments()
+    setup_logging()
+    if args["profiling"]:
+        TelemetryProfiling.enable(window_seconds=args["profiling_seconds"], port=args["profiling_port"])
+    sink = create_sink(args)
+    health_tracker = create_health_tracker(args)
+    latest_values = LatestValuesTable(args["latest_values"], capacity=args["latest_values_capacity"]) \
+        if args["latest_values"] else None
+    group_aggregator = create_group_aggregator(args)
+    scheduler = create_scheduler(args)
+    workers = start_fair_workers(args, scheduler, sink, health_tracker, latest_values, group_aggregator) \
+        if scheduler is not None else []
+    overload_controller = create_overload_controller(args, scheduler)
+    metrics_written = time.monotonic()
+    scheduler_logged = time.monotonic()
     threads = list()
     monitoring_log_files = []
-    while True:
-        rsys_logs = glob.glob(rsyslog_path, recursive=True)
-        idrac_rsyslogs = list(filter(lambda x: ('idrac' in str(x).lower() and str(x).endswith('.log')), rsys_logs))
-        for log_file in idrac_rsyslogs:
-            try:
-                if log_file in monitoring_log_files:
-                    continue
-                logger.info(("Processing file '{}'".format(log_file)).center(100, '*'))
-                x = threading.Thread(target=parser.monitor_Rsyslog_files, args=(log_file,), name=log_file)
-                threads.append(x)
-                x.start()
-                monitoring_log_files.append(log_file)
-            except Exception as e:
-                if log_file in monitoring_log_files: monitoring_log_files.remove(log_file)
-                logger.error("Error occurred while processing '{}'  and error is {}".format(log_file, e))
-        time.sleep(2)
+    try:
+        while True:
+            for log_file in find_rsyslog_files(args["s"]):
+                try:
+                    if log_file in monitoring_log_files:
+                        continue
+                    logger.info(("Processing file '{}'".format(log_file)).center(100, '*'))
+                    x = threading.Thread(target=monitor_Rsyslog_files, name=log_file, daemon=True,
+                                         args=(log_file, sink, report_filter_from_args(args), args["delta"],
+                                               health_tracker, latest_values, args["profiling"], group_aggregator,
+                                               scheduler, overload_controller))
+                    threads.append(x)
+                    x.start()
+                    monitoring_log_files.append(log_file)
+                except Exception as e:
+                    if log_file in monitoring_log_files: monitoring_log_files.remove(log_file)
+                    logger.error("Error occurred while processing '{}'  and error is {}".format(log_file, e))
+            if health_tracker is not None:
+                health_tracker.check_silence()
+                if args["health_metrics"] and time.monotonic() - metrics_written >= args["health_interval"]:
+                    health_tracker.write_prometheus_file(args["health_metrics"])
+                    metrics_written = time.monotonic()
+            if group_aggregator is not None:
+                # closes the buckets of groups whose iDRACs stopped sending
+                aggregate_writer(sink, latest_values)(group_aggregator.expire())
+            if overload_controller is not None:
+                overload_controller.update()
+            if scheduler is not None:
+                scheduler.update_rates()
+                if args["fair_stats_interval"] and time.monotonic() - scheduler_logged >= args["fair_stats_interval"]:
+                    scheduler.log_stats()
+                    scheduler_logged = time.monotonic()
+            time.sleep(2)
+    except KeyboardInterrupt:
+        logger.info("Stopping, writing the pending reports")
+        if overload_controller is not None:
+            overload_controller.log_stats()
+        if scheduler is not None:
+            # the file threads are stopped with the process, the workers process what they already queued
+            scheduler.close()
+            for worker in workers:
+                worker.join(10)
+            scheduler.log_stats()
+        if group_aggregator is not None:
+            aggregate_writer(sink, latest_values)(group_aggregator.flush())
+        sink.close()
+        if latest_values is not None:
+            latest_values.close()
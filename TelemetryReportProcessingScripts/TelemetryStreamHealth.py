@@ -0,0 +1,293 @@
+#
+# TelemetryStreamHealth. Python module tracking the report sequence gaps, duplicates, delivery latency and silence of
+# every (iDRAC, report Id) stream seen by the Telemetry report pipeline.
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Every report costs O(1): the ReportSequence is checked against a sliding bitmap of the last WINDOW sequences and
+# silent streams are found with a timer wheel, only the streams whose deadline falls in the elapsed slots are visited.
+#
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger('RsysLogProcessor')
+
+# Sequences tracked behind the highest one, a report older than that is treated as a sequence reset (iDRAC reboot)
+WINDOW = 64
+WINDOW_MASK = (1 << WINDOW) - 1
+DEFAULT_MIN_SILENCE_SECONDS = 60
+# A stream is silent once it sent nothing for this many times its usual interval between reports
+DEFAULT_SILENCE_FACTOR = 3
+DEFAULT_WHEEL_SLOTS = 4096
+DEFAULT_WHEEL_RESOLUTION = 1.0
+# Weight of the last measure in the exponentially weighted moving averages
+EWMA_WEIGHT = 0.2
+
+
+def log_event(event):
+    """Default event callback, logs the event on the RsysLogProcessor logger"""
+    details = ' '.join('{}={}'.format(name, value) for name, value in event.items()
+                       if name not in ('event', 'iDRAC', 'Id'))
+    level = logging.INFO if event['event'] == 'recovered' else logging.WARNING
+    logger.log(level, 'Stream %s %s: %s %s', event['iDRAC'], event['Id'], event['event'], details)
+
+
+def report_time(timestamp):
+    """Returns the epoch time of a report Timestamp such as 2022-04-20T10:11:12-05:00, None if it is not valid"""
+    if not timestamp:
+        return None
+    try:
+        if timestamp.endswith('Z'):
+            timestamp = timestamp[:-1] + '+00:00'
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamHealth(object):
+    """Sequence window, latency and silence state of one (iDRAC, report Id) stream"""
+    __slots__ = ('idrac_name', 'report_id', 'highest', 'lowest', 'window', 'received', 'gaps', 'duplicates',
+                 'reordered', 'resets', 'latency', 'latency_max', 'interval', 'last_seen', 'deadline', 'scheduled',
+                 'silent')
+
+    def __init__(self, idrac_name, report_id):
+        self.idrac_name = idrac_name
+        self.report_id = report_id
+        self.highest = None
+        # first sequence since the stream started or reset, no gap was counted below it
+        self.lowest = None
+        self.window = 0
+        self.received = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.resets = 0
+        self.latency = None
+        self.latency_max = 0.0
+        self.interval = None
+        self.last_seen = None
+        self.deadline = None
+        self.scheduled = False
+        self.silent = False
+
+    def as_dict(self):
+        return {'iDRAC': self.idrac_name, 'Id': self.report_id, 'received': self.received, 'gaps': self.gaps,
+                'duplicates': self.duplicates, 'reordered': self.reordered, 'resets': self.resets,
+                'latency_seconds': self.latency, 'latency_max_seconds': self.latency_max,
+                'interval_seconds': self.interval, 'last_sequence': self.highest, 'silent': self.silent}
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel of stream deadlines. A stream stays in the slot it was scheduled in when its deadline moves,
+    it is moved to its new slot when the old one expires, so updating a deadline does not touch the wheel.
+    """
+
+    def __init__(self, slots=DEFAULT_WHEEL_SLOTS, resolution=DEFAULT_WHEEL_RESOLUTION, now=None):
+        self.resolution = resolution
+        self.slots = [[] for _ in range(slots)]
+        self.tick = int((now if now is not None else time.monotonic()) / resolution)
+
+    def schedule(self, stream):
+        tick = max(int(stream.deadline / self.resolution), self.tick + 1)
+        self.slots[tick % len(self.slots)].append(stream)
+        stream.scheduled = True
+
+    def advance(self, now):
+        """Yields the streams whose deadline expired up to now, streams whose deadline moved are rescheduled"""
+        target = int(now / self.resolution)
+        # After a pause longer than the wheel, every slot is visited once
+        start = max(self.tick + 1, target - len(self.slots) + 1)
+        for tick in range(start, target + 1):
+            slot_index = tick % len(self.slots)
+            streams, self.slots[slot_index] = self.slots[slot_index], []
+            for stream in streams:
+                stream.scheduled = False
+                if stream.deadline <= now:
+                    yield stream
+                else:
+                    self.tick = tick
+                    self.schedule(stream)
+        self.tick = max(self.tick, target)
+
+
+class StreamHealthTracker(object):
+    """
+    Tracks every (iDRAC, report Id) stream of the reports passed to observe(). Gaps, duplicates, resets and silent
+    streams are reported as events, dicts passed to on_event which logs them by default:
+
+      {'event': 'gap', 'iDRAC': 'idrac-1', 'Id': 'PowerMetrics', 'missing': 2, 'first_missing': 1041, ...}
+
+    Event types are gap, duplicate, reset, silent and recovered. observe() and check_silence() may be called from
+    several threads.
+
+    :param min_silence_seconds: minimum time without reports before a stream is silent
+    :param silence_factor: a stream is silent after this many times its average interval without reports
+    :param on_event: callable receiving each event, None to only count them
+    """
+
+    def __init__(self, min_silence_seconds=DEFAULT_MIN_SILENCE_SECONDS, silence_factor=DEFAULT_SILENCE_FACTOR,
+                 on_event=log_event, wheel_slots=DEFAULT_WHEEL_SLOTS, wheel_resolution=DEFAULT_WHEEL_RESOLUTION):
+        self.min_silence_seconds = min_silence_seconds
+        self.silence_factor = silence_factor
+        self.on_event = on_event
+        self.streams = {}
+        self.wheel = TimerWheel(wheel_slots, wheel_resolution)
+        self.events = {'gap': 0, 'duplicate': 0, 'reset': 0, 'silent': 0, 'recovered': 0}
+        self._lock = threading.Lock()
+
+    def _event(self, event, stream, **details):
+        self.events[event] += 1
+        if self.on_event is not None:
+            details.update({'event': event, 'iDRAC': stream.idrac_name, 'Id': stream.report_id})
+            self.on_event(details)
+
+    def observe(self, idrac_name, report, now=None, wall_time=None):
+        """Updates the stream of a report, call it for every report in arrival order"""
+        now = now if now is not None else time.monotonic()
+        key = (idrac_name, report.get('Id', 'UnknownId'))
+        with self._lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                stream = self.streams[key] = StreamHealth(*key)
+            self._update_sequence(stream, report.get('ReportSequence'))
+            self._update_latency(stream, report.get('Timestamp'), wall_time)
+            if stream.last_seen is not None:
+                elapsed = now - stream.last_seen
+                stream.interval = elapsed if stream.interval is None else \
+                    stream.interval + EWMA_WEIGHT * (elapsed - stream.interval)
+            stream.last_seen = now
+            stream.received += 1
+            if stream.silent:
+                stream.silent = False
+                self._event('recovered', stream)
+            stream.deadline = now + max(self.min_silence_seconds, self.silence_factor * (stream.interval or 0))
+            if not stream.scheduled:
+                self.wheel.schedule(stream)
+
+    def _update_sequence(self, stream, report_sequence):
+        try:
+            sequence = int(report_sequence)
+        except (TypeError, ValueError):
+            return
+        if stream.highest is None:
+            stream.highest, stream.lowest, stream.window = sequence, sequence, 1
+        elif sequence > stream.highest:
+            shift = sequence - stream.highest
+            if shift > 1:
+                stream.gaps += shift - 1
+                self._event('gap', stream, missing=shift - 1, first_missing=stream.highest + 1,
+                            last_missing=sequence - 1)
+            stream.window = ((stream.window << shift) | 1) & WINDOW_MASK if shift < WINDOW else 1
+            stream.highest = sequence
+        elif stream.highest - sequence < WINDOW:
+            bit = 1 << (stream.highest - sequence)
+            if stream.window & bit:
+                stream.duplicates += 1
+                self._event('duplicate', stream, sequence=sequence)
+            else:
+                # a late report fills a gap counted when the sequence was skipped, none was counted below the first one
+                stream.window |= bit
+                if sequence > stream.lowest:
+                    stream.gaps -= 1
+                stream.reordered += 1
+        else:
+            stream.resets += 1
+            self._event('reset', stream, sequence=sequence, previous_sequence=stream.highest)
+            stream.highest, stream.lowest, stream.window = sequence, sequence, 1
+
+    def _update_latency(self, stream, timestamp, wall_time):
+        generated = report_time(timestamp)
+        if generated is None:
+            return
+        latency = max(0.0, (wall_time if wall_time is not None else time.time()) - generated)
+        stream.latency = latency if stream.latency is None else \
+            stream.latency + EWMA_WEIGHT * (latency - stream.latency)
+        stream.latency_max = max(stream.latency_max, latency)
+
+    def check_silence(self, now=None):
+        """Flags the streams which sent nothing since their deadline, call it periodically, for example every second"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            for stream in self.wheel.advance(now):
+                if not stream.silent:
+                    stream.silent = True
+                    self._event('silent', stream, silent_seconds=round(now - stream.last_seen, 1))
+
+    def totals(self):
+        with self._lock:
+            streams = list(self.streams.values())
+        return {'streams': len(streams), 'silent_streams': sum(stream.silent for stream in streams),
+                'received': sum(stream.received for stream in streams), 'gaps': sum(stream.gaps for stream in streams),
+                'duplicates': sum(stream.duplicates for stream in streams),
+                'resets': sum(stream.resets for stream in streams), 'events': dict(self.events)}
+
+    def prometheus_text(self):
+        """Returns the per stream counters and gauges in the Prometheus text exposition format"""
+        metrics = (('received', 'counter', 'Reports received'),
+                   ('gaps', 'gauge', 'Report sequences missing'),
+                   ('duplicates', 'counter', 'Duplicate reports received'),
+                   ('resets', 'counter', 'Report sequence resets'),
+                   ('latency', 'gauge', 'Average delay between the report Timestamp and its reception in seconds'),
+                   ('silent', 'gauge', '1 when the stream sent no report for longer than expected'))
+        with self._lock:
+            streams = list(self.streams.values())
+        lines = []
+        for name, metric_type, description in metrics:
+            metric = 'idrac_telemetry_report_{}'.format(name)
+            lines.append('# HELP {} {}'.format(metric, description))
+            lines.append('# TYPE {} {}'.format(metric, metric_type))
+            for stream in streams:
+                value = getattr(stream, name)
+                if value is None:
+                    continue
+                lines.append('{}{{idrac="{}",report="{}"}} {}'.format(metric, stream.idrac_name, stream.report_id,
+                                                                   float(value)))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus_file(self, file_name):
+        """Writes prometheus_text() atomically, for example for the node_exporter textfile collector"""
+        temporary_file = file_name + '.tmp'
+        with open(temporary_file, 'w') as file:
+            file.write(self.prometheus_text())
+        os.replace(temporary_file, file_name)
+
+
+def track_health(reports, tracker):
+    """
+    Pipeline stage passing every report through unchanged while observing it with a StreamHealthTracker
+
+    :param reports: iterable of TelemetryReport
+    """
+    for telemetry_report in reports:
+        tracker.observe(telemetry_report.idrac_name, telemetry_report.report)
+        yield telemetry_report
+
+
+class JsonLinesEventWriter(object):
+    """Event callback appending each event as a JSON line with the time it was raised"""
+
+    def __init__(self, file_name):
+        self.file = open(file_name, 'a')
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        event['time'] = datetime.now().astimezone().isoformat()
+        with self._lock:
+            self.file.write(json.dumps(event) + '\n')
+            self.file.flush()
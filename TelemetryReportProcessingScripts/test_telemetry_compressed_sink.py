@@ -0,0 +1,68 @@
+#
+# test_telemetry_compressed_sink. Tests of the TelemetryCompressedSink segments and frame index, run with:
+# python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import glob
+import gzip
+import json
+import os
+
+import pytest
+
+from TelemetryCompressedSink import CompressedSink, read_frame, read_index, read_segment
+from TelemetryPipeline import TelemetryReport
+
+
+def write_segment(folder, reports=12, batch_reports=3):
+    """Writes PowerMetrics reports one minute apart from 10:00, returns the segment path"""
+    sink = CompressedSink(folder, codec='gzip', batch_reports=batch_reports)
+    for sequence in range(reports):
+        sink.write(TelemetryReport('idrac-1', sequence, {
+            'Id': 'PowerMetrics', 'ReportSequence': str(sequence),
+            'Timestamp': '2022-04-20T10:%02d:00-05:00' % sequence}))
+    sink.close()
+    return glob.glob(os.path.join(folder, 'PowerMetrics', '*.jsonl.gz'))[0]
+
+
+def test_segment_is_a_gzip_stream(tmp_path):
+    segment_path = write_segment(str(tmp_path))
+    with gzip.open(segment_path) as file:
+        records = [json.loads(line) for line in file]
+    assert [record['Index'] for record in records] == list(range(12))
+
+
+def test_index_has_one_entry_per_frame(tmp_path):
+    segment_path = write_segment(str(tmp_path))
+    index = read_index(segment_path)
+    assert [entry['reports'] for entry in index] == [3, 3, 3, 3]
+    assert index[1]['max_time'] - index[1]['min_time'] == 120
+    assert [record['Index'] for record in read_frame(segment_path, index[2])] == [6, 7, 8]
+
+
+def test_read_segment_only_reads_the_frames_in_the_time_range(tmp_path):
+    segment_path = write_segment(str(tmp_path))
+    assert len(list(read_segment(segment_path))) == 12
+    records = list(read_segment(segment_path, '2022-04-20T10:04:00-05:00', '2022-04-20T10:06:00-05:00'))
+    assert [record['Index'] for record in records] == [3, 4, 5, 6, 7, 8]
+    start = read_index(segment_path)[3]['min_time']
+    assert [record['Index'] for record in read_segment(segment_path, start=start)] == [9, 10, 11]
+    assert list(read_segment(segment_path, end='2022-04-20T09:00:00-05:00')) == []
+
+
+def test_read_segment_rejects_invalid_timestamps(tmp_path):
+    segment_path = write_segment(str(tmp_path))
+    with pytest.raises(ValueError):
+        list(read_segment(segment_path, start='yesterday'))
@@ -0,0 +1,121 @@
+#
+# test_telemetry_delta_encoding. Tests of the TelemetryDeltaEncoding keyframes and deltas, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import json
+import os
+
+import TelemetryDeltaEncoding
+from TelemetryDeltaEncoding import DeltaEncoder, DeltaFileSink, delta_decode, delta_encode, is_delta, \
+    read_keyframe_index, read_report
+from TelemetryPipeline import TelemetryReport
+
+
+def make_report(sequence, sensors=4):
+    """PowerMetrics report whose first sensor changes at every report and the others every fourth report"""
+    timestamp = '2022-04-20T10:%02d:%02d-05:00' % (sequence // 60 % 60, sequence % 60)
+    return {'@odata.id': '/redfish/v1/TelemetryService/MetricReports/PowerMetrics', 'Id': 'PowerMetrics',
+            'ReportSequence': str(sequence), 'Timestamp': timestamp,
+            'MetricValues': [{'MetricId': 'SystemInputPower', 'Timestamp': timestamp,
+                              'MetricValue': str(sequence if position == 0 else sequence // 4),
+                              'Oem': {'Dell': {'ContextID': 'System.Embedded.1#Sensor%d' % position}}}
+                             for position in range(sensors)]}
+
+
+def reports(idrac_names=('idrac-1', 'idrac-2'), count=25):
+    return [TelemetryReport(idrac_name, sequence, make_report(sequence)) for sequence in range(1, count + 1)
+            for idrac_name in idrac_names]
+
+
+def test_encode_decode_round_trip():
+    encoder = DeltaEncoder(keyframe_interval=10)
+    records = list(delta_encode(reports(), encoder))
+    assert encoder.keyframes == 6 and encoder.deltas == 44
+    delta = records[2].report
+    assert is_delta(delta) and delta['@Delta']['Keyframe'] == '1'
+    assert delta['@Delta']['Values'] == [[0, '2']]
+    assert delta['@Delta']['ValueTimestamp'] == '2022-04-20T10:00:02-05:00'
+    assert list(delta_decode(records)) == reports()
+
+
+def test_changed_metric_properties_start_a_keyframe():
+    encoder = DeltaEncoder()
+    encoder.encode('idrac-1', make_report(1))
+    assert is_delta(encoder.encode('idrac-1', make_report(2)))
+    assert not is_delta(encoder.encode('idrac-1', make_report(3, sensors=5)))
+    changed = make_report(4, sensors=5)
+    changed['MetricValues'][1]['MetricId'] = 'TotalCPUPower'
+    assert not is_delta(encoder.encode('idrac-1', changed))
+
+
+def test_delta_decode_skips_deltas_without_keyframe():
+    records = list(delta_encode(reports(idrac_names=('idrac-1',), count=3)))
+    assert [report.report['ReportSequence'] for report in delta_decode(records[1:])] == []
+
+
+def test_delta_file_sink_read_report(tmp_path):
+    sink = DeltaFileSink(str(tmp_path))
+    for record in delta_encode(reports(), DeltaEncoder(keyframe_interval=10)):
+        sink.write(record)
+    sink.close()
+    delta_path = os.path.join(str(tmp_path), 'PowerMetrics.delta.jsonl')
+    keyframes = read_keyframe_index(delta_path)
+    assert [sequence for _, sequence, _ in keyframes['idrac-2']] == ['1', '11', '21']
+    for sequence in (1, 10, 11, 17, 25):
+        assert read_report(delta_path, 'idrac-2', sequence, keyframes) == make_report(sequence)
+    assert read_report(delta_path, 'idrac-1', 26) is None
+    assert read_report(delta_path, 'idrac-3', 1) is None
+
+
+def write_delta_file(folder, telemetry_reports):
+    sink = DeltaFileSink(folder)
+    for record in delta_encode(telemetry_reports, DeltaEncoder(keyframe_interval=10)):
+        sink.write(record)
+    sink.close()
+    return os.path.join(folder, 'PowerMetrics.delta.jsonl')
+
+
+def test_read_report_only_reads_the_segment_of_its_keyframe(tmp_path, monkeypatch):
+    delta_path = write_delta_file(str(tmp_path), reports(count=100))
+    keyframes = read_keyframe_index(delta_path)
+    decoded, loads = [], json.loads
+    monkeypatch.setattr(TelemetryDeltaEncoding.json, 'loads', lambda data: decoded.append(data) or loads(data))
+    assert read_report(delta_path, 'idrac-2', 57, keyframes) == make_report(57)
+    # the records of idrac-1 are skipped without decoding them
+    assert len(decoded) == 7
+
+
+def later(report, hours):
+    """Returns the report as sent hours later, after its sequence wrapped around"""
+    text = json.dumps(report).replace('2022-04-20T10:', '2022-04-20T%02d:' % (10 + hours))
+    return json.loads(text)
+
+
+def test_read_report_after_the_sequence_wrapped_around(tmp_path):
+    telemetry_reports = [TelemetryReport('idrac-1', index, report) for index, report in enumerate(
+        [make_report(sequence) for sequence in range(1, 26)] + [later(make_report(sequence), 1)
+                                                                for sequence in range(1, 16)])]
+    delta_path = write_delta_file(str(tmp_path), telemetry_reports)
+    keyframes = read_keyframe_index(delta_path)
+    assert [sequence for _, sequence, _ in keyframes['idrac-1']] == ['1', '11', '21', '6']
+    assert read_report(delta_path, 'idrac-1', 3, keyframes) == later(make_report(3), 1)
+    assert read_report(delta_path, 'idrac-1', 3, keyframes, make_report(3)['Timestamp']) == make_report(3)
+    assert read_report(delta_path, 'idrac-1', 23, keyframes) == make_report(23)
+    assert read_report(delta_path, 'idrac-1', 14, keyframes) == later(make_report(14), 1)
+    # the sequence wrapped around within the segment of keyframe 21
+    assert read_report(delta_path, 'idrac-1', 5, keyframes) == later(make_report(5), 1)
+    assert read_report(delta_path, 'idrac-1', 5, keyframes, make_report(5)['Timestamp']) == make_report(5)
+    assert read_report(delta_path, 'idrac-1', 16, keyframes) == make_report(16)
+    assert read_report(delta_path, 'idrac-1', 26, keyframes) is None
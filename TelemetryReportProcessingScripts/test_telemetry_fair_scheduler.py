@@ -0,0 +1,153 @@
+#
+# test_telemetry_fair_scheduler. Tests of the TelemetryFairScheduler deficit round robin, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import collections
+import threading
+import time
+
+import pytest
+
+from TelemetryFairScheduler import FairScheduler, parse_weights
+
+
+def served(scheduler, count):
+    """Serves count items on one worker, returns the bytes served per iDRAC"""
+    served_bytes = collections.Counter()
+    for _ in range(count):
+        idrac_name, cost = scheduler.get()
+        served_bytes[idrac_name] += cost
+        scheduler.done(idrac_name)
+    return served_bytes
+
+
+def test_parse_weights():
+    assert parse_weights('idrac-gpu-*=2, idrac-7=0.25') == [('idrac-gpu-*', 2.0), ('idrac-7', 0.25)]
+    assert parse_weights('') == []
+    for value in ('idrac-1', 'idrac-1=0', '=2'):
+        with pytest.raises(ValueError):
+            parse_weights(value)
+
+
+def test_weighted_shares():
+    scheduler = FairScheduler(weights=parse_weights('idrac-heavy=4'), quantum_bytes=4096)
+    for _ in range(2000):
+        scheduler.put('idrac-heavy', 1024, 1024)
+        scheduler.put('idrac-light', 1024, 1024)
+    served_bytes = served(scheduler, 2000)
+    assert served_bytes['idrac-heavy'] == 4 * served_bytes['idrac-light']
+
+
+def test_byte_fairness_with_different_report_sizes():
+    scheduler = FairScheduler(quantum_bytes=64 * 1024)
+    for _ in range(100):
+        scheduler.put('idrac-large', 60 * 1024, 60 * 1024)
+    for _ in range(6000):
+        scheduler.put('idrac-small', 1024, 1024)
+    served_bytes = served(scheduler, 1000)
+    assert abs(served_bytes['idrac-large'] - served_bytes['idrac-small']) <= 64 * 1024
+
+
+def test_report_larger_than_the_quantum_is_served():
+    scheduler = FairScheduler(quantum_bytes=1024)
+    scheduler.put('idrac-1', 'large', 10 * 1024)
+    scheduler.put('idrac-2', 'small', 100)
+    assert sorted(item for _, item in (scheduler.get(), scheduler.get())) == ['large', 'small']
+
+
+def test_idrac_served_by_one_worker_at_a_time_in_order():
+    scheduler = FairScheduler(quantum_bytes=4096)
+    for idrac_name in ('idrac-1', 'idrac-2', 'idrac-3'):
+        for sequence in range(500):
+            scheduler.put(idrac_name, sequence, 1024)
+    scheduler.close()
+    processed = collections.defaultdict(list)
+    busy = set()
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            scheduled = scheduler.get()
+            if scheduled is None:
+                return
+            idrac_name, sequence = scheduled
+            with lock:
+                if idrac_name in busy:
+                    errors.append(idrac_name)
+                busy.add(idrac_name)
+                processed[idrac_name].append(sequence)
+            # let the other workers run while the iDRAC is busy
+            time.sleep(0.0001)
+            with lock:
+                busy.discard(idrac_name)
+            scheduler.done(idrac_name)
+
+    workers = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join(10)
+    assert errors == []
+    assert {idrac_name: sequences for idrac_name, sequences in processed.items()} == \
+        {idrac_name: list(range(500)) for idrac_name in ('idrac-1', 'idrac-2', 'idrac-3')}
+
+
+def test_noisy_idrac_loses_its_oldest_reports():
+    scheduler = FairScheduler(host_queue_bytes=4096)
+    for sequence in range(10):
+        scheduler.put('idrac-noisy', sequence, 1024)
+    scheduler.put('idrac-quiet', 'quiet', 1024)
+    scheduler.close()
+    items = collections.defaultdict(list)
+    for idrac_name, item in iter(scheduler.get, None):
+        items[idrac_name].append(item)
+        scheduler.done(idrac_name)
+    assert items == {'idrac-noisy': [6, 7, 8, 9], 'idrac-quiet': ['quiet']}
+    stats = {host['iDRAC']: host for host in scheduler.stats()}
+    assert stats['idrac-noisy']['dropped'] == 6 and stats['idrac-quiet']['dropped'] == 0
+
+
+def test_put_waits_for_room_before_dropping_the_reports_of_the_idrac():
+    scheduler = FairScheduler(host_queue_bytes=100, total_queue_bytes=150)
+    scheduler.put('idrac-1', 'first', 100)
+    scheduler.put('idrac-2', 'other', 50)
+    putting = threading.Thread(target=scheduler.put, args=('idrac-1', 'second', 100), daemon=True)
+    putting.start()
+    # put() holds the lock from counting the report until it waits for room
+    while scheduler.hosts['idrac-1'].received < 2:
+        time.sleep(0.01)
+    assert scheduler.get() == ('idrac-1', 'first')
+    scheduler.done('idrac-1')
+    putting.join(5)
+    scheduler.close()
+    assert sorted(iter(scheduler.get, None)) == [('idrac-1', 'second'), ('idrac-2', 'other')]
+    assert [host['dropped'] for host in scheduler.stats()] == [0, 0]
+
+
+def test_drop_emptying_the_queue_of_an_idrac_in_turn():
+    scheduler = FairScheduler(host_queue_bytes=100)
+    scheduler.put('idrac-1', 'first', 100)
+    scheduler._drop_oldest(scheduler.hosts['idrac-1'])
+    scheduler.put('idrac-2', 'other', 50)
+    assert scheduler.get() == ('idrac-2', 'other')
+    assert not scheduler.hosts['idrac-1'].active
+
+
+def test_drain_ends_once_closed_and_empty():
+    scheduler = FairScheduler()
+    scheduler.put('idrac-1', 'report', 10)
+    scheduler.close()
+    assert list(scheduler.drain()) == ['report']
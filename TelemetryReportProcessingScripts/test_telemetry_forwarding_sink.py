@@ -0,0 +1,152 @@
+#
+# test_telemetry_forwarding_sink. Tests of the TelemetryForwardingSink batches and spool against a StandInReceiver,
+# run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import json
+import os
+import socket
+
+import pytest
+
+from TelemetryForwardingSink import Batch, ForwardingSink, Spool, StandInReceiver, batch_records, compress, \
+    decompress
+from TelemetryPipeline import TelemetryReport
+
+
+class CollectingSink(object):
+    def __init__(self):
+        self.reports = []
+
+    def write(self, telemetry_report):
+        self.reports.append(telemetry_report)
+
+
+def free_port():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        return listener.getsockname()[1]
+
+
+@pytest.fixture(params=['http', 'tcp'])
+def receiver(request):
+    url = '%s://127.0.0.1:%d' % (request.param, free_port())
+    receiver = StandInReceiver(url, sink=CollectingSink()).start()
+    receiver.url = url
+    yield receiver
+    receiver.stop()
+
+
+def make_reports(count, idrac_name='idrac-1'):
+    return [TelemetryReport(idrac_name, index, {'Id': 'PowerMetrics', 'ReportSequence': str(index)})
+            for index in range(count)]
+
+
+def spooled_batch(sequence, reports, codec='gzip'):
+    lines = b''.join(json.dumps({'iDRAC': report.idrac_name, 'Index': report.index, 'Report': report.report}).encode(
+        'utf-8') + b'\n' for report in reports)
+    return Batch(sequence, codec, compress(codec, lines), len(reports), len(lines))
+
+
+@pytest.mark.parametrize('codec', ['gzip', 'none'])
+def test_compress_round_trip(codec):
+    lines = b'{"iDRAC": "idrac-1", "Index": 1, "Report": {"Id": "PowerMetrics"}}\n'
+    assert decompress(codec, compress(codec, lines)) == lines
+    assert batch_records(codec, compress(codec, lines)) == [{'iDRAC': 'idrac-1', 'Index': 1,
+                                                             'Report': {'Id': 'PowerMetrics'}}]
+
+
+def test_forwarded_reports_reach_the_receiver(receiver, tmp_path):
+    sink = ForwardingSink(receiver.url, batch_reports=10, linger_seconds=0.05, connections=2,
+                          spool_folder=str(tmp_path / 'spool'), close_timeout=10)
+    for report in make_reports(95):
+        sink.write(report)
+    sink.close()
+    summary = sink.summary()
+    assert (summary['reports_sent'], summary['batches_sent'], summary['dropped']) == (95, 10, 0)
+    assert sorted(report.index for report in receiver.sink.reports) == list(range(95))
+    assert receiver.stats.as_dict()['duplicates'] == 0
+    assert os.listdir(str(tmp_path / 'spool')) == []
+
+
+def test_spool_left_by_a_previous_run_is_drained_first(receiver, tmp_path):
+    folder = str(tmp_path / 'spool')
+    spool = Spool(folder)
+    for sequence in (1, 2, 3):
+        spool.write(spooled_batch(sequence, make_reports(5, 'idrac-spooled-%d' % sequence)))
+    sink = ForwardingSink(receiver.url, batch_reports=10, linger_seconds=0.05, connections=1, spool_folder=folder,
+                          close_timeout=10)
+    for report in make_reports(5):
+        sink.write(report)
+    sink.close()
+    assert sink.summary()['reports_sent'] == 20
+    assert [report.idrac_name for report in receiver.sink.reports] == \
+        ['idrac-spooled-%d' % sequence for sequence in (1, 2, 3) for _ in range(5)] + ['idrac-1'] * 5
+    assert os.listdir(folder) == []
+
+
+def test_spool_reads_legacy_names_and_removes_partial_writes(tmp_path):
+    folder = str(tmp_path / 'spool')
+    os.makedirs(folder)
+    batch = spooled_batch(7, make_reports(3))
+    with open(os.path.join(folder, '%016d-3.gzip' % 7), 'wb') as file:
+        file.write(batch.payload)
+    with open(os.path.join(folder, '%016d-2-100.gzip.tmp' % 8), 'wb') as file:
+        file.write(b'partial')
+    with open(os.path.join(folder, 'notes.txt'), 'w') as file:
+        file.write('not a batch')
+    spool = Spool(folder)
+    assert len(spool) == 1 and spool.last_sequence == 7 and spool.bytes == batch.size
+    assert sorted(os.listdir(folder)) == ['%016d-3.gzip' % 7, 'notes.txt']
+    loaded = Spool.load(spool.pop())
+    assert (loaded.sequence, loaded.reports, loaded.raw_bytes) == (7, 3, 0)
+    assert len(batch_records(loaded.codec, loaded.payload)) == 3
+    spool.remove(loaded)
+    assert spool.bytes == 0 and os.listdir(folder) == ['notes.txt']
+
+
+def test_spool_keeps_raw_bytes(tmp_path):
+    spool = Spool(str(tmp_path))
+    batch = spooled_batch(12, make_reports(4))
+    spool.add(spool.write(batch))
+    assert Spool(str(tmp_path)).entries[0][5] == batch.raw_bytes
+    assert Spool.load(spool.pop()).raw_bytes == batch.raw_bytes
+
+
+def test_unreachable_collector_spools_the_batches(tmp_path):
+    folder = str(tmp_path / 'spool')
+    sink = ForwardingSink('http://127.0.0.1:%d' % free_port(), batch_reports=10, linger_seconds=0.05, connections=1,
+                          spool_folder=folder, timeout=1, close_timeout=0.5)
+    for report in make_reports(30):
+        sink.write(report)
+    sink.close()
+    assert sink.summary()['reports_sent'] == 0
+    spool = Spool(folder)
+    assert sum(entry[1] for entry in spool.entries) == 30
+
+
+def test_batch_in_flight_when_closing_is_spooled(tmp_path):
+    folder = str(tmp_path / 'spool')
+    with socket.socket() as collector:
+        # accepts the connection and never acknowledges the batch
+        collector.bind(('127.0.0.1', 0))
+        collector.listen()
+        sink = ForwardingSink('tcp://127.0.0.1:%d' % collector.getsockname()[1], batch_reports=10, connections=1,
+                              spool_folder=folder, timeout=0.5, close_timeout=0.1)
+        for report in make_reports(10):
+            sink.write(report)
+        sink.close()
+    assert sink.summary()['reports_sent'] == 0
+    assert [entry[1] for entry in Spool(folder).entries] == [10]
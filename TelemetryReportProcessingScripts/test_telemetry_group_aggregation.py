@@ -0,0 +1,123 @@
+#
+# test_telemetry_group_aggregation. Tests of the TelemetryGroupAggregation buckets and watermarks, run with:
+# python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import time
+
+import pytest
+
+from TelemetryGroupAggregation import GroupAggregator, _timestamp, read_group_mapping
+
+# 2022-04-20T15:00:00Z, aligned on the buckets
+START = 1650466800
+MAPPING = {'idrac-1': {'Rack': 'R1', 'Cluster': 'A'}, 'idrac-2': {'Rack': 'R1', 'Cluster': 'A'},
+           'idrac-3': {'Rack': 'R2', 'Cluster': 'A'}}
+
+
+def make_report(epoch, values, metric_id='SystemInputPower'):
+    return {'Id': 'PowerMetrics', 'Timestamp': _timestamp(epoch),
+            'MetricValues': [{'MetricId': metric_id, 'MetricValue': str(value), 'Timestamp': _timestamp(epoch),
+                              'Oem': {'Dell': {'ContextID': 'PS%d' % position}}}
+                             for position, value in enumerate(values)]}
+
+
+def statistics(aggregate_report):
+    """Returns {statistic: value} of the first MetricId of an aggregate report"""
+    return {metric_value['Oem']['Dell']['Aggregation']: float(metric_value['MetricValue'])
+            for metric_value in aggregate_report.report['MetricValues']}
+
+
+def test_read_group_mapping(tmp_path):
+    path = tmp_path / 'iDRACs.csv'
+    path.write_text('iDRAC IP,Username,Password,Name,Rack,Cluster\n'
+                    '192.168.0.120,root,calvin,idrac-r12-01,R12,ClusterA\n'
+                    '192.168.0.121,root,calvin,,R12,\n'
+                    '\n')
+    assert read_group_mapping(str(path)) == {'idrac-r12-01': {'Rack': 'R12', 'Cluster': 'ClusterA'},
+                                             '192.168.0.121': {'Rack': 'R12'}}
+    with pytest.raises(ValueError):
+        read_group_mapping(str(path), levels=('Rack', 'Row'))
+
+
+def test_bucket_statistics_keep_the_last_value_of_each_sensor():
+    aggregator = GroupAggregator(MAPPING, levels=('Rack',))
+    aggregator.update('idrac-1', make_report(START, [100, 200]))
+    aggregator.update('idrac-1', make_report(START + 10, [110, 200]))
+    aggregator.update('idrac-2', make_report(START + 20, [300]))
+    reports = aggregator.flush()
+    assert [(report.idrac_name, report.report['Oem']['Dell']['BucketStart']) for report in reports] == \
+        [('rack-R1', _timestamp(START))]
+    assert statistics(reports[0]) == {'sum': 610, 'min': 110, 'max': 300, 'avg': round(610 / 3, 6), 'count': 3}
+
+
+def test_bucket_waits_for_the_slowest_idrac_of_the_group():
+    aggregator = GroupAggregator(MAPPING, levels=('Rack',), bucket_seconds=60, lateness_seconds=120)
+    aggregator.update('idrac-1', make_report(START, [100]))
+    aggregator.update('idrac-2', make_report(START, [200]))
+    for offset in range(60, 600, 60):
+        assert aggregator.update('idrac-1', make_report(START + offset, [100])) == []
+    # idrac-3 is in another rack, it does not close the buckets of R1
+    assert aggregator.update('idrac-3', make_report(START + 600, [50])) == []
+    reports = aggregator.update('idrac-2', make_report(START + 180, [200]))
+    assert [report.report['Oem']['Dell']['BucketStart'] for report in reports] == [_timestamp(START)]
+    assert statistics(reports[0])['sum'] == 300
+
+
+def test_values_after_the_bucket_closed_are_late():
+    aggregator = GroupAggregator(MAPPING, levels=('Rack',), bucket_seconds=60, lateness_seconds=120)
+    aggregator.update('idrac-1', make_report(START, [100]))
+    aggregator.update('idrac-2', make_report(START, [200]))
+    aggregator.update('idrac-1', make_report(START + 180, [100]))
+    assert len(aggregator.update('idrac-2', make_report(START + 180, [200]))) == 1
+    assert aggregator.update('idrac-2', make_report(START + 30, [999])) == []
+    reports = aggregator.flush()
+    assert [report.report['Oem']['Dell']['LateValuesDropped'] for report in reports] == [1]
+    assert statistics(reports[0])['max'] == 200
+
+
+def test_timestamps_ahead_of_the_local_clock_are_clamped():
+    aggregator = GroupAggregator(MAPPING, levels=('Rack',), bucket_seconds=60, lateness_seconds=120)
+    now = time.time()
+    aggregator.update('idrac-1', make_report(now - 60, [100]))
+    aggregator.update('idrac-2', make_report(now - 60, [200]))
+    # five minutes ahead, the buckets of idrac-1 are not closed early
+    assert aggregator.update('idrac-2', make_report(now + 300, [200])) == []
+    assert aggregator.clock_ahead_idracs == {'idrac-2'}
+    aggregator.update('idrac-1', make_report(now - 30, [100]))
+    reports = aggregator.flush()
+    assert sum(report.report['Oem']['Dell']['LateValuesDropped'] for report in reports) == 0
+    assert max(report.report['Oem']['Dell']['BucketStart'] for report in reports) <= _timestamp(time.time())
+
+
+def test_expire_closes_buckets_once_the_reports_stopped():
+    aggregator = GroupAggregator(MAPPING, levels=('Rack', 'Cluster'), bucket_seconds=60, lateness_seconds=120)
+    aggregator.update('idrac-1', make_report(START, [100]))
+    aggregator.update('idrac-3', make_report(START, [50]))
+    assert aggregator.expire(time.monotonic()) == []
+    reports = aggregator.expire(time.monotonic() + 121)
+    assert sorted(report.idrac_name for report in reports) == ['cluster-A', 'rack-R1', 'rack-R2']
+    cluster = [report for report in reports if report.idrac_name == 'cluster-A'][0]
+    assert statistics(cluster)['sum'] == 150
+    assert cluster.report['MetricValues'][0]['Oem']['Dell']['MissingiDRACs'] == ['idrac-2']
+
+
+def test_unmapped_idracs_and_filtered_metrics_are_ignored():
+    aggregator = GroupAggregator(MAPPING, levels=('Rack',), metric_ids=['SystemInput*'])
+    aggregator.update('idrac-9', make_report(START, [100]))
+    aggregator.update('idrac-1', make_report(START, [100], metric_id='CPUUsage'))
+    aggregator.update('idrac-1', make_report(START, ['Enabled']))
+    assert aggregator.flush() == []
+    assert aggregator.unmapped_idracs == {'idrac-9'}
@@ -0,0 +1,89 @@
+#
+# test_telemetry_latest_values. Tests of the TelemetryLatestValues shared memory table, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import math
+
+import pytest
+
+from TelemetryLatestValues import LatestValuesReader, LatestValuesTable, metric_number, series_labels
+
+REPORT = {'Id': 'PowerMetrics', 'Timestamp': '2022-04-20T10:11:12-05:00',
+          'MetricValues': [{'MetricId': 'SystemInputPower', 'MetricValue': '250',
+                            'Oem': {'Dell': {'ContextID': 'System.Embedded.1#PS1'}}},
+                           {'MetricId': 'SystemInputPower', 'MetricValue': '251.5',
+                            'Timestamp': '2022-04-20T15:11:13Z',
+                            'Oem': {'Dell': {'FQDD': 'PSU.Slot.2'}}},
+                           {'MetricId': 'PowerState', 'MetricValue': 'On',
+                            'MetricProperty': '/redfish/v1/Systems/System.Embedded.1#PowerState'}]}
+
+
+def test_series_labels_and_metric_number():
+    assert [series_labels(metric_value) for metric_value in REPORT['MetricValues']] == \
+        ['System.Embedded.1#PS1', 'PSU.Slot.2', '/redfish/v1/Systems/System.Embedded.1#PowerState']
+    assert metric_number('40.5') == 40.5
+    assert math.isnan(metric_number('Enabled')) and math.isnan(metric_number(None))
+
+
+def test_table_reader_round_trip(tmp_path):
+    path = str(tmp_path / 'latest')
+    table = LatestValuesTable(path, capacity=16, name_size=128)
+    reader = LatestValuesReader(path)
+    try:
+        assert reader.get('idrac-1', 'SystemInputPower', 'System.Embedded.1#PS1') is None
+        table.update_report('idrac-1', REPORT)
+        assert reader.get('idrac-1', 'SystemInputPower', 'System.Embedded.1#PS1') == (250.0, 1650467472.0, 1)
+        assert reader.get('idrac-1', 'SystemInputPower', 'PSU.Slot.2') == (251.5, 1650467473.0, 1)
+        value, timestamp, updates = reader.get('idrac-1', 'PowerState',
+                                               '/redfish/v1/Systems/System.Embedded.1#PowerState')
+        assert math.isnan(value) and updates == 1
+        table.update('idrac-1', 'SystemInputPower', 'System.Embedded.1#PS1', 260.0, 1650467480.0)
+        assert reader.get('idrac-1', 'SystemInputPower', 'System.Embedded.1#PS1') == (260.0, 1650467480.0, 2)
+        assert reader.series()[0] == ('idrac-1', 'SystemInputPower', 'System.Embedded.1#PS1')
+        assert len(reader.snapshot()) == 3
+    finally:
+        table.close()
+    assert reader.closed
+    reader.close()
+
+
+def test_full_table_ignores_new_series(tmp_path):
+    path = str(tmp_path / 'latest')
+    table = LatestValuesTable(path, capacity=2, name_size=64)
+    table.update_report('idrac-1', REPORT)
+    table.update('idrac-1', 'M' * 100, '', 1.0, 0.0)
+    assert table.series_count == 2 and table.dropped_series == 2
+    table.close()
+
+
+def test_new_table_closes_the_previous_one(tmp_path):
+    path = str(tmp_path / 'latest')
+    first = LatestValuesTable(path, capacity=4, name_size=64)
+    reader = LatestValuesReader(path)
+    second = LatestValuesTable(path, capacity=4, name_size=64)
+    assert reader.closed
+    reader.close()
+    reader = LatestValuesReader(path)
+    assert not reader.closed
+    reader.close()
+    first.close()
+    second.close()
+
+
+def test_reader_rejects_other_files(tmp_path):
+    path = tmp_path / 'latest'
+    path.write_bytes(b'\0' * 4096)
+    with pytest.raises(ValueError):
+        LatestValuesReader(str(path))
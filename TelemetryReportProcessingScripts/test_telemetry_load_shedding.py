@@ -0,0 +1,65 @@
+#
+# test_telemetry_load_shedding. Tests of the TelemetryLoadShedding levels and chunk shedding, run with:
+# python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import pytest
+
+from TelemetryLoadShedding import OverloadController, parse_priorities, shed_reports
+from TelemetryPipeline import Chunk
+
+
+def controller_at_level(level, backlog, sample_every=4):
+    controller = OverloadController(parse_priorities('PowerMetrics=critical,Sensor=high,NIC*=low'), shed_bytes=100,
+                                    recover_bytes=10, sample_every=sample_every, recover_seconds=30)
+    controller.add_source(lambda: backlog[0])
+    for _ in range(level):
+        controller.update(0)
+    return controller
+
+
+def test_parse_priorities():
+    assert parse_priorities('PowerMetrics=critical, NIC*=LOW') == [('PowerMetrics', 3), ('NIC*', 0)]
+    with pytest.raises(ValueError):
+        parse_priorities('PowerMetrics=urgent')
+
+
+def test_levels_go_up_while_behind_and_down_once_recovered():
+    backlog = [1000]
+    controller = controller_at_level(0, backlog)
+    assert [controller.update(0) for _ in range(4)] == [1, 2, 3, 3]
+    backlog[0] = 500
+    assert controller.update(1) == 3
+    backlog[0] = 5
+    assert [controller.update(now) for now in (2, 10, 32, 40, 62, 92)] == [3, 3, 2, 2, 1, 0]
+
+
+def test_accepts_by_priority_and_samples_one_level():
+    controller = controller_at_level(2, [1000], sample_every=4)
+    assert all(controller.accepts('idrac-1', 'PowerMetrics') for _ in range(10))
+    assert all(controller.accepts('idrac-1', 'Sensor') for _ in range(10))
+    assert [controller.accepts('idrac-1', 'ThermalSensor') for _ in range(8)] == [True, False, False, False] * 2
+    assert not controller.accepts('idrac-1', 'NICStatistics')
+    assert controller.stats()['shed_reports'] == {'ThermalSensor': 6, 'NICStatistics': 1}
+
+
+def test_shed_reports_drops_every_chunk_of_a_shed_report():
+    controller = controller_at_level(2, [1000])
+    chunks = [Chunk('', '', 'idrac-1', 1, 2, 1, '{"@odata.id": "/redfish/v1/TelemetryService/MetricReports/'
+                                                'NICStatistics", "Id": "NICSta'),
+              Chunk('', '', 'idrac-1', 2, 1, 1, '{"Id": "PowerMetrics"}'),
+              Chunk('', '', 'idrac-1', 1, 2, 2, 'tistics"}')]
+    assert [chunk.index for chunk in shed_reports(chunks, controller)] == [2]
+    assert controller.stats()['shed_chunks'] == 2
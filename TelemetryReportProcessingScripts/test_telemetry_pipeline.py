@@ -0,0 +1,216 @@
+#
+# test_telemetry_pipeline. Tests of the TelemetryPipeline stages, run with: python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import json
+import os
+import threading
+import time
+
+from TelemetryPipeline import FilePosition, ReportFilter, TelemetryRsyslogParser, assemble_reports, \
+    follow_binary_lines, parse_chunks, report_stream
+
+
+def make_report(report_id, sequence, metric_ids=('SystemInputPower', 'CPUUsage')):
+    return {'@odata.id': '/redfish/v1/TelemetryService/MetricReports/' + report_id, 'Id': report_id,
+            'ReportSequence': str(sequence), 'Timestamp': '2022-04-20T10:11:%02d-05:00' % (sequence % 60),
+            'MetricValues': [{'MetricId': metric_id, 'MetricValue': str(sequence + position),
+                              'Timestamp': '2022-04-20T10:11:%02d-05:00' % (sequence % 60),
+                              'Oem': {'Dell': {'ContextID': 'System.Embedded.1#Sensor%d' % position}}}
+                             for position, metric_id in enumerate(metric_ids)],
+            'MetricValues@odata.count': len(metric_ids)}
+
+
+def rsyslog_lines(idrac_name, index, report, chunk_size=64):
+    """Splits a report in Rsyslog lines the way an iDRAC sends it"""
+    message = json.dumps(report)
+    parts = [message[offset:offset + chunk_size] for offset in range(0, len(message), chunk_size)]
+    return ['2022-04-20T10:11:12.123-05:00 10.0.0.1 %s: #Telemetry#:%d-%d-%d: %s\n' %
+            (idrac_name, index, len(parts), chunk_id, part) for chunk_id, part in enumerate(parts, 1)]
+
+
+def interleaved_lines():
+    """Lines of two iDRACs sending two reports each, their chunks interleaved"""
+    reports = [('idrac-1', 1, make_report('PowerMetrics', 1)), ('idrac-2', 1, make_report('PowerMetrics', 7)),
+               ('idrac-1', 2, make_report('ThermalSensor', 2)), ('idrac-2', 2, make_report('ThermalSensor', 8))]
+    streams = [rsyslog_lines(*report) for report in reports]
+    lines = []
+    while any(streams):
+        for stream in streams:
+            if stream:
+                lines.append(stream.pop(0))
+    return reports, lines
+
+
+def test_parse_chunk_str_and_bytes_agree():
+    line = rsyslog_lines('idrac-1', 12, make_report('PowerMetrics', 3))[0]
+    chunk = TelemetryRsyslogParser().parse_chunk(line)
+    assert chunk == TelemetryRsyslogParser.parse_chunk_bytes(line.rstrip('\n').encode('utf-8'))
+    assert (chunk.host_name, chunk.idrac_name, chunk.index, chunk.chunk_id) == ('10.0.0.1', 'idrac-1', 12, 1)
+
+
+def test_parse_chunks_ignores_other_lines():
+    lines = [b'2022-04-20T10:11:12.123-05:00 10.0.0.1 sshd[42]: Accepted password for root'] + \
+        [line.rstrip('\n').encode('utf-8') for line in rsyslog_lines('idrac-1', 1, make_report('PowerMetrics', 1))]
+    assert len(list(parse_chunks(lines))) == len(lines) - 1
+
+
+def test_parse_assemble_round_trip():
+    reports, lines = interleaved_lines()
+    for lines_type in (str, bytes):
+        source = lines if lines_type is str else [line.rstrip('\n').encode('utf-8') for line in lines]
+        decoded = list(report_stream(source))
+        assert sorted((report.idrac_name, report.index, json.dumps(report.report)) for report in decoded) == \
+            sorted((idrac_name, index, json.dumps(report)) for idrac_name, index, report in reports)
+
+
+def test_assemble_reports_drops_oldest_incomplete_report():
+    _, lines = interleaved_lines()
+    chunks = [chunk for chunk in parse_chunks(lines) if not (chunk.idrac_name == 'idrac-1' and chunk.index == 1 and
+                                                             chunk.chunk_id == 1)]
+    raw_reports = list(assemble_reports(chunks, max_pending=1))
+    assert ('idrac-1', 1) not in [(raw_report.idrac_name, raw_report.index) for raw_report in raw_reports]
+
+
+def test_report_filter_drops_reports_on_first_chunk_and_prunes_metrics():
+    _, lines = interleaved_lines()
+    report_filter = ReportFilter(include_reports=['Power*'], exclude_metrics=['CPUUsage'], idrac_names=['idrac-1'])
+    decoded = list(report_stream([line.rstrip('\n').encode('utf-8') for line in lines], report_filter=report_filter))
+    assert [(report.idrac_name, report.report['Id']) for report in decoded] == [('idrac-1', 'PowerMetrics')]
+    assert [value['MetricId'] for value in decoded[0].report['MetricValues']] == ['SystemInputPower']
+    assert decoded[0].report['MetricValues@odata.count'] == 1
+    assert report_filter.dropped_reports == 1
+    assert report_filter.dropped_lines > 0
+    assert report_filter.pruned_metrics == 1
+
+
+class FollowedFile(object):
+    """Runs follow_binary_lines on a thread and collects the lines it yields"""
+
+    def __init__(self, path, **kwargs):
+        self.lines = []
+        self.position = FilePosition(path)
+        self.stop_event = threading.Event()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, args=(path, kwargs), daemon=True)
+        self._thread.start()
+
+    def _run(self, path, kwargs):
+        for line in follow_binary_lines(path, poll_interval=0.01, stop_event=self.stop_event, position=self.position,
+                                        **kwargs):
+            with self._condition:
+                self.lines.append(line)
+                self._condition.notify_all()
+            if self.stop_event.is_set():
+                return
+
+    def wait_opened(self, offset, timeout=5):
+        """Waits for the generator to open the file and seek to offset, lines appended before that may be skipped"""
+        deadline = time.monotonic() + timeout
+        while self.position.offset != offset and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def wait_lines(self, count, timeout=5):
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.lines) >= count, timeout)
+            return list(self.lines)
+
+    def stop(self):
+        self.stop_event.set()
+        self._thread.join(5)
+
+
+def append(path, data):
+    with open(path, 'ab') as file:
+        file.write(data)
+
+
+def test_follow_binary_lines_joins_partial_lines(tmp_path):
+    path = str(tmp_path / 'idrac.log')
+    append(path, b'old line\n')
+    followed = FollowedFile(path, block_size=4)
+    followed.wait_opened(len(b'old line\n'))
+    try:
+        append(path, b'first li')
+        append(path, b'ne\nsecond line\n')
+        assert followed.wait_lines(2) == [b'first line', b'second line']
+    finally:
+        followed.stop()
+
+
+def test_follow_binary_lines_reads_existing_lines_when_not_from_end(tmp_path):
+    path = str(tmp_path / 'idrac.log')
+    append(path, b'old line\n')
+    followed = FollowedFile(path, from_end=False)
+    try:
+        assert followed.wait_lines(1) == [b'old line']
+    finally:
+        followed.stop()
+
+
+def test_follow_binary_lines_follows_rotation(tmp_path):
+    path = str(tmp_path / 'idrac.log')
+    append(path, b'')
+    followed = FollowedFile(path, from_end=False)
+    try:
+        append(path, b'before rotation\n')
+        assert followed.wait_lines(1) == [b'before rotation']
+        os.rename(path, path + '.1')
+        append(path, b'after rotation\n')
+        assert followed.wait_lines(2) == [b'before rotation', b'after rotation']
+        assert followed.position.offset == len(b'after rotation\n')
+        assert followed.position.bytes_behind() == 0
+    finally:
+        followed.stop()
+
+
+def test_follow_binary_lines_follows_truncation(tmp_path):
+    path = str(tmp_path / 'idrac.log')
+    append(path, b'')
+    followed = FollowedFile(path, from_end=False)
+    try:
+        append(path, b'a long line before the truncation\n')
+        assert len(followed.wait_lines(1)) == 1
+        with open(path, 'wb') as file:
+            file.write(b'short\n')
+        assert followed.wait_lines(2)[1:] == [b'short']
+    finally:
+        followed.stop()
+
+
+def test_follow_binary_lines_idle_reopen_does_not_yield_lines_again(tmp_path):
+    path = str(tmp_path / 'idrac.log')
+    append(path, b'')
+    followed = FollowedFile(path, from_end=False, reopen_after=0)
+    try:
+        append(path, b'one\n')
+        assert followed.wait_lines(1) == [b'one']
+        followed.wait_lines(2, timeout=0.2)
+        append(path, b'two\n')
+        assert followed.wait_lines(3, timeout=0.5) == [b'one', b'two']
+    finally:
+        followed.stop()
+
+
+def test_file_position_bytes_behind(tmp_path):
+    path = str(tmp_path / 'idrac.log')
+    append(path, b'0123456789\n')
+    position = FilePosition(path)
+    assert position.bytes_behind() == 11
+    position.offset = 5
+    assert position.bytes_behind() == 6
+    position.identity = (-1, -1)
+    assert position.bytes_behind() == 11
+    assert FilePosition(str(tmp_path / 'missing.log')).bytes_behind() == 0
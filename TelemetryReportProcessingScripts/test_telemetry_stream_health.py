@@ -0,0 +1,106 @@
+#
+# test_telemetry_stream_health. Tests of the TelemetryStreamHealth sequence window and silence detection, run with:
+# python -m pytest
+#
+#
+#
+# _version_ = 1.0
+#
+# Copyright (c) 2022, Dell, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+import time
+
+from TelemetryStreamHealth import WINDOW, StreamHealthTracker, report_time
+
+
+def observe(sequences, report_id='PowerMetrics', start=None):
+    """Returns the tracker and the events after observing the ReportSequences of one iDRAC, one report per second"""
+    events = []
+    tracker = StreamHealthTracker(on_event=events.append)
+    start = time.monotonic() if start is None else start
+    for position, sequence in enumerate(sequences):
+        tracker.observe('idrac-1', {'Id': report_id, 'ReportSequence': str(sequence)}, now=start + position)
+    return tracker, events
+
+
+def test_report_time():
+    assert report_time('2022-04-20T10:11:12-05:00') == 1650467472
+    assert report_time('2022-04-20T15:11:12.500+00:00') == 1650467472.5
+    assert report_time('not a timestamp') is None
+    assert report_time(None) is None
+
+
+def test_in_order_sequences_raise_no_event():
+    tracker, events = observe(range(1, 200))
+    assert events == []
+    assert tracker.streams[('idrac-1', 'PowerMetrics')].received == 199
+
+
+def test_gap():
+    tracker, events = observe([1, 2, 5, 6])
+    assert [(event['event'], event['missing'], event['first_missing'], event['last_missing']) for event in events] == \
+        [('gap', 2, 3, 4)]
+    assert tracker.streams[('idrac-1', 'PowerMetrics')].gaps == 2
+
+
+def test_late_report_fills_gap():
+    tracker, events = observe([1, 2, 5, 3, 6])
+    stream = tracker.streams[('idrac-1', 'PowerMetrics')]
+    assert (stream.gaps, stream.reordered, stream.duplicates) == (1, 1, 0)
+    assert [event['event'] for event in events] == ['gap']
+
+
+def test_late_report_older_than_the_first_one_is_only_reordered():
+    tracker, events = observe([10, 11, 8, 9, 13, 12, 8])
+    stream = tracker.streams[('idrac-1', 'PowerMetrics')]
+    assert (stream.gaps, stream.reordered, stream.duplicates) == (0, 3, 1)
+    assert [event['event'] for event in events] == ['gap', 'duplicate']
+
+
+def test_duplicate():
+    tracker, events = observe([1, 2, 3, 2, 3])
+    assert [(event['event'], event['sequence']) for event in events] == [('duplicate', 2), ('duplicate', 3)]
+    assert tracker.streams[('idrac-1', 'PowerMetrics')].duplicates == 2
+
+
+def test_duplicate_at_the_edge_of_the_window():
+    sequences = list(range(1, WINDOW + 1))
+    _, events = observe(sequences + [1])
+    assert [event['event'] for event in events] == ['duplicate']
+
+
+def test_reset():
+    tracker, events = observe(list(range(1000, 1000 + WINDOW + 1)) + [1, 2])
+    assert [(event['event'], event['sequence'], event['previous_sequence']) for event in events] == \
+        [('reset', 1, 1000 + WINDOW)]
+    stream = tracker.streams[('idrac-1', 'PowerMetrics')]
+    assert (stream.resets, stream.highest, stream.gaps) == (1, 2, 0)
+
+
+def test_streams_are_tracked_per_report_id():
+    events = []
+    tracker = StreamHealthTracker(on_event=events.append)
+    for sequence in (1, 2, 3):
+        tracker.observe('idrac-1', {'Id': 'PowerMetrics', 'ReportSequence': str(sequence)})
+        tracker.observe('idrac-1', {'Id': 'ThermalSensor', 'ReportSequence': str(sequence * 10)})
+    assert sorted(tracker.streams) == [('idrac-1', 'PowerMetrics'), ('idrac-1', 'ThermalSensor')]
+    assert tracker.events['gap'] == 2
+
+
+def test_silent_and_recovered():
+    start = time.monotonic()
+    tracker, events = observe(range(1, 11), start=start)
+    tracker.check_silence(start + 30)
+    assert events == []
+    tracker.check_silence(start + 9 + 61)
+    assert [event['event'] for event in events] == ['silent']
+    tracker.observe('idrac-1', {'Id': 'PowerMetrics', 'ReportSequence': '11'}, now=start + 80)
+    assert [event['event'] for event in events] == ['silent', 'recovered']
+    assert tracker.events['silent'] == 1 and tracker.events['recovered'] == 1